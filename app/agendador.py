@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Agendador de tarefas periódicas dentro do processo da aplicação
+
+Substitui o cron externo para as tarefas de manutenção. Cada tarefa tem
+uma expressão no formato do cron (minuto hora dia mês dia-da-semana) e
+um atraso aleatório opcional (jitter) para não concentrar execuções no
+mesmo instante. Tarefas exclusivas usam uma linha de lease no SQLite, de
+modo que cada horário seja executado por um único processo mesmo com
+vários workers; tarefas por processo (ex.: limpeza das sessões em
+memória) rodam em todos. Todas as execuções ficam registradas em
+``agendador_execucoes``.
+
+As tarefas rodam em uma conexão própria do agendador (como os jobs de
+app.jobs): tarefas que abrem transações (arquivamento, otimização do
+banco) não podem se misturar com as transações das requisições, o que
+aconteceria na conexão compartilhada com as rotas.
+"""
+
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, FrozenSet, List, Optional
+
+from fastlite import Database
+
+from app.date_utils import format_datetime_iso
+
+logger = logging.getLogger(__name__)
+
+# Tempo máximo (s) que uma execução exclusiva segura o lease
+DURACAO_LEASE_PADRAO = 600
+
+# Espera máxima (s) do laço entre duas verificações de tarefas pendentes
+ESPERA_MAXIMA = 60
+
+# Execuções mantidas no histórico por tarefa
+HISTORICO_POR_TAREFA = 200
+
+# (mínimo, máximo) de minuto, hora, dia, mês e dia da semana (7 = domingo)
+_LIMITES_CRON = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+
+def _expandir_campo(campo: str, minimo: int, maximo: int) -> FrozenSet[int]:
+    """Converte um campo do cron (*, */n, a-b, a-b/n, listas) no conjunto de valores"""
+    valores = set()
+    for parte in campo.split(','):
+        faixa, _, passo_texto = parte.partition('/')
+        passo = int(passo_texto) if passo_texto else 1
+        if faixa == '*':
+            inicio, fim = minimo, maximo
+        elif '-' in faixa:
+            inicio, fim = (int(v) for v in faixa.split('-', 1))
+        else:
+            inicio = int(faixa)
+            fim = maximo if passo_texto else inicio
+        if passo < 1 or inicio < minimo or fim > maximo or inicio > fim:
+            raise ValueError(f"Campo cron inválido: {campo}")
+        valores.update(range(inicio, fim + 1, passo))
+    return frozenset(valores)
+
+
+class CronSpec:
+    """Expressão no formato do cron: minuto hora dia mês dia-da-semana"""
+
+    def __init__(self, expressao: str):
+        campos = expressao.split()
+        if len(campos) != 5:
+            raise ValueError(f"Expressão cron inválida: {expressao}")
+
+        self.expressao = expressao
+        self.minutos, self.horas, self.dias, self.meses, dias_semana = (
+            _expandir_campo(campo, minimo, maximo)
+            for campo, (minimo, maximo) in zip(campos, _LIMITES_CRON)
+        )
+        # Domingo pode ser 0 ou 7
+        self.dias_semana = frozenset(d % 7 for d in dias_semana)
+        # Com dia do mês e dia da semana restritos, basta um deles conferir
+        self._dia_ou_semana = campos[2] != '*' and campos[4] != '*'
+
+    def _dia_confere(self, instante: datetime) -> bool:
+        """Verifica dia do mês e dia da semana"""
+        dia = instante.day in self.dias
+        semana = instante.isoweekday() % 7 in self.dias_semana
+        return (dia or semana) if self._dia_ou_semana else (dia and semana)
+
+    def proxima_execucao(self, apos: datetime) -> datetime:
+        """
+        Retorna o primeiro minuto após ``apos`` que atende à expressão
+
+        Raises:
+            ValueError: Se nenhum horário for encontrado (ex.: 31 de fevereiro)
+        """
+        instante = apos.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limite = instante + timedelta(days=366 * 4)
+
+        while instante <= limite:
+            if instante.month not in self.meses:
+                instante = (instante.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._dia_confere(instante):
+                instante = (instante + timedelta(days=1)).replace(hour=0, minute=0)
+            elif instante.hour not in self.horas:
+                instante = (instante + timedelta(hours=1)).replace(minute=0)
+            elif instante.minute not in self.minutos:
+                instante += timedelta(minutes=1)
+            else:
+                return instante
+
+        raise ValueError(f"Expressão cron sem horários válidos: {self.expressao}")
+
+    def execucao_anterior(self, ate: datetime) -> datetime:
+        """
+        Retorna o último minuto até ``ate`` (inclusive) que atende à expressão
+
+        Raises:
+            ValueError: Se nenhum horário for encontrado
+        """
+        instante = ate.replace(second=0, microsecond=0)
+        limite = instante - timedelta(days=366 * 4)
+
+        while instante >= limite:
+            if instante.month not in self.meses:
+                instante = instante.replace(day=1, hour=23, minute=59) - timedelta(days=1)
+            elif not self._dia_confere(instante):
+                instante = instante.replace(hour=23, minute=59) - timedelta(days=1)
+            elif instante.hour not in self.horas:
+                instante = instante.replace(minute=59) - timedelta(hours=1)
+            elif instante.minute not in self.minutos:
+                instante -= timedelta(minutes=1)
+            else:
+                return instante
+
+        raise ValueError(f"Expressão cron sem horários válidos: {self.expressao}")
+
+
+@dataclass
+class TarefaAgendada:
+    """Tarefa registrada no agendador"""
+
+    nome: str
+    cron: CronSpec
+    funcao: Callable[[Database], Any]
+    jitter_segundos: int = 0
+    exclusiva: bool = True
+    duracao_lease_segundos: int = DURACAO_LEASE_PADRAO
+    horario: Optional[datetime] = field(default=None, repr=False)
+    executar_em: Optional[datetime] = field(default=None, repr=False)
+
+
+class Agendador:
+    """Executa as tarefas registradas em uma thread de fundo"""
+
+    def __init__(self, db: Database, dono: Optional[str] = None):
+        """
+        Args:
+            db: Conexão usada pelas tarefas (não compartilhar com as rotas)
+            dono: Identificação do processo no lease (padrão: host:pid)
+        """
+        self.db = db
+        self.dono = dono or f"{socket.gethostname()}:{os.getpid()}"
+        self._tarefas: Dict[str, TarefaAgendada] = {}
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def registrar(self, nome: str, expressao_cron: str, funcao: Callable[[Database], Any],
+                  jitter_segundos: int = 0, exclusiva: bool = True,
+                  duracao_lease_segundos: int = DURACAO_LEASE_PADRAO):
+        """
+        Registra uma tarefa
+
+        Args:
+            nome: Identificador da tarefa (chave do lease e do histórico)
+            expressao_cron: Horários no formato do cron
+            funcao: Recebe o banco e retorna um resultado serializável em JSON
+            jitter_segundos: Atraso aleatório máximo após o horário
+            exclusiva: Se True, cada horário roda em um único processo
+            duracao_lease_segundos: Tempo máximo de posse do lease
+        """
+        tarefa = TarefaAgendada(
+            nome, CronSpec(expressao_cron), funcao, jitter_segundos,
+            exclusiva, duracao_lease_segundos
+        )
+        self._agendar(tarefa, datetime.now())
+        self._tarefas[nome] = tarefa
+
+    def _agendar(self, tarefa: TarefaAgendada, apos: datetime):
+        """Calcula o próximo horário da tarefa e o instante com jitter"""
+        tarefa.horario = tarefa.cron.proxima_execucao(apos)
+        atraso = random.uniform(0, tarefa.jitter_segundos) if tarefa.jitter_segundos else 0
+        tarefa.executar_em = tarefa.horario + timedelta(seconds=atraso)
+
+    def _adquirir_lease(self, tarefa: TarefaAgendada, horario: str) -> bool:
+        """
+        Tenta obter o lease da tarefa para o horário
+
+        Falha se outro processo detém um lease válido ou se o horário já
+        foi executado (ultimo_horario >= horario).
+        """
+        agora = time.time()
+        linha = self.db.execute("""
+            INSERT INTO agendador_leases (tarefa, dono, expira_em, ultimo_horario)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (tarefa) DO UPDATE SET
+                dono = excluded.dono, expira_em = excluded.expira_em,
+                ultimo_horario = excluded.ultimo_horario
+            WHERE agendador_leases.expira_em < ?
+            AND (agendador_leases.ultimo_horario IS NULL
+                 OR agendador_leases.ultimo_horario < excluded.ultimo_horario)
+            RETURNING dono
+        """, (tarefa.nome, self.dono, agora + tarefa.duracao_lease_segundos, horario, agora)).fetchone()
+        return linha is not None
+
+    def _liberar_lease(self, tarefa: TarefaAgendada):
+        """Libera o lease mantendo o último horário executado"""
+        self.db.execute(
+            "UPDATE agendador_leases SET expira_em = 0 WHERE tarefa = ? AND dono = ?",
+            (tarefa.nome, self.dono)
+        )
+
+    def executar(self, nome: str, horario: Optional[datetime] = None) -> Optional[int]:
+        """
+        Executa uma tarefa registrando o histórico
+
+        Args:
+            nome: Nome da tarefa
+            horario: Horário agendado (padrão: agora, para execução manual)
+
+        Returns:
+            ID da execução ou None se outro processo já executou o horário
+        """
+        tarefa = self._tarefas[nome]
+        horario_iso = format_datetime_iso(horario or datetime.now())
+
+        if tarefa.exclusiva and not self._adquirir_lease(tarefa, horario_iso):
+            logger.debug(f"Tarefa {nome} ({horario_iso}) executada por outro processo")
+            return None
+
+        execucao_id = self.db.execute("""
+            INSERT INTO agendador_execucoes (tarefa, dono, horario_agendado, iniciada_em, status)
+            VALUES (?, ?, ?, datetime('now', 'localtime'), 'executando')
+            RETURNING id
+        """, (nome, self.dono, horario_iso)).fetchone()[0]
+
+        status, resultado, erro = 'concluida', None, None
+        try:
+            logger.info(f"Executando tarefa agendada {nome}")
+            resultado = tarefa.funcao(self.db)
+        except Exception as e:
+            logger.error(f"Erro na tarefa agendada {nome}: {e}")
+            status, erro = 'falhou', str(e)
+        finally:
+            self.db.execute("""
+                UPDATE agendador_execucoes
+                SET status = ?, resultado = ?, erro = ?, finalizada_em = datetime('now', 'localtime')
+                WHERE id = ?
+            """, (status, json.dumps(resultado, default=str) if resultado is not None else None,
+                  erro, execucao_id))
+            if tarefa.exclusiva:
+                self._liberar_lease(tarefa)
+            self.db.execute("""
+                DELETE FROM agendador_execucoes
+                WHERE tarefa = ? AND id <= (
+                    SELECT id FROM agendador_execucoes WHERE tarefa = ?
+                    ORDER BY id DESC LIMIT 1 OFFSET ?
+                )
+            """, (nome, nome, HISTORICO_POR_TAREFA))
+
+        return execucao_id
+
+    def executar_manual(self, nome: str, forcar: bool = False) -> Optional[int]:
+        """
+        Executa uma tarefa fora da thread (ex.: scripts/utils/maintenance.py)
+
+        A execução ocupa o horário mais recente do cron da tarefa: se a
+        aplicação já executou esse horário a tarefa não é repetida, e se
+        ainda não executou, a aplicação deixa de executá-lo. Com ``forcar``
+        a tarefa roda como um horário novo (repetindo o último), ainda sob
+        o lease, então não concorre com uma execução em andamento.
+
+        Returns:
+            ID da execução ou None se o horário já foi executado
+        """
+        tarefa = self._tarefas[nome]
+        agora = datetime.now()
+        return self.executar(nome, agora if forcar else tarefa.cron.execucao_anterior(agora))
+
+    def executar_pendentes(self, agora: Optional[datetime] = None) -> int:
+        """
+        Executa as tarefas cujo horário (com jitter) já chegou
+
+        Horários perdidos enquanto o processo estava parado ou ocupado são
+        executados uma única vez.
+
+        Returns:
+            Quantidade de tarefas executadas por este processo
+        """
+        agora = agora or datetime.now()
+        executadas = 0
+        for tarefa in list(self._tarefas.values()):
+            if tarefa.executar_em > agora:
+                continue
+            try:
+                if self.executar(tarefa.nome, tarefa.horario) is not None:
+                    executadas += 1
+            except Exception as e:
+                logger.error(f"Erro ao executar tarefa agendada {tarefa.nome}: {e}")
+            self._agendar(tarefa, max(agora, tarefa.horario))
+        return executadas
+
+    def _executar_periodicamente(self):
+        """Laço da thread: executa as tarefas pendentes e espera a próxima"""
+        while not self._parar.is_set():
+            self.executar_pendentes()
+            if self._tarefas:
+                proxima = min(t.executar_em for t in self._tarefas.values())
+                espera = (proxima - datetime.now()).total_seconds()
+            else:
+                espera = ESPERA_MAXIMA
+            self._parar.wait(min(max(espera, 1), ESPERA_MAXIMA))
+
+    def iniciar(self):
+        """Inicia a thread do agendador"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(
+            target=self._executar_periodicamente, name="agendador", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Agendador iniciado com {len(self._tarefas)} tarefas ({self.dono})")
+
+    def parar(self, timeout: Optional[float] = None):
+        """Sinaliza a parada e aguarda a thread terminar"""
+        self._parar.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def proximas_execucoes(self) -> Dict[str, datetime]:
+        """Retorna o próximo horário de cada tarefa"""
+        return {nome: tarefa.horario for nome, tarefa in self._tarefas.items()}
+
+    def historico(self, tarefa: Optional[str] = None, limite: int = 20) -> List[Dict[str, Any]]:
+        """
+        Retorna as execuções mais recentes
+
+        Args:
+            tarefa: Filtra por tarefa (padrão: todas)
+            limite: Quantidade máxima de execuções
+        """
+        colunas = ('id', 'tarefa', 'dono', 'horario_agendado', 'iniciada_em',
+                   'finalizada_em', 'status', 'resultado', 'erro')
+        sql = f"SELECT {', '.join(colunas)} FROM agendador_execucoes"
+        params: list = []
+        if tarefa:
+            sql += " WHERE tarefa = ?"
+            params.append(tarefa)
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(limite)
+        return [dict(zip(colunas, row)) for row in self.db.execute(sql, params).fetchall()]
+
+
+# Instância global do agendador
+_agendador: Optional[Agendador] = None
+
+
+def get_agendador() -> Optional[Agendador]:
+    """Retorna o agendador iniciado pela aplicação, se houver"""
+    return _agendador
+
+
+def abrir_conexao_agendador(db: Database, config) -> Database:
+    """
+    Abre a conexão própria do agendador no mesmo arquivo do banco da aplicação
+
+    Espera locks de escrita das requisições (busy timeout) e anexa o banco
+    de arquivo, usado pela tarefa de arquivamento.
+    """
+    from app.arquivamento import anexar_arquivo, arquivo_anexado
+    from app.database import CACHE_COMANDOS_PADRAO, abrir_banco
+    from app.jobs import TIMEOUT_OCUPADO_MS
+
+    conexao = abrir_banco(db.conn.filename, getattr(config, 'SQLITE_CACHE_COMANDOS', CACHE_COMANDOS_PADRAO))
+    conexao.conn.setbusytimeout(TIMEOUT_OCUPADO_MS)
+    caminho_arquivo = getattr(config, 'ARQUIVO_DATABASE_PATH', None)
+    if caminho_arquivo and arquivo_anexado(db):
+        anexar_arquivo(conexao, caminho_arquivo)
+    return conexao
+
+
+def iniciar_agendador(db: Database, config) -> Agendador:
+    """
+    Cria o agendador com as tarefas de manutenção e inicia a thread
+
+    Args:
+        db: Banco da aplicação (as tarefas usam uma conexão própria no mesmo arquivo)
+        config: Configuração da aplicação (expressões cron e jitter)
+    """
+    global _agendador
+
+    from app.database import fechar_banco
+    from app.manutencao import registrar_tarefas_manutencao
+
+    if _agendador is not None:
+        _agendador.parar()
+        fechar_banco(_agendador.db)
+    _agendador = Agendador(abrir_conexao_agendador(db, config))
+    registrar_tarefas_manutencao(_agendador, config)
+    _agendador.iniciar()
+    return _agendador
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Arquivamento de garantias antigas em um banco separado
+
+Garantias vencidas ou desativadas há mais de ``ARQUIVAMENTO_DIAS`` dias
+(em boa parte importadas do Caspio desde 2017) são movidas, em lotes,
+da tabela ``garantias`` para ``garantias`` no banco de arquivo
+(``ARQUIVO_DATABASE_PATH``, anexado à conexão como ``arquivo``). A tabela
+quente e seus índices ficam só com as garantias em uso, que são as que
+listagens e contagens percorrem.
+
+As consultas históricas, raras, usam a visão temporária
+``garantias_historico`` (UNION ALL das duas tabelas, com a coluna
+``arquivada``), criada ao anexar o arquivo. Os ids continuam únicos
+entre as duas tabelas porque ``garantias`` usa AUTOINCREMENT.
+
+O tempo de desativação é medido por ``data_desativacao``, preenchida por
+triggers quando ``ativo`` passa a FALSE (e limpa na reativação): uma
+garantia antiga desativada ontem continua na tabela quente e pode ser
+reativada pelo cliente.
+
+Ao sair da tabela quente a garantia deixa de ser contada pelos triggers
+de app.contadores e app.estabelecimentos: os contadores refletem as
+garantias não arquivadas.
+"""
+
+import logging
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Union
+
+from fastlite import Database
+
+from app.date_utils import format_date_iso, format_datetime_iso
+from app.unidade_trabalho import UnidadeTrabalho
+
+logger = logging.getLogger(__name__)
+
+ESQUEMA_ARQUIVO = 'arquivo'
+VISAO_HISTORICO = 'garantias_historico'
+
+DIAS_ARQUIVAMENTO_PADRAO = 730
+TAMANHO_LOTE_ARQUIVAMENTO = 500
+
+# Domingo de madrugada (minuto hora dia mês dia-da-semana)
+CRON_ARQUIVAMENTO = '0 4 * * 0'
+
+# Garantias vencidas, ou desativadas, antes da data de corte
+_CONDICAO_ARQUIVAVEL = "(data_vencimento < ? OR (ativo = FALSE AND data_desativacao < ?))"
+
+GATILHOS = {
+    'trg_garantias_desativacao_insert': """
+        CREATE TRIGGER IF NOT EXISTS trg_garantias_desativacao_insert
+        AFTER INSERT ON garantias
+        WHEN NEW.ativo = FALSE AND NEW.data_desativacao IS NULL
+        BEGIN
+            UPDATE garantias SET data_desativacao = datetime('now', 'localtime') WHERE id = NEW.id;
+        END
+    """,
+    'trg_garantias_desativacao_update': """
+        CREATE TRIGGER IF NOT EXISTS trg_garantias_desativacao_update
+        AFTER UPDATE OF ativo ON garantias
+        WHEN OLD.ativo IS NOT NEW.ativo
+        BEGIN
+            UPDATE garantias
+            SET data_desativacao = CASE WHEN NEW.ativo = TRUE THEN NULL ELSE datetime('now', 'localtime') END
+            WHERE id = NEW.id;
+        END
+    """,
+}
+
+
+def criar_gatilhos(db: Database):
+    """Cria os triggers que mantêm ``garantias.data_desativacao``"""
+    for sql in GATILHOS.values():
+        db.execute(sql)
+
+
+def _colunas_garantias(db: Database) -> List[tuple]:
+    """(nome, tipo) das colunas da tabela quente, incluindo as geradas"""
+    return [(row[1], row[2]) for row in db.execute("PRAGMA main.table_xinfo(garantias)").fetchall()]
+
+
+def arquivo_anexado(db: Database) -> bool:
+    """Indica se o banco de arquivo está anexado à conexão"""
+    return any(row[1] == ESQUEMA_ARQUIVO for row in db.execute("PRAGMA database_list").fetchall())
+
+
+def anexar_arquivo(db: Database, caminho: Union[str, Path]):
+    """
+    Anexa o banco de arquivo e cria a visão ``garantias_historico``
+
+    A tabela de arquivo acompanha as colunas da tabela quente: colunas
+    novas (migrações posteriores) são acrescentadas ao anexar. Colunas
+    geradas viram colunas comuns no arquivo, com o valor copiado.
+    """
+    if not arquivo_anexado(db):
+        db.execute(f"ATTACH DATABASE ? AS {ESQUEMA_ARQUIVO}", (str(caminho),))
+        # Só tem efeito em arquivo novo, antes da primeira tabela
+        db.execute(f"PRAGMA {ESQUEMA_ARQUIVO}.auto_vacuum = INCREMENTAL")
+
+    colunas = _colunas_garantias(db)
+    definicoes = ', '.join(
+        f"{nome} {tipo}".strip() for nome, tipo in colunas if nome != 'id'
+    )
+    db.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ESQUEMA_ARQUIVO}.garantias (
+            id INTEGER PRIMARY KEY,
+            {definicoes},
+            data_arquivamento DATETIME
+        )
+    """)
+    existentes = {
+        row[1] for row in db.execute(f"PRAGMA {ESQUEMA_ARQUIVO}.table_info(garantias)").fetchall()
+    }
+    for nome, tipo in colunas:
+        if nome not in existentes:
+            db.execute(f"ALTER TABLE {ESQUEMA_ARQUIVO}.garantias ADD COLUMN {nome} {tipo}")
+            logger.info(f"Coluna {nome} adicionada à tabela de arquivo")
+    db.execute(f"CREATE INDEX IF NOT EXISTS {ESQUEMA_ARQUIVO}.idx_garantias_usuario ON garantias (usuario_id)")
+    db.execute(f"CREATE INDEX IF NOT EXISTS {ESQUEMA_ARQUIVO}.idx_garantias_lote_norm ON garantias (lote_norm)")
+
+    # Visões permanentes não podem referenciar outro banco; a temporária sim
+    nomes = ', '.join(nome for nome, _ in colunas)
+    db.execute(f"DROP VIEW IF EXISTS temp.{VISAO_HISTORICO}")
+    db.execute(f"""
+        CREATE TEMP VIEW {VISAO_HISTORICO} AS
+        SELECT {nomes}, FALSE AS arquivada FROM main.garantias
+        UNION ALL
+        SELECT {nomes}, TRUE AS arquivada FROM {ESQUEMA_ARQUIVO}.garantias
+    """)
+    logger.info(f"Banco de arquivo anexado: {caminho}")
+
+
+def tabela_garantias(db: Database, incluir_arquivadas: bool = False) -> str:
+    """Tabela (ou visão) de garantias a consultar"""
+    if incluir_arquivadas and arquivo_anexado(db):
+        return VISAO_HISTORICO
+    return 'garantias'
+
+
+def arquivar_garantias(db: Database, dias: int = DIAS_ARQUIVAMENTO_PADRAO,
+                       tamanho_lote: int = TAMANHO_LOTE_ARQUIVAMENTO) -> Dict[str, Any]:
+    """
+    Move para o arquivo as garantias vencidas ou inativas há mais de ``dias``
+
+    Cada lote é copiado e removido da tabela quente numa transação curta.
+    A cópia usa INSERT OR REPLACE: com WAL a transação não é atômica entre
+    os dois arquivos, e um lote interrompido entre a cópia e a remoção é
+    refeito sem duplicar.
+
+    Returns:
+        Quantidade de garantias arquivadas e data de corte
+    """
+    if not arquivo_anexado(db):
+        raise RuntimeError("Banco de arquivo não anexado (ARQUIVO_DATABASE_PATH)")
+
+    corte = format_date_iso(date.today() - timedelta(days=dias))
+    nomes = ', '.join(nome for nome, _ in _colunas_garantias(db))
+    total = 0
+    while True:
+        ids = [row[0] for row in db.execute(f"""
+            SELECT id FROM main.garantias WHERE {_CONDICAO_ARQUIVAVEL}
+            ORDER BY id LIMIT ?
+        """, (corte, corte, tamanho_lote)).fetchall()]
+        if not ids:
+            break
+
+        marcadores = ', '.join('?' for _ in ids)
+        with UnidadeTrabalho(db) as uow:
+            uow.execute(f"""
+                INSERT OR REPLACE INTO {ESQUEMA_ARQUIVO}.garantias ({nomes}, data_arquivamento)
+                SELECT {nomes}, ? FROM main.garantias WHERE id IN ({marcadores})
+            """, (format_datetime_iso(datetime.now()), *ids))
+            uow.execute(f"DELETE FROM main.garantias WHERE id IN ({marcadores})", ids)
+        total += len(ids)
+
+    if total:
+        logger.info(f"{total} garantias arquivadas (corte {corte})")
+    return {'arquivadas': total, 'corte': corte}
+
+
+def excluir_arquivadas_do_usuario(db: Database, usuario_id: int) -> int:
+    """Remove do arquivo as garantias de um usuário excluído"""
+    if not arquivo_anexado(db):
+        return 0
+    db.execute(f"DELETE FROM {ESQUEMA_ARQUIVO}.garantias WHERE usuario_id = ?", (usuario_id,))
+    return db.conn.changes()
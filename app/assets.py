@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Pipeline de arquivos estáticos
+
+Na inicialização (ou pelo script scripts/utils/build_assets.py) cada
+arquivo de ``static/`` é copiado para o diretório de build com o hash do
+conteúdo no nome (``style.css`` -> ``style.3f2a9c1b4d5e.css``) e, se for
+texto, pré-comprimido em gzip e brotli. Esses arquivos são servidos em
+``/assets/`` com ``Cache-Control: immutable``: como o nome muda quando o
+conteúdo muda, o navegador não precisa revalidar e visitas seguintes não
+baixam nenhum byte estático.
+
+Os arquivos do MonsterUI, Tailwind e HTMX que vêm de CDN são mantidos em
+``static/vendor/`` (baixados por ``build_assets.py`` e versionados) e os
+cabeçalhos da página passam a apontar para as cópias locais. Se algum
+cabeçalho continuar apontando para a CDN (arquivo não baixado ou URL nova
+após atualizar o FastHTML/MonsterUI), a inicialização falha, a menos que
+ASSETS_PERMITIR_CDN esteja ativo (desenvolvimento sem acesso aos
+arquivos), caso em que as URLs de CDN são registradas no log.
+"""
+
+import copy
+import gzip
+import hashlib
+import importlib.util
+import json
+import logging
+import mimetypes
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from starlette.responses import FileResponse, Response
+from starlette.routing import Route
+
+logger = logging.getLogger(__name__)
+
+# brotli é opcional; sem ele apenas a versão gzip é gerada
+BROTLI_DISPONIVEL = importlib.util.find_spec('brotli') is not None
+
+PREFIXO_URL = '/assets/'
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+TAMANHO_HASH = 12
+NOME_MANIFESTO = 'manifest.json'
+
+# Extensões que valem a pena comprimir (imagens já são comprimidas)
+EXTENSOES_COMPRIMIVEIS = {'.css', '.js', '.svg', '.ico', '.json', '.txt', '.map', '.html'}
+
+# Arquivos de CDN usados pelos cabeçalhos do FastHTML e do MonsterUI -> nome em static/vendor
+ASSETS_VENDORIZADOS = {
+    'https://cdn.jsdelivr.net/npm/htmx.org@2.0.7/dist/htmx.js': 'htmx-2.0.7.js',
+    'https://cdn.jsdelivr.net/gh/answerdotai/fasthtml-js@1.0.12/fasthtml.js': 'fasthtml-1.0.12.js',
+    'https://cdn.jsdelivr.net/gh/answerdotai/surreal@main/surreal.js': 'surreal.js',
+    'https://cdn.jsdelivr.net/gh/gnat/css-scope-inline@main/script.js': 'css-scope-inline.js',
+    'https://cdn.jsdelivr.net/npm/franken-ui@2.0.0/dist/css/core.min.css': 'franken-ui-2.0.0-core.min.css',
+    'https://cdn.jsdelivr.net/npm/franken-ui@2.0.0/dist/js/core.iife.js': 'franken-ui-2.0.0-core.iife.js',
+    'https://cdn.jsdelivr.net/npm/franken-ui@2.0.0/dist/js/icon.iife.js': 'franken-ui-2.0.0-icon.iife.js',
+    'https://cdn.tailwindcss.com/3.4.17': 'tailwindcss-3.4.17.js',
+    'https://cdn.jsdelivr.net/npm/daisyui@4.12.24/dist/full.min.css': 'daisyui-4.12.24-full.min.css',
+}
+
+
+def _nome_com_hash(caminho_relativo: str, conteudo: bytes) -> str:
+    """Insere o hash do conteúdo antes da extensão"""
+    digest = hashlib.sha256(conteudo).hexdigest()[:TAMANHO_HASH]
+    caminho = Path(caminho_relativo)
+    return caminho.with_name(f"{caminho.stem}.{digest}{caminho.suffix}").as_posix()
+
+
+def _gravar_se_ausente(destino: Path, conteudo: bytes):
+    """Arquivos com hash no nome são imutáveis: só grava se não existir"""
+    if not destino.exists():
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        temporario = destino.with_name(destino.name + '.tmp')
+        temporario.write_bytes(conteudo)
+        temporario.replace(destino)
+
+
+class PipelineAssets:
+    """Manifesto dos arquivos estáticos com hash e respostas para /assets/"""
+
+    def __init__(self, origem: Path, destino: Path):
+        """
+        Args:
+            origem: Diretório static/ do projeto
+            destino: Diretório de build (arquivos com hash e comprimidos)
+        """
+        self.origem = Path(origem)
+        self.destino = Path(destino)
+        self.manifesto: Dict[str, str] = {}
+        self._servidos: Dict[str, str] = {}
+
+    def construir(self) -> Dict[str, str]:
+        """
+        Gera os arquivos com hash e as versões .gz/.br
+
+        Returns:
+            Manifesto {caminho original: caminho com hash}
+        """
+        manifesto = {}
+        for arquivo in sorted(self.origem.rglob('*')):
+            if not arquivo.is_file() or arquivo.name.startswith('.'):
+                continue
+            relativo = arquivo.relative_to(self.origem).as_posix()
+            conteudo = arquivo.read_bytes()
+            nome = _nome_com_hash(relativo, conteudo)
+            destino = self.destino / nome
+            _gravar_se_ausente(destino, conteudo)
+
+            if arquivo.suffix.lower() in EXTENSOES_COMPRIMIVEIS:
+                self._comprimir(destino, conteudo)
+            manifesto[relativo] = nome
+
+        (self.destino / NOME_MANIFESTO).write_text(json.dumps(manifesto, indent=2, sort_keys=True))
+        self._definir_manifesto(manifesto)
+        logger.info(f"Assets estáticos: {len(manifesto)} arquivos em {self.destino}")
+        return manifesto
+
+    def carregar(self) -> bool:
+        """Carrega o manifesto gerado anteriormente pelo script de build"""
+        caminho = self.destino / NOME_MANIFESTO
+        if not caminho.exists():
+            return False
+        self._definir_manifesto(json.loads(caminho.read_text()))
+        return True
+
+    def _definir_manifesto(self, manifesto: Dict[str, str]):
+        self.manifesto = manifesto
+        self._servidos = {nome: original for original, nome in manifesto.items()}
+
+    @staticmethod
+    def _comprimir(destino: Path, conteudo: bytes):
+        """Grava .gz e .br quando forem menores que o original"""
+        gz = destino.with_name(destino.name + '.gz')
+        if not gz.exists():
+            comprimido = gzip.compress(conteudo, compresslevel=9, mtime=0)
+            if len(comprimido) < len(conteudo):
+                _gravar_se_ausente(gz, comprimido)
+
+        br = destino.with_name(destino.name + '.br')
+        if BROTLI_DISPONIVEL and not br.exists():
+            import brotli
+            comprimido = brotli.compress(conteudo, quality=11)
+            if len(comprimido) < len(conteudo):
+                _gravar_se_ausente(br, comprimido)
+
+    def url(self, caminho: str) -> str:
+        """URL com hash do arquivo de static/ (ou /static/ se não estiver no manifesto)"""
+        nome = self.manifesto.get(caminho)
+        return f"{PREFIXO_URL}{nome}" if nome else f"/static/{caminho}"
+
+    def cabecalhos_locais(self, hdrs: Iterable, permitir_cdn: bool = False) -> List:
+        """
+        Troca as URLs de CDN dos cabeçalhos pelas cópias locais
+
+        Args:
+            hdrs: Cabeçalhos do FastHTML/MonsterUI
+            permitir_cdn: Se True, mantém (e registra no log) as URLs sem
+                cópia local em vez de falhar
+
+        Raises:
+            RuntimeError: Se algum cabeçalho continuar apontando para a CDN
+        """
+        resultado = []
+        externas = []
+        for hdr in hdrs:
+            atributos = getattr(hdr, 'attrs', None) or {}
+            for chave in ('src', 'href'):
+                url = atributos.get(chave)
+                vendor = ASSETS_VENDORIZADOS.get(url)
+                if vendor and f"vendor/{vendor}" in self.manifesto:
+                    hdr = copy.copy(hdr)
+                    hdr.attrs = {**atributos, chave: self.url(f"vendor/{vendor}")}
+                elif isinstance(url, str) and url.startswith(('http://', 'https://')):
+                    externas.append(url)
+            resultado.append(hdr)
+
+        if externas:
+            mensagem = (
+                f"{len(externas)} cabeçalhos sem cópia local em static/vendor "
+                f"(execute python scripts/utils/build_assets.py): {', '.join(externas)}"
+            )
+            if not permitir_cdn:
+                raise RuntimeError(mensagem)
+            logger.warning(f"Usando CDN: {mensagem}")
+        return resultado
+
+    def responder(self, nome: str, accept_encoding: str) -> Response:
+        """
+        Resposta para /assets/{nome}: usa brotli ou gzip conforme o cliente
+
+        Apenas nomes presentes no manifesto são servidos.
+        """
+        original = self._servidos.get(nome)
+        if original is None:
+            return Response(status_code=404)
+
+        caminho = self.destino / nome
+        tipo = mimetypes.guess_type(original)[0] or 'application/octet-stream'
+        cabecalhos = {'Cache-Control': CACHE_IMUTAVEL, 'Vary': 'Accept-Encoding'}
+
+        codificacoes = {c.split(';')[0].strip() for c in accept_encoding.lower().split(',')}
+        for codificacao, sufixo in (('br', '.br'), ('gzip', '.gz')):
+            comprimido = caminho.with_name(caminho.name + sufixo)
+            if codificacao in codificacoes and comprimido.exists():
+                cabecalhos['Content-Encoding'] = codificacao
+                return FileResponse(comprimido, media_type=tipo, headers=cabecalhos)
+
+        return FileResponse(caminho, media_type=tipo, headers=cabecalhos)
+
+
+# Instância global do pipeline
+_pipeline: Optional[PipelineAssets] = None
+
+
+def get_pipeline_assets() -> Optional[PipelineAssets]:
+    """Retorna o pipeline configurado pela aplicação, se houver"""
+    return _pipeline
+
+
+def url_asset(caminho: str) -> str:
+    """
+    URL de um arquivo de static/ para uso nos templates
+
+    Args:
+        caminho: Caminho relativo a static/ (ex.: 'g70k.png')
+    """
+    if _pipeline is None:
+        return f"/static/{caminho}"
+    return _pipeline.url(caminho)
+
+
+def iniciar_pipeline_assets(config) -> PipelineAssets:
+    """
+    Prepara os assets na inicialização
+
+    Com ASSETS_BUILD_NA_INICIALIZACAO desativado, usa o manifesto gerado
+    por scripts/utils/build_assets.py durante o deploy.
+    """
+    global _pipeline
+
+    pipeline = PipelineAssets(config.BASE_DIR / 'static', config.ASSETS_DIR)
+    if config.ASSETS_BUILD_NA_INICIALIZACAO or not pipeline.carregar():
+        pipeline.construir()
+    _pipeline = pipeline
+    return pipeline
+
+
+def setup_assets(app, pipeline: PipelineAssets):
+    """
+    Registra a rota /assets/ na aplicação
+
+    A rota entra no início da tabela porque o fast_app já registra a rota
+    genérica de arquivos estáticos (/{arquivo}.{extensão}).
+    """
+
+    def servir_asset(request):
+        """Arquivo estático com hash no nome, cacheável para sempre"""
+        return pipeline.responder(request.path_params['nome'], request.headers.get('accept-encoding', ''))
+
+    app.router.routes.insert(0, Route(PREFIXO_URL + "{nome:path}", servir_asset, methods=['GET', 'HEAD']))
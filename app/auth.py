@@ -3,9 +3,12 @@
 Sistema de autenticação e autorização
 """
 
+import heapq
 import logging
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Set, Tuple
 from fasthtml.common import *
 from fastlite import Database
 from models.usuario import Usuario
@@ -18,26 +21,76 @@ logger = logging.getLogger(__name__)
 SESSION_COOKIE_NAME = 'viemar_session'
 SESSION_TIMEOUT_HOURS = 24
 
+# Limites de sessões em memória: ao atingir o limite do usuário sai a sessão
+# mais antiga dele; ao atingir o total sai a que expira primeiro
+MAX_SESSOES_POR_USUARIO = 10
+MAX_SESSOES_TOTAL = 50000
+
+# Entradas do índice de expiração examinadas por requisição, para o custo
+# de remover sessões abandonadas ficar diluído (O(1) amortizado)
+EXPIRACOES_POR_REQUISICAO = 8
+
+# Tempo que os dados do usuário ficam em memória em get_current_user.
+# Alterações feitas pela aplicação invalidam o cache na hora (invalidar_usuario);
+# o TTL só limita quanto tempo uma alteração externa ao app leva para aparecer.
+USUARIO_CACHE_TTL_SEGUNDOS = 60
+
 class AuthManager:
     """Gerenciador de autenticação e sessões"""
     
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, max_sessoes_por_usuario: int = MAX_SESSOES_POR_USUARIO,
+                 max_sessoes: int = MAX_SESSOES_TOTAL):
         self.db = db
         self.sessions = {}  # Em produção, usar Redis ou banco
+        self.max_sessoes_por_usuario = max_sessoes_por_usuario
+        self.max_sessoes = max_sessoes
+        self._cache_usuarios: Dict[int, Tuple[float, Dict[str, Any]]] = {}
+        self._cache_lock = threading.Lock()
+        
+        # Índice de expiração: heap de (expira_em, session_id), uma entrada por
+        # sessão. Renovar não mexe no heap; a entrada desatualizada é
+        # recolocada com o prazo novo quando chega ao topo.
+        self._expiracoes: List[Tuple[datetime, str]] = []
+        self._sessoes_por_usuario: Dict[int, Set[str]] = {}
+        self._sessoes_lock = threading.RLock()
+        self._contadores = {
+            'criadas': 0,
+            'expiradas': 0,
+            'encerradas': 0,
+            'removidas_limite_usuario': 0,
+            'removidas_limite_total': 0,
+        }
     
     def criar_sessao(self, usuario_id: int, usuario_email: str, tipo_usuario: str) -> str:
         """Cria uma nova sessão para o usuário"""
         
         session_id = secrets.token_urlsafe(32)
+        agora = datetime.now()
         session_data = {
             'usuario_id': usuario_id,
             'usuario_email': usuario_email,
             'tipo_usuario': tipo_usuario,
-            'criado_em': datetime.now(),
-            'expira_em': datetime.now() + timedelta(hours=SESSION_TIMEOUT_HOURS)
+            'criado_em': agora,
+            'expira_em': agora + timedelta(hours=SESSION_TIMEOUT_HOURS)
         }
         
-        self.sessions[session_id] = session_data
+        with self._sessoes_lock:
+            self._expirar(agora, EXPIRACOES_POR_REQUISICAO)
+            
+            # Limite por usuário: remove a sessão mais antiga dele
+            do_usuario = self._sessoes_por_usuario.setdefault(usuario_id, set())
+            while len(do_usuario) >= self.max_sessoes_por_usuario:
+                mais_antiga = min(do_usuario, key=lambda sid: self.sessions[sid]['criado_em'])
+                self._remover(mais_antiga, 'removidas_limite_usuario')
+            
+            # Limite total: remove a sessão que expira primeiro
+            while len(self.sessions) >= self.max_sessoes:
+                self._remover_proxima_a_expirar()
+            
+            self.sessions[session_id] = session_data
+            self._sessoes_por_usuario.setdefault(usuario_id, set()).add(session_id)
+            heapq.heappush(self._expiracoes, (session_data['expira_em'], session_id))
+            self._contadores['criadas'] += 1
         
         logger.info(f"Sessão criada para usuário {usuario_email} (ID: {usuario_id})")
         return session_id
@@ -45,37 +98,111 @@ class AuthManager:
     def obter_sessao(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Obtém dados da sessão se válida"""
         
-        if not session_id or session_id not in self.sessions:
-            return None
-        
-        session_data = self.sessions[session_id]
-        
-        # Verificar se a sessão expirou
-        if datetime.now() > session_data['expira_em']:
-            del self.sessions[session_id]
-            logger.info(f"Sessão expirada removida: {session_id[:8]}...")
-            return None
+        agora = datetime.now()
+        with self._sessoes_lock:
+            self._expirar(agora, EXPIRACOES_POR_REQUISICAO)
+            
+            if not session_id or session_id not in self.sessions:
+                return None
+            
+            session_data = self.sessions[session_id]
+            
+            # Verificar se a sessão expirou
+            if agora > session_data['expira_em']:
+                self._remover(session_id, 'expiradas')
+                logger.info(f"Sessão expirada removida: {session_id[:8]}...")
+                return None
         
         return session_data
     
     def renovar_sessao(self, session_id: str) -> bool:
         """Renova o tempo de expiração da sessão"""
         
-        if session_id in self.sessions:
-            self.sessions[session_id]['expira_em'] = datetime.now() + timedelta(hours=SESSION_TIMEOUT_HOURS)
-            return True
+        with self._sessoes_lock:
+            if session_id in self.sessions:
+                self.sessions[session_id]['expira_em'] = datetime.now() + timedelta(hours=SESSION_TIMEOUT_HOURS)
+                return True
         return False
     
     def destruir_sessao(self, session_id: str) -> bool:
         """Remove a sessão"""
         
-        if session_id in self.sessions:
-            usuario_email = self.sessions[session_id].get('usuario_email', 'N/A')
-            del self.sessions[session_id]
-            logger.info(f"Sessão destruída para usuário {usuario_email}")
-            return True
+        with self._sessoes_lock:
+            if session_id in self.sessions:
+                usuario_email = self.sessions[session_id].get('usuario_email', 'N/A')
+                self._remover(session_id, 'encerradas')
+                logger.info(f"Sessão destruída para usuário {usuario_email}")
+                return True
         return False
     
+    def _remover(self, session_id: str, motivo: str):
+        """Remove a sessão dos índices (a entrada do heap é descartada ao chegar ao topo)"""
+        session_data = self.sessions.pop(session_id)
+        do_usuario = self._sessoes_por_usuario.get(session_data['usuario_id'])
+        if do_usuario is not None:
+            do_usuario.discard(session_id)
+            if not do_usuario:
+                del self._sessoes_por_usuario[session_data['usuario_id']]
+        self._contadores[motivo] += 1
+        
+        # Entradas de sessões já removidas ficam no heap até chegarem ao topo;
+        # se passarem a dominar, o heap é reconstruído (custo diluído nas remoções)
+        if len(self._expiracoes) > 2 * len(self.sessions) + 64:
+            self._expiracoes = [(data['expira_em'], sid) for sid, data in self.sessions.items()]
+            heapq.heapify(self._expiracoes)
+    
+    def _expirar(self, agora: datetime, limite: Optional[int] = None) -> int:
+        """
+        Remove sessões expiradas a partir do topo do heap
+        
+        Args:
+            agora: Momento de referência
+            limite: Máximo de entradas do heap examinadas (None = todas as vencidas)
+        
+        Returns:
+            Número de sessões removidas
+        """
+        removidas = 0
+        examinadas = 0
+        while self._expiracoes and self._expiracoes[0][0] < agora:
+            if limite is not None and examinadas >= limite:
+                break
+            examinadas += 1
+            _, session_id = heapq.heappop(self._expiracoes)
+            session_data = self.sessions.get(session_id)
+            if session_data is None:
+                continue  # já removida (logout ou limite)
+            if session_data['expira_em'] >= agora:
+                # Renovada depois de entrar no heap: volta com o prazo atual
+                heapq.heappush(self._expiracoes, (session_data['expira_em'], session_id))
+                continue
+            self._remover(session_id, 'expiradas')
+            removidas += 1
+        return removidas
+    
+    def _remover_proxima_a_expirar(self):
+        """Remove a sessão ativa com o menor prazo de expiração"""
+        while self._expiracoes:
+            expira_em, session_id = heapq.heappop(self._expiracoes)
+            session_data = self.sessions.get(session_id)
+            if session_data is None:
+                continue
+            if session_data['expira_em'] != expira_em:
+                heapq.heappush(self._expiracoes, (session_data['expira_em'], session_id))
+                continue
+            self._remover(session_id, 'removidas_limite_total')
+            return
+    
+    def estatisticas_sessoes(self) -> Dict[str, int]:
+        """Contadores de sessões: ativas, criadas e removidas por motivo"""
+        with self._sessoes_lock:
+            return {
+                'ativas': len(self.sessions),
+                'usuarios': len(self._sessoes_por_usuario),
+                'indice_expiracao': len(self._expiracoes),
+                **self._contadores,
+            }
+    
     def autenticar_usuario(self, email: str, senha: str) -> Optional[Dict[str, Any]]:
         """Autentica usuário com email e senha
         
@@ -146,20 +273,40 @@ class AuthManager:
         
         return None
     
-    def limpar_sessoes_expiradas(self):
-        """Remove sessões expiradas (executar periodicamente)"""
+    def obter_usuario_cache(self, usuario_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Obtém dados do usuário pelo ID usando o cache em memória
+
+        Dentro do TTL não há consulta ao banco; usuários não encontrados não
+        são guardados.
+        """
+        agora = time.monotonic()
+        with self._cache_lock:
+            item = self._cache_usuarios.get(usuario_id)
+            if item and item[0] > agora:
+                return item[1]
+
+        usuario = self.obter_usuario_por_id(usuario_id)
+        if usuario:
+            with self._cache_lock:
+                self._cache_usuarios[usuario_id] = (agora + USUARIO_CACHE_TTL_SEGUNDOS, usuario)
+        return usuario
+
+    def invalidar_usuario(self, usuario_id: int):
+        """Remove o usuário do cache (chamar após alterar ou excluir o cadastro)"""
+        with self._cache_lock:
+            self._cache_usuarios.pop(int(usuario_id), None)
+
+    def limpar_sessoes_expiradas(self) -> int:
+        """Remove todas as sessões expiradas (executada pelo agendador da aplicação)"""
         
-        agora = datetime.now()
-        sessoes_expiradas = [
-            session_id for session_id, data in self.sessions.items()
-            if agora > data['expira_em']
-        ]
+        with self._sessoes_lock:
+            removidas = self._expirar(datetime.now())
         
-        for session_id in sessoes_expiradas:
-            del self.sessions[session_id]
+        if removidas:
+            logger.info(f"Removidas {removidas} sessões expiradas")
         
-        if sessoes_expiradas:
-            logger.info(f"Removidas {len(sessoes_expiradas)} sessões expiradas")
+        return removidas
 
 # Instância global do gerenciador de autenticação
 auth_manager = None
@@ -296,8 +443,8 @@ def get_current_user(request) -> Optional[Dict[str, Any]]:
     if session_id:
         session_data = get_auth_manager().obter_sessao(session_id)
         if session_data:
-            # Buscar dados completos do usuário no banco
-            usuario_completo = get_auth_manager().obter_usuario_por_id(session_data['usuario_id'])
+            # Dados completos do usuário (cache em memória, sem consulta dentro do TTL)
+            usuario_completo = get_auth_manager().obter_usuario_cache(session_data['usuario_id'])
             if usuario_completo:
                 # Combinar dados da sessão com dados do banco
                 return {
@@ -327,40 +474,30 @@ def gerar_token_reset_senha() -> str:
     return secrets.token_urlsafe(32)
 
 def validar_token(token: str, usuario_id: int, tipo_token: str) -> bool:
-    """Valida token de confirmação ou reset"""
+    """Valida token de confirmação ou reset (tipo_token: 'confirmacao' ou 'reset_senha')"""
+    from app.tokens import VALIDADE_TOKENS, usuario_do_token
+    
+    if tipo_token not in VALIDADE_TOKENS:
+        return False
     try:
-        db = get_auth_manager().db
-        
-        if tipo_token == 'confirmacao':
-            result = db.execute(
-                "SELECT id FROM usuarios WHERE id = ? AND token_confirmacao = ?",
-                (usuario_id, token)
-            ).fetchone()
-        elif tipo_token == 'reset_senha':
-            result = db.execute(
-                "SELECT id FROM usuarios WHERE id = ? AND token_reset_senha = ?",
-                (usuario_id, token)
-            ).fetchone()
-        else:
-            return False
-        
-        return result is not None
-        
+        return usuario_do_token(get_auth_manager().db, token, tipo_token) == int(usuario_id)
     except Exception as e:
         logger.error(f"Erro ao validar token {tipo_token}: {e}")
         return False
 
 def confirmar_email(usuario_id: int, token: str) -> bool:
-    """Confirma o email do usuário"""
+    """Confirma o email do usuário, consumindo o token"""
+    from app.tokens import FINALIDADE_CONFIRMACAO, consumir_token
+    
     try:
-        if not validar_token(token, usuario_id, 'confirmacao'):
+        db = get_auth_manager().db
+        if not validar_token(token, usuario_id, FINALIDADE_CONFIRMACAO):
+            return False
+        if consumir_token(db, token, FINALIDADE_CONFIRMACAO) != int(usuario_id):
             return False
         
-        db = get_auth_manager().db
-        db.execute(
-            "UPDATE usuarios SET confirmado = TRUE, token_confirmacao = NULL WHERE id = ?",
-            (usuario_id,)
-        )
+        db.execute("UPDATE usuarios SET confirmado = TRUE WHERE id = ?", (usuario_id,))
+        get_auth_manager().invalidar_usuario(usuario_id)
         
         logger.info(f"Email confirmado para usuário ID: {usuario_id}")
         return True
@@ -370,22 +507,23 @@ def confirmar_email(usuario_id: int, token: str) -> bool:
         return False
 
 def resetar_senha(usuario_id: int, token: str, nova_senha: str) -> bool:
-    """Reseta a senha do usuário"""
+    """Reseta a senha do usuário, consumindo o token"""
+    from app.tokens import FINALIDADE_RESET_SENHA, consumir_token
+    
     try:
-        if not validar_token(token, usuario_id, 'reset_senha'):
+        db = get_auth_manager().db
+        if not validar_token(token, usuario_id, FINALIDADE_RESET_SENHA):
+            return False
+        if consumir_token(db, token, FINALIDADE_RESET_SENHA) != int(usuario_id):
             return False
         
         senha_hash = Usuario.criar_hash_senha(nova_senha)
-        
-        db = get_auth_manager().db
-        db.execute(
-            "UPDATE usuarios SET senha_hash = ?, token_reset_senha = NULL WHERE id = ?",
-            (senha_hash, usuario_id)
-        )
+        db.execute("UPDATE usuarios SET senha_hash = ? WHERE id = ?", (senha_hash, usuario_id))
+        get_auth_manager().invalidar_usuario(usuario_id)
         
         logger.info(f"Senha resetada para usuário ID: {usuario_id}")
         return True
         
     except Exception as e:
         logger.error(f"Erro ao resetar senha do usuário {usuario_id}: {e}")
-        return False
\ No newline at end of file
+        return False
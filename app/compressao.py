@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Compressão das respostas HTML e JSON
+
+Middleware ASGI que comprime com brotli (se o pacote estiver instalado)
+ou gzip, conforme o Accept-Encoding do cliente. Respostas completas
+abaixo do tamanho mínimo seguem sem compressão; respostas em partes
+(StreamingResponse) são comprimidas parte a parte, com flush a cada
+parte para o cliente recebê-las sem esperar o fim. Server-Sent Events
+(text/event-stream) e respostas que já têm Content-Encoding (arquivos de
+/assets/) não são alterados.
+"""
+
+import logging
+import zlib
+from typing import Optional
+
+from app.assets import BROTLI_DISPONIVEL
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_MINIMO_PADRAO = 1024
+NIVEL_GZIP_PADRAO = 6
+QUALIDADE_BROTLI_PADRAO = 5
+
+# Tipos de conteúdo comprimidos (prefixo do Content-Type)
+TIPOS_COMPRIMIVEIS = (
+    'text/html', 'text/plain', 'text/css', 'text/csv', 'text/xml',
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+)
+
+
+def escolher_codificacao(accept_encoding: str) -> Optional[str]:
+    """
+    Escolhe 'br' ou 'gzip' a partir do Accept-Encoding
+
+    Codificações com q=0 são recusadas; entre as aceitas, brotli tem
+    preferência quando disponível.
+    """
+    aceitas = set()
+    for item in accept_encoding.lower().split(','):
+        nome, _, parametros = item.strip().partition(';')
+        qualidade = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith('q='):
+            try:
+                qualidade = float(parametros[2:])
+            except ValueError:
+                qualidade = 0.0
+        if nome and qualidade > 0:
+            aceitas.add(nome)
+
+    if BROTLI_DISPONIVEL and ('br' in aceitas or '*' in aceitas):
+        return 'br'
+    if 'gzip' in aceitas or '*' in aceitas:
+        return 'gzip'
+    return None
+
+
+class _Compressor:
+    """Interface comum para gzip (zlib) e brotli em modo incremental"""
+
+    def __init__(self, codificacao: str, nivel_gzip: int, qualidade_brotli: int):
+        if codificacao == 'br':
+            import brotli
+            self._brotli = brotli.Compressor(quality=qualidade_brotli)
+            self._zlib = None
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(nivel_gzip, zlib.DEFLATED, 31)
+
+    def comprimir(self, dados: bytes) -> bytes:
+        """Comprime e faz flush, para a parte poder ser enviada já"""
+        if self._brotli:
+            return self._brotli.process(dados) + self._brotli.flush()
+        return self._zlib.compress(dados) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finalizar(self) -> bytes:
+        if self._brotli:
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+class CompressaoMiddleware:
+    """Middleware ASGI de compressão de respostas"""
+
+    def __init__(self, app, tamanho_minimo: int = TAMANHO_MINIMO_PADRAO,
+                 nivel_gzip: int = NIVEL_GZIP_PADRAO,
+                 qualidade_brotli: int = QUALIDADE_BROTLI_PADRAO):
+        """
+        Args:
+            app: Aplicação ASGI
+            tamanho_minimo: Respostas completas menores que isso (bytes) não são comprimidas
+            nivel_gzip: Nível do gzip (1-9)
+            qualidade_brotli: Qualidade do brotli (0-11)
+        """
+        self.app = app
+        self.tamanho_minimo = tamanho_minimo
+        self.nivel_gzip = nivel_gzip
+        self.qualidade_brotli = qualidade_brotli
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        accept_encoding = ''
+        for chave, valor in scope.get('headers', ()):
+            if chave == b'accept-encoding':
+                accept_encoding = valor.decode('latin-1')
+                break
+        codificacao = escolher_codificacao(accept_encoding)
+        if codificacao is None:
+            return await self.app(scope, receive, send)
+
+        inicio = None
+        compressor: Optional[_Compressor] = None
+        repassar = False
+
+        async def enviar(mensagem):
+            nonlocal inicio, compressor, repassar
+
+            if mensagem['type'] == 'http.response.start':
+                inicio = mensagem
+                repassar = not self._comprimivel(mensagem)
+                if repassar:
+                    await send(mensagem)
+                return
+
+            if mensagem['type'] != 'http.response.body' or repassar:
+                return await send(mensagem)
+
+            corpo = mensagem.get('body', b'')
+            mais = mensagem.get('more_body', False)
+
+            if compressor is None:
+                # Resposta completa pequena: não compensa comprimir
+                if not mais and len(corpo) < self.tamanho_minimo:
+                    repassar = True
+                    await send(inicio)
+                    return await send(mensagem)
+
+                compressor = _Compressor(codificacao, self.nivel_gzip, self.qualidade_brotli)
+                cabecalhos = [
+                    (k, v) for k, v in inicio['headers']
+                    if k not in (b'content-length', b'content-encoding')
+                ]
+                cabecalhos.append((b'content-encoding', codificacao.encode()))
+                if not any(k == b'vary' for k, _ in cabecalhos):
+                    cabecalhos.append((b'vary', b'Accept-Encoding'))
+
+                if not mais:
+                    comprimido = compressor.comprimir(corpo) + compressor.finalizar()
+                    cabecalhos.append((b'content-length', str(len(comprimido)).encode()))
+                    await send({**inicio, 'headers': cabecalhos})
+                    return await send({'type': 'http.response.body', 'body': comprimido})
+
+                await send({**inicio, 'headers': cabecalhos})
+
+            if mais:
+                dados = compressor.comprimir(corpo)
+                if dados:
+                    await send({'type': 'http.response.body', 'body': dados, 'more_body': True})
+            else:
+                await send({
+                    'type': 'http.response.body',
+                    'body': compressor.comprimir(corpo) + compressor.finalizar(),
+                })
+
+        await self.app(scope, receive, enviar)
+
+    @staticmethod
+    def _comprimivel(inicio) -> bool:
+        """Tipo de conteúdo comprimível, sem codificação prévia e com corpo"""
+        if inicio['status'] < 200 or inicio['status'] in (204, 304):
+            return False
+        tipo = ''
+        for chave, valor in inicio.get('headers', ()):
+            if chave == b'content-encoding':
+                return False
+            if chave == b'content-type':
+                tipo = valor.decode('latin-1').lower()
+        return tipo.startswith(TIPOS_COMPRIMIVEIS)
+
+
+def setup_compressao(app, config):
+    """
+    Adiciona o middleware de compressão à aplicação
+
+    Args:
+        app: Aplicação FastHTML
+        config: Configuração (COMPRESSAO_*)
+    """
+    if not getattr(config, 'COMPRESSAO_ATIVA', True):
+        return
+
+    app.add_middleware(
+        CompressaoMiddleware,
+        tamanho_minimo=getattr(config, 'COMPRESSAO_TAMANHO_MINIMO', TAMANHO_MINIMO_PADRAO),
+        nivel_gzip=getattr(config, 'COMPRESSAO_NIVEL_GZIP', NIVEL_GZIP_PADRAO),
+        qualidade_brotli=getattr(config, 'COMPRESSAO_QUALIDADE_BROTLI', QUALIDADE_BROTLI_PADRAO),
+    )
+    logger.info(f"Compressão de respostas ativa (brotli: {BROTLI_DISPONIVEL})")
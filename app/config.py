@@ -29,6 +29,11 @@ class Config:
             self.DATABASE_PATH = database_path_env
         else:
             self.DATABASE_PATH = self.BASE_DIR / 'data' / 'viemar_garantia.db'
+        # Comandos SQL compilados mantidos em cache por conexão
+        self.SQLITE_CACHE_COMANDOS = int(os.getenv('SQLITE_CACHE_COMANDOS', 256))
+        # Banco de arquivo das garantias vencidas/inativas há mais de ARQUIVAMENTO_DIAS
+        self.ARQUIVO_DATABASE_PATH = os.getenv('ARQUIVO_DATABASE_PATH', str(self.BASE_DIR / 'data' / 'archive.db'))
+        self.ARQUIVAMENTO_DIAS = int(os.getenv('ARQUIVAMENTO_DIAS', 730))
         
         # Configurações de segurança
         self.SECRET_KEY = os.getenv('SECRET_KEY')
@@ -42,7 +47,13 @@ class Config:
         self.SMTP_USERNAME = os.getenv('SMTP_USERNAME', '')
         self.SMTP_PASSWORD = os.getenv('SMTP_PASSWORD', '')
         self.EMAIL_FROM = os.getenv('EMAIL_FROM', 'noreply@viemar.com.br')
-        self.EMAIL_USE_TLS = True
+        self.EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True').lower() == 'true'
+        # 'vieutil' (relay autorizado, uma conexão por email) ou 'smtp'
+        # (sessão SMTP persistente com SMTP_SERVER/SMTP_PORT, ver app/envio_smtp.py)
+        self.EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'vieutil')
+        self.SMTP_TIMEOUT = int(os.getenv('SMTP_TIMEOUT', 30))
+        self.SMTP_MENSAGENS_POR_CONEXAO = int(os.getenv('SMTP_MENSAGENS_POR_CONEXAO', 500))
+        self.SMTP_OCIOSIDADE_MAXIMA = int(os.getenv('SMTP_OCIOSIDADE_MAXIMA', 60))
         
         # Configurações de logging
         self.LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
@@ -64,11 +75,62 @@ class Config:
         self.FIREBIRD_DATABASE = os.getenv('FIREBIRD_DATABASE', '/ssd/tecnicon/dados/emp17.fdb')
         self.FIREBIRD_ROLE = os.getenv('FIREBIRD_ROLE', 'TECNICONE')
         self.FIREBIRD_CHARSET = os.getenv('FIREBIRD_CHARSET', 'ISO8859_1')
+        # 'sqlite' usa o substituto local do driver (FIREBIRD_DATABASE passa a ser o arquivo SQLite)
+        self.FIREBIRD_DRIVER = os.getenv('FIREBIRD_DRIVER', 'firebird')
+        self.FIREBIRD_POOL_SIZE = int(os.getenv('FIREBIRD_POOL_SIZE', 2))
+        self.FIREBIRD_POOL_IDLE_SECONDS = int(os.getenv('FIREBIRD_POOL_IDLE_SECONDS', 300))
+        self.FIREBIRD_FETCH_SIZE = int(os.getenv('FIREBIRD_FETCH_SIZE', 500))
+        
+        # Jobs em segundo plano executados ao mesmo tempo
+        self.JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+        
+        # Agendador de tarefas de manutenção (formato cron: minuto hora dia mês dia-da-semana)
+        self.AGENDADOR_ATIVO = os.getenv('AGENDADOR_ATIVO', 'True').lower() == 'true'
+        self.AGENDADOR_JITTER_SEGUNDOS = int(os.getenv('AGENDADOR_JITTER_SEGUNDOS', 120))
+        self.CRON_VENCIMENTO_GARANTIAS = os.getenv('CRON_VENCIMENTO_GARANTIAS', '0 8 * * *')
+        self.CRON_LIMPEZA_SESSOES = os.getenv('CRON_LIMPEZA_SESSOES', '*/15 * * * *')
+        self.CRON_RELATORIO_DIARIO = os.getenv('CRON_RELATORIO_DIARIO', '0 7 * * *')
+        self.CRON_LIMPEZA_TOKENS = os.getenv('CRON_LIMPEZA_TOKENS', '30 3 * * *')
+        self.CRON_ARQUIVAMENTO = os.getenv('CRON_ARQUIVAMENTO', '0 4 * * 0')
+        # ANALYZE, PRAGMA optimize e incremental_vacuum (até N páginas por execução)
+        self.CRON_OTIMIZACAO_BANCO = os.getenv('CRON_OTIMIZACAO_BANCO', '45 3 * * *')
+        # Sincronização automática de produtos com o ERP (vazio desativa), ex.: '0 * * * *'
+        self.CRON_SINCRONIZACAO_ERP = os.getenv('CRON_SINCRONIZACAO_ERP', '')
+        self.VACUUM_PAGINAS_POR_EXECUCAO = int(os.getenv('VACUUM_PAGINAS_POR_EXECUCAO', 5000))
+        
+        # Limite de requisições nas rotas públicas ('N/S' = N requisições a cada S segundos)
+        self.RATE_LIMIT_ATIVO = os.getenv('RATE_LIMIT_ATIVO', 'True').lower() == 'true'
+        # 'memoria' (por processo) ou 'sqlite' (compartilhado entre workers)
+        self.RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memoria')
+        self.RATE_LIMIT_DB_PATH = os.getenv('RATE_LIMIT_DB_PATH', str(self.BASE_DIR / 'data' / 'rate_limit.db'))
+        # Usar X-Forwarded-For como IP do cliente (apenas atrás de proxy reverso)
+        self.RATE_LIMIT_CONFIAR_PROXY = os.getenv('RATE_LIMIT_CONFIAR_PROXY', 'False').lower() == 'true'
+        self.RATE_LIMIT_LOGIN_IP = os.getenv('RATE_LIMIT_LOGIN_IP', '20/60')
+        self.RATE_LIMIT_LOGIN_EMAIL = os.getenv('RATE_LIMIT_LOGIN_EMAIL', '5/300')
+        self.RATE_LIMIT_CADASTRO_IP = os.getenv('RATE_LIMIT_CADASTRO_IP', '5/600')
+        self.RATE_LIMIT_CADASTRO_EMAIL = os.getenv('RATE_LIMIT_CADASTRO_EMAIL', '3/3600')
+        self.RATE_LIMIT_CEP_IP = os.getenv('RATE_LIMIT_CEP_IP', '30/60')
+        self.RATE_LIMIT_CONTATO_IP = os.getenv('RATE_LIMIT_CONTATO_IP', '5/600')
+        
+        # Arquivos estáticos com hash no nome (gerados na inicialização ou por scripts/utils/build_assets.py)
+        self.ASSETS_DIR = Path(os.getenv('ASSETS_DIR', self.BASE_DIR / 'data' / 'assets'))
+        self.ASSETS_BUILD_NA_INICIALIZACAO = os.getenv('ASSETS_BUILD_NA_INICIALIZACAO', 'True').lower() == 'true'
+        # Sem static/vendor completo a inicialização falha; True mantém as URLs de CDN (desenvolvimento)
+        self.ASSETS_PERMITIR_CDN = os.getenv('ASSETS_PERMITIR_CDN', 'False').lower() == 'true'
+        
+        # Compressão das respostas HTML/JSON (brotli se instalado, senão gzip)
+        self.COMPRESSAO_ATIVA = os.getenv('COMPRESSAO_ATIVA', 'True').lower() == 'true'
+        self.COMPRESSAO_TAMANHO_MINIMO = int(os.getenv('COMPRESSAO_TAMANHO_MINIMO', 1024))
+        self.COMPRESSAO_NIVEL_GZIP = int(os.getenv('COMPRESSAO_NIVEL_GZIP', 6))
+        self.COMPRESSAO_QUALIDADE_BROTLI = int(os.getenv('COMPRESSAO_QUALIDADE_BROTLI', 5))
         
         # Configurações de upload
         self.UPLOAD_DIR = self.BASE_DIR / 'uploads'
         self.MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
         
+        # Diretório dos XMLs do Caspio; a importação pelo admin só aceita arquivos daqui
+        self.CASPIO_IMPORT_DIR = Path(os.getenv('CASPIO_IMPORT_DIR', self.BASE_DIR / 'data' / 'caspio'))
+        
         # Criar diretórios necessários
         self.LOG_DIR.mkdir(exist_ok=True)
         self.UPLOAD_DIR.mkdir(exist_ok=True)
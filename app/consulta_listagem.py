@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Consultas das listagens a partir de filtros e ordenações declarados
+
+Cada listagem declara uma vez a origem (FROM/JOINs), as colunas, os
+campos filtráveis e os campos ordenáveis. A partir da query string,
+``Listagem.montar`` valida a ordenação, lê os filtros e devolve o SQL de
+contagem e de página com os parâmetros.
+
+O SQL é canônico: os filtros entram sempre na ordem da declaração, com o
+mesmo texto, e o texto gerado para cada combinação de filtros/ordenação
+fica guardado na própria listagem. A mesma combinação produz sempre a
+mesma string, então o SQLite reaproveita o comando já compilado no cache
+de comandos da conexão (``SQLITE_CACHE_COMANDOS``, ver
+``app.database.abrir_banco``) em vez de compilá-lo a cada requisição.
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from fastlite import Database
+
+from app.garantia_status import dias_para_vencimento_sql, filtro_status_sql, status_sql
+from app.arquivamento import VISAO_HISTORICO
+from app.estabelecimentos import normalizar_estabelecimento
+from app.recall import condicao_prefixo_lote
+
+logger = logging.getLogger(__name__)
+
+# Tipos de filtro
+FILTRO_CONTEM = 'contem'      # coluna LIKE %valor%
+FILTRO_IGUAL = 'igual'        # coluna = valor
+FILTRO_BOOLEANO = 'booleano'  # 'true' -> TRUE, qualquer outro valor -> FALSE
+FILTRO_STATUS = 'status'      # status calculado da garantia (app.garantia_status)
+FILTRO_LOTE = 'lote'          # prefixo do lote normalizado, pelo índice (app.recall)
+FILTRO_ESTABELECIMENTO = 'estabelecimento'  # nome normalizado contém (app.estabelecimentos)
+
+DIRECOES = ('asc', 'desc')
+
+
+@dataclass(frozen=True)
+class CampoFiltro:
+    """Campo filtrável de uma listagem"""
+    nome: str
+    coluna: str
+    tipo: str = FILTRO_CONTEM
+
+
+@dataclass
+class ConsultaListagem:
+    """Consulta montada para uma requisição"""
+    filtros: Dict[str, str]
+    sort_field: str
+    sort_direction: str
+    sql_contagem: str
+    sql_pagina: str
+    sql_todos: str
+    params: List[Any]
+
+    def contar(self, db: Database) -> int:
+        """Total de registros com os filtros aplicados"""
+        return db.execute(self.sql_contagem, self.params).fetchone()[0]
+
+    def buscar(self, db: Database, limite: Optional[int] = None, deslocamento: int = 0) -> List:
+        """Registros da página (ou todos, sem ``limite``)"""
+        if limite is None:
+            return db.execute(self.sql_todos, self.params).fetchall()
+        return db.execute(self.sql_pagina, [*self.params, limite, deslocamento]).fetchall()
+
+
+class Listagem:
+    """Definição declarativa de uma listagem"""
+
+    def __init__(self, origem: str, colunas: Sequence[str], filtros: Sequence[CampoFiltro],
+                 ordenacoes: Mapping[str, str], ordenacao_padrao: str,
+                 direcao_padrao: str = 'asc', condicao_fixa: Optional[str] = None,
+                 origem_contagem: Optional[str] = None):
+        """
+        Args:
+            origem: Tabela principal e JOINs (texto após FROM)
+            colunas: Expressões do SELECT, na ordem em que as rotas leem a linha
+            filtros: Campos filtráveis, na ordem em que entram no WHERE
+            ordenacoes: Parâmetro ``sort`` -> expressão do ORDER BY
+            ordenacao_padrao: ``sort`` usado quando ausente ou inválido
+            direcao_padrao: ``direction`` usado quando ausente ou inválido
+            condicao_fixa: Condição sempre aplicada (ex.: garantias do usuário),
+                com parâmetros passados em ``montar``; só pode usar a tabela principal
+            origem_contagem: Tabela principal com alias (ex.: ``garantias g``),
+                contada sem os JOINs quando nenhum filtro preenchido usa as
+                tabelas juntadas. Só vale para JOINs que não eliminam linhas
+                (chave estrangeira NOT NULL)
+        """
+        self.origem = origem
+        self.colunas = ', '.join(colunas)
+        self.filtros = tuple(filtros)
+        self.ordenacoes = dict(ordenacoes)
+        self.ordenacao_padrao = ordenacao_padrao
+        self.direcao_padrao = direcao_padrao
+        self.condicao_fixa = condicao_fixa
+        self.origem_contagem = origem_contagem
+        self._alias_contagem = origem_contagem.split()[-1] if origem_contagem else None
+        self._sql: Dict[Tuple, Tuple[str, str, str]] = {}
+
+    def ler_filtros(self, query_params: Mapping[str, str]) -> Dict[str, str]:
+        """Valores dos filtros declarados (vazios quando ausentes)"""
+        return {campo.nome: (query_params.get(campo.nome) or '').strip() for campo in self.filtros}
+
+    def ler_ordenacao(self, query_params: Mapping[str, str]) -> Tuple[str, str]:
+        """Campo e direção de ordenação validados"""
+        campo = query_params.get('sort', self.ordenacao_padrao)
+        direcao = query_params.get('direction', self.direcao_padrao)
+        if campo not in self.ordenacoes:
+            campo = self.ordenacao_padrao
+        if direcao not in DIRECOES:
+            direcao = self.direcao_padrao
+        return campo, direcao
+
+    def _condicao(self, campo: CampoFiltro, valor: str) -> Tuple[Optional[str], List[Any]]:
+        """Condição e parâmetros de um filtro preenchido"""
+        if campo.tipo == FILTRO_CONTEM:
+            return f"{campo.coluna} LIKE ?", [f"%{valor}%"]
+        if campo.tipo == FILTRO_IGUAL:
+            return f"{campo.coluna} = ?", [valor]
+        if campo.tipo == FILTRO_BOOLEANO:
+            return f"{campo.coluna} = ?", [valor == 'true']
+        if campo.tipo == FILTRO_STATUS:
+            return filtro_status_sql(valor, alias=campo.coluna)
+        if campo.tipo == FILTRO_LOTE:
+            return condicao_prefixo_lote(valor, campo.coluna)
+        if campo.tipo == FILTRO_ESTABELECIMENTO:
+            return f"{campo.coluna} LIKE ?", [f"%{normalizar_estabelecimento(valor)}%"]
+        raise ValueError(f"Tipo de filtro desconhecido: {campo.tipo}")
+
+    def _filtro_na_tabela_principal(self, campo: CampoFiltro) -> bool:
+        """Indica se o filtro usa só a tabela de ``origem_contagem``"""
+        return campo.coluna.split('.')[0] == self._alias_contagem
+
+    def _montar_sql(self, condicoes: Tuple[str, ...], campo: str, direcao: str,
+                    contagem_sem_juncoes: bool = False) -> Tuple[str, str, str]:
+        """SQL de contagem, página e completo para uma combinação (guardado por combinação)"""
+        chave = (condicoes, campo, direcao, contagem_sem_juncoes)
+        sql = self._sql.get(chave)
+        if sql is None:
+            where = f" WHERE {' AND '.join(condicoes)}" if condicoes else ""
+            ordem = f" ORDER BY {self.ordenacoes[campo]} {direcao.upper()}"
+            selecao = f"SELECT {self.colunas} FROM {self.origem}{where}{ordem}"
+            origem_contagem = self.origem_contagem if contagem_sem_juncoes else self.origem
+            sql = (f"SELECT COUNT(*) FROM {origem_contagem}{where}", f"{selecao} LIMIT ? OFFSET ?", selecao)
+            self._sql[chave] = sql
+        return sql
+
+    def montar(self, query_params: Mapping[str, str],
+               params_fixos: Sequence[Any] = ()) -> ConsultaListagem:
+        """
+        Monta a consulta da requisição
+
+        Args:
+            query_params: Query string da requisição
+            params_fixos: Parâmetros de ``condicao_fixa``
+
+        Returns:
+            ConsultaListagem com filtros lidos, ordenação validada, SQL e parâmetros
+        """
+        filtros = self.ler_filtros(query_params)
+        campo, direcao = self.ler_ordenacao(query_params)
+
+        condicoes = [self.condicao_fixa] if self.condicao_fixa else []
+        params = list(params_fixos)
+        contagem_sem_juncoes = self.origem_contagem is not None
+        for definicao in self.filtros:
+            valor = filtros[definicao.nome]
+            if not valor:
+                continue
+            condicao, params_filtro = self._condicao(definicao, valor)
+            if condicao:
+                condicoes.append(condicao)
+                params.extend(params_filtro)
+                contagem_sem_juncoes = contagem_sem_juncoes and self._filtro_na_tabela_principal(definicao)
+
+        sql_contagem, sql_pagina, sql_todos = self._montar_sql(
+            tuple(condicoes), campo, direcao, contagem_sem_juncoes
+        )
+        return ConsultaListagem(filtros, campo, direcao, sql_contagem, sql_pagina, sql_todos, params)
+
+
+# ===== Listagens =====
+
+LISTAGEM_USUARIOS = Listagem(
+    origem="usuarios",
+    colunas=["id", "email", "nome", "tipo_usuario", "confirmado", "email_enviado", "data_cadastro"],
+    filtros=[
+        CampoFiltro('nome', 'nome'),
+        CampoFiltro('email', 'email'),
+        CampoFiltro('tipo_usuario', 'tipo_usuario', FILTRO_IGUAL),
+        CampoFiltro('confirmado', 'confirmado', FILTRO_BOOLEANO),
+    ],
+    ordenacoes={
+        'nome': 'nome',
+        'email': 'email',
+        'tipo_usuario': 'tipo_usuario',
+        'confirmado': 'confirmado',
+        'data_cadastro': 'data_cadastro',
+    },
+    ordenacao_padrao='data_cadastro',
+    direcao_padrao='desc',
+)
+
+LISTAGEM_PRODUTOS = Listagem(
+    origem="produtos",
+    colunas=["id", "sku", "descricao", "ativo", "data_cadastro"],
+    filtros=[
+        CampoFiltro('sku', 'sku'),
+        CampoFiltro('descricao', 'descricao'),
+        CampoFiltro('ativo', 'ativo', FILTRO_BOOLEANO),
+    ],
+    ordenacoes={
+        'sku': 'sku',
+        'descricao': 'descricao',
+        'ativo': 'ativo',
+        'data_cadastro': 'data_cadastro',
+    },
+    ordenacao_padrao='sku',
+)
+
+# Filtros comuns às listagens de garantias (cliente e admin)
+_FILTROS_GARANTIA = [
+    CampoFiltro('produto_sku', 'p.sku'),
+    CampoFiltro('produto_descricao', 'p.descricao'),
+    CampoFiltro('veiculo_marca', 'v.marca'),
+    CampoFiltro('veiculo_modelo', 'v.modelo'),
+    CampoFiltro('veiculo_placa', 'v.placa'),
+    CampoFiltro('lote_fabricacao', 'g.lote_norm', FILTRO_LOTE),
+    CampoFiltro('status', 'g', FILTRO_STATUS),
+]
+
+def _listagem_garantias_admin(tabela: str, arquivada: str) -> Listagem:
+    """Listagem administrativa de garantias sobre a tabela quente ou o histórico"""
+    return Listagem(
+        origem=(
+            f"{tabela} g "
+            "JOIN usuarios u ON g.usuario_id = u.id "
+            "JOIN produtos p ON g.produto_id = p.id "
+            "JOIN veiculos v ON g.veiculo_id = v.id"
+        ),
+        colunas=[
+            "g.id", "u.nome", "u.email", "p.sku", "p.descricao", "v.marca", "v.modelo", "v.placa",
+            "g.lote_fabricacao", "g.data_instalacao", "g.data_cadastro", "g.data_vencimento", "g.ativo",
+            f"{status_sql()} AS status",
+            f"{dias_para_vencimento_sql()} AS dias_para_vencimento",
+            f"{arquivada} AS arquivada",
+        ],
+        filtros=[
+            CampoFiltro('cliente_nome', 'u.nome'),
+            CampoFiltro('cliente_email', 'u.email'),
+            *_FILTROS_GARANTIA,
+            CampoFiltro('estabelecimento_id', 'g.estabelecimento_id', FILTRO_IGUAL),
+        ],
+        ordenacoes={
+            'id': 'g.id',
+            'cliente_nome': 'u.nome',
+            'produto_sku': 'p.sku',
+            'veiculo_marca': 'v.marca',
+            'data_instalacao': 'g.data_instalacao',
+            'data_vencimento': 'g.data_vencimento',
+            'ativo': 'g.ativo',
+            'data_cadastro': 'g.data_cadastro',
+        },
+        ordenacao_padrao='data_cadastro',
+        direcao_padrao='desc',
+        origem_contagem=f"{tabela} g",
+    )
+
+
+LISTAGEM_GARANTIAS_ADMIN = _listagem_garantias_admin('garantias', 'FALSE')
+
+# Com "incluir arquivadas": visão temporária criada por app.arquivamento.anexar_arquivo
+LISTAGEM_GARANTIAS_ADMIN_HISTORICO = _listagem_garantias_admin(VISAO_HISTORICO, 'g.arquivada')
+
+LISTAGEM_GARANTIAS_CLIENTE = Listagem(
+    origem=(
+        "garantias g "
+        "JOIN produtos p ON g.produto_id = p.id "
+        "JOIN veiculos v ON g.veiculo_id = v.id"
+    ),
+    colunas=[
+        "g.id", "p.sku", "p.descricao", "v.marca", "v.modelo", "v.placa",
+        "g.lote_fabricacao", "g.data_instalacao", "g.data_cadastro",
+        "g.data_vencimento", "g.ativo", "g.nota_fiscal", "g.nome_estabelecimento",
+        "g.quilometragem", "g.observacoes",
+        f"{status_sql()} AS status",
+        f"{dias_para_vencimento_sql()} AS dias_para_vencimento",
+    ],
+    filtros=_FILTROS_GARANTIA,
+    ordenacoes={'data_cadastro': 'g.data_cadastro'},
+    ordenacao_padrao='data_cadastro',
+    direcao_padrao='desc',
+    condicao_fixa="g.usuario_id = ?",
+    origem_contagem="garantias g",
+)
+
+LISTAGEM_ESTABELECIMENTOS = Listagem(
+    origem="estabelecimentos",
+    colunas=["id", "nome", "total_garantias", "garantias_ativas", "data_cadastro"],
+    filtros=[
+        CampoFiltro('nome', 'nome_norm', FILTRO_ESTABELECIMENTO),
+    ],
+    ordenacoes={
+        'nome': 'nome_norm',
+        'total_garantias': 'total_garantias',
+        'garantias_ativas': 'garantias_ativas',
+    },
+    ordenacao_padrao='garantias_ativas',
+    direcao_padrao='desc',
+)
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Contadores de garantias e veículos mantidos por triggers
+
+``veiculos`` guarda ``total_garantias`` e ``garantias_ativas`` e
+``usuarios`` guarda, além desses dois, ``veiculos_ativos``. Os triggers
+atualizam os contadores a cada INSERT, DELETE e mudança de ``ativo``,
+``veiculo_id`` ou ``usuario_id``, então as telas leem os totais direto da
+linha em vez de contar garantias a cada requisição.
+
+"Ativa" segue o critério usado nas consultas (``ativo = TRUE``), sem
+considerar a data de vencimento, que muda sem que a linha seja alterada.
+
+``recalcular_contadores`` refaz as contagens a partir das tabelas e
+corrige as linhas divergentes (``python scripts/utils/maintenance.py
+repair-counters``).
+
+``somar_garantia``, ``contagens_garantias`` e ``recalcular_contadores``
+recebem a tabela e a chave em garantias, e são usados também pelos
+contadores dos estabelecimentos (app.estabelecimentos).
+"""
+
+import logging
+from typing import Dict, Optional
+
+from fastlite import Database
+
+logger = logging.getLogger(__name__)
+
+# Colunas de contadores por tabela
+COLUNAS_CONTADORES = {
+    'veiculos': ('total_garantias', 'garantias_ativas'),
+    'usuarios': ('total_garantias', 'garantias_ativas', 'veiculos_ativos'),
+}
+
+_ATIVA_NEW = "(CASE WHEN NEW.ativo = TRUE THEN 1 ELSE 0 END)"
+_ATIVA_OLD = "(CASE WHEN OLD.ativo = TRUE THEN 1 ELSE 0 END)"
+
+
+def somar_garantia(tabela: str, chave: str, linha: str, sinal: str) -> str:
+    """
+    UPDATE que soma (ou subtrai) uma garantia nos contadores de uma tabela
+
+    Args:
+        tabela: Tabela com total_garantias e garantias_ativas
+        chave: Coluna de garantias que aponta para a tabela
+        linha: 'NEW' ou 'OLD' (linha do trigger)
+        sinal: '+' ou '-'
+    """
+    ativa = _ATIVA_NEW if linha == 'NEW' else _ATIVA_OLD
+    return f"""
+            UPDATE {tabela}
+            SET total_garantias = total_garantias {sinal} 1,
+                garantias_ativas = garantias_ativas {sinal} {ativa}
+            WHERE id = {linha}.{chave};"""
+
+
+def _somar_veiculo(linha: str, sinal: str) -> str:
+    """UPDATE que soma (ou subtrai) um veículo ativo em usuarios.veiculos_ativos"""
+    ativo = _ATIVA_NEW if linha == 'NEW' else _ATIVA_OLD
+    return f"""
+            UPDATE usuarios SET veiculos_ativos = veiculos_ativos {sinal} {ativo}
+            WHERE id = {linha}.usuario_id;"""
+
+
+GATILHOS = {
+    'trg_garantias_contadores_insert': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_garantias_contadores_insert
+        AFTER INSERT ON garantias
+        BEGIN{somar_garantia('veiculos', 'veiculo_id', 'NEW', '+')}{somar_garantia('usuarios', 'usuario_id', 'NEW', '+')}
+        END
+    """,
+    'trg_garantias_contadores_delete': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_garantias_contadores_delete
+        AFTER DELETE ON garantias
+        BEGIN{somar_garantia('veiculos', 'veiculo_id', 'OLD', '-')}{somar_garantia('usuarios', 'usuario_id', 'OLD', '-')}
+        END
+    """,
+    'trg_garantias_contadores_update': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_garantias_contadores_update
+        AFTER UPDATE OF ativo, veiculo_id, usuario_id ON garantias
+        WHEN OLD.ativo IS NOT NEW.ativo
+          OR OLD.veiculo_id IS NOT NEW.veiculo_id
+          OR OLD.usuario_id IS NOT NEW.usuario_id
+        BEGIN{somar_garantia('veiculos', 'veiculo_id', 'OLD', '-')}{somar_garantia('usuarios', 'usuario_id', 'OLD', '-')}{somar_garantia('veiculos', 'veiculo_id', 'NEW', '+')}{somar_garantia('usuarios', 'usuario_id', 'NEW', '+')}
+        END
+    """,
+    'trg_veiculos_contadores_insert': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_veiculos_contadores_insert
+        AFTER INSERT ON veiculos
+        BEGIN{_somar_veiculo('NEW', '+')}
+        END
+    """,
+    'trg_veiculos_contadores_delete': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_veiculos_contadores_delete
+        AFTER DELETE ON veiculos
+        BEGIN{_somar_veiculo('OLD', '-')}
+        END
+    """,
+    'trg_veiculos_contadores_update': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_veiculos_contadores_update
+        AFTER UPDATE OF ativo, usuario_id ON veiculos
+        WHEN OLD.ativo IS NOT NEW.ativo OR OLD.usuario_id IS NOT NEW.usuario_id
+        BEGIN{_somar_veiculo('OLD', '-')}{_somar_veiculo('NEW', '+')}
+        END
+    """,
+}
+
+def contagens_garantias(tabela: str, chave: str) -> Dict[str, str]:
+    """Contagens de referência de total_garantias e garantias_ativas (subconsultas correlacionadas)"""
+    contagem = f"SELECT COUNT(*) FROM garantias g WHERE g.{chave} = {tabela}.id"
+    return {
+        'total_garantias': contagem,
+        'garantias_ativas': f"{contagem} AND g.ativo = TRUE",
+    }
+
+
+# Contagem de referência de cada contador
+_CONTAGENS = {
+    'veiculos': contagens_garantias('veiculos', 'veiculo_id'),
+    'usuarios': {
+        **contagens_garantias('usuarios', 'usuario_id'),
+        'veiculos_ativos': "SELECT COUNT(*) FROM veiculos v WHERE v.usuario_id = usuarios.id AND v.ativo = TRUE",
+    },
+}
+
+
+def criar_gatilhos(db: Database):
+    """Cria os triggers que mantêm os contadores"""
+    for sql in GATILHOS.values():
+        db.execute(sql)
+
+
+def recalcular_contadores(db: Database,
+                          contagens_por_tabela: Optional[Dict[str, Dict[str, str]]] = None) -> Dict[str, int]:
+    """
+    Recalcula os contadores a partir das tabelas e corrige os divergentes
+
+    Usado pela migração que cria os contadores e como comando de reparo,
+    caso as linhas tenham sido alteradas com os triggers desativados
+    (importações externas, restauração parcial de backup).
+
+    Args:
+        db: Banco da aplicação
+        contagens_por_tabela: Coluna -> contagem de referência por tabela
+            (padrão: contadores de veiculos e usuarios)
+
+    Returns:
+        Quantidade de linhas corrigidas por tabela
+    """
+    corrigidas = {}
+    for tabela, contagens in (contagens_por_tabela or _CONTAGENS).items():
+        atribuicoes = ", ".join(f"{coluna} = ({sql})" for coluna, sql in contagens.items())
+        divergentes = " OR ".join(f"{coluna} IS NOT ({sql})" for coluna, sql in contagens.items())
+        db.execute(f"UPDATE {tabela} SET {atribuicoes} WHERE {divergentes}")
+        corrigidas[tabela] = db.conn.changes()
+        if corrigidas[tabela]:
+            logger.warning(f"Contadores corrigidos em {corrigidas[tabela]} registros de {tabela}")
+    return corrigidas
@@ -5,113 +5,88 @@ Inicialização e configuração do banco de dados SQLite
 
 import logging
 from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Union
+
+import apsw
 from fastlite import Database
 from models.usuario import Usuario
 from models.produto import Produto
 from models.veiculo import Veiculo
 from models.garantia import Garantia
 from app.date_utils import format_datetime_iso
+from app.migrations import aplicar_migracoes
 
 logger = logging.getLogger(__name__)
 
+# Comandos compilados mantidos por conexão (o padrão do apsw é 100)
+CACHE_COMANDOS_PADRAO = 256
+
+def abrir_banco(caminho: Union[str, Path], cache_comandos: int = CACHE_COMANDOS_PADRAO) -> Database:
+    """
+    Abre o banco com um cache de comandos compilados maior que o padrão
+
+    As listagens geram um texto de SQL por combinação de filtros e
+    ordenação (app.consulta_listagem); o cache maior mantém essas
+    variações compiladas entre as requisições.
+    """
+    return Database(apsw.Connection(str(caminho), statementcachesize=cache_comandos))
+
+def fechar_banco(db: Database):
+    """
+    Fecha a conexão executando antes PRAGMA optimize
+
+    O SQLite recomenda o optimize ao fechar conexões: ele roda ANALYZE só
+    nas tabelas cujas estatísticas ficaram desatualizadas pelas consultas
+    feitas durante a conexão.
+    """
+    try:
+        db.execute("PRAGMA optimize")
+    except apsw.Error as e:
+        logger.warning(f"PRAGMA optimize falhou ao fechar o banco: {e}")
+    db.close()
+
+# Modos de PRAGMA auto_vacuum
+MODOS_AUTO_VACUUM = {0: 'none', 1: 'full', 2: 'incremental'}
+
+def estatisticas_armazenamento(db: Database) -> List[Dict[str, Any]]:
+    """
+    Tamanho, páginas livres e fragmentação de cada banco da conexão
+
+    A fragmentação é o percentual de páginas na freelist (espaço
+    ocupado pelo arquivo sem dados), que o incremental_vacuum devolve ao
+    sistema de arquivos.
+
+    Returns:
+        Um dicionário por banco anexado (main, arquivo)
+    """
+    estatisticas = []
+    for row in db.execute("PRAGMA database_list").fetchall():
+        esquema = row[1]
+        if esquema == 'temp':
+            continue
+        tamanho_pagina, paginas, livres, auto_vacuum = (
+            db.execute(f"PRAGMA {esquema}.{nome}").fetchone()[0]
+            for nome in ('page_size', 'page_count', 'freelist_count', 'auto_vacuum')
+        )
+        estatisticas.append({
+            'banco': esquema,
+            'tamanho_bytes': tamanho_pagina * paginas,
+            'paginas': paginas,
+            'paginas_livres': livres,
+            'livre_bytes': tamanho_pagina * livres,
+            'fragmentacao_pct': round(100 * livres / paginas, 1) if paginas else 0.0,
+            'auto_vacuum': MODOS_AUTO_VACUUM.get(auto_vacuum, 'none'),
+        })
+    return estatisticas
+
 def init_database(db: Database):
     """Inicializa o banco de dados com as tabelas necessárias"""
     
     logger.info("Inicializando banco de dados...")
     
-    # Criar tabela de usuários
-    db.execute("""
-        CREATE TABLE IF NOT EXISTS usuarios (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL,
-            senha_hash TEXT NOT NULL,
-            nome TEXT NOT NULL,
-            tipo_usuario TEXT NOT NULL DEFAULT 'cliente',
-            confirmado BOOLEAN DEFAULT FALSE,
-            email_enviado BOOLEAN DEFAULT FALSE,
-            cep TEXT,
-            endereco TEXT,
-            bairro TEXT,
-            cidade TEXT,
-            uf TEXT,
-            telefone TEXT,
-            cpf_cnpj TEXT,
-            data_nascimento DATETIME,
-            data_cadastro DATETIME DEFAULT CURRENT_TIMESTAMP,
-            token_confirmacao TEXT,
-            token_reset_senha TEXT,
-            CONSTRAINT chk_tipo_usuario CHECK (tipo_usuario IN ('cliente', 'administrador'))
-        )
-    """)
-    
-    # Adicionar coluna email_enviado se não existir (para bancos existentes)
-    try:
-        db.execute("ALTER TABLE usuarios ADD COLUMN email_enviado BOOLEAN DEFAULT FALSE")
-        logger.info("Coluna email_enviado adicionada à tabela usuarios")
-    except Exception:
-        # Coluna já existe, ignorar erro
-        pass
-    
-    # Criar tabela de produtos
-    db.execute("""
-        CREATE TABLE IF NOT EXISTS produtos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            sku TEXT UNIQUE NOT NULL,
-            descricao TEXT,
-            ativo BOOLEAN DEFAULT TRUE,
-            data_cadastro DATETIME DEFAULT CURRENT_TIMESTAMP,
-            data_atualizacao DATETIME
-        )
-    """)
-    
-    # Criar tabela de veículos
-    db.execute("""
-        CREATE TABLE IF NOT EXISTS veiculos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            usuario_id INTEGER NOT NULL,
-            marca TEXT NOT NULL,
-            modelo TEXT NOT NULL,
-            ano_modelo TEXT,
-            placa TEXT NOT NULL,
-            chassi TEXT,
-            cor TEXT,
-            data_cadastro DATETIME DEFAULT CURRENT_TIMESTAMP,
-            data_atualizacao DATETIME,
-            ativo BOOLEAN DEFAULT TRUE,
-            FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-        )
-    """)
-    
-    # Criar tabela de garantias
-    db.execute("""
-        CREATE TABLE IF NOT EXISTS garantias (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            usuario_id INTEGER NOT NULL,
-            produto_id INTEGER NOT NULL,
-            veiculo_id INTEGER NOT NULL,
-            lote_fabricacao TEXT NOT NULL,
-            data_instalacao DATETIME NOT NULL,
-            nota_fiscal TEXT NOT NULL,
-            nome_estabelecimento TEXT NOT NULL,
-            quilometragem INTEGER NOT NULL,
-            data_cadastro DATETIME DEFAULT CURRENT_TIMESTAMP,
-            data_vencimento DATETIME,
-            ativo BOOLEAN DEFAULT TRUE,
-            observacoes TEXT,
-            FOREIGN KEY (usuario_id) REFERENCES usuarios (id),
-            FOREIGN KEY (produto_id) REFERENCES produtos (id),
-            FOREIGN KEY (veiculo_id) REFERENCES veiculos (id)
-        )
-    """)
-    
-    # Criar índices para melhor performance
-    db.execute("CREATE INDEX IF NOT EXISTS idx_usuarios_email ON usuarios (email)")
-    db.execute("CREATE INDEX IF NOT EXISTS idx_usuarios_tipo ON usuarios (tipo_usuario)")
-    db.execute("CREATE INDEX IF NOT EXISTS idx_produtos_sku ON produtos (sku)")
-    db.execute("CREATE INDEX IF NOT EXISTS idx_veiculos_usuario ON veiculos (usuario_id)")
-    db.execute("CREATE INDEX IF NOT EXISTS idx_garantias_usuario ON garantias (usuario_id)")
-    db.execute("CREATE INDEX IF NOT EXISTS idx_garantias_produto ON garantias (produto_id)")
-    db.execute("CREATE INDEX IF NOT EXISTS idx_garantias_veiculo ON garantias (veiculo_id)")
+    # Aplicar migrações de schema pendentes (uma consulta de versão se atualizado)
+    aplicar_migracoes(db)
     
     # Criar usuário administrador padrão se não existir
     criar_admin_padrao(db)
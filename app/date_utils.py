@@ -8,10 +8,77 @@ garantindo consistência no padrão brasileiro:
 - Data/hora: dd/MM/yyyy HH:mm:ss
 
 Para logs, mantém o formato yyyy-MM-dd HH:mm:ss.
+
+No banco as datas são gravadas em formato ISO canônico: yyyy-MM-dd para
+colunas de data e yyyy-MM-dd HH:mm:ss para data/hora (ver
+normalizar_data_iso/normalizar_datetime_iso). As funções de exibição
+reconhecem esse formato por fatiamento fixo, sem strptime; valores fora
+do padrão seguem pelo caminho antigo, com cache (memoização).
 """
 
-from datetime import datetime
-from typing import Optional, Union
+import calendar
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Optional, Sequence, Union
+
+FORMATO_DATA_ISO = '%Y-%m-%d'
+FORMATO_DATETIME_ISO = '%Y-%m-%d %H:%M:%S'
+
+# Quantidade de valores fora do padrão canônico mantidos em cache
+TAMANHO_CACHE_FORMATACAO = 4096
+
+# Formatos aceitos na normalização de valores legados, em ordem de tentativa
+FORMATOS_ENTRADA = (
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%d %H:%M:%S.%f',
+    '%Y-%m-%dT%H:%M:%S.%f',
+    '%Y-%m-%d %H:%M',
+    '%Y-%m-%dT%H:%M',
+    '%Y-%m-%d',
+    '%d/%m/%Y %H:%M:%S',
+    '%d/%m/%Y %H:%M',
+    '%d/%m/%Y',
+)
+
+# Formatos exportados pelo Caspio (mês antes do dia)
+FORMATOS_CASPIO = (
+    '%m/%d/%Y %I:%M:%S %p',  # 11/9/2017 2:26:09 PM
+    '%m/%d/%Y',              # 4/14/1962
+    '%Y-%m-%d',              # 1962-04-14
+    '%d/%m/%Y',              # 14/04/1962
+)
+
+
+def _e_data_iso(valor: str) -> bool:
+    """Verifica se os 10 primeiros caracteres são uma data yyyy-MM-dd válida"""
+    if not (
+        valor[4] == '-' and valor[7] == '-'
+        and valor[:4].isdigit() and valor[5:7].isdigit() and valor[8:10].isdigit()
+        and valor[:4] != '0000' and '01' <= valor[5:7] <= '12' and '01' <= valor[8:10] <= '31'
+    ):
+        return False
+    # Dias acima de 28 dependem do mês e do ano (30/02, 31/04, 29/02 fora de ano bissexto)
+    return valor[8:10] <= '28' or int(valor[8:10]) <= calendar.monthrange(int(valor[:4]), int(valor[5:7]))[1]
+
+
+def _formato_canonico(valor: str) -> int:
+    """
+    Identifica o formato ISO canônico por posição fixa, sem strptime
+
+    Returns:
+        10 para yyyy-MM-dd, 19 para yyyy-MM-dd HH:mm:ss ou 0 se fora do padrão
+    """
+    tamanho = len(valor)
+    if tamanho == 10:
+        return 10 if valor.isascii() and _e_data_iso(valor) else 0
+    if tamanho == 19:
+        if (valor.isascii() and valor[10] == ' ' and valor[13] == ':' and valor[16] == ':'
+                and _e_data_iso(valor)
+                and valor[11:13].isdigit() and valor[14:16].isdigit() and valor[17:19].isdigit()
+                and valor[11:13] <= '23' and valor[14:16] <= '59' and valor[17:19] <= '59'):
+            return 19
+    return 0
 
 
 def format_date_br(date_value: Union[str, datetime, None]) -> str:
@@ -27,51 +94,62 @@ def format_date_br(date_value: Union[str, datetime, None]) -> str:
     if not date_value:
         return 'N/A'
     
+    if isinstance(date_value, str):
+        if _formato_canonico(date_value):
+            return f"{date_value[8:10]}/{date_value[5:7]}/{date_value[:4]}"
+        return _format_date_br_texto(date_value)
+    
     try:
-        if isinstance(date_value, str):
-            # Tenta diferentes formatos de entrada, incluindo ISO com microsegundos
-            formats = [
-                '%Y-%m-%dT%H:%M:%S.%f',      # ISO com microsegundos: 2025-09-14T17:47:26.925777
-                '%Y-%m-%dT%H:%M:%S',         # ISO sem microsegundos: 2025-09-14T17:47:26
-                '%Y-%m-%d %H:%M:%S.%f',      # Com espaço e microsegundos
-                '%Y-%m-%d %H:%M:%S',         # Com espaço sem microsegundos
-                '%Y-%m-%d %H:%M',            # Com espaço só hora:minuto
-                '%Y-%m-%d',                  # Só data
-            ]
-            
-            for fmt in formats:
-                try:
-                    date_obj = datetime.strptime(date_value, fmt).date()
-                    return date_obj.strftime('%d/%m/%Y')
-                except ValueError:
-                    continue
-            
-            # Se não conseguir converter com os formatos padrão, tenta fromisoformat
-            try:
-                # Tenta usar fromisoformat (Python 3.7+)
-                if hasattr(datetime, 'fromisoformat'):
-                    date_obj = datetime.fromisoformat(date_value).date()
-                    return date_obj.strftime('%d/%m/%Y')
-            except:
-                pass
-            
-            # Tenta parsing manual separando data e hora
-            try:
-                if 'T' in date_value:
-                    date_part = date_value.split('T')[0]
-                    date_obj = datetime.strptime(date_part, '%Y-%m-%d').date()
-                    return date_obj.strftime('%d/%m/%Y')
-            except:
-                pass
-            
-            # Se ainda não conseguir, retorna N/A
-            return 'N/A'
+        # Assume que é um objeto datetime ou date
+        if hasattr(date_value, 'date'):
+            return date_value.date().strftime('%d/%m/%Y')
         else:
-            # Assume que é um objeto datetime ou date
-            if hasattr(date_value, 'date'):
-                return date_value.date().strftime('%d/%m/%Y')
-            else:
-                return date_value.strftime('%d/%m/%Y')
+            return date_value.strftime('%d/%m/%Y')
+    except Exception:
+        return 'N/A'
+
+
+@lru_cache(maxsize=TAMANHO_CACHE_FORMATACAO)
+def _format_date_br_texto(date_value: str) -> str:
+    """Caminho lento de format_date_br para strings fora do padrão canônico"""
+    try:
+        # Tenta diferentes formatos de entrada, incluindo ISO com microsegundos
+        formats = [
+            '%Y-%m-%dT%H:%M:%S.%f',      # ISO com microsegundos: 2025-09-14T17:47:26.925777
+            '%Y-%m-%dT%H:%M:%S',         # ISO sem microsegundos: 2025-09-14T17:47:26
+            '%Y-%m-%d %H:%M:%S.%f',      # Com espaço e microsegundos
+            '%Y-%m-%d %H:%M:%S',         # Com espaço sem microsegundos
+            '%Y-%m-%d %H:%M',            # Com espaço só hora:minuto
+            '%Y-%m-%d',                  # Só data
+        ]
+
+        for fmt in formats:
+            try:
+                date_obj = datetime.strptime(date_value, fmt).date()
+                return date_obj.strftime('%d/%m/%Y')
+            except ValueError:
+                continue
+
+        # Se não conseguir converter com os formatos padrão, tenta fromisoformat
+        try:
+            # Tenta usar fromisoformat (Python 3.7+)
+            if hasattr(datetime, 'fromisoformat'):
+                date_obj = datetime.fromisoformat(date_value).date()
+                return date_obj.strftime('%d/%m/%Y')
+        except:
+            pass
+
+        # Tenta parsing manual separando data e hora
+        try:
+            if 'T' in date_value:
+                date_part = date_value.split('T')[0]
+                date_obj = datetime.strptime(date_part, '%Y-%m-%d').date()
+                return date_obj.strftime('%d/%m/%Y')
+        except:
+            pass
+
+        # Se ainda não conseguir, retorna N/A
+        return 'N/A'
     except Exception:
         return 'N/A'
 
@@ -119,28 +197,41 @@ def format_datetime_br(datetime_value: Union[str, datetime, None]) -> str:
     if not datetime_value:
         return 'N/A'
     
+    if isinstance(datetime_value, str):
+        formato = _formato_canonico(datetime_value)
+        if formato:
+            hora = datetime_value[11:] if formato == 19 else '00:00:00'
+            return f"{datetime_value[8:10]}/{datetime_value[5:7]}/{datetime_value[:4]} {hora}"
+        return _format_datetime_br_texto(datetime_value)
+    
     try:
-        if isinstance(datetime_value, str):
-            # Tenta diferentes formatos de entrada, incluindo com microsegundos
-            formats = [
-                '%Y-%m-%d %H:%M:%S.%f',  # Com microsegundos
-                '%Y-%m-%dT%H:%M:%S.%f',  # ISO com T e microsegundos
-                '%Y-%m-%d %H:%M:%S',     # Sem microsegundos
-                '%Y-%m-%dT%H:%M:%S',     # ISO com T sem microsegundos
-                '%Y-%m-%d %H:%M',        # Só até minutos
-                '%Y-%m-%d'               # Só data
-            ]
-            
-            for fmt in formats:
-                try:
-                    dt_obj = datetime.strptime(datetime_value, fmt)
-                    return dt_obj.strftime('%d/%m/%Y %H:%M:%S')
-                except ValueError:
-                    continue
-            return datetime_value  # Retorna original se não conseguir converter
-        else:
-            # Assume que é um objeto datetime
-            return datetime_value.strftime('%d/%m/%Y %H:%M:%S')
+        # Assume que é um objeto datetime
+        return datetime_value.strftime('%d/%m/%Y %H:%M:%S')
+    except Exception:
+        return 'N/A'
+
+
+@lru_cache(maxsize=TAMANHO_CACHE_FORMATACAO)
+def _format_datetime_br_texto(datetime_value: str) -> str:
+    """Caminho lento de format_datetime_br para strings fora do padrão canônico"""
+    try:
+        # Tenta diferentes formatos de entrada, incluindo com microsegundos
+        formats = [
+            '%Y-%m-%d %H:%M:%S.%f',  # Com microsegundos
+            '%Y-%m-%dT%H:%M:%S.%f',  # ISO com T e microsegundos
+            '%Y-%m-%d %H:%M:%S',     # Sem microsegundos
+            '%Y-%m-%dT%H:%M:%S',     # ISO com T sem microsegundos
+            '%Y-%m-%d %H:%M',        # Só até minutos
+            '%Y-%m-%d'               # Só data
+        ]
+
+        for fmt in formats:
+            try:
+                dt_obj = datetime.strptime(datetime_value, fmt)
+                return dt_obj.strftime('%d/%m/%Y %H:%M:%S')
+            except ValueError:
+                continue
+        return datetime_value  # Retorna original se não conseguir converter
     except Exception:
         return 'N/A'
 
@@ -158,6 +249,12 @@ def format_datetime_br_short(datetime_value: Union[str, datetime, None]) -> str:
     if not datetime_value:
         return 'N/A'
     
+    if isinstance(datetime_value, str):
+        formato = _formato_canonico(datetime_value)
+        if formato:
+            hora = datetime_value[11:16] if formato == 19 else '00:00'
+            return f"{datetime_value[8:10]}/{datetime_value[5:7]}/{datetime_value[:4]} {hora}"
+    
     try:
         if isinstance(datetime_value, str):
             # Tenta diferentes formatos de entrada
@@ -321,4 +418,59 @@ def format_datetime_for_database(datetime_value: Union[str, datetime, None]) ->
             # Assume que é um objeto datetime
             return datetime_value.strftime('%Y-%m-%d %H:%M:%S')
     except Exception:
-        return None
\ No newline at end of file
+        return None
+
+def _interpretar_data(valor, formatos: Sequence[str]) -> Optional[datetime]:
+    """Converte datetime, date ou string em um dos formatos informados"""
+    if isinstance(valor, datetime):
+        return valor.replace(tzinfo=None)
+    if isinstance(valor, date):
+        return datetime(valor.year, valor.month, valor.day)
+    if not isinstance(valor, str) or not valor.strip():
+        return None
+
+    texto = valor.strip()
+    for fmt in formatos:
+        try:
+            return datetime.strptime(texto, fmt)
+        except ValueError:
+            continue
+
+    try:
+        # Cobre variações ISO restantes (fuso horário, frações de segundo)
+        return datetime.fromisoformat(texto).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def normalizar_data_iso(valor, formatos: Sequence[str] = FORMATOS_ENTRADA) -> Optional[str]:
+    """
+    Converte uma data para o formato canônico de armazenamento (yyyy-MM-dd).
+    
+    Args:
+        valor: Data em string, datetime ou date
+        formatos: Formatos de string aceitos, em ordem de tentativa
+        
+    Returns:
+        Data no formato canônico ou None se não for possível interpretar
+    """
+    dt_obj = _interpretar_data(valor, formatos)
+    return dt_obj.strftime(FORMATO_DATA_ISO) if dt_obj else None
+
+
+def normalizar_datetime_iso(valor, formatos: Sequence[str] = FORMATOS_ENTRADA) -> Optional[str]:
+    """
+    Converte uma data/hora para o formato canônico de armazenamento (yyyy-MM-dd HH:mm:ss).
+    
+    Frações de segundo e fuso horário são descartados; datas sem horário
+    ficam com 00:00:00.
+    
+    Args:
+        valor: Data/hora em string, datetime ou date
+        formatos: Formatos de string aceitos, em ordem de tentativa
+        
+    Returns:
+        Data/hora no formato canônico ou None se não for possível interpretar
+    """
+    dt_obj = _interpretar_data(valor, formatos)
+    return dt_obj.strftime(FORMATO_DATETIME_ISO) if dt_obj else None
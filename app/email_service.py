@@ -3,24 +3,37 @@
 Serviço de envio de emails para o sistema de garantia Viemar
 """
 
+import importlib.util
 from datetime import datetime
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
 from pathlib import Path
 
 from app.config import Config
 from app.date_utils import format_datetime_br
+from app.envio_smtp import get_entrega_smtp
 from app.logger import get_logger
 
-# Importar vieutil para envio de emails em produção
-try:
-    from vieutil import send_email as vieutil_send_email
-    VIEUTIL_AVAILABLE = True
-except ImportError:
-    VIEUTIL_AVAILABLE = False
-    vieutil_send_email = None
+# vieutil é usado para envio de emails em produção; a importação é lenta,
+# então apenas verificamos se o pacote existe e carregamos no primeiro envio
+VIEUTIL_AVAILABLE = importlib.util.find_spec('vieutil') is not None
+vieutil_send_email = None
 
 logger = get_logger(__name__)
 
+def _carregar_vieutil():
+    """Importa vieutil.send_email sob demanda"""
+    global vieutil_send_email, VIEUTIL_AVAILABLE
+    
+    if vieutil_send_email is None and VIEUTIL_AVAILABLE:
+        try:
+            from vieutil import send_email
+            vieutil_send_email = send_email
+        except ImportError as e:
+            logger.error(f"Falha ao importar vieutil: {e}")
+            VIEUTIL_AVAILABLE = False
+    
+    return vieutil_send_email
+
 # Configuração será instanciada quando necessário
 config = None
 
@@ -41,10 +54,15 @@ class EmailService:
         # vieutil.send_email não requer autenticação SMTP (usa relay autorizado)
         self.email_from = config.EMAIL_FROM
         
-        # vieutil disponível (único método suportado)
+        # vieutil disponível (método padrão)
         self.vieutil_available = VIEUTIL_AVAILABLE
         
-        if self.vieutil_available:
+        # EMAIL_BACKEND=smtp: sessão SMTP persistente compartilhada pelo processo
+        self.backend = 'smtp' if getattr(config, 'EMAIL_BACKEND', 'vieutil') == 'smtp' else 'vieutil'
+        
+        if self.backend == 'smtp':
+            logger.info("EmailService inicializado com sessão SMTP persistente")
+        elif self.vieutil_available:
             logger.info("EmailService inicializado com vieutil.send_email (relay autorizado)")
         else:
             logger.error("EmailService não pode ser inicializado - vieutil.send_email não disponível")
@@ -60,7 +78,11 @@ class EmailService:
     ) -> bool:
         """Envia email usando vieutil.send_email (relay autorizado - não requer autenticação SMTP)"""
         
-        if not self.vieutil_available or not vieutil_send_email:
+        if self.backend == 'smtp':
+            return get_entrega_smtp(get_config()).enviar(to_email, subject, body)
+        
+        send = _carregar_vieutil() if self.vieutil_available else None
+        if not send:
             logger.error("vieutil.send_email não está disponível")
             return False
             
@@ -69,7 +91,7 @@ class EmailService:
             
             # Usar apenas texto puro
             # vieutil.send_email não requer autenticação - usa relay autorizado
-            result = vieutil_send_email(
+            result = send(
                 to=to_email,
                 subject=subject,
                 text=body,
@@ -83,6 +105,23 @@ class EmailService:
             logger.error(f"Erro ao enviar email via vieutil para {to_email}: {e}")
             return False
     
+    def send_emails(self, mensagens: List[Tuple[str, str, str]]) -> List[bool]:
+        """
+        Envia vários emails de uma vez
+        
+        Com o backend SMTP todas as mensagens passam pela mesma conexão sem
+        liberá-la entre elas; com vieutil são enviadas uma a uma.
+        
+        Args:
+            mensagens: Tuplas (destinatário, assunto, corpo)
+        
+        Returns:
+            Resultado de cada envio, na mesma ordem
+        """
+        if self.backend == 'smtp':
+            return get_entrega_smtp(get_config()).enviar_lote(mensagens)
+        return [self.send_email(destinatario, assunto, corpo) for destinatario, assunto, corpo in mensagens]
+    
     def send_welcome_email(self, user_email: str, user_name: str) -> bool:
         """Envia email de boas-vindas"""
         subject = "Bem-vindo ao Sistema de Garantia Viemar"
@@ -259,7 +298,7 @@ def send_email_with_vieutil(
         send_from_str = f"from_name <{send_from}>"
         
         # Send email using vieutil (no authentication required - uses pre-authorized relay)
-        if VIEUTIL_AVAILABLE:
+        if VIEUTIL_AVAILABLE and _carregar_vieutil():
             return vieutil_send_email(
                 send_from_str,
                 to,
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Entrega de emails por uma conexão SMTP persistente
+
+O envio pelo vieutil abre uma conexão com o relay a cada mensagem. Com
+EMAIL_BACKEND=smtp o EmailService passa a usar uma única sessão SMTP
+(EHLO, STARTTLS e login feitos uma vez), reaproveitada entre mensagens e
+reaberta quando o servidor derruba a conexão, quando fica ociosa por
+muito tempo ou depois de um número máximo de mensagens.
+
+Se o servidor anuncia PIPELINING (RFC 2920), MAIL FROM, RCPT TO e DATA de
+cada mensagem vão em uma única escrita, economizando duas idas e voltas
+por mensagem.
+"""
+
+import logging
+import re
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+from email.policy import SMTP as POLITICA_SMTP
+from email.utils import formatdate, make_msgid
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT_PADRAO = 30
+MENSAGENS_POR_CONEXAO_PADRAO = 500
+OCIOSIDADE_MAXIMA_PADRAO = 60
+
+_PONTO_INICIO_LINHA = re.compile(rb'(?m)^\.')
+
+
+class EntregaSMTP:
+    """Envio de mensagens de texto por uma sessão SMTP reaproveitada"""
+
+    def __init__(self, servidor: str, porta: int, remetente: str,
+                 usuario: str = '', senha: str = '', usar_tls: bool = True,
+                 timeout: float = TIMEOUT_PADRAO,
+                 mensagens_por_conexao: int = MENSAGENS_POR_CONEXAO_PADRAO,
+                 ociosidade_maxima: float = OCIOSIDADE_MAXIMA_PADRAO):
+        """
+        Args:
+            servidor: Host do servidor/relay SMTP
+            porta: Porta do servidor
+            remetente: Endereço usado no From e no MAIL FROM
+            usuario: Usuário SMTP (vazio = relay sem autenticação)
+            senha: Senha SMTP
+            usar_tls: Exigir STARTTLS
+            timeout: Timeout de rede em segundos
+            mensagens_por_conexao: Mensagens enviadas antes de reabrir a conexão
+            ociosidade_maxima: Segundos sem uso após os quais a conexão é reaberta
+        """
+        self.servidor = servidor
+        self.porta = porta
+        self.remetente = remetente
+        self.usuario = usuario
+        self.senha = senha
+        self.usar_tls = usar_tls
+        self.timeout = timeout
+        self.mensagens_por_conexao = mensagens_por_conexao
+        self.ociosidade_maxima = ociosidade_maxima
+
+        self._lock = threading.Lock()
+        self._conexao: Optional[smtplib.SMTP] = None
+        self._mensagens_na_conexao = 0
+        self._ultimo_uso = 0.0
+        self._metricas = {
+            'enviadas': 0,
+            'falhas': 0,
+            'conexoes': 0,
+            'reconexoes': 0,
+            'segundos_enviando': 0.0,
+        }
+
+    # ----- conexão -----
+
+    def _conectar(self) -> smtplib.SMTP:
+        conexao = smtplib.SMTP(self.servidor, self.porta, timeout=self.timeout)
+        conexao.ehlo()
+        if self.usar_tls:
+            conexao.starttls()
+            conexao.ehlo()
+        if self.usuario:
+            conexao.login(self.usuario, self.senha)
+        self._metricas['conexoes'] += 1
+        self._mensagens_na_conexao = 0
+        logger.debug(f"Conexão SMTP aberta com {self.servidor}:{self.porta}")
+        return conexao
+
+    def _obter_conexao(self) -> smtplib.SMTP:
+        """Conexão atual, reaberta se ociosa demais ou no limite de mensagens"""
+        if self._conexao is not None:
+            ociosa = time.monotonic() - self._ultimo_uso > self.ociosidade_maxima
+            if ociosa or self._mensagens_na_conexao >= self.mensagens_por_conexao:
+                self._fechar_conexao()
+        if self._conexao is None:
+            self._conexao = self._conectar()
+        return self._conexao
+
+    def _fechar_conexao(self, educado: bool = True):
+        if self._conexao is None:
+            return
+        try:
+            if educado:
+                self._conexao.quit()
+            else:
+                self._conexao.close()
+        except Exception:
+            self._conexao.close()
+        self._conexao = None
+
+    def fechar(self):
+        """Encerra a sessão SMTP (QUIT)"""
+        with self._lock:
+            self._fechar_conexao()
+
+    # ----- mensagens -----
+
+    def _montar(self, destinatario: str, assunto: str, corpo: str) -> bytes:
+        mensagem = EmailMessage(policy=POLITICA_SMTP)
+        mensagem['From'] = self.remetente
+        mensagem['To'] = destinatario
+        mensagem['Subject'] = assunto
+        mensagem['Date'] = formatdate(localtime=True)
+        mensagem['Message-ID'] = make_msgid(domain=self.remetente.rpartition('@')[2] or None)
+        mensagem.set_content(corpo)
+        return mensagem.as_bytes()
+
+    def _transmitir(self, conexao: smtplib.SMTP, destinatario: str, dados: bytes):
+        """Envia uma mensagem; com PIPELINING o envelope vai em uma só escrita"""
+        if not conexao.has_extn('pipelining'):
+            conexao.sendmail(self.remetente, [destinatario], dados)
+            return
+
+        conexao.send(
+            f"MAIL FROM:<{self.remetente}>\r\nRCPT TO:<{destinatario}>\r\nDATA\r\n".encode('ascii')
+        )
+        codigo_mail, resposta_mail = conexao.getreply()
+        codigo_rcpt, resposta_rcpt = conexao.getreply()
+        codigo_data, resposta_data = conexao.getreply()
+
+        if codigo_data == 354:
+            # Envelope recusado com DATA aceito: aborta o corpo com uma mensagem vazia
+            if codigo_mail != 250 or codigo_rcpt not in (250, 251):
+                conexao.send(b".\r\n")
+                conexao.getreply()
+        if codigo_mail == 421 or codigo_rcpt == 421 or codigo_data == 421:
+            raise smtplib.SMTPServerDisconnected(resposta_data.decode(errors='replace'))
+        if codigo_mail != 250:
+            conexao.rset()
+            raise smtplib.SMTPSenderRefused(codigo_mail, resposta_mail, self.remetente)
+        if codigo_rcpt not in (250, 251):
+            conexao.rset()
+            raise smtplib.SMTPRecipientsRefused({destinatario: (codigo_rcpt, resposta_rcpt)})
+        if codigo_data != 354:
+            conexao.rset()
+            raise smtplib.SMTPDataError(codigo_data, resposta_data)
+
+        corpo = _PONTO_INICIO_LINHA.sub(b'..', dados)
+        if not corpo.endswith(b"\r\n"):
+            corpo += b"\r\n"
+        conexao.send(corpo + b".\r\n")
+        codigo, resposta = conexao.getreply()
+        if codigo != 250:
+            raise smtplib.SMTPDataError(codigo, resposta)
+
+    def _reconectar(self, tentativa: int, destinatario: str, erro: Exception) -> bool:
+        """Descarta a conexão perdida; True se ainda cabe uma nova tentativa"""
+        self._fechar_conexao(educado=False)
+        if tentativa == 0:
+            self._metricas['reconexoes'] += 1
+            logger.warning(f"Conexão SMTP perdida ({erro}); reconectando")
+            return True
+        logger.error(f"Erro ao enviar email para {destinatario}: {erro}")
+        return False
+
+    def _enviar_uma(self, destinatario: str, assunto: str, corpo: str) -> bool:
+        """Envia uma mensagem (chamado com o lock); reconecta uma vez se a conexão caiu"""
+        dados = self._montar(destinatario, assunto, corpo)
+        for tentativa in range(2):
+            try:
+                conexao = self._obter_conexao()
+                self._transmitir(conexao, destinatario, dados)
+                self._mensagens_na_conexao += 1
+                self._ultimo_uso = time.monotonic()
+                self._metricas['enviadas'] += 1
+                return True
+            except smtplib.SMTPResponseException as e:
+                # 421: servidor encerrando a sessão; demais códigos recusam só a mensagem
+                if e.smtp_code == 421 and self._reconectar(tentativa, destinatario, e):
+                    continue
+                logger.error(f"Servidor SMTP recusou email para {destinatario}: {e.smtp_code} {e.smtp_error!r}")
+                break
+            except smtplib.SMTPRecipientsRefused as e:
+                logger.error(f"Servidor SMTP recusou o destinatário {destinatario}: {e.recipients}")
+                break
+            except smtplib.SMTPServerDisconnected as e:
+                if self._reconectar(tentativa, destinatario, e):
+                    continue
+            except smtplib.SMTPException as e:
+                logger.error(f"Erro SMTP ao enviar email para {destinatario}: {e}")
+                self._fechar_conexao(educado=False)
+                break
+            except OSError as e:
+                # Erros de rede (conexão recusada, reset, timeout)
+                if self._reconectar(tentativa, destinatario, e):
+                    continue
+            break
+        self._metricas['falhas'] += 1
+        return False
+
+    def enviar(self, destinatario: str, assunto: str, corpo: str) -> bool:
+        """Envia uma mensagem de texto pela sessão persistente"""
+        inicio = time.perf_counter()
+        with self._lock:
+            enviado = self._enviar_uma(destinatario, assunto, corpo)
+            self._metricas['segundos_enviando'] += time.perf_counter() - inicio
+        return enviado
+
+    def enviar_lote(self, mensagens: Iterable[Tuple[str, str, str]]) -> List[bool]:
+        """
+        Envia várias mensagens em sequência, sem liberar a conexão entre elas
+
+        Args:
+            mensagens: Tuplas (destinatário, assunto, corpo)
+
+        Returns:
+            Resultado de cada mensagem, na mesma ordem
+        """
+        inicio = time.perf_counter()
+        with self._lock:
+            resultados = [self._enviar_uma(*mensagem) for mensagem in mensagens]
+            self._metricas['segundos_enviando'] += time.perf_counter() - inicio
+        logger.info(f"Lote SMTP: {sum(resultados)}/{len(resultados)} emails enviados")
+        return resultados
+
+    def estatisticas(self) -> Dict[str, Any]:
+        """Contadores de envio e taxa média (mensagens/s)"""
+        with self._lock:
+            metricas = dict(self._metricas)
+        segundos = metricas['segundos_enviando']
+        metricas['mensagens_por_segundo'] = metricas['enviadas'] / segundos if segundos else 0.0
+        return metricas
+
+
+# Instância global (criada no primeiro envio com EMAIL_BACKEND=smtp)
+_entrega: Optional[EntregaSMTP] = None
+_entrega_lock = threading.Lock()
+
+
+def criar_entrega_smtp(config) -> EntregaSMTP:
+    """Cria a entrega SMTP a partir da configuração (SMTP_*, EMAIL_*)"""
+    return EntregaSMTP(
+        servidor=config.SMTP_SERVER,
+        porta=config.SMTP_PORT,
+        remetente=config.EMAIL_FROM,
+        usuario=config.SMTP_USERNAME,
+        senha=config.SMTP_PASSWORD,
+        usar_tls=config.EMAIL_USE_TLS,
+        timeout=getattr(config, 'SMTP_TIMEOUT', TIMEOUT_PADRAO),
+        mensagens_por_conexao=getattr(config, 'SMTP_MENSAGENS_POR_CONEXAO', MENSAGENS_POR_CONEXAO_PADRAO),
+        ociosidade_maxima=getattr(config, 'SMTP_OCIOSIDADE_MAXIMA', OCIOSIDADE_MAXIMA_PADRAO),
+    )
+
+
+def get_entrega_smtp(config) -> EntregaSMTP:
+    """Retorna a entrega SMTP compartilhada pelo processo"""
+    global _entrega
+    with _entrega_lock:
+        if _entrega is None:
+            _entrega = criar_entrega_smtp(config)
+            logger.info(f"Entrega SMTP persistente configurada para {config.SMTP_SERVER}:{config.SMTP_PORT}")
+        return _entrega
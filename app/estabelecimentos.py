@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Estabelecimentos instaladores (oficinas) como dimensão
+
+``garantias.nome_estabelecimento`` (e ``oficina_nome`` nas garantias
+importadas do Caspio) é texto livre repetido em cada linha. A tabela
+``estabelecimentos`` guarda cada instalador uma vez, identificado pelo
+nome normalizado (maiúsculas, sem acentos, espaços colapsados), e as
+garantias apontam para ela por ``estabelecimento_id``.
+
+``total_garantias`` e ``garantias_ativas`` de cada estabelecimento são
+mantidos por triggers (como em app.contadores), então rankings e filtros
+por instalador são consultas indexadas em vez de varreduras com
+comparação de texto.
+
+Novas garantias recebem o ``estabelecimento_id`` na criação
+(``resolver_estabelecimento``); as demais (importação do Caspio, scripts)
+são vinculadas em lotes por ``vincular_estabelecimentos`` (``python
+scripts/utils/maintenance.py link-installers``).
+"""
+
+import logging
+import re
+import unicodedata
+from typing import Dict, Optional
+
+from fastlite import Database
+
+from app.contadores import contagens_garantias, recalcular_contadores, somar_garantia
+from app.migrations import migrar_em_lotes
+
+logger = logging.getLogger(__name__)
+
+
+def _somar(linha: str, sinal: str) -> str:
+    """UPDATE que soma (ou subtrai) uma garantia nos contadores do estabelecimento"""
+    return somar_garantia('estabelecimentos', 'estabelecimento_id', linha, sinal)
+
+
+GATILHOS = {
+    'trg_garantias_estabelecimento_insert': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_garantias_estabelecimento_insert
+        AFTER INSERT ON garantias
+        WHEN NEW.estabelecimento_id IS NOT NULL
+        BEGIN{_somar('NEW', '+')}
+        END
+    """,
+    'trg_garantias_estabelecimento_delete': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_garantias_estabelecimento_delete
+        AFTER DELETE ON garantias
+        WHEN OLD.estabelecimento_id IS NOT NULL
+        BEGIN{_somar('OLD', '-')}
+        END
+    """,
+    'trg_garantias_estabelecimento_update': f"""
+        CREATE TRIGGER IF NOT EXISTS trg_garantias_estabelecimento_update
+        AFTER UPDATE OF ativo, estabelecimento_id ON garantias
+        WHEN OLD.ativo IS NOT NEW.ativo OR OLD.estabelecimento_id IS NOT NEW.estabelecimento_id
+        BEGIN{_somar('OLD', '-')}{_somar('NEW', '+')}
+        END
+    """,
+}
+
+_CONTAGENS = {'estabelecimentos': contagens_garantias('estabelecimentos', 'estabelecimento_id')}
+
+
+def normalizar_estabelecimento(nome: Optional[str]) -> str:
+    """Nome em maiúsculas, sem acentos e com espaços colapsados"""
+    if not nome:
+        return ''
+    sem_acentos = ''.join(
+        c for c in unicodedata.normalize('NFKD', nome) if not unicodedata.combining(c)
+    )
+    return re.sub(r'\s+', ' ', sem_acentos).strip().upper()
+
+
+def criar_gatilhos(db: Database):
+    """Cria os triggers que mantêm os contadores dos estabelecimentos"""
+    for sql in GATILHOS.values():
+        db.execute(sql)
+
+
+def resolver_estabelecimento(db: Database, nome: Optional[str]) -> Optional[int]:
+    """
+    Id do estabelecimento com o nome, criando-o se necessário
+
+    Returns:
+        Id do estabelecimento ou None se o nome for vazio
+    """
+    nome_norm = normalizar_estabelecimento(nome)
+    if not nome_norm:
+        return None
+    # O UPDATE sem efeito no conflito faz o RETURNING devolver o id existente
+    rows = db.execute("""
+        INSERT INTO estabelecimentos (nome, nome_norm) VALUES (?, ?)
+        ON CONFLICT (nome_norm) DO UPDATE SET nome = nome
+        RETURNING id
+    """, (re.sub(r'\s+', ' ', nome).strip(), nome_norm)).fetchall()
+    return rows[0][0]
+
+
+def vincular_estabelecimentos(db: Database) -> Dict[str, int]:
+    """
+    Vincula ao estabelecimento as garantias ainda sem ``estabelecimento_id``
+
+    Percorre garantias em lotes (cada lote em uma transação curta),
+    usando ``nome_estabelecimento`` ou, se vazio, ``oficina_nome`` do
+    Caspio.
+
+    Returns:
+        Quantidade de garantias vinculadas
+    """
+    ids: Dict[str, int] = {}
+
+    def vincular(row):
+        _, estabelecimento_id, nome, oficina_nome = row
+        if estabelecimento_id is not None:
+            return None
+        nome = nome if normalizar_estabelecimento(nome) else oficina_nome
+        nome_norm = normalizar_estabelecimento(nome)
+        if not nome_norm:
+            return None
+        if nome_norm not in ids:
+            ids[nome_norm] = resolver_estabelecimento(db, nome)
+        return {'estabelecimento_id': ids[nome_norm]}
+
+    total = migrar_em_lotes(
+        db, 'garantias', ['estabelecimento_id', 'nome_estabelecimento', 'oficina_nome'], vincular
+    )
+    if total:
+        logger.info(f"{total} garantias vinculadas a {len(ids)} estabelecimentos")
+    return {'vinculadas': total}
+
+
+def recalcular_contadores_estabelecimentos(db: Database) -> Dict[str, int]:
+    """
+    Recalcula os contadores dos estabelecimentos e corrige os divergentes
+
+    Returns:
+        Quantidade de estabelecimentos corrigidos
+    """
+    return recalcular_contadores(db, _CONTAGENS)
@@ -11,16 +11,20 @@ def filter_component(
     fields: list[dict],
     current_filters: dict = None,
     action_url: str = "",
-    placeholder_text: str = "Filtrar..."
+    placeholder_text: str = "Filtrar...",
+    hx_target: str = None
 ) -> Div:
     """
     Componente de filtro reutilizável para telas de listagem.
     
     Args:
         fields: Lista de dicionários com 'name', 'label' e 'type' dos campos
+            (selects aceitam 'options' e 'rotulo_vazio', o rótulo da opção sem filtro)
         current_filters: Filtros atualmente aplicados
         action_url: URL para onde enviar o formulário de filtro
         placeholder_text: Texto placeholder para campos de texto
+        hx_target: Seletor trocado via HTMX ao filtrar (opcional; sem ele o
+            formulário recarrega a página inteira)
     
     Returns:
         Div: Componente de filtro HTML
@@ -28,6 +32,16 @@ def filter_component(
     if current_filters is None:
         current_filters = {}
     
+    # Com alvo HTMX, o formulário busca só a tabela e atualiza a URL
+    htmx_attrs = {}
+    if hx_target:
+        htmx_attrs = {
+            "hx_get": action_url,
+            "hx_target": hx_target,
+            "hx_swap": "outerHTML",
+            "hx_push_url": "true"
+        }
+    
     filter_inputs = []
     
     for field in fields:
@@ -38,7 +52,7 @@ def filter_component(
         current_value = current_filters.get(field_name, '')
         
         if field_type == 'select':
-            options = [Option("Todos", value="", selected=(current_value == ""))]
+            options = [Option(field.get('rotulo_vazio', "Todos"), value="", selected=(current_value == ""))]
             for option in field_options:
                 if isinstance(option, dict):
                     opt_value = option.get('value', '')
@@ -101,7 +115,8 @@ def filter_component(
                 method="get",
                 action=action_url,
                 cls="space-y-4",
-                id="filter-form"
+                id="filter-form",
+                **htmx_attrs
             ),
             cls="p-6"
         ),
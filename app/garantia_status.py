@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Status de garantias calculado no SQL
+
+Centraliza as expressões usadas pelas listagens de garantias (cliente e
+admin) para calcular status e dias para o vencimento na própria consulta,
+seguindo as mesmas regras de Garantia.status_garantia. Os filtros por
+status comparam ``data_vencimento`` com datas passadas como parâmetro, o
+que permite ao SQLite usar o índice (ativo, data_vencimento) como busca
+por intervalo.
+"""
+
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+
+from app.date_utils import format_date_iso
+
+# Garantia ativa que vence dentro deste prazo é "Próxima do vencimento"
+DIAS_PROXIMO_VENCIMENTO = 30
+
+STATUS_ATIVA = 'ativa'
+STATUS_PROXIMA = 'proxima'
+STATUS_VENCIDA = 'vencida'
+STATUS_INATIVA = 'inativa'
+
+# Rótulo e classe do badge para cada status
+STATUS_EXIBICAO = {
+    STATUS_ATIVA: ("Ativa", "success"),
+    STATUS_PROXIMA: ("Próxima do vencimento", "warning"),
+    STATUS_VENCIDA: ("Vencida", "danger"),
+    STATUS_INATIVA: ("Inativa", "secondary"),
+}
+
+# Opções para o filtro de status das listagens
+STATUS_OPCOES_FILTRO = [
+    {'value': STATUS_ATIVA, 'label': 'Ativa'},
+    {'value': STATUS_PROXIMA, 'label': f'Vence em até {DIAS_PROXIMO_VENCIMENTO} dias'},
+    {'value': STATUS_VENCIDA, 'label': 'Vencida'},
+    {'value': STATUS_INATIVA, 'label': 'Inativa'},
+]
+
+
+def status_sql(alias: str = 'g') -> str:
+    """
+    Expressão SQL que calcula o código de status da garantia
+
+    Args:
+        alias: Alias da tabela garantias na consulta
+
+    Returns:
+        Expressão CASE que resulta em 'ativa', 'proxima', 'vencida' ou 'inativa'
+    """
+    return f"""CASE
+            WHEN NOT {alias}.ativo THEN '{STATUS_INATIVA}'
+            WHEN {alias}.data_vencimento IS NULL THEN '{STATUS_ATIVA}'
+            WHEN date({alias}.data_vencimento) < date('now', 'localtime') THEN '{STATUS_VENCIDA}'
+            WHEN date({alias}.data_vencimento) <= date('now', 'localtime', '+{DIAS_PROXIMO_VENCIMENTO} days') THEN '{STATUS_PROXIMA}'
+            ELSE '{STATUS_ATIVA}'
+        END"""
+
+
+def dias_para_vencimento_sql(alias: str = 'g') -> str:
+    """
+    Expressão SQL com os dias até o vencimento (negativo se já venceu)
+
+    Args:
+        alias: Alias da tabela garantias na consulta
+    """
+    return (
+        f"CAST(julianday(date({alias}.data_vencimento)) - "
+        f"julianday(date('now', 'localtime')) AS INTEGER)"
+    )
+
+
+def filtro_status_sql(status: str, alias: str = 'g',
+                      hoje: Optional[date] = None) -> Tuple[Optional[str], List]:
+    """
+    Condição WHERE para filtrar garantias por status
+
+    As datas limite são calculadas aqui e passadas como parâmetro, de modo
+    que a condição seja uma comparação direta em data_vencimento (busca
+    por intervalo no índice) em vez de uma expressão por linha.
+
+    Args:
+        status: Código do status ('ativa', 'proxima', 'vencida', 'inativa')
+        alias: Alias da tabela garantias na consulta
+        hoje: Data de referência (padrão: data atual)
+
+    Returns:
+        Tupla (condição, parâmetros); condição None para status desconhecido
+    """
+    hoje = hoje or date.today()
+    hoje_iso = format_date_iso(hoje)
+    # data_vencimento pode ter horário; comparar com o dia seguinte evita perdê-lo
+    limite_iso = format_date_iso(hoje + timedelta(days=DIAS_PROXIMO_VENCIMENTO + 1))
+
+    if status == STATUS_INATIVA:
+        return f"{alias}.ativo = FALSE", []
+
+    if status == STATUS_VENCIDA:
+        return f"{alias}.ativo = TRUE AND {alias}.data_vencimento < ?", [hoje_iso]
+
+    if status == STATUS_PROXIMA:
+        return (
+            f"{alias}.ativo = TRUE AND {alias}.data_vencimento >= ? AND {alias}.data_vencimento < ?",
+            [hoje_iso, limite_iso]
+        )
+
+    if status == STATUS_ATIVA:
+        return (
+            f"{alias}.ativo = TRUE AND ({alias}.data_vencimento IS NULL OR {alias}.data_vencimento >= ?)",
+            [limite_iso]
+        )
+
+    return None, []
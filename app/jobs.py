@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Execução de tarefas longas em segundo plano (jobs)
+
+Os jobs são registrados na tabela ``jobs`` com status, progresso e
+resultado e executados por um pequeno pool de threads do próprio
+processo, cada execução com a sua conexão SQLite. A função do job recebe
+um ContextoJob para informar o progresso e atender pedidos de
+cancelamento; o pedido é gravado em ``jobs.cancelar`` e lido pelo job
+periodicamente, então vale mesmo quando chega a outro worker. O
+progresso fica em memória para leitura imediata (a página de
+administração acompanha via Server-Sent Events) e é gravado na tabela
+periodicamente.
+
+Cada job registra o processo dono (host:pid) e um heartbeat renovado
+por uma thread do gerenciador enquanto o processo tem jobs abertos. Ao
+iniciar, e a cada heartbeat, o gerenciador marca como falhos apenas os
+próprios jobs deixados por uma execução anterior e os jobs de processos
+cujo heartbeat expirou; jobs de outros workers vivos não são tocados.
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import apsw
+from fastlite import Database
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDENTE = 'pendente'
+STATUS_EXECUTANDO = 'executando'
+STATUS_CONCLUIDO = 'concluido'
+STATUS_FALHOU = 'falhou'
+STATUS_CANCELADO = 'cancelado'
+STATUS_FINAIS = (STATUS_CONCLUIDO, STATUS_FALHOU, STATUS_CANCELADO)
+
+# Intervalo mínimo (s) entre gravações do progresso na tabela
+INTERVALO_GRAVACAO_PROGRESSO = 1.0
+
+# Intervalo mínimo (s) entre leituras de jobs.cancelar pelo job em execução
+INTERVALO_LEITURA_CANCELAMENTO = 1.0
+
+# Jobs executados ao mesmo tempo quando não configurado (Config.JOB_WORKERS)
+MAX_WORKERS_PADRAO = 2
+
+# Espera máxima (ms) pelo lock de escrita do SQLite nas conexões dos jobs
+TIMEOUT_OCUPADO_MS = 5000
+
+# Intervalo (s) entre heartbeats dos jobs abertos do processo
+INTERVALO_HEARTBEAT = 30.0
+
+# Sem heartbeat há mais que isso (s), o processo dono é considerado encerrado
+HEARTBEAT_EXPIRADO = 120.0
+
+TIPO_SINCRONIZACAO_PRODUTOS = 'sincronizacao_produtos'
+TIPO_IMPORTACAO_CASPIO = 'importacao_caspio'
+
+_COLUNAS_JOB = (
+    'id', 'tipo', 'status', 'progresso', 'processados', 'total', 'mensagem',
+    'resultado', 'erro', 'cancelar', 'usuario_id', 'criado_em', 'iniciado_em', 'finalizado_em'
+)
+
+
+class JobCancelado(Exception):
+    """Levantada dentro do job quando o cancelamento foi solicitado"""
+
+
+class ContextoJob:
+    """Acesso do job ao banco, aos parâmetros, ao progresso e ao cancelamento"""
+
+    def __init__(self, gerenciador: 'GerenciadorJobs', db: Database, job_id: int,
+                 parametros: Dict[str, Any]):
+        self.db = db
+        self.job_id = job_id
+        self.parametros = parametros
+        self.caminho_db = gerenciador.caminho_db
+        self._gerenciador = gerenciador
+        self._cancelamento = gerenciador._cancelamentos[job_id]
+        self._ultima_gravacao = 0.0
+        self._ultima_leitura_cancelamento = time.monotonic()
+
+    def progresso(self, processados: int, total: Optional[int] = None,
+                  mensagem: Optional[str] = None):
+        """
+        Informa o progresso e interrompe o job se houver pedido de cancelamento
+
+        Args:
+            processados: Itens processados até agora
+            total: Total de itens, se conhecido
+            mensagem: Descrição da etapa atual
+
+        Raises:
+            JobCancelado: Se o cancelamento foi solicitado
+        """
+        estado = {
+            'processados': processados,
+            'total': total,
+            'progresso': min(100, processados * 100 // total) if total else None,
+            'mensagem': mensagem,
+        }
+        self._gerenciador._progresso[self.job_id] = estado
+
+        agora = time.monotonic()
+        if agora - self._ultima_gravacao >= INTERVALO_GRAVACAO_PROGRESSO:
+            self._ultima_gravacao = agora
+            self._gravar_progresso(estado)
+
+        self.verificar_cancelamento()
+
+    def _gravar_progresso(self, estado: Dict[str, Any]):
+        """Grava o progresso sem esperar por locks (o job pode estar escrevendo em outra conexão)"""
+        self.db.conn.setbusytimeout(0)
+        try:
+            self.db.execute("""
+                UPDATE jobs SET processados = ?, total = ?, progresso = ?,
+                    mensagem = COALESCE(?, mensagem), heartbeat_em = ?
+                WHERE id = ?
+            """, (estado['processados'], estado['total'], estado['progresso'],
+                  estado['mensagem'], time.time(), self.job_id))
+        except apsw.BusyError:
+            logger.debug(f"Progresso do job {self.job_id} não gravado: banco ocupado")
+        finally:
+            self.db.conn.setbusytimeout(TIMEOUT_OCUPADO_MS)
+
+    def verificar_cancelamento(self):
+        """
+        Levanta JobCancelado se o cancelamento foi solicitado
+
+        Além do sinal em memória (pedido feito neste processo), lê
+        ``jobs.cancelar`` no máximo a cada INTERVALO_LEITURA_CANCELAMENTO,
+        para atender pedidos feitos em outro worker.
+        """
+        agora = time.monotonic()
+        if agora - self._ultima_leitura_cancelamento >= INTERVALO_LEITURA_CANCELAMENTO:
+            self._ultima_leitura_cancelamento = agora
+            row = self.db.execute("SELECT cancelar FROM jobs WHERE id = ?", (self.job_id,)).fetchone()
+            if row and row[0]:
+                self._cancelamento.set()
+        if self._cancelamento.is_set():
+            raise JobCancelado()
+
+
+class GerenciadorJobs:
+    """Fila de jobs executados por threads do processo da aplicação"""
+
+    def __init__(self, db: Database, max_workers: int = MAX_WORKERS_PADRAO,
+                 dono: Optional[str] = None):
+        """
+        Args:
+            db: Banco da aplicação (usado para enfileirar e consultar jobs)
+            max_workers: Quantidade de jobs executados ao mesmo tempo
+            dono: Identificação do processo nos jobs (padrão: host:pid)
+        """
+        self.db = db
+        self.caminho_db = db.conn.filename
+        self.dono = dono or f"{socket.gethostname()}:{os.getpid()}"
+        self._criado_em = time.time()
+        self._tipos: Dict[str, Callable[[ContextoJob], Any]] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._futuros: Dict[int, Future] = {}
+        self._cancelamentos: Dict[int, threading.Event] = {}
+        self._progresso: Dict[int, Dict[str, Any]] = {}
+        self._parar_heartbeat = threading.Event()
+        self._thread_heartbeat: Optional[threading.Thread] = None
+
+    def registrar(self, tipo: str, funcao: Callable[[ContextoJob], Any]):
+        """Associa um tipo de job à função que o executa"""
+        self._tipos[tipo] = funcao
+
+    def enfileirar(self, tipo: str, parametros: Optional[Dict[str, Any]] = None,
+                   usuario_id: Optional[int] = None) -> int:
+        """
+        Registra um job e agenda a sua execução
+
+        Returns:
+            ID do job criado
+
+        Raises:
+            ValueError: Se o tipo de job não estiver registrado
+        """
+        if tipo not in self._tipos:
+            raise ValueError(f"Tipo de job desconhecido: {tipo}")
+
+        parametros = parametros or {}
+        job_id = self.db.execute("""
+            INSERT INTO jobs (tipo, status, parametros, usuario_id, dono, heartbeat_em, criado_em)
+            VALUES (?, ?, ?, ?, ?, ?, datetime('now', 'localtime'))
+            RETURNING id
+        """, (tipo, STATUS_PENDENTE, json.dumps(parametros), usuario_id, self.dono, time.time())).fetchone()[0]
+
+        self._cancelamentos[job_id] = threading.Event()
+        self._futuros[job_id] = self._executor.submit(self._executar, job_id, tipo, parametros)
+        self._iniciar_heartbeat()
+        logger.info(f"Job {job_id} ({tipo}) enfileirado")
+        return job_id
+
+    def _iniciar_heartbeat(self):
+        """Inicia a thread de heartbeat na primeira vez que o processo enfileira um job"""
+        if self._thread_heartbeat is None and not self._parar_heartbeat.is_set():
+            self._thread_heartbeat = threading.Thread(
+                target=self._manter_heartbeat, name='job-heartbeat', daemon=True
+            )
+            self._thread_heartbeat.start()
+
+    def _manter_heartbeat(self):
+        """Renova o heartbeat dos jobs do processo e recupera os de processos encerrados"""
+        db = Database(self.caminho_db)
+        db.conn.setbusytimeout(TIMEOUT_OCUPADO_MS)
+        try:
+            while not self._parar_heartbeat.wait(INTERVALO_HEARTBEAT):
+                try:
+                    self.renovar_heartbeat(db)
+                    self.recuperar_interrompidos(db)
+                except apsw.Error as e:
+                    logger.warning(f"Erro no heartbeat dos jobs: {e}")
+        finally:
+            db.conn.close()
+
+    def renovar_heartbeat(self, db: Optional[Database] = None) -> int:
+        """
+        Renova o heartbeat dos jobs pendentes e em execução deste processo
+
+        Returns:
+            Quantidade de jobs renovados
+        """
+        db = db or self.db
+        db.execute(
+            "UPDATE jobs SET heartbeat_em = ? WHERE dono = ? AND status IN (?, ?)",
+            (time.time(), self.dono, STATUS_PENDENTE, STATUS_EXECUTANDO)
+        )
+        return db.conn.changes()
+
+    def _executar(self, job_id: int, tipo: str, parametros: Dict[str, Any]):
+        """Executa o job na thread do pool e registra o resultado"""
+        db = Database(self.caminho_db)
+        db.conn.setbusytimeout(TIMEOUT_OCUPADO_MS)
+        try:
+            iniciado = db.execute("""
+                UPDATE jobs SET status = ?, iniciado_em = datetime('now', 'localtime'), heartbeat_em = ?
+                WHERE id = ? AND status = ? AND NOT cancelar
+                RETURNING id
+            """, (STATUS_EXECUTANDO, time.time(), job_id, STATUS_PENDENTE)).fetchone()
+            if not iniciado or self._cancelamentos[job_id].is_set():
+                self._finalizar(db, job_id, STATUS_CANCELADO, mensagem="Cancelado antes de iniciar")
+                return
+
+            contexto = ContextoJob(self, db, job_id, parametros)
+            try:
+                resultado = self._tipos[tipo](contexto)
+            except JobCancelado:
+                logger.info(f"Job {job_id} ({tipo}) cancelado")
+                self._finalizar(db, job_id, STATUS_CANCELADO, mensagem="Cancelado pelo usuário")
+            except Exception as e:
+                logger.error(f"Erro no job {job_id} ({tipo}): {e}")
+                self._finalizar(db, job_id, STATUS_FALHOU, erro=str(e))
+            else:
+                logger.info(f"Job {job_id} ({tipo}) concluído")
+                self._finalizar(db, job_id, STATUS_CONCLUIDO, resultado=resultado)
+        finally:
+            self._progresso.pop(job_id, None)
+            db.conn.close()
+
+    def _finalizar(self, db: Database, job_id: int, status: str, resultado: Any = None,
+                   erro: Optional[str] = None, mensagem: Optional[str] = None):
+        """Grava o status final do job"""
+        estado = self._progresso.get(job_id, {})
+        db.execute("""
+            UPDATE jobs SET status = ?, resultado = ?, erro = ?,
+                mensagem = COALESCE(?, ?, mensagem),
+                processados = COALESCE(?, processados), total = COALESCE(?, total),
+                progresso = CASE WHEN ? = ? THEN 100 ELSE COALESCE(?, progresso) END,
+                finalizado_em = datetime('now', 'localtime')
+            WHERE id = ?
+        """, (
+            status, json.dumps(resultado, default=str) if resultado is not None else None, erro,
+            mensagem, estado.get('mensagem'),
+            estado.get('processados'), estado.get('total'),
+            status, STATUS_CONCLUIDO, estado.get('progresso'),
+            job_id
+        ))
+
+    def cancelar(self, job_id: int) -> bool:
+        """
+        Solicita o cancelamento de um job pendente ou em execução
+
+        Returns:
+            True se o job ainda podia ser cancelado
+        """
+        self.db.execute(
+            "UPDATE jobs SET cancelar = TRUE WHERE id = ? AND status IN (?, ?)",
+            (job_id, STATUS_PENDENTE, STATUS_EXECUTANDO)
+        )
+        if not self.db.conn.changes():
+            return False
+        if job_id in self._cancelamentos:
+            self._cancelamentos[job_id].set()
+        logger.info(f"Cancelamento do job {job_id} solicitado")
+        return True
+
+    def obter(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Retorna o estado do job, com o progresso mais recente em memória
+
+        Returns:
+            Dicionário com os dados do job ou None se não existir
+        """
+        row = self.db.execute(
+            f"SELECT {', '.join(_COLUNAS_JOB)} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if not row:
+            return None
+
+        job = dict(zip(_COLUNAS_JOB, row))
+        job['cancelar'] = bool(job['cancelar'])
+        job['resultado'] = json.loads(job['resultado']) if job['resultado'] else None
+        if job['status'] == STATUS_EXECUTANDO:
+            for chave, valor in self._progresso.get(job_id, {}).items():
+                if valor is not None:
+                    job[chave] = valor
+        return job
+
+    def aguardar(self, job_id: int, timeout: Optional[float] = None):
+        """Aguarda o término de um job enfileirado por este processo"""
+        futuro = self._futuros.get(job_id)
+        if futuro:
+            futuro.result(timeout)
+
+    def recuperar_interrompidos(self, db: Optional[Database] = None) -> int:
+        """
+        Marca como falhos os jobs abertos cujo processo dono foi encerrado
+
+        São recuperados os jobs deste host:pid com heartbeat anterior à
+        criação do gerenciador (deixados por uma execução anterior com o
+        mesmo pid), os jobs sem dono (anteriores ao heartbeat) e os jobs de
+        outros processos sem heartbeat há mais de HEARTBEAT_EXPIRADO.
+
+        Args:
+            db: Conexão a usar (padrão: a do gerenciador)
+
+        Returns:
+            Quantidade de jobs marcados
+        """
+        db = db or self.db
+        db.execute("""
+            UPDATE jobs SET status = ?, erro = 'Interrompido pelo encerramento do processo',
+                finalizado_em = datetime('now', 'localtime')
+            WHERE status IN (?, ?)
+            AND (dono IS NULL OR heartbeat_em IS NULL OR heartbeat_em < ?
+                 OR (dono = ? AND heartbeat_em < ?))
+        """, (STATUS_FALHOU, STATUS_PENDENTE, STATUS_EXECUTANDO,
+              time.time() - HEARTBEAT_EXPIRADO, self.dono, self._criado_em))
+        interrompidos = db.conn.changes()
+        if interrompidos:
+            logger.warning(f"{interrompidos} jobs interrompidos marcados como falhos")
+        return interrompidos
+
+    def encerrar(self, aguardar: bool = True):
+        """Cancela os jobs em andamento e encerra o pool de threads"""
+        self._parar_heartbeat.set()
+        for evento in self._cancelamentos.values():
+            evento.set()
+        self._executor.shutdown(wait=aguardar)
+
+
+def job_sincronizar_produtos(contexto: ContextoJob) -> Dict[str, int]:
+    """Sincroniza os produtos do ERP, informando o progresso a cada lote"""
+    from app.services import get_firebird_service
+
+    service = get_firebird_service()
+
+    def ao_progredir(stats):
+        contexto.progresso(
+            stats['total_erp'],
+            mensagem=f"{stats['total_erp']} produtos lidos do ERP"
+        )
+
+    return service.sync_produtos(contexto.db, ao_progredir=ao_progredir)
+
+
+def job_importar_caspio(contexto: ContextoJob) -> Dict[str, Any]:
+    """Importa usuários, veículos e garantias de um XML do Caspio"""
+    from app.services import CaspioImportService
+
+    service = CaspioImportService(contexto.caminho_db, contexto.parametros['caminho_xml'])
+    service.ao_progredir = lambda etapa, atual, total: contexto.progresso(
+        atual, total, f"Importando {etapa}: {atual}/{total}"
+    )
+    service.import_all()
+    return service.get_import_stats()
+
+
+# Instância global do gerenciador
+_gerenciador_jobs: Optional[GerenciadorJobs] = None
+
+
+def get_gerenciador_jobs(db: Database, max_workers: int = MAX_WORKERS_PADRAO) -> GerenciadorJobs:
+    """
+    Retorna o gerenciador de jobs do banco informado (singleton)
+
+    Na criação registra os tipos de job da aplicação e marca como falhos
+    os jobs deixados em aberto por processos encerrados.
+
+    Args:
+        db: Banco da aplicação
+        max_workers: Jobs executados ao mesmo tempo (usado apenas na criação)
+    """
+    global _gerenciador_jobs
+
+    if _gerenciador_jobs is None or _gerenciador_jobs.db is not db:
+        if _gerenciador_jobs is not None:
+            _gerenciador_jobs.encerrar(aguardar=False)
+        gerenciador = GerenciadorJobs(db, max_workers=max_workers)
+        gerenciador.registrar(TIPO_SINCRONIZACAO_PRODUTOS, job_sincronizar_produtos)
+        gerenciador.registrar(TIPO_IMPORTACAO_CASPIO, job_importar_caspio)
+        gerenciador.recuperar_interrompidos()
+        _gerenciador_jobs = gerenciador
+
+    return _gerenciador_jobs
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Limite de requisições (token bucket) para as rotas públicas
+
+Login e cadastro executam bcrypt, a consulta de CEP chama o ViaCEP e o
+formulário de contato envia email. O middleware ASGI deste módulo aplica
+orçamentos por IP e por email antes de a requisição chegar à rota, de
+modo que uma requisição recusada não faz hash, I/O nem renderização.
+
+Os baldes ficam em memória (um conjunto por processo) ou, com vários
+workers, em um arquivo SQLite compartilhado. O consumo no SQLite pode
+esperar pelo lock de escrita e roda em uma thread, fora do event loop.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from fastlite import Database
+
+logger = logging.getLogger(__name__)
+
+CHAVE_IP = 'ip'
+CHAVE_EMAIL = 'email'
+
+# Quantidade máxima de baldes mantidos em memória (os menos usados saem primeiro)
+MAX_BALDES_MEMORIA = 100_000
+
+# Corpo máximo lido pelo middleware para extrair o email do formulário
+MAX_CORPO_FORMULARIO = 64 * 1024
+
+# Baldes SQLite sem uso há mais que isso (s) são removidos
+RETENCAO_BALDES_SQLITE = 86400
+
+# A limpeza dos baldes SQLite roda a cada N consumos
+INTERVALO_LIMPEZA_SQLITE = 1000
+
+TIMEOUT_OCUPADO_MS = 2000
+
+
+def interpretar_orcamento(orcamento: str) -> Tuple[int, float]:
+    """
+    Converte 'N/S' (N requisições a cada S segundos) em capacidade e recarga
+
+    Returns:
+        Tupla (capacidade, tokens recarregados por segundo)
+    """
+    quantidade, _, segundos = orcamento.partition('/')
+    capacidade, periodo = int(quantidade), float(segundos)
+    if capacidade < 1 or periodo <= 0:
+        raise ValueError(f"Orçamento de requisições inválido: {orcamento}")
+    return capacidade, capacidade / periodo
+
+
+@dataclass(frozen=True)
+class RegraLimite:
+    """Orçamento aplicado a um método e caminho"""
+
+    nome: str
+    metodo: str
+    caminho: str
+    capacidade: int
+    recarga_por_segundo: float
+    chave: str = CHAVE_IP
+
+    @classmethod
+    def de_orcamento(cls, nome: str, metodo: str, caminho: str, orcamento: str,
+                     chave: str = CHAVE_IP) -> 'RegraLimite':
+        """Cria a regra a partir de um orçamento 'N/S'"""
+        capacidade, recarga = interpretar_orcamento(orcamento)
+        return cls(nome, metodo, caminho, capacidade, recarga, chave)
+
+    def aplica(self, metodo: str, caminho: str) -> bool:
+        """Caminhos terminados em '/' valem como prefixo"""
+        if metodo != self.metodo:
+            return False
+        if self.caminho.endswith('/'):
+            return caminho.startswith(self.caminho)
+        return caminho == self.caminho
+
+
+class BaldesMemoria:
+    """Baldes em memória, válidos apenas para o processo atual"""
+
+    # consumir é rápido e pode rodar no event loop
+    bloqueante = False
+
+    def __init__(self, max_baldes: int = MAX_BALDES_MEMORIA):
+        self._baldes: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_baldes = max_baldes
+
+    def consumir(self, chave: str, capacidade: int, recarga_por_segundo: float,
+                 agora: Optional[float] = None) -> Tuple[bool, float]:
+        """
+        Retira um token do balde
+
+        Returns:
+            Tupla (permitido, segundos até haver um token)
+        """
+        agora = time.monotonic() if agora is None else agora
+        with self._lock:
+            tokens, atualizado = self._baldes.pop(chave, (capacidade, agora))
+            tokens = min(capacidade, tokens + (agora - atualizado) * recarga_por_segundo)
+            permitido = tokens >= 1
+            if permitido:
+                tokens -= 1
+            self._baldes[chave] = (tokens, agora)
+            if len(self._baldes) > self.max_baldes:
+                self._baldes.popitem(last=False)
+        return permitido, 0.0 if permitido else (1 - tokens) / recarga_por_segundo
+
+
+class BaldesSQLite:
+    """
+    Baldes em um arquivo SQLite compartilhado entre os workers
+
+    Cada consumo é um único UPSERT atômico que recarrega, debita e
+    devolve o resultado.
+    """
+
+    # consumir espera o lock do SQLite (até TIMEOUT_OCUPADO_MS): roda fora do event loop
+    bloqueante = True
+
+    def __init__(self, caminho: str):
+        Path(caminho).parent.mkdir(parents=True, exist_ok=True)
+        self.db = Database(str(caminho))
+        self.db.conn.setbusytimeout(TIMEOUT_OCUPADO_MS)
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS baldes (
+                chave TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                atualizado REAL NOT NULL,
+                permitido BOOLEAN NOT NULL
+            )
+        """)
+        self._lock = threading.Lock()
+        self._consumos = 0
+
+    def consumir(self, chave: str, capacidade: int, recarga_por_segundo: float,
+                 agora: Optional[float] = None) -> Tuple[bool, float]:
+        """
+        Retira um token do balde
+
+        Returns:
+            Tupla (permitido, segundos até haver um token)
+        """
+        agora = time.time() if agora is None else agora
+        recarregado = "MIN(:capacidade, tokens + (:agora - atualizado) * :recarga)"
+        with self._lock:
+            permitido, tokens = self.db.execute(f"""
+                INSERT INTO baldes (chave, tokens, atualizado, permitido)
+                VALUES (:chave, :capacidade - 1, :agora, TRUE)
+                ON CONFLICT (chave) DO UPDATE SET
+                    permitido = {recarregado} >= 1,
+                    tokens = CASE WHEN {recarregado} >= 1 THEN {recarregado} - 1 ELSE {recarregado} END,
+                    atualizado = :agora
+                RETURNING permitido, tokens
+            """, {'chave': chave, 'capacidade': capacidade, 'agora': agora,
+                  'recarga': recarga_por_segundo}).fetchone()
+
+            self._consumos += 1
+            if self._consumos % INTERVALO_LIMPEZA_SQLITE == 0:
+                self.db.execute("DELETE FROM baldes WHERE atualizado < ?", (agora - RETENCAO_BALDES_SQLITE,))
+
+        return bool(permitido), 0.0 if permitido else (1 - tokens) / recarga_por_segundo
+
+
+def _cabecalho(scope, nome: bytes) -> Optional[str]:
+    """Valor de um cabeçalho da requisição ASGI"""
+    for chave, valor in scope.get('headers', ()):
+        if chave == nome:
+            return valor.decode('latin-1')
+    return None
+
+
+async def _responder_limite(send, caminho: str, espera: float):
+    """Resposta 429 sem passar pela aplicação"""
+    segundos = max(1, int(espera + 0.999))
+    if caminho.startswith('/api/'):
+        corpo = b'{"success": false, "error": "Muitas requisicoes. Tente novamente em instantes."}'
+        tipo = b'application/json'
+    else:
+        corpo = f"Muitas tentativas. Tente novamente em {segundos} segundos.".encode('utf-8')
+        tipo = b'text/plain; charset=utf-8'
+    await send({
+        'type': 'http.response.start',
+        'status': 429,
+        'headers': [
+            (b'content-type', tipo),
+            (b'content-length', str(len(corpo)).encode()),
+            (b'retry-after', str(segundos).encode()),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': corpo})
+
+
+class LimiteRequisicoesMiddleware:
+    """Middleware ASGI que aplica as regras de limite antes da rota"""
+
+    def __init__(self, app, regras: Iterable[RegraLimite], baldes=None, confiar_proxy: bool = False):
+        """
+        Args:
+            app: Aplicação ASGI
+            regras: Regras de limite
+            baldes: BaldesMemoria ou BaldesSQLite (padrão: memória)
+            confiar_proxy: Usa X-Forwarded-For como IP do cliente
+        """
+        self.app = app
+        self.regras: List[RegraLimite] = list(regras)
+        self.baldes = baldes or BaldesMemoria()
+        self.confiar_proxy = confiar_proxy
+
+    def _ip(self, scope) -> str:
+        """IP do cliente (primeiro de X-Forwarded-For atrás de proxy confiável)"""
+        if self.confiar_proxy:
+            encaminhado = _cabecalho(scope, b'x-forwarded-for')
+            if encaminhado:
+                return encaminhado.split(',')[0].strip()
+        cliente = scope.get('client')
+        return cliente[0] if cliente else 'desconhecido'
+
+    async def _consumir(self, regra: RegraLimite, valor: str) -> Tuple[bool, float]:
+        argumentos = (f"{regra.nome}:{regra.chave}:{valor}", regra.capacidade, regra.recarga_por_segundo)
+        if getattr(self.baldes, 'bloqueante', False):
+            return await asyncio.to_thread(self.baldes.consumir, *argumentos)
+        return self.baldes.consumir(*argumentos)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        metodo, caminho = scope['method'], scope['path']
+        regras = [r for r in self.regras if r.aplica(metodo, caminho)]
+        if not regras:
+            return await self.app(scope, receive, send)
+
+        ip = self._ip(scope)
+        for regra in regras:
+            if regra.chave == CHAVE_IP:
+                permitido, espera = await self._consumir(regra, ip)
+                if not permitido:
+                    logger.warning(f"Limite {regra.nome} atingido para IP {ip}")
+                    return await _responder_limite(send, caminho, espera)
+
+        regras_email = [r for r in regras if r.chave == CHAVE_EMAIL]
+        if regras_email:
+            corpo, receive = await self._ler_corpo(scope, receive)
+            email = self._email_do_formulario(scope, corpo)
+            if email:
+                for regra in regras_email:
+                    permitido, espera = await self._consumir(regra, email)
+                    if not permitido:
+                        logger.warning(f"Limite {regra.nome} atingido para {email}")
+                        return await _responder_limite(send, caminho, espera)
+
+        return await self.app(scope, receive, send)
+
+    async def _ler_corpo(self, scope, receive):
+        """
+        Lê o corpo do formulário e devolve um receive que o reproduz
+
+        Corpos acima de MAX_CORPO_FORMULARIO não são lidos (sem chave de email).
+        """
+        tamanho = _cabecalho(scope, b'content-length')
+        if tamanho is None or not tamanho.isdigit() or int(tamanho) > MAX_CORPO_FORMULARIO:
+            return b'', receive
+
+        partes = []
+        while True:
+            mensagem = await receive()
+            if mensagem['type'] != 'http.request':
+                return b'', receive
+            partes.append(mensagem.get('body', b''))
+            if not mensagem.get('more_body', False):
+                break
+        corpo = b''.join(partes)
+        entregue = False
+
+        async def reproduzir():
+            nonlocal entregue
+            if not entregue:
+                entregue = True
+                return {'type': 'http.request', 'body': corpo, 'more_body': False}
+            return await receive()
+
+        return corpo, reproduzir
+
+    @staticmethod
+    def _email_do_formulario(scope, corpo: bytes) -> Optional[str]:
+        """Email de um formulário application/x-www-form-urlencoded"""
+        tipo = _cabecalho(scope, b'content-type') or ''
+        if not corpo or not tipo.startswith('application/x-www-form-urlencoded'):
+            return None
+        valores = parse_qs(corpo.decode('utf-8', 'replace')).get('email')
+        return valores[0].strip().lower() if valores and valores[0].strip() else None
+
+
+# Orçamentos padrão ('N/S' = N requisições a cada S segundos)
+ORCAMENTOS_PADRAO = {
+    'RATE_LIMIT_LOGIN_IP': '20/60',
+    'RATE_LIMIT_LOGIN_EMAIL': '5/300',
+    'RATE_LIMIT_CADASTRO_IP': '5/600',
+    'RATE_LIMIT_CADASTRO_EMAIL': '3/3600',
+    'RATE_LIMIT_CEP_IP': '30/60',
+    'RATE_LIMIT_CONTATO_IP': '5/600',
+}
+
+
+def regras_da_config(config) -> List[RegraLimite]:
+    """Monta as regras das rotas públicas a partir dos orçamentos da Config"""
+    def orcamento(nome):
+        return getattr(config, nome, ORCAMENTOS_PADRAO[nome])
+
+    return [
+        RegraLimite.de_orcamento('login', 'POST', '/login', orcamento('RATE_LIMIT_LOGIN_IP')),
+        RegraLimite.de_orcamento('login', 'POST', '/login', orcamento('RATE_LIMIT_LOGIN_EMAIL'), CHAVE_EMAIL),
+        RegraLimite.de_orcamento('cadastro', 'POST', '/cadastro', orcamento('RATE_LIMIT_CADASTRO_IP')),
+        RegraLimite.de_orcamento('cadastro', 'POST', '/cadastro', orcamento('RATE_LIMIT_CADASTRO_EMAIL'), CHAVE_EMAIL),
+        RegraLimite.de_orcamento('cep', 'GET', '/api/cep/', orcamento('RATE_LIMIT_CEP_IP')),
+        RegraLimite.de_orcamento('contato', 'POST', '/contato', orcamento('RATE_LIMIT_CONTATO_IP')),
+    ]
+
+
+def setup_limite_requisicoes(app, config):
+    """
+    Adiciona o middleware de limite de requisições à aplicação
+
+    Args:
+        app: Aplicação FastHTML
+        config: Configuração (RATE_LIMIT_*)
+    """
+    if not getattr(config, 'RATE_LIMIT_ATIVO', True):
+        return
+
+    if getattr(config, 'RATE_LIMIT_BACKEND', 'memoria') == 'sqlite':
+        baldes = BaldesSQLite(config.RATE_LIMIT_DB_PATH)
+    else:
+        baldes = BaldesMemoria()
+
+    app.add_middleware(
+        LimiteRequisicoesMiddleware,
+        regras=regras_da_config(config),
+        baldes=baldes,
+        confiar_proxy=getattr(config, 'RATE_LIMIT_CONFIAR_PROXY', False),
+    )
+    logger.info(f"Limite de requisições ativo ({type(baldes).__name__})")
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Tarefas de manutenção do sistema de garantia Viemar
+
+Executadas pelo agendador da aplicação (app.agendador) e também pelo
+script scripts/utils/maintenance.py. Cada tarefa recebe o banco e
+retorna um resumo que fica registrado no histórico do agendador.
+"""
+
+import logging
+from datetime import date, datetime, timedelta
+from functools import partial
+from typing import Any, Dict
+
+from fastlite import Database
+
+from app.arquivamento import CRON_ARQUIVAMENTO, DIAS_ARQUIVAMENTO_PADRAO, arquivar_garantias
+from app.database import estatisticas_armazenamento
+from app.date_utils import format_date_br, format_date_iso, format_datetime_iso
+from app.email_service import send_admin_notification, send_warranty_expiry_notification
+from app.garantia_status import STATUS_PROXIMA, filtro_status_sql
+from app.tokens import purgar_tokens_expirados
+
+logger = logging.getLogger(__name__)
+
+# Dias antes do vencimento em que o cliente é notificado
+DIAS_NOTIFICACAO_VENCIMENTO = (30, 15, 7)
+
+# Expressões cron padrão (minuto hora dia mês dia-da-semana)
+CRON_VENCIMENTO_GARANTIAS = '0 8 * * *'
+CRON_LIMPEZA_SESSOES = '*/15 * * * *'
+CRON_RELATORIO_DIARIO = '0 7 * * *'
+CRON_LIMPEZA_TOKENS = '30 3 * * *'
+CRON_OTIMIZACAO_BANCO = '45 3 * * *'
+
+# Sincronização de produtos com o ERP: desativada sem CRON_SINCRONIZACAO_ERP;
+# o lease cobre uma leitura completa do catálogo do ERP
+DURACAO_LEASE_SINCRONIZACAO_ERP = 3600
+
+# Páginas devolvidas por execução da otimização e por comando
+# incremental_vacuum (cada passo é curto e libera o banco para as escritas)
+PAGINAS_VACUUM_POR_EXECUCAO = 5000
+PAGINAS_VACUUM_POR_PASSO = 500
+
+# Linhas amostradas por índice no ANALYZE (PRAGMA analysis_limit)
+LIMITE_ANALISE = 1000
+
+
+def verificar_vencimento_garantias(db: Database) -> Dict[str, Any]:
+    """Notifica os clientes cujas garantias vencem em 30, 15 ou 7 dias"""
+    logger.info("Iniciando verificação de vencimento de garantias")
+
+    enviadas = 0
+    falhas = 0
+    for dias in DIAS_NOTIFICACAO_VENCIMENTO:
+        inicio = date.today() + timedelta(days=dias)
+        # data_vencimento está no formato ISO; o intervalo usa o índice (ativo, data_vencimento)
+        garantias = db.execute("""
+            SELECT u.nome, u.email, p.descricao,
+                   v.marca || ' ' || v.modelo || ' - ' || v.placa
+            FROM garantias g
+            JOIN usuarios u ON g.usuario_id = u.id
+            JOIN produtos p ON g.produto_id = p.id
+            JOIN veiculos v ON g.veiculo_id = v.id
+            WHERE g.ativo = TRUE AND g.data_vencimento >= ? AND g.data_vencimento < ?
+        """, (format_date_iso(inicio), format_date_iso(inicio + timedelta(days=1)))).fetchall()
+
+        for nome, email, produto, veiculo in garantias:
+            if send_warranty_expiry_notification(
+                user_email=email,
+                user_name=nome,
+                produto_nome=produto,
+                veiculo_info=veiculo,
+                days_until_expiry=dias
+            ):
+                logger.info(f"Notificação enviada para {email} - Garantia vence em {dias} dias")
+                enviadas += 1
+            else:
+                logger.error(f"Falha ao enviar notificação para {email}")
+                falhas += 1
+
+    if enviadas > 0:
+        send_admin_notification(
+            subject=f"Relatório de Notificações - {format_date_br(datetime.now())}",
+            message=f"Foram enviadas {enviadas} notificações de vencimento de garantias hoje."
+        )
+
+    logger.info(f"Verificação concluída. {enviadas} notificações enviadas.")
+    return {'enviadas': enviadas, 'falhas': falhas}
+
+
+def limpar_sessoes_expiradas(db: Database) -> Dict[str, Any]:
+    """Remove as sessões expiradas mantidas em memória por este processo"""
+    from app.auth import get_auth_manager
+
+    auth_manager = get_auth_manager()
+    removidas = auth_manager.limpar_sessoes_expiradas()
+    return {'removidas': removidas, **auth_manager.estatisticas_sessoes()}
+
+
+def limpar_tokens_expirados(db: Database) -> Dict[str, Any]:
+    """Remove os tokens de confirmação e de redefinição de senha vencidos"""
+    return {'removidos': purgar_tokens_expirados(db)}
+
+
+def sincronizar_produtos_erp(db: Database, config=None) -> Dict[str, int]:
+    """Sincroniza os produtos do ERP (apenas os alterados desde a última execução)"""
+    from app.services import get_firebird_service
+
+    return get_firebird_service(config).sync_produtos(db)
+
+
+def otimizar_banco(db: Database, paginas_vacuum: int = PAGINAS_VACUUM_POR_EXECUCAO) -> Dict[str, Any]:
+    """
+    Atualiza as estatísticas do planejador e devolve páginas livres
+
+    Roda ANALYZE com amostragem limitada e PRAGMA optimize e, nos bancos
+    com auto_vacuum incremental, incremental_vacuum em passos de
+    PAGINAS_VACUUM_POR_PASSO até ``paginas_vacuum`` páginas.
+    """
+    db.execute(f"PRAGMA analysis_limit = {LIMITE_ANALISE}")
+    db.execute("ANALYZE")
+    db.execute("PRAGMA optimize")
+
+    liberadas = {}
+    for banco in estatisticas_armazenamento(db):
+        esquema = banco['banco']
+        liberadas[esquema] = 0
+        if banco['auto_vacuum'] != 'incremental':
+            continue
+        restantes = min(paginas_vacuum, banco['paginas_livres'])
+        while restantes > 0:
+            passo = min(PAGINAS_VACUUM_POR_PASSO, restantes)
+            # Cada linha do resultado corresponde a uma página devolvida
+            db.execute(f"PRAGMA {esquema}.incremental_vacuum({passo})").fetchall()
+            liberadas[esquema] += passo
+            restantes -= passo
+
+    depois = {banco['banco']: banco for banco in estatisticas_armazenamento(db)}
+    logger.info(f"Banco otimizado: páginas liberadas {liberadas}")
+    return {
+        'paginas_liberadas': liberadas,
+        'paginas_livres': {esquema: banco['paginas_livres'] for esquema, banco in depois.items()},
+        'tamanho_bytes': {esquema: banco['tamanho_bytes'] for esquema, banco in depois.items()},
+    }
+
+
+def gerar_relatorio_diario(db: Database) -> Dict[str, Any]:
+    """Envia ao administrador o resumo de atividade do dia"""
+    logger.info("Gerando relatório diário")
+
+    hoje = date.today()
+    inicio = format_datetime_iso(datetime.combine(hoje, datetime.min.time()))
+    fim = format_datetime_iso(datetime.combine(hoje + timedelta(days=1), datetime.min.time()))
+
+    novas_garantias = db.execute(
+        "SELECT COUNT(*) FROM garantias WHERE data_cadastro >= ? AND data_cadastro < ?",
+        (inicio, fim)
+    ).fetchone()[0]
+    novos_usuarios = db.execute(
+        "SELECT COUNT(*) FROM usuarios WHERE data_cadastro >= ? AND data_cadastro < ?",
+        (inicio, fim)
+    ).fetchone()[0]
+    garantias_ativas = db.execute("SELECT COUNT(*) FROM garantias WHERE ativo = TRUE").fetchone()[0]
+    usuarios_ativos = db.execute("SELECT COUNT(*) FROM usuarios WHERE confirmado = TRUE").fetchone()[0]
+    condicao, params = filtro_status_sql(STATUS_PROXIMA, hoje=hoje)
+    vencendo = db.execute(f"SELECT COUNT(*) FROM garantias g WHERE {condicao}", params).fetchone()[0]
+
+    relatorio = f"""
+Relatório Diário - Sistema de Garantias Viemar
+Data: {format_date_br(hoje)}
+
+=== ATIVIDADE DO DIA ===
+- Novas garantias ativadas: {novas_garantias}
+- Novos usuários cadastrados: {novos_usuarios}
+
+=== ESTATÍSTICAS GERAIS ===
+- Total de garantias ativas: {garantias_ativas}
+- Total de usuários ativos: {usuarios_ativos}
+- Garantias vencendo em 30 dias: {vencendo}
+
+=== ALERTAS ===
+"""
+
+    if vencendo > 10:
+        relatorio += f"- ATENÇÃO: {vencendo} garantias vencem nos próximos 30 dias\n"
+
+    if novas_garantias == 0:
+        relatorio += "- Nenhuma garantia foi ativada hoje\n"
+
+    enviado = send_admin_notification(
+        subject=f"Relatório Diário - {format_date_br(hoje)}",
+        message=relatorio
+    )
+
+    logger.info("Relatório diário gerado e enviado")
+    return {
+        'novas_garantias': novas_garantias,
+        'novos_usuarios': novos_usuarios,
+        'garantias_vencendo': vencendo,
+        'enviado': bool(enviado),
+    }
+
+
+def registrar_tarefas_manutencao(agendador, config):
+    """
+    Registra as tarefas de manutenção no agendador
+
+    Args:
+        agendador: Instância de app.agendador.Agendador
+        config: Configuração com as expressões cron e o jitter
+    """
+    jitter = getattr(config, 'AGENDADOR_JITTER_SEGUNDOS', 0)
+    agendador.registrar(
+        'vencimento_garantias',
+        getattr(config, 'CRON_VENCIMENTO_GARANTIAS', CRON_VENCIMENTO_GARANTIAS),
+        verificar_vencimento_garantias, jitter_segundos=jitter
+    )
+    agendador.registrar(
+        'relatorio_diario',
+        getattr(config, 'CRON_RELATORIO_DIARIO', CRON_RELATORIO_DIARIO),
+        gerar_relatorio_diario, jitter_segundos=jitter
+    )
+    agendador.registrar(
+        'limpeza_tokens',
+        getattr(config, 'CRON_LIMPEZA_TOKENS', CRON_LIMPEZA_TOKENS),
+        limpar_tokens_expirados, jitter_segundos=jitter
+    )
+    agendador.registrar(
+        'otimizacao_banco',
+        getattr(config, 'CRON_OTIMIZACAO_BANCO', CRON_OTIMIZACAO_BANCO),
+        partial(otimizar_banco, paginas_vacuum=getattr(config, 'VACUUM_PAGINAS_POR_EXECUCAO', PAGINAS_VACUUM_POR_EXECUCAO)),
+        jitter_segundos=jitter
+    )
+    agendador.registrar(
+        'arquivamento_garantias',
+        getattr(config, 'CRON_ARQUIVAMENTO', CRON_ARQUIVAMENTO),
+        partial(arquivar_garantias, dias=getattr(config, 'ARQUIVAMENTO_DIAS', DIAS_ARQUIVAMENTO_PADRAO)),
+        jitter_segundos=jitter
+    )
+    cron_erp = getattr(config, 'CRON_SINCRONIZACAO_ERP', '')
+    if cron_erp:
+        agendador.registrar(
+            'sincronizacao_erp', cron_erp, partial(sincronizar_produtos_erp, config=config),
+            jitter_segundos=jitter, duracao_lease_segundos=DURACAO_LEASE_SINCRONIZACAO_ERP
+        )
+    # As sessões ficam em memória, então cada processo limpa as suas
+    agendador.registrar(
+        'limpeza_sessoes',
+        getattr(config, 'CRON_LIMPEZA_SESSOES', CRON_LIMPEZA_SESSOES),
+        limpar_sessoes_expiradas, exclusiva=False
+    )
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Motor de migrações versionadas do banco de dados SQLite
+
+Cada migração é um módulo deste pacote nomeado ``mNNNN_descricao.py`` que
+define uma função ``upgrade(db)``. As migrações são aplicadas em ordem
+crescente de versão, uma única vez, e a versão aplicada é registrada na
+tabela ``schema_version``. Na inicialização a aplicação faz apenas uma
+consulta de versão quando o banco já está atualizado.
+
+Por padrão cada migração roda dentro de uma transação. Migrações de dados
+grandes podem declarar ``TRANSACIONAL = False`` e usar ``migrar_em_lotes``
+para processar a tabela em lotes curtos, sem bloquear o banco por muito
+tempo. Essas migrações devem ser idempotentes, pois podem ser retomadas
+após uma interrupção.
+
+Vários processos (workers, scripts) podem iniciar ao mesmo tempo: a
+aplicação das migrações pendentes é serializada por uma trava de arquivo
+ao lado do banco (``<banco>.migracoes.lock``), e a versão é relida sob a
+trava, então cada migração roda uma única vez e os demais processos
+apenas esperam. As migrações transacionais ainda conferem a versão dentro
+do ``BEGIN IMMEDIATE`` (sistemas sem ``fcntl``).
+"""
+
+import importlib
+import logging
+import pkgutil
+import re
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+try:
+    import fcntl
+except ImportError:  # Windows: apenas a verificação dentro da transação
+    fcntl = None
+
+from fastlite import Database
+
+from app.unidade_trabalho import UnidadeTrabalho
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_LOTE_PADRAO = 500
+
+_PADRAO_MODULO = re.compile(r'^m(\d{4})_(\w+)$')
+
+
+@dataclass
+class Migracao:
+    """Migração de schema ou de dados"""
+
+    versao: int
+    nome: str
+    descricao: str
+    upgrade: Callable[[Database], None]
+    transacional: bool = True
+
+
+def descobrir_migracoes() -> List[Migracao]:
+    """
+    Localiza os módulos de migração deste pacote
+
+    Returns:
+        Lista de migrações ordenada pela versão
+    """
+    migracoes = []
+    versoes = set()
+
+    for info in pkgutil.iter_modules(__path__):
+        match = _PADRAO_MODULO.match(info.name)
+        if not match:
+            continue
+
+        versao = int(match.group(1))
+        if versao in versoes:
+            raise ValueError(f"Versão de migração duplicada: {versao}")
+        versoes.add(versao)
+
+        modulo = importlib.import_module(f"{__name__}.{info.name}")
+        migracoes.append(Migracao(
+            versao=versao,
+            nome=info.name,
+            descricao=(modulo.__doc__ or info.name).strip().splitlines()[0],
+            upgrade=modulo.upgrade,
+            transacional=getattr(modulo, 'TRANSACIONAL', True)
+        ))
+
+    return sorted(migracoes, key=lambda m: m.versao)
+
+
+def _criar_tabela_versao(db: Database):
+    """Cria a tabela de controle de versões se não existir"""
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            versao INTEGER PRIMARY KEY,
+            nome TEXT NOT NULL,
+            aplicada_em DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def versao_atual(db: Database) -> int:
+    """
+    Retorna a maior versão de schema aplicada
+
+    Args:
+        db: Instância do banco de dados
+
+    Returns:
+        Número da versão ou 0 se nenhuma migração foi aplicada
+    """
+    _criar_tabela_versao(db)
+    result = db.execute("SELECT MAX(versao) FROM schema_version").fetchone()
+    return result[0] if result and result[0] is not None else 0
+
+
+def _versao_aplicada(db: Database, versao: int) -> bool:
+    """Indica se a versão já está registrada em schema_version"""
+    return db.execute("SELECT 1 FROM schema_version WHERE versao = ?", (versao,)).fetchone() is not None
+
+
+@contextmanager
+def _trava_migracoes(db: Database) -> Iterator[None]:
+    """Trava de arquivo exclusiva entre os processos que migram o mesmo banco"""
+    caminho = db.conn.filename
+    if fcntl is None or not caminho:
+        yield
+        return
+    with open(f"{caminho}.migracoes.lock", 'a') as arquivo:
+        fcntl.flock(arquivo, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(arquivo, fcntl.LOCK_UN)
+
+
+def _registrar_versao(db: Database, migracao: Migracao):
+    """Registra a migração como aplicada"""
+    db.execute(
+        "INSERT INTO schema_version (versao, nome) VALUES (?, ?)",
+        (migracao.versao, migracao.nome)
+    )
+
+
+def aplicar_migracoes(db: Database, migracoes: Optional[Sequence[Migracao]] = None,
+                      versao_alvo: Optional[int] = None) -> int:
+    """
+    Aplica as migrações pendentes em ordem
+
+    Args:
+        db: Instância do banco de dados
+        migracoes: Lista de migrações (padrão: descobertas no pacote)
+        versao_alvo: Versão máxima a aplicar (padrão: todas)
+
+    Returns:
+        Quantidade de migrações aplicadas
+    """
+    if migracoes is None:
+        migracoes = descobrir_migracoes()
+
+    def pendentes_desde(versao: int) -> List[Migracao]:
+        return [
+            m for m in migracoes
+            if m.versao > versao and (versao_alvo is None or m.versao <= versao_alvo)
+        ]
+
+    versao = versao_atual(db)
+    if not pendentes_desde(versao):
+        logger.debug(f"Schema atualizado na versão {versao}")
+        return 0
+
+    with _trava_migracoes(db):
+        # Outro processo pode ter migrado enquanto esperávamos a trava
+        versao = versao_atual(db)
+        pendentes = pendentes_desde(versao)
+        aplicadas = 0
+        for migracao in pendentes:
+            if _aplicar(db, migracao):
+                aplicadas += 1
+
+    if aplicadas:
+        logger.info(f"Schema migrado da versão {versao} para {pendentes[-1].versao}")
+    return aplicadas
+
+
+def _aplicar(db: Database, migracao: Migracao) -> bool:
+    """
+    Aplica uma migração e registra a versão
+
+    Returns:
+        False se a versão já havia sido aplicada por outro processo
+    """
+    if migracao.transacional:
+        db.execute("BEGIN IMMEDIATE")
+        if _versao_aplicada(db, migracao.versao):
+            db.execute("ROLLBACK")
+            return False
+        logger.info(f"Aplicando migração {migracao.versao:04d}: {migracao.descricao}")
+        try:
+            migracao.upgrade(db)
+            _registrar_versao(db, migracao)
+            db.execute("COMMIT")
+        except Exception as e:
+            db.execute("ROLLBACK")
+            logger.error(f"Erro na migração {migracao.nome}: {e}")
+            raise
+        return True
+
+    # Fora de transação a trava de arquivo é a proteção; a migração é idempotente
+    if _versao_aplicada(db, migracao.versao):
+        return False
+    logger.info(f"Aplicando migração {migracao.versao:04d}: {migracao.descricao}")
+    try:
+        migracao.upgrade(db)
+        _registrar_versao(db, migracao)
+    except Exception as e:
+        logger.error(f"Erro na migração {migracao.nome}: {e}")
+        raise
+    return True
+
+
+def colunas_tabela(db: Database, tabela: str) -> List[str]:
+    """Retorna os nomes das colunas de uma tabela"""
+    return [row[1] for row in db.execute(f"PRAGMA table_info({tabela})").fetchall()]
+
+
+def adicionar_coluna(db: Database, tabela: str, coluna: str, definicao: str) -> bool:
+    """
+    Adiciona uma coluna se ela ainda não existir
+
+    Bancos antigos podem já ter a coluna por causa dos scripts de migração
+    avulsos usados antes deste motor.
+
+    Returns:
+        True se a coluna foi criada
+    """
+    if coluna in colunas_tabela(db, tabela):
+        return False
+    db.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {definicao}")
+    logger.info(f"Coluna {coluna} adicionada à tabela {tabela}")
+    return True
+
+
+def migrar_em_lotes(db: Database, tabela: str, colunas: Sequence[str],
+                    transformar: Callable[[tuple], Optional[Dict[str, object]]],
+                    tamanho_lote: int = TAMANHO_LOTE_PADRAO) -> int:
+    """
+    Atualiza uma tabela em lotes percorrendo o rowid
+
+    Cada lote roda na sua própria transação, liberando o banco entre os
+    lotes. Dentro de uma migração transacional os lotes participam da
+    transação já aberta.
+
+    Args:
+        db: Instância do banco de dados
+        tabela: Tabela a ser atualizada
+        colunas: Colunas lidas e repassadas para ``transformar``
+        transformar: Recebe a tupla (rowid, *colunas) e retorna um dicionário
+            com os novos valores ou None para manter a linha
+        tamanho_lote: Quantidade de linhas lidas por lote
+
+    Returns:
+        Quantidade de linhas atualizadas
+    """
+    ultimo_rowid = 0
+    total = 0
+    select_sql = (
+        f"SELECT rowid, {', '.join(colunas)} FROM {tabela} "
+        f"WHERE rowid > ? ORDER BY rowid LIMIT ?"
+    )
+
+    while True:
+        linhas = db.execute(select_sql, (ultimo_rowid, tamanho_lote)).fetchall()
+        if not linhas:
+            break
+
+        with UnidadeTrabalho(db):
+            for linha in linhas:
+                valores = transformar(linha)
+                if not valores:
+                    continue
+                atribuicoes = ', '.join(f"{col} = ?" for col in valores)
+                db.execute(
+                    f"UPDATE {tabela} SET {atribuicoes} WHERE rowid = ?",
+                    (*valores.values(), linha[0])
+                )
+                total += 1
+
+        ultimo_rowid = linhas[-1][0]
+        logger.debug(f"Lote de {tabela} processado até rowid {ultimo_rowid}")
+
+    return total
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Schema inicial: usuários, produtos, veículos e garantias
+
+Usa IF NOT EXISTS para ser aplicável a bancos criados antes do controle
+de versões.
+"""
+
+from fastlite import Database
+
+
+def upgrade(db: Database):
+    """Cria as tabelas e índices base do sistema"""
+    
+    # Criar tabela de usuários
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            senha_hash TEXT NOT NULL,
+            nome TEXT NOT NULL,
+            tipo_usuario TEXT NOT NULL DEFAULT 'cliente',
+            confirmado BOOLEAN DEFAULT FALSE,
+            email_enviado BOOLEAN DEFAULT FALSE,
+            cep TEXT,
+            endereco TEXT,
+            bairro TEXT,
+            cidade TEXT,
+            uf TEXT,
+            telefone TEXT,
+            cpf_cnpj TEXT,
+            data_nascimento DATETIME,
+            data_cadastro DATETIME DEFAULT CURRENT_TIMESTAMP,
+            token_confirmacao TEXT,
+            token_reset_senha TEXT,
+            CONSTRAINT chk_tipo_usuario CHECK (tipo_usuario IN ('cliente', 'administrador'))
+        )
+    """)
+    
+    # Criar tabela de produtos
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS produtos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sku TEXT UNIQUE NOT NULL,
+            descricao TEXT,
+            ativo BOOLEAN DEFAULT TRUE,
+            data_cadastro DATETIME DEFAULT CURRENT_TIMESTAMP,
+            data_atualizacao DATETIME
+        )
+    """)
+    
+    # Criar tabela de veículos
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS veiculos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            usuario_id INTEGER NOT NULL,
+            marca TEXT NOT NULL,
+            modelo TEXT NOT NULL,
+            ano_modelo TEXT,
+            placa TEXT NOT NULL,
+            chassi TEXT,
+            cor TEXT,
+            data_cadastro DATETIME DEFAULT CURRENT_TIMESTAMP,
+            data_atualizacao DATETIME,
+            ativo BOOLEAN DEFAULT TRUE,
+            FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+        )
+    """)
+    
+    # Criar tabela de garantias
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS garantias (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            usuario_id INTEGER NOT NULL,
+            produto_id INTEGER NOT NULL,
+            veiculo_id INTEGER NOT NULL,
+            lote_fabricacao TEXT NOT NULL,
+            data_instalacao DATETIME NOT NULL,
+            nota_fiscal TEXT NOT NULL,
+            nome_estabelecimento TEXT NOT NULL,
+            quilometragem INTEGER NOT NULL,
+            data_cadastro DATETIME DEFAULT CURRENT_TIMESTAMP,
+            data_vencimento DATETIME,
+            ativo BOOLEAN DEFAULT TRUE,
+            observacoes TEXT,
+            FOREIGN KEY (usuario_id) REFERENCES usuarios (id),
+            FOREIGN KEY (produto_id) REFERENCES produtos (id),
+            FOREIGN KEY (veiculo_id) REFERENCES veiculos (id)
+        )
+    """)
+    
+    # Criar índices para melhor performance
+    db.execute("CREATE INDEX IF NOT EXISTS idx_usuarios_email ON usuarios (email)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_usuarios_tipo ON usuarios (tipo_usuario)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_produtos_sku ON produtos (sku)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_veiculos_usuario ON veiculos (usuario_id)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_garantias_usuario ON garantias (usuario_id)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_garantias_produto ON garantias (produto_id)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_garantias_veiculo ON garantias (veiculo_id)")
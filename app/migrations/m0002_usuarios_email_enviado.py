@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+"""
+Coluna email_enviado em usuários
+
+Bancos anteriores à coluna são atualizados aqui; nos demais ela já existe.
+"""
+
+from fastlite import Database
+
+from app.migrations import adicionar_coluna
+
+
+def upgrade(db: Database):
+    """Adiciona a coluna que controla o envio do email de confirmação"""
+    adicionar_coluna(db, 'usuarios', 'email_enviado', 'BOOLEAN DEFAULT FALSE')
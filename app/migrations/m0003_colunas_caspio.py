@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Colunas de referência para a importação do Caspio
+
+Substitui o script avulso scripts/utils/migrate_for_caspio_import.py.
+"""
+
+from fastlite import Database
+
+from app.migrations import adicionar_coluna
+
+
+COLUNAS_GARANTIAS_CASPIO = [
+    ('referencia_produto', 'TEXT'),
+    ('lote_caspio', 'TEXT'),
+    ('data_aplicacao_caspio', 'TEXT'),
+    ('km_aplicacao', 'INTEGER'),
+    ('oficina_nome', 'TEXT'),
+    ('oficina_nf', 'TEXT'),
+]
+
+
+def upgrade(db: Database):
+    """Adiciona os IDs originais do Caspio e os dados de aplicação das garantias"""
+    adicionar_coluna(db, 'usuarios', 'caspio_id', 'TEXT')
+    adicionar_coluna(db, 'veiculos', 'caspio_veiculo_id', 'TEXT')
+    
+    for coluna, tipo in COLUNAS_GARANTIAS_CASPIO:
+        adicionar_coluna(db, 'garantias', coluna, tipo)
+    
+    db.execute("CREATE INDEX IF NOT EXISTS idx_usuarios_caspio_id ON usuarios (caspio_id)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_veiculos_caspio_id ON veiculos (caspio_veiculo_id)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_garantias_referencia ON garantias (referencia_produto)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_garantias_lote_caspio ON garantias (lote_caspio)")
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Placa e chassi normalizados em veículos, com índices únicos parciais
+
+A normalização usa Veiculo.normalizar_placa (formato antigo e Mercosul
+unificados) e Veiculo.normalizar_chassi. O preenchimento é feito em lotes,
+fora de uma transação única, para não bloquear bancos grandes.
+"""
+
+import logging
+
+from fastlite import Database
+
+from app.migrations import adicionar_coluna, migrar_em_lotes
+from models.veiculo import Veiculo
+
+logger = logging.getLogger(__name__)
+
+TRANSACIONAL = False
+
+
+def _normalizar(row):
+    """Calcula placa_norm e chassi_norm para a linha (rowid, placa, chassi)"""
+    return {
+        'placa_norm': Veiculo.normalizar_placa(row[1]),
+        'chassi_norm': Veiculo.normalizar_chassi(row[2]),
+    }
+
+
+def _liberar_duplicados(db: Database, coluna: str):
+    """
+    Mantém a chave normalizada apenas no veículo ativo mais antigo
+
+    Duplicados já existentes impediriam a criação do índice único; os
+    demais ficam com a coluna nula e voltam a ser validados ao serem
+    editados.
+    """
+    db.execute(f"""
+        UPDATE veiculos SET {coluna} = NULL
+        WHERE ativo = TRUE AND {coluna} IS NOT NULL
+        AND id NOT IN (
+            SELECT MIN(id) FROM veiculos
+            WHERE ativo = TRUE AND {coluna} IS NOT NULL
+            GROUP BY {coluna}
+        )
+    """)
+    liberados = db.conn.changes()
+    if liberados:
+        logger.warning(f"{liberados} veículos ativos com {coluna} duplicado ficaram sem chave normalizada")
+
+
+def upgrade(db: Database):
+    """Adiciona, preenche e indexa placa_norm e chassi_norm"""
+    adicionar_coluna(db, 'veiculos', 'placa_norm', 'TEXT')
+    adicionar_coluna(db, 'veiculos', 'chassi_norm', 'TEXT')
+
+    total = migrar_em_lotes(db, 'veiculos', ['placa', 'chassi'], _normalizar)
+    logger.info(f"Placa/chassi normalizados em {total} veículos")
+
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        _liberar_duplicados(db, 'placa_norm')
+        _liberar_duplicados(db, 'chassi_norm')
+        db.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_veiculos_placa_norm
+            ON veiculos (placa_norm) WHERE ativo = TRUE AND placa_norm IS NOT NULL
+        """)
+        db.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_veiculos_chassi_norm
+            ON veiculos (chassi_norm) WHERE ativo = TRUE AND chassi_norm IS NOT NULL
+        """)
+        db.execute("COMMIT")
+    except Exception:
+        db.execute("ROLLBACK")
+        raise
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+Índices de garantias por status e data de vencimento
+
+Permitem que os filtros de status das listagens (vencida, próxima do
+vencimento, ativa) sejam buscas por intervalo em data_vencimento.
+"""
+
+from fastlite import Database
+
+
+def upgrade(db: Database):
+    """Cria os índices (ativo, data_vencimento) global e por usuário"""
+    db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_garantias_ativo_vencimento
+        ON garantias (ativo, data_vencimento)
+    """)
+    db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_garantias_usuario_ativo_vencimento
+        ON garantias (usuario_id, ativo, data_vencimento)
+    """)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Datas gravadas em formato ISO canônico
+
+Normaliza as colunas de data para yyyy-MM-dd e as de data/hora para
+yyyy-MM-dd HH:mm:ss. Os valores antigos misturam ISO com "T" e
+microssegundos, CURRENT_TIMESTAMP, datas sem horário em colunas de
+data/hora e o texto original do Caspio (mês antes do dia). Valores que
+não podem ser interpretados são mantidos. O processamento é feito em
+lotes, fora de uma transação única.
+"""
+
+import logging
+
+from fastlite import Database
+
+from app.date_utils import FORMATOS_CASPIO, normalizar_data_iso, normalizar_datetime_iso
+from app.migrations import colunas_tabela, migrar_em_lotes
+
+logger = logging.getLogger(__name__)
+
+TRANSACIONAL = False
+
+# Coluna -> função de normalização, por tabela
+COLUNAS_DATA = {
+    'usuarios': {
+        'data_nascimento': normalizar_data_iso,
+        'data_cadastro': normalizar_datetime_iso,
+    },
+    'produtos': {
+        'data_cadastro': normalizar_datetime_iso,
+        'data_atualizacao': normalizar_datetime_iso,
+    },
+    'veiculos': {
+        'data_cadastro': normalizar_datetime_iso,
+        'data_atualizacao': normalizar_datetime_iso,
+    },
+    'garantias': {
+        'data_instalacao': normalizar_data_iso,
+        'data_vencimento': normalizar_data_iso,
+        'data_cadastro': normalizar_datetime_iso,
+        'data_aplicacao_caspio': lambda valor: normalizar_datetime_iso(valor, FORMATOS_CASPIO),
+    },
+}
+
+
+def _transformador(colunas, normalizadores):
+    """Cria a função de transformação de uma linha (rowid, *colunas)"""
+    def transformar(linha):
+        valores = {}
+        for coluna, normalizar, valor in zip(colunas, normalizadores, linha[1:]):
+            if valor is None:
+                continue
+            canonico = normalizar(valor)
+            if canonico and canonico != valor:
+                valores[coluna] = canonico
+        return valores or None
+    return transformar
+
+
+def upgrade(db: Database):
+    """Reescreve as datas fora do formato canônico"""
+    for tabela, mapa in COLUNAS_DATA.items():
+        existentes = colunas_tabela(db, tabela)
+        colunas = [coluna for coluna in mapa if coluna in existentes]
+        if not colunas:
+            continue
+
+        normalizadores = [mapa[coluna] for coluna in colunas]
+        total = migrar_em_lotes(db, tabela, colunas, _transformador(colunas, normalizadores))
+        logger.info(f"Datas normalizadas em {total} registros de {tabela}")
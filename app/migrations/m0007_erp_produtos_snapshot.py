@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+"""
+Snapshot dos produtos sincronizados com o ERP
+
+Guarda o hash do conteúdo de cada produto na última sincronização, para
+que apenas os produtos alterados no ERP sejam gravados no SQLite.
+"""
+
+from fastlite import Database
+
+
+def upgrade(db: Database):
+    """Cria a tabela erp_produtos_snapshot"""
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS erp_produtos_snapshot (
+            sku TEXT PRIMARY KEY,
+            hash TEXT NOT NULL,
+            sincronizado_em DATETIME
+        )
+    """)
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Tabela de jobs executados em segundo plano
+
+Registra status, progresso e resultado das tarefas longas (sincronização
+com o ERP, importação do Caspio).
+"""
+
+from fastlite import Database
+
+
+def upgrade(db: Database):
+    """Cria a tabela jobs"""
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tipo TEXT NOT NULL,
+            status TEXT NOT NULL,
+            parametros TEXT,
+            progresso INTEGER,
+            processados INTEGER DEFAULT 0,
+            total INTEGER,
+            mensagem TEXT,
+            resultado TEXT,
+            erro TEXT,
+            cancelar BOOLEAN DEFAULT FALSE,
+            usuario_id INTEGER,
+            criado_em DATETIME,
+            iniciado_em DATETIME,
+            finalizado_em DATETIME,
+            FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+        )
+    """)
+    db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)")
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Tabelas do agendador de tarefas
+
+agendador_leases garante que cada horário de uma tarefa exclusiva seja
+executado por um único processo; agendador_execucoes guarda o histórico.
+"""
+
+from fastlite import Database
+
+
+def upgrade(db: Database):
+    """Cria agendador_leases e agendador_execucoes"""
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS agendador_leases (
+            tarefa TEXT PRIMARY KEY,
+            dono TEXT NOT NULL,
+            expira_em REAL NOT NULL,
+            ultimo_horario TEXT
+        )
+    """)
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS agendador_execucoes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tarefa TEXT NOT NULL,
+            dono TEXT NOT NULL,
+            horario_agendado TEXT,
+            iniciada_em DATETIME,
+            finalizada_em DATETIME,
+            status TEXT NOT NULL,
+            resultado TEXT,
+            erro TEXT
+        )
+    """)
+    db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_agendador_execucoes_tarefa
+        ON agendador_execucoes (tarefa, id)
+    """)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Tabela tokens (confirmação de email e redefinição de senha)
+
+Os tokens pendentes em usuarios.token_confirmacao/token_reset_senha são
+copiados como hash, com a validade padrão contada a partir da migração,
+e as duas colunas são removidas de usuarios.
+"""
+
+import logging
+from datetime import datetime
+
+from fastlite import Database
+
+from app.date_utils import format_datetime_iso
+from app.migrations import colunas_tabela
+from app.tokens import FINALIDADE_CONFIRMACAO, FINALIDADE_RESET_SENHA, VALIDADE_TOKENS, hash_token
+
+logger = logging.getLogger(__name__)
+
+COLUNAS_TOKEN = {
+    'token_confirmacao': FINALIDADE_CONFIRMACAO,
+    'token_reset_senha': FINALIDADE_RESET_SENHA,
+}
+
+
+def upgrade(db: Database):
+    """Cria tokens, migra os tokens pendentes e remove as colunas antigas"""
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS tokens (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            token_hash TEXT NOT NULL,
+            finalidade TEXT NOT NULL,
+            usuario_id INTEGER NOT NULL,
+            criado_em DATETIME NOT NULL,
+            expira_em DATETIME NOT NULL,
+            FOREIGN KEY (usuario_id) REFERENCES usuarios (id) ON DELETE CASCADE
+        )
+    """)
+    db.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_tokens_hash ON tokens (token_hash)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_tokens_usuario ON tokens (usuario_id, finalidade)")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_tokens_expira_em ON tokens (expira_em)")
+
+    colunas = colunas_tabela(db, 'usuarios')
+    agora = datetime.now()
+    for coluna, finalidade in COLUNAS_TOKEN.items():
+        if coluna not in colunas:
+            continue
+        pendentes = db.execute(
+            f"SELECT id, {coluna} FROM usuarios WHERE {coluna} IS NOT NULL AND {coluna} != ''"
+        ).fetchall()
+        for usuario_id, token in pendentes:
+            db.execute(
+                """INSERT OR IGNORE INTO tokens (token_hash, finalidade, usuario_id, criado_em, expira_em)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (hash_token(token), finalidade, usuario_id, format_datetime_iso(agora),
+                 format_datetime_iso(agora + VALIDADE_TOKENS[finalidade]))
+            )
+        db.execute(f"ALTER TABLE usuarios DROP COLUMN {coluna}")
+        logger.info(f"{len(pendentes)} tokens de {finalidade} migrados; coluna usuarios.{coluna} removida")
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Contadores de garantias em veículos e usuários
+
+Adiciona total_garantias/garantias_ativas em veiculos e usuarios (e
+veiculos_ativos em usuarios), cria os triggers de app.contadores e
+preenche os valores a partir das tabelas existentes.
+"""
+
+import logging
+
+from fastlite import Database
+
+from app.contadores import COLUNAS_CONTADORES, criar_gatilhos, recalcular_contadores
+from app.migrations import adicionar_coluna
+
+logger = logging.getLogger(__name__)
+
+
+def upgrade(db: Database):
+    """Cria as colunas de contadores, os triggers e faz a contagem inicial"""
+    for tabela, colunas in COLUNAS_CONTADORES.items():
+        for coluna in colunas:
+            adicionar_coluna(db, tabela, coluna, 'INTEGER NOT NULL DEFAULT 0')
+
+    criar_gatilhos(db)
+    corrigidas = recalcular_contadores(db)
+    logger.info(f"Contadores iniciais calculados: {corrigidas}")
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Índice único parcial: uma garantia ativa por produto e veículo
+
+Substitui a consulta de duplicidade feita antes do INSERT em
+criar_garantia, que não protegia envios concorrentes do formulário.
+Duplicidades já existentes impediriam a criação do índice: em cada par
+produto/veículo a garantia ativa mais antiga é mantida e as demais são
+desativadas. Cada garantia desativada fica registrada em
+``garantias_desativadas`` (com a garantia mantida e o motivo), para que
+o suporte consiga explicar ao cliente por que ela ficou inativa.
+"""
+
+import logging
+
+from fastlite import Database
+
+logger = logging.getLogger(__name__)
+
+
+MOTIVO_DUPLICADA = 'duplicada_produto_veiculo'
+
+
+def upgrade(db: Database):
+    """Desativa garantias ativas duplicadas (registrando-as) e cria o índice único"""
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS garantias_desativadas (
+            garantia_id INTEGER PRIMARY KEY,
+            garantia_mantida_id INTEGER,
+            motivo TEXT NOT NULL,
+            data_desativacao DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    db.execute("""
+        INSERT OR IGNORE INTO garantias_desativadas (garantia_id, garantia_mantida_id, motivo)
+        SELECT id, mantida_id, ? FROM (
+            SELECT id, MIN(id) OVER (PARTITION BY produto_id, veiculo_id) AS mantida_id
+            FROM garantias
+            WHERE ativo = TRUE
+        )
+        WHERE id <> mantida_id
+    """, (MOTIVO_DUPLICADA,))
+    desativadas = db.conn.changes()
+    if desativadas:
+        db.execute("""
+            UPDATE garantias SET ativo = FALSE
+            WHERE ativo = TRUE
+            AND id IN (SELECT garantia_id FROM garantias_desativadas WHERE motivo = ?)
+        """, (MOTIVO_DUPLICADA,))
+        logger.warning(
+            f"{desativadas} garantias ativas duplicadas foram desativadas (ver tabela garantias_desativadas)"
+        )
+
+    db.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_garantias_produto_veiculo_ativa
+        ON garantias (produto_id, veiculo_id) WHERE ativo = TRUE
+    """)
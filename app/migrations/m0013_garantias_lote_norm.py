@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Lote de fabricação normalizado em garantias, com índice
+
+``lote_norm`` é uma coluna gerada (VIRTUAL) com a mesma normalização de
+app.recall.normalizar_lote, então todos os caminhos de escrita (rotas,
+importação do Caspio, scripts) ficam cobertos sem alteração. O índice
+atende às buscas de recall por lote exato, prefixo e intervalo.
+"""
+
+import logging
+
+from fastlite import Database
+
+from app.recall import LOTE_NORM_SQL
+
+logger = logging.getLogger(__name__)
+
+
+def upgrade(db: Database):
+    """Adiciona a coluna gerada lote_norm e o índice"""
+    # table_info não lista colunas geradas; table_xinfo sim
+    colunas = [row[1] for row in db.execute("PRAGMA table_xinfo(garantias)").fetchall()]
+    if 'lote_norm' not in colunas:
+        db.execute(f"""
+            ALTER TABLE garantias ADD COLUMN lote_norm TEXT
+            GENERATED ALWAYS AS ({LOTE_NORM_SQL.format(coluna='lote_fabricacao')}) VIRTUAL
+        """)
+        logger.info("Coluna gerada lote_norm adicionada à tabela garantias")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_garantias_lote_norm ON garantias (lote_norm)")
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Tabela de estabelecimentos instaladores referenciada pelas garantias
+
+Cria ``estabelecimentos`` e ``garantias.estabelecimento_id``, os triggers
+de contadores de app.estabelecimentos e vincula as garantias existentes
+em lotes, fora de uma transação única, para não bloquear bancos grandes.
+"""
+
+import logging
+
+from fastlite import Database
+
+from app.estabelecimentos import (
+    criar_gatilhos, recalcular_contadores_estabelecimentos, vincular_estabelecimentos
+)
+from app.migrations import adicionar_coluna
+
+logger = logging.getLogger(__name__)
+
+TRANSACIONAL = False
+
+
+def upgrade(db: Database):
+    """Cria a dimensão de estabelecimentos e vincula as garantias"""
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS estabelecimentos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            nome_norm TEXT NOT NULL UNIQUE,
+            total_garantias INTEGER NOT NULL DEFAULT 0,
+            garantias_ativas INTEGER NOT NULL DEFAULT 0,
+            data_cadastro DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_estabelecimentos_ativas
+        ON estabelecimentos (garantias_ativas)
+    """)
+    adicionar_coluna(db, 'garantias', 'estabelecimento_id', 'INTEGER REFERENCES estabelecimentos (id)')
+    db.execute("CREATE INDEX IF NOT EXISTS idx_garantias_estabelecimento ON garantias (estabelecimento_id)")
+    criar_gatilhos(db)
+
+    vinculadas = vincular_estabelecimentos(db)
+    logger.info(f"Garantias vinculadas aos estabelecimentos: {vinculadas}")
+    recalcular_contadores_estabelecimentos(db)
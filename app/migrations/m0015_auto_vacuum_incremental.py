@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+auto_vacuum = INCREMENTAL
+
+Com o modo incremental as páginas liberadas por exclusões (importações,
+sincronizações, exclusão de usuários, arquivamento) ficam na freelist e
+são devolvidas aos poucos pela tarefa de otimização
+(app.manutencao.otimizar_banco). Em um banco já criado a mudança de
+modo só vale após um VACUUM completo, feito uma vez aqui, fora de
+transação.
+"""
+
+import logging
+
+from fastlite import Database
+
+logger = logging.getLogger(__name__)
+
+TRANSACIONAL = False
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def upgrade(db: Database):
+    """Ativa o auto_vacuum incremental e reconstrói o arquivo"""
+    if db.execute("PRAGMA auto_vacuum").fetchone()[0] == AUTO_VACUUM_INCREMENTAL:
+        return
+    db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    db.execute("VACUUM")
+    logger.info("auto_vacuum incremental ativado (VACUUM concluído)")
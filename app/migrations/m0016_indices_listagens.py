@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Índices das ordenações padrão das listagens e das contagens do dashboard
+
+As listagens de usuários, veículos e garantias (admin) ordenam por
+data_cadastro decrescente e a de garantias do cliente por data_cadastro
+dentro do usuário: com estes índices a página é lida em ordem, sem
+ordenar em B-tree temporária. As contagens de produtos e veículos ativos
+do dashboard passam a usar só o índice de ``ativo``.
+
+Verificados por tests/test_planos_consulta.py.
+"""
+
+from fastlite import Database
+
+INDICES = {
+    'idx_usuarios_data_cadastro': 'usuarios (data_cadastro)',
+    'idx_veiculos_data_cadastro': 'veiculos (data_cadastro)',
+    'idx_garantias_data_cadastro': 'garantias (data_cadastro)',
+    'idx_garantias_usuario_cadastro': 'garantias (usuario_id, data_cadastro)',
+    'idx_produtos_ativo': 'produtos (ativo)',
+    'idx_veiculos_ativo': 'veiculos (ativo)',
+}
+
+
+def upgrade(db: Database):
+    """Cria os índices de ordenação e de contagem"""
+    for nome, definicao in INDICES.items():
+        db.execute(f"CREATE INDEX IF NOT EXISTS {nome} ON {definicao}")
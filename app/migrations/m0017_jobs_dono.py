@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+"""
+Dono e heartbeat dos jobs
+
+Cada job guarda o processo que o executa (host:pid) e o instante do
+último sinal de vida desse processo. Na partida, um processo só marca
+como falhos os próprios jobs (de uma execução anterior com o mesmo
+host:pid) ou os de processos que pararam de enviar heartbeat, sem tocar
+nos jobs em andamento em outros workers.
+"""
+
+from fastlite import Database
+
+from app.migrations import adicionar_coluna
+
+
+def upgrade(db: Database):
+    """Adiciona jobs.dono e jobs.heartbeat_em"""
+    adicionar_coluna(db, 'jobs', 'dono', 'TEXT')
+    adicionar_coluna(db, 'jobs', 'heartbeat_em', 'REAL')
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Data de desativação das garantias
+
+O arquivamento de garantias inativas passa a contar o tempo desde a
+desativação, e não desde o cadastro. Os triggers de app.arquivamento
+mantêm ``data_desativacao``. As garantias já inativas não têm a data
+registrada: recebem a data da desativação feita pela migração 0012
+(``garantias_desativadas``) ou, na falta dela, a data desta migração, e
+só são arquivadas depois de ARQUIVAMENTO_DIAS a partir daí.
+"""
+
+import logging
+
+from fastlite import Database
+
+from app.arquivamento import criar_gatilhos
+from app.migrations import adicionar_coluna
+
+logger = logging.getLogger(__name__)
+
+
+def upgrade(db: Database):
+    """Cria garantias.data_desativacao, os triggers e preenche as inativas"""
+    adicionar_coluna(db, 'garantias', 'data_desativacao', 'DATETIME')
+    criar_gatilhos(db)
+    db.execute("""
+        UPDATE garantias
+        SET data_desativacao = COALESCE(
+            (SELECT d.data_desativacao FROM garantias_desativadas d WHERE d.garantia_id = garantias.id),
+            datetime('now', 'localtime')
+        )
+        WHERE ativo = FALSE AND data_desativacao IS NULL
+    """)
+    logger.info(f"Data de desativação preenchida em {db.conn.changes()} garantias inativas")
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Captura de comandos SQL e análise de planos de consulta
+
+``CapturaConsultas`` registra, pelo exec_trace do apsw, todos os comandos
+executados na conexão enquanto está ativa (por exemplo durante uma
+requisição de teste). ``problemas_plano`` roda EXPLAIN QUERY PLAN em cada
+SELECT capturado e aponta os passos que não escalam:
+
+- ``SCAN`` de uma tabela grande sem índice (varredura completa);
+- ``USE TEMP B-TREE FOR ORDER BY`` (ordenação sem índice), quando pedido.
+
+Os testes de tests/test_planos_consulta.py usam estas funções para que
+uma mudança em filtro ou ordenação que troque uma busca indexada por uma
+varredura falhe no CI em vez de aparecer como lentidão em produção.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+from fastlite import Database
+
+# Tabelas que crescem com o uso (as demais são pequenas ou de controle)
+TABELAS_GRANDES = frozenset({'garantias', 'usuarios', 'veiculos', 'produtos', 'estabelecimentos'})
+
+ORDENACAO_TEMPORARIA = 'USE TEMP B-TREE FOR ORDER BY'
+
+# "SCAN g" ou "SCAN garantias AS g"; "SCAN g USING INDEX ..." percorre um índice
+_SCAN = re.compile(r'^SCAN (\w+)(?: AS (\w+))?(.*)$')
+# Aliases das tabelas no FROM/JOIN: "garantias g", "garantias AS g"
+_ALIAS = re.compile(r'\b(?:FROM|JOIN)\s+(?:\w+\.)?(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+
+
+@dataclass
+class ComandoCapturado:
+    """Comando executado na conexão e seus parâmetros"""
+    sql: str
+    params: Any
+
+    @property
+    def consulta(self) -> bool:
+        """Indica se é uma consulta (SELECT/WITH) cujo plano pode ser analisado"""
+        return self.sql.lstrip().upper().startswith(('SELECT', 'WITH'))
+
+
+class CapturaConsultas:
+    """
+    Registra os comandos executados na conexão dentro do bloco
+
+    O exec_trace anterior da conexão é restaurado na saída. Os comandos
+    EXPLAIN emitidos pela própria análise não são capturados.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.comandos: List[ComandoCapturado] = []
+        self._anterior = None
+
+    def _registrar(self, cursor, sql: str, params) -> bool:
+        if not sql.lstrip().upper().startswith('EXPLAIN'):
+            self.comandos.append(ComandoCapturado(sql, params))
+        return True
+
+    def __enter__(self) -> 'CapturaConsultas':
+        self._anterior = self.db.conn.exec_trace
+        self.db.conn.exec_trace = self._registrar
+        return self
+
+    def __exit__(self, *exc):
+        self.db.conn.exec_trace = self._anterior
+        return False
+
+    @property
+    def consultas(self) -> List[ComandoCapturado]:
+        """Apenas as consultas (SELECT/WITH) capturadas"""
+        return [comando for comando in self.comandos if comando.consulta]
+
+
+def plano_consulta(db: Database, sql: str, params: Any = None) -> List[str]:
+    """Passos (coluna ``detail``) do EXPLAIN QUERY PLAN da consulta"""
+    cursor = db.conn.cursor()
+    return [row[-1] for row in cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def _tabelas_por_alias(sql: str) -> dict:
+    """Mapeia aliases (e nomes) usados no FROM/JOIN para as tabelas"""
+    tabelas = {}
+    for tabela, alias in _ALIAS.findall(sql):
+        tabelas[tabela.lower()] = tabela.lower()
+        if alias and alias.upper() not in ('ON', 'WHERE', 'JOIN', 'LEFT', 'INNER', 'ORDER', 'GROUP', 'LIMIT'):
+            tabelas[alias.lower()] = tabela.lower()
+    return tabelas
+
+
+def problemas_plano(detalhes: Sequence[str], sql: str,
+                    tabelas_grandes: Iterable[str] = TABELAS_GRANDES,
+                    permitir_ordenacao_temporaria: bool = True) -> List[str]:
+    """
+    Passos do plano que indicam varredura ou ordenação sem índice
+
+    Args:
+        detalhes: Passos retornados por ``plano_consulta``
+        sql: Consulta analisada (para resolver os aliases das tabelas)
+        tabelas_grandes: Tabelas que não podem ser varridas por completo
+        permitir_ordenacao_temporaria: Se False, ``USE TEMP B-TREE FOR
+            ORDER BY`` também é um problema
+
+    Returns:
+        Lista de passos problemáticos (vazia se o plano está ok)
+    """
+    grandes = set(tabelas_grandes)
+    tabelas = _tabelas_por_alias(sql)
+    problemas = []
+    for detalhe in detalhes:
+        scan = _SCAN.match(detalhe)
+        if scan:
+            nome, alias, resto = scan.groups()
+            tabela = tabelas.get((alias or nome).lower(), nome.lower())
+            if tabela in grandes and 'INDEX' not in resto:
+                problemas.append(detalhe)
+        elif detalhe.startswith(ORDENACAO_TEMPORARIA) and not permitir_ordenacao_temporaria:
+            problemas.append(detalhe)
+    return problemas
+
+
+def analisar_captura(db: Database, captura: CapturaConsultas,
+                     **opcoes) -> List[Tuple[str, List[str]]]:
+    """
+    Problemas de plano de todas as consultas capturadas
+
+    Returns:
+        Lista de (sql, problemas) apenas das consultas com problemas
+    """
+    resultado = []
+    for comando in captura.consultas:
+        problemas = problemas_plano(plano_consulta(db, comando.sql, comando.params), comando.sql, **opcoes)
+        if problemas:
+            resultado.append((' '.join(comando.sql.split()), problemas))
+    return resultado
+
+
+def relatorio_orcamento(medicoes: Sequence[Tuple[str, int, Optional[int]]]) -> str:
+    """
+    Tabela de texto com comandos executados por rota e o orçamento
+
+    Args:
+        medicoes: Tuplas (rota, comandos, orcamento)
+    """
+    largura = max((len(rota) for rota, _, _ in medicoes), default=4)
+    linhas = [f"{'Rota'.ljust(largura)}  Comandos  Orçamento"]
+    for rota, comandos, orcamento in medicoes:
+        excedido = ' EXCEDIDO' if orcamento is not None and comandos > orcamento else ''
+        linhas.append(f"{rota.ljust(largura)}  {comandos:>8}  {orcamento if orcamento is not None else '-':>9}{excedido}")
+    return '\n'.join(linhas)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Recall por lote de fabricação
+
+Quando um lote de produção é suspeito, o recall localiza todas as
+garantias do lote (exato, prefixo ou intervalo de lotes) com os contatos
+dos clientes, agrega o resultado por produto, UF e estabelecimento
+instalador e exporta os clientes afetados em CSV.
+
+As buscas usam a coluna gerada ``garantias.lote_norm`` (migração 0013) e
+o índice ``idx_garantias_lote_norm``: o lote é comparado já normalizado,
+e prefixo e intervalo viram faixas ``>= / <`` percorridas no índice, em
+vez de ``LIKE '%lote%'`` varrendo a tabela inteira.
+"""
+
+import csv
+import io
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from fastlite import Database
+
+logger = logging.getLogger(__name__)
+
+# Normalização do lote em SQL (coluna gerada) e em Python (valores buscados).
+# As duas precisam produzir o mesmo texto: remove espaços, hífens, pontos e
+# barras e converte para maiúsculas (lotes são ASCII).
+LOTE_NORM_SQL = (
+    "UPPER(REPLACE(REPLACE(REPLACE(REPLACE({coluna}, ' ', ''), '-', ''), '.', ''), '/', ''))"
+)
+_SEPARADORES_LOTE = str.maketrans('', '', ' -./')
+
+# Modos de busca
+MODO_EXATO = 'exato'
+MODO_PREFIXO = 'prefixo'
+MODO_INTERVALO = 'intervalo'
+MODOS = (MODO_EXATO, MODO_PREFIXO, MODO_INTERVALO)
+
+# Agregações: dimensão -> colunas agrupadas
+DIMENSOES = {
+    'produto': ('p.sku', 'p.descricao'),
+    'uf': ('u.uf',),
+    'estabelecimento': ('g.nome_estabelecimento',),
+}
+
+LIMITE_RESULTADOS = 200
+TAMANHO_LOTE_EXPORTACAO = 1000
+
+_ORIGEM = (
+    "garantias g "
+    "JOIN usuarios u ON g.usuario_id = u.id "
+    "JOIN produtos p ON g.produto_id = p.id "
+    "JOIN veiculos v ON g.veiculo_id = v.id"
+)
+
+_COLUNAS = (
+    "g.id, g.lote_fabricacao, p.sku, p.descricao, u.nome, u.email, u.telefone, "
+    "u.cidade, u.uf, v.placa, g.nome_estabelecimento, g.data_instalacao, g.ativo"
+)
+
+CABECALHO_EXPORTACAO = [
+    'garantia_id', 'lote', 'sku', 'produto', 'cliente', 'email', 'telefone',
+    'cidade', 'uf', 'placa', 'estabelecimento', 'data_instalacao', 'ativa',
+]
+
+
+def normalizar_lote(valor: str) -> str:
+    """Normaliza um lote como a coluna lote_norm"""
+    return (valor or '').translate(_SEPARADORES_LOTE).upper()
+
+
+def _sucessor(prefixo: str) -> str:
+    """Menor texto maior que todos os que começam com o prefixo"""
+    return prefixo[:-1] + chr(ord(prefixo[-1]) + 1)
+
+
+def condicao_prefixo_lote(valor: str, coluna: str = 'g.lote_norm') -> Tuple[Optional[str], List[Any]]:
+    """Condição indexável para lotes que começam com ``valor``"""
+    prefixo = normalizar_lote(valor)
+    if not prefixo:
+        return None, []
+    return f"{coluna} >= ? AND {coluna} < ?", [prefixo, _sucessor(prefixo)]
+
+
+@dataclass(frozen=True)
+class CriterioRecall:
+    """Lotes buscados em um recall"""
+    modo: str
+    lote: str
+    lote_fim: str = ''
+
+    @property
+    def vazio(self) -> bool:
+        if self.modo == MODO_INTERVALO:
+            return not (self.lote and self.lote_fim)
+        return not self.lote
+
+    def condicao(self) -> Tuple[str, List[Any]]:
+        """Condição SQL sobre g.lote_norm e seus parâmetros"""
+        if self.modo == MODO_EXATO:
+            return "g.lote_norm = ?", [self.lote]
+        if self.modo == MODO_PREFIXO:
+            return condicao_prefixo_lote(self.lote)
+        inicio, fim = sorted((self.lote, self.lote_fim))
+        return "g.lote_norm BETWEEN ? AND ?", [inicio, fim]
+
+
+def ler_criterio(query_params: Mapping[str, str]) -> CriterioRecall:
+    """Critério de recall a partir da query string (lote, modo, lote_fim)"""
+    modo = query_params.get('modo', MODO_PREFIXO)
+    if modo not in MODOS:
+        modo = MODO_PREFIXO
+    return CriterioRecall(
+        modo=modo,
+        lote=normalizar_lote(query_params.get('lote', '')),
+        lote_fim=normalizar_lote(query_params.get('lote_fim', '')),
+    )
+
+
+def contar_garantias(db: Database, criterio: CriterioRecall) -> Dict[str, int]:
+    """Garantias, clientes e garantias ativas afetados"""
+    condicao, params = criterio.condicao()
+    row = db.execute(f"""
+        SELECT COUNT(*), COUNT(DISTINCT g.usuario_id), COALESCE(SUM(g.ativo = TRUE), 0)
+        FROM garantias g WHERE {condicao}
+    """, params).fetchone()
+    return {'garantias': row[0], 'clientes': row[1], 'ativas': row[2]}
+
+
+def buscar_garantias(db: Database, criterio: CriterioRecall,
+                     limite: int = LIMITE_RESULTADOS) -> List:
+    """
+    Garantias do critério com os contatos dos clientes
+
+    Colunas: id, lote, sku, descrição, cliente, email, telefone, cidade,
+    uf, placa, estabelecimento, data de instalação, ativo
+    """
+    condicao, params = criterio.condicao()
+    return db.execute(f"""
+        SELECT {_COLUNAS} FROM {_ORIGEM}
+        WHERE {condicao}
+        ORDER BY g.lote_norm, g.id
+        LIMIT ?
+    """, [*params, limite]).fetchall()
+
+
+def agregar(db: Database, criterio: CriterioRecall, dimensao: str) -> List:
+    """
+    Totais do critério agrupados por produto, UF ou estabelecimento
+
+    Returns:
+        Linhas (colunas da dimensão..., garantias, clientes), da maior para
+        a menor quantidade de garantias
+    """
+    colunas = ', '.join(DIMENSOES[dimensao])
+    condicao, params = criterio.condicao()
+    return db.execute(f"""
+        SELECT {colunas}, COUNT(*) AS garantias, COUNT(DISTINCT g.usuario_id) AS clientes
+        FROM {_ORIGEM}
+        WHERE {condicao}
+        GROUP BY {colunas}
+        ORDER BY garantias DESC, {colunas}
+    """, params).fetchall()
+
+
+def exportar_csv(db: Database, criterio: CriterioRecall,
+                 tamanho_lote: int = TAMANHO_LOTE_EXPORTACAO) -> Iterator[str]:
+    """
+    CSV dos clientes afetados, gerado em partes para StreamingResponse
+
+    As garantias são lidas em lotes pela chave (lote_norm, id), cada lote
+    numa consulta curta, então a exportação não segura um cursor aberto
+    na conexão compartilhada enquanto o cliente baixa o arquivo.
+    """
+    condicao, params = criterio.condicao()
+    sql = f"""
+        SELECT g.lote_norm, {_COLUNAS} FROM {_ORIGEM}
+        WHERE {condicao} AND (g.lote_norm, g.id) > (?, ?)
+        ORDER BY g.lote_norm, g.id
+        LIMIT ?
+    """
+
+    def linhas(rows) -> str:
+        saida = io.StringIO()
+        csv.writer(saida).writerows(rows)
+        return saida.getvalue()
+
+    yield linhas([CABECALHO_EXPORTACAO])
+
+    ultimo = ('', 0)
+    total = 0
+    while True:
+        rows = db.execute(sql, [*params, *ultimo, tamanho_lote]).fetchall()
+        if not rows:
+            break
+        ultimo = (rows[-1][0], rows[-1][1])
+        total += len(rows)
+        yield linhas([
+            [*row[1:13], 'sim' if row[13] else 'não']
+            for row in rows
+        ])
+    logger.info(f"Exportação de recall ({criterio.modo} {criterio.lote}): {total} garantias")
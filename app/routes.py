@@ -17,6 +17,9 @@ from models.veiculo import Veiculo
 from models.garantia import Garantia
 from app.date_utils import format_date_br, format_datetime_br_short, format_date_iso, format_datetime_iso
 from app.cep_service import consultar_cep_sync
+from app.tokens import FINALIDADE_CONFIRMACAO, emitir_token, usuario_do_token
+from app.unidade_trabalho import UnidadeTrabalho
+from app.database import estatisticas_armazenamento
 
 # Definir Row como um Div com classe Bootstrap
 Row = lambda *args, **kwargs: Div(*args, cls=f"row {kwargs.get('cls', '')}".strip(), **{k: v for k, v in kwargs.items() if k != 'cls'})
@@ -396,28 +399,29 @@ def setup_routes(app, db: Database):
                 telefone=form_data.get('telefone', ''),
                 cpf_cnpj=form_data.get('cpf_cnpj', ''),
                 data_nascimento=data_nascimento,
-                data_cadastro=datetime.now(),
-                token_confirmacao=Usuario.gerar_token_confirmacao()
+                data_cadastro=datetime.now()
             )
             
             logger.info(f"Inserindo usuário no banco: {usuario.email}")
-            # Inserir no banco
-            cursor = db.execute("""
-                INSERT INTO usuarios (
-                    email, senha_hash, nome, tipo_usuario, confirmado,
-                    cep, endereco, bairro, cidade, uf, telefone, cpf_cnpj,
-                    data_nascimento, data_cadastro, token_confirmacao
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                usuario.email, usuario.senha_hash, usuario.nome, usuario.tipo_usuario,
-                usuario.confirmado, usuario.cep, usuario.endereco, usuario.bairro,
-                usuario.cidade, usuario.uf, usuario.telefone, usuario.cpf_cnpj,
-                format_date_iso(usuario.data_nascimento) if usuario.data_nascimento else None,
-                format_datetime_iso(usuario.data_cadastro), usuario.token_confirmacao
-            ))
-            
-            # Obter o ID do usuário inserido
-            usuario_id = db.execute("SELECT last_insert_rowid()").fetchone()[0]
+            # Inserir o usuário e o token de confirmação em uma única transação
+            with UnidadeTrabalho(db) as uow:
+                usuario_id = uow.inserir('usuarios', {
+                    'email': usuario.email,
+                    'senha_hash': usuario.senha_hash,
+                    'nome': usuario.nome,
+                    'tipo_usuario': usuario.tipo_usuario,
+                    'confirmado': usuario.confirmado,
+                    'cep': usuario.cep,
+                    'endereco': usuario.endereco,
+                    'bairro': usuario.bairro,
+                    'cidade': usuario.cidade,
+                    'uf': usuario.uf,
+                    'telefone': usuario.telefone,
+                    'cpf_cnpj': usuario.cpf_cnpj,
+                    'data_nascimento': format_date_iso(usuario.data_nascimento) if usuario.data_nascimento else None,
+                    'data_cadastro': format_datetime_iso(usuario.data_cadastro),
+                })[0]
+                token_confirmacao = emitir_token(db, usuario_id, FINALIDADE_CONFIRMACAO)
             
             logger.info(f"Novo usuário cadastrado: {email} (ID: {usuario_id})")
             
@@ -427,7 +431,7 @@ def setup_routes(app, db: Database):
                 send_confirmation_email_async(
                     user_email=usuario.email,
                     user_name=usuario.nome,
-                    confirmation_token=usuario.token_confirmacao
+                    confirmation_token=token_confirmacao
                 )
                 logger.info(f"Email de confirmação agendado para envio assíncrono: {usuario.email}")
                     
@@ -504,17 +508,12 @@ def setup_routes(app, db: Database):
         
         # Buscar estatísticas do cliente
         try:
-            # Contar veículos
-            veiculos_count = db.execute(
-                "SELECT COUNT(*) FROM veiculos WHERE usuario_id = ? AND ativo = TRUE",
-                (user['usuario_id'],)
-            ).fetchone()[0]
-            
-            # Contar garantias ativas
-            garantias_count = db.execute(
-                "SELECT COUNT(*) FROM garantias WHERE usuario_id = ? AND ativo = TRUE",
+            # Veículos e garantias ativas (contadores mantidos por triggers)
+            contadores = db.execute(
+                "SELECT veiculos_ativos, garantias_ativas FROM usuarios WHERE id = ?",
                 (user['usuario_id'],)
-            ).fetchone()[0]
+            ).fetchone()
+            veiculos_count, garantias_count = contadores if contadores else (0, 0)
             
             # Últimas garantias
             ultimas_garantias = db.execute("""
@@ -624,6 +623,13 @@ def setup_routes(app, db: Database):
             stats = {'usuarios': 0, 'produtos': 0, 'veiculos': 0, 'garantias': 0}
             ultimas_ativacoes = []
         
+        # Tamanho e espaço livre dos arquivos (PRAGMAs, sem varrer tabelas)
+        try:
+            armazenamento = estatisticas_armazenamento(db)
+        except Exception as e:
+            logger.error(f"Erro ao buscar estatísticas do banco: {e}")
+            armazenamento = []
+        
         content = Container(
             Row(
                 Col(
@@ -693,6 +699,26 @@ def setup_routes(app, db: Database):
                     ),
                     width=12
                 )
+            ),
+            Row(
+                Col(
+                    card_component(
+                        "Banco de Dados",
+                        table_component(
+                            ["Banco", "Tamanho", "Páginas livres", "Fragmentação", "Auto vacuum"],
+                            [
+                                [
+                                    b['banco'],
+                                    f"{b['tamanho_bytes'] / (1024 * 1024):.1f} MB",
+                                    f"{b['paginas_livres']} ({b['livre_bytes'] / (1024 * 1024):.1f} MB)",
+                                    f"{b['fragmentacao_pct']}%",
+                                    b['auto_vacuum']
+                                ] for b in armazenamento
+                            ]
+                        ) if armazenamento else P("Estatísticas indisponíveis.", cls="text-muted")
+                    ),
+                    width=12
+                )
             )
         )
         
@@ -900,6 +926,7 @@ def setup_routes(app, db: Database):
                 "UPDATE usuarios SET nome = ?, telefone = ? WHERE id = ?",
                 (nome, telefone, user['usuario_id'])
             )
+            get_auth_manager().invalidar_usuario(user['usuario_id'])
             
             logger.info(f"Perfil atualizado para usuário {user['usuario_id']}")
             return RedirectResponse('/cliente/perfil?sucesso=atualizado', status_code=302)
@@ -936,10 +963,10 @@ def setup_routes(app, db: Database):
             return base_layout("Erro na Confirmação", content, show_nav=False)
         
         try:
-            # Buscar usuário pelo token
+            # Buscar usuário pelo token (índice único do hash na tabela tokens)
             result = db.execute(
-                "SELECT id, nome, email FROM usuarios WHERE token_confirmacao = ? AND confirmado = FALSE",
-                (token,)
+                "SELECT id, nome, email FROM usuarios WHERE id = ? AND confirmado = FALSE",
+                (usuario_do_token(db, token, FINALIDADE_CONFIRMACAO),)
             ).fetchone()
             
             if not result:
@@ -3,15 +3,36 @@
 Rotas administrativas
 """
 
+import asyncio
+import json
 import logging
 import math
 from datetime import datetime
+from pathlib import Path
 from fasthtml.common import *
 from monsterui.all import *
 from fastlite import Database
-from app.auth import admin_required, get_current_user
+from app.auth import admin_required, get_current_user, get_auth_manager
 from app.templates import *
 from app.filter_component import filter_component
+from app.services.catalogo_produtos import invalidar_catalogo_produtos
+from app.tokens import FINALIDADE_CONFIRMACAO, emitir_token, revogar_tokens
+from app.unidade_trabalho import UnidadeTrabalho
+from app.consulta_listagem import (
+    LISTAGEM_ESTABELECIMENTOS, LISTAGEM_GARANTIAS_ADMIN, LISTAGEM_GARANTIAS_ADMIN_HISTORICO,
+    LISTAGEM_PRODUTOS, LISTAGEM_USUARIOS
+)
+from app.arquivamento import arquivo_anexado, excluir_arquivadas_do_usuario, tabela_garantias
+from app.recall import (
+    LIMITE_RESULTADOS, MODO_EXATO, MODO_INTERVALO, MODO_PREFIXO,
+    agregar, buscar_garantias, contar_garantias, exportar_csv, ler_criterio
+)
+from app.jobs import (
+    STATUS_FINAIS, TIPO_IMPORTACAO_CASPIO, TIPO_SINCRONIZACAO_PRODUTOS, get_gerenciador_jobs
+)
+from app.garantia_status import (
+    STATUS_EXIBICAO, STATUS_OPCOES_FILTRO, STATUS_PROXIMA, status_sql, dias_para_vencimento_sql, filtro_status_sql
+)
 from models.usuario import Usuario
 from models.produto import Produto
 from app.date_utils import format_date_br, format_datetime_br_short, format_datetime_br, format_datetime_iso, parse_iso_date
@@ -21,8 +42,23 @@ Row = lambda *args, **kwargs: Div(*args, cls=f"row {kwargs.get('cls', '')}".stri
 
 logger = logging.getLogger(__name__)
 
-def setup_admin_routes(app, db: Database):
-    """Configura rotas administrativas"""
+# Intervalo (s) entre as consultas de progresso no stream de eventos de um job
+INTERVALO_EVENTOS_JOB = 0.5
+
+# Diretório dos XMLs do Caspio quando não configurado (Config.CASPIO_IMPORT_DIR)
+DIRETORIO_CASPIO_PADRAO = Path(__file__).parent.parent / 'data' / 'caspio'
+
+def setup_admin_routes(app, db: Database, config=None):
+    """
+    Configura rotas administrativas
+    
+    Args:
+        app: Aplicação FastHTML
+        db: Banco da aplicação
+        config: Configuração (opcional; usa os padrões do módulo se ausente)
+    """
+    
+    gerenciador_jobs = get_gerenciador_jobs(db)
     
     # ===== GERENCIAMENTO DE USUÁRIOS =====
     
@@ -49,55 +85,10 @@ def setup_admin_routes(app, db: Database):
         # Calcular offset
         offset = (page - 1) * page_size
         
-        # Parâmetros de ordenação
-        sort_field = request.query_params.get('sort', 'data_cadastro')
-        sort_direction = request.query_params.get('direction', 'desc')
-        
-        # Validar campo de ordenação
-        valid_sort_fields = {
-            'nome': 'nome',
-            'email': 'email', 
-            'tipo_usuario': 'tipo_usuario',
-            'confirmado': 'confirmado',
-            'data_cadastro': 'data_cadastro'
-        }
-        
-        if sort_field not in valid_sort_fields:
-            sort_field = 'data_cadastro'
-        
-        if sort_direction not in ['asc', 'desc']:
-            sort_direction = 'desc'
-        
-        # Parâmetros de filtro
-        filtros = {
-            'nome': request.query_params.get('nome', '').strip(),
-            'email': request.query_params.get('email', '').strip(),
-            'tipo_usuario': request.query_params.get('tipo_usuario', '').strip(),
-            'confirmado': request.query_params.get('confirmado', '').strip()
-        }
-        
-        # Construir query com filtros
-        where_conditions = []
-        params = []
-        
-        if filtros['nome']:
-            where_conditions.append("nome LIKE ?")
-            params.append(f"%{filtros['nome']}%")
-        
-        if filtros['email']:
-            where_conditions.append("email LIKE ?")
-            params.append(f"%{filtros['email']}%")
-        
-        if filtros['tipo_usuario']:
-            where_conditions.append("tipo_usuario = ?")
-            params.append(filtros['tipo_usuario'])
-        
-        if filtros['confirmado']:
-            confirmado_bool = filtros['confirmado'] == 'true'
-            where_conditions.append("confirmado = ?")
-            params.append(confirmado_bool)
-        
-        where_clause = " WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+        # Filtros e ordenação validados pela definição da listagem
+        consulta = LISTAGEM_USUARIOS.montar(request.query_params)
+        filtros = consulta.filtros
+        sort_field, sort_direction = consulta.sort_field, consulta.sort_direction
         
         # Verificar mensagens na query string
         sucesso = request.query_params.get('sucesso')
@@ -130,18 +121,10 @@ def setup_admin_routes(app, db: Database):
         
         try:
             # Contar total de usuários com filtros
-            count_query = f"SELECT COUNT(*) FROM usuarios{where_clause}"
-            total_usuarios = db.execute(count_query, params).fetchone()[0]
+            total_usuarios = consulta.contar(db)
             
             # Buscar usuários com paginação, filtros e ordenação
-            select_query = f"""
-                SELECT id, email, nome, tipo_usuario, confirmado, email_enviado, data_cadastro
-                FROM usuarios 
-                {where_clause}
-                ORDER BY {sort_field} {sort_direction.upper()}
-                LIMIT ? OFFSET ?
-            """
-            usuarios = db.execute(select_query, params + [page_size, offset]).fetchall()
+            usuarios = consulta.buscar(db, page_size, offset)
             
         except Exception as e:
             logger.error(f"Erro ao buscar usuários: {e}")
@@ -212,6 +195,32 @@ def setup_admin_routes(app, db: Database):
             ]}
         ]
         
+        # Tabela + paginação: único trecho devolvido nas requisições HTMX
+        listagem = listagem_component(
+            table_component(
+                ["Nome", "Email", "Tipo", "Confirmação", "Email Enviado", "Cadastro", "Ações"],
+                dados_tabela,
+                sortable_columns=["nome", "email", "tipo_usuario", "confirmado", "", "data_cadastro", ""],
+                current_sort=sort_field,
+                sort_direction=sort_direction,
+                base_url="/admin/usuarios",
+                query_params=request.query_params,
+                hx_target=f"#{ALVO_LISTAGEM}"
+            ) if usuarios else P("Nenhum usuário cadastrado ainda.", cls="text-muted text-center py-4"),
+            # Adicionar paginação
+            pagination_component(
+                current_page=page,
+                total_pages=math.ceil(total_usuarios / page_size) if total_usuarios > 0 else 1,
+                base_url="/admin/usuarios",
+                page_size=page_size,
+                total_records=total_usuarios,
+                query_params=request.query_params,
+                hx_target=f"#{ALVO_LISTAGEM}"
+            ) if total_usuarios > 0 else None
+        )
+        if requisicao_htmx(request):
+            return listagem
+        
         content = Container(
             Row(
                 Col(
@@ -245,30 +254,14 @@ def setup_admin_routes(app, db: Database):
             filter_component(
                 fields=filter_fields,
                 current_filters=filtros,
-                action_url="/admin/usuarios"
+                action_url="/admin/usuarios",
+                hx_target=f"#{ALVO_LISTAGEM}"
             ),
             Row(
                 Col(
                     card_component(
                         "Usuários Cadastrados",
-                        Div(
-                            table_component(
-                                ["Nome", "Email", "Tipo", "Confirmação", "Email Enviado", "Cadastro", "Ações"],
-                                dados_tabela,
-                                sortable_columns=["nome", "email", "tipo_usuario", "confirmado", "", "data_cadastro", ""],
-                                current_sort=sort_field,
-                                sort_direction=sort_direction,
-                                base_url="/admin/usuarios"
-                            ) if usuarios else P("Nenhum usuário cadastrado ainda.", cls="text-muted text-center py-4"),
-                            # Adicionar paginação
-                            pagination_component(
-                                current_page=page,
-                                total_pages=math.ceil(total_usuarios / page_size) if total_usuarios > 0 else 1,
-                                base_url="/admin/usuarios",
-                                page_size=page_size,
-                                total_records=total_usuarios
-                            ) if total_usuarios > 0 else None
-                        )
+                        listagem
                     ),
                     width=12
                 )
@@ -473,24 +466,21 @@ def setup_admin_routes(app, db: Database):
                 confirmado=confirmado,
                 cpf_cnpj=cpf_cnpj,
                 telefone=telefone,
-                data_cadastro=datetime.now(),
-                token_confirmacao=Usuario.gerar_token_confirmacao() if not confirmado else None
+                data_cadastro=datetime.now()
             )
             
-            # Inserir no banco
-            db.execute("""
-                INSERT INTO usuarios (
-                    email, senha_hash, nome, tipo_usuario, confirmado,
-                    cpf_cnpj, telefone, data_cadastro, token_confirmacao
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                usuario.email, usuario.senha_hash, usuario.nome, usuario.tipo_usuario,
-                usuario.confirmado, usuario.cpf_cnpj, usuario.telefone,
-                format_datetime_iso(usuario.data_cadastro), usuario.token_confirmacao
-            ))
-            
-            # Obter o ID do usuário inserido
-            usuario_id = db.execute("SELECT last_insert_rowid()").fetchone()[0]
+            # Inserir no banco (RETURNING devolve o id no mesmo comando)
+            with UnidadeTrabalho(db) as uow:
+                usuario_id = uow.inserir('usuarios', {
+                    'email': usuario.email,
+                    'senha_hash': usuario.senha_hash,
+                    'nome': usuario.nome,
+                    'tipo_usuario': usuario.tipo_usuario,
+                    'confirmado': usuario.confirmado,
+                    'cpf_cnpj': usuario.cpf_cnpj,
+                    'telefone': usuario.telefone,
+                    'data_cadastro': format_datetime_iso(usuario.data_cadastro),
+                })[0]
             
             logger.info(f"Novo usuário criado pelo admin {user['usuario_id']}: {email} (ID: {usuario_id})")
             
@@ -535,23 +525,18 @@ def setup_admin_routes(app, db: Database):
             # Buscar usuário
             usuario = db.execute("""
                 SELECT id, email, nome, tipo_usuario, confirmado, cep, endereco, bairro,
-                       cidade, uf, telefone, cpf_cnpj, data_nascimento, data_cadastro
+                       cidade, uf, telefone, cpf_cnpj, data_nascimento, data_cadastro,
+                       veiculos_ativos, garantias_ativas
                 FROM usuarios WHERE id = ?
             """, (usuario_id,)).fetchone()
             
             if not usuario:
                 return RedirectResponse('/admin/usuarios?erro=nao_encontrado', status_code=302)
             
-            # Buscar estatísticas do usuário
+            # Estatísticas do usuário (contadores mantidos por triggers)
             stats = {
-                'veiculos': db.execute(
-                    "SELECT COUNT(*) FROM veiculos WHERE usuario_id = ? AND ativo = TRUE",
-                    (usuario_id,)
-                ).fetchone()[0],
-                'garantias': db.execute(
-                    "SELECT COUNT(*) FROM garantias WHERE usuario_id = ? AND ativo = TRUE",
-                    (usuario_id,)
-                ).fetchone()[0]
+                'veiculos': usuario[14],
+                'garantias': usuario[15]
             }
             
         except Exception as e:
@@ -922,6 +907,7 @@ def setup_admin_routes(app, db: Database):
                 endereco or None, bairro or None, cidade or None, 
                 uf or None, usuario_id
             ))
+            get_auth_manager().invalidar_usuario(usuario_id)
             
             logger.info(f"Usuário {usuario_id} editado pelo admin {user['usuario_id']}")
             
@@ -954,68 +940,17 @@ def setup_admin_routes(app, db: Database):
         # Calcular offset
         offset = (page - 1) * page_size
         
-        # Parâmetros de ordenação
-        sort_field = request.query_params.get('sort', 'sku')
-        sort_direction = request.query_params.get('direction', 'asc')
-        
-        # Validar campo de ordenação
-        valid_sort_fields = {
-            'sku': 'sku',
-            'descricao': 'descricao',
-            'ativo': 'ativo',
-            'data_cadastro': 'data_cadastro'
-        }
-        
-        if sort_field not in valid_sort_fields:
-            sort_field = 'sku'
-        
-        if sort_direction not in ['asc', 'desc']:
-            sort_direction = 'asc'
-            page_size = 50
-        
-        # Calcular offset
-        offset = (page - 1) * page_size
-        
-        # Parâmetros de filtro
-        filtros = {
-            'sku': request.query_params.get('sku', '').strip(),
-            'descricao': request.query_params.get('descricao', '').strip(),
-            'ativo': request.query_params.get('ativo', '').strip()
-        }
-        
-        # Construir query com filtros
-        where_conditions = []
-        params = []
-        
-        if filtros['sku']:
-            where_conditions.append("sku LIKE ?")
-            params.append(f"%{filtros['sku']}%")
-        
-        if filtros['descricao']:
-            where_conditions.append("descricao LIKE ?")
-            params.append(f"%{filtros['descricao']}%")
-        
-        if filtros['ativo']:
-            ativo_bool = filtros['ativo'] == 'true'
-            where_conditions.append("ativo = ?")
-            params.append(ativo_bool)
-        
-        where_clause = " WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+        # Filtros e ordenação validados pela definição da listagem
+        consulta = LISTAGEM_PRODUTOS.montar(request.query_params)
+        filtros = consulta.filtros
+        sort_field, sort_direction = consulta.sort_field, consulta.sort_direction
         
         try:
             # Contar total de produtos com filtros
-            count_query = f"SELECT COUNT(*) FROM produtos{where_clause}"
-            total_produtos = db.execute(count_query, params).fetchone()[0]
+            total_produtos = consulta.contar(db)
             
             # Buscar produtos com paginação, filtros e ordenação
-            select_query = f"""
-                SELECT id, sku, descricao, ativo, data_cadastro
-                FROM produtos 
-                {where_clause}
-                ORDER BY {sort_field} {sort_direction.upper()}
-                LIMIT ? OFFSET ?
-            """
-            produtos = db.execute(select_query, params + [page_size, offset]).fetchall()
+            produtos = consulta.buscar(db, page_size, offset)
             
         except Exception as e:
             logger.error(f"Erro ao buscar produtos: {e}")
@@ -1058,6 +993,31 @@ def setup_admin_routes(app, db: Database):
             ]}
         ]
         
+        # Tabela + paginação: único trecho devolvido nas requisições HTMX
+        listagem = listagem_component(
+            table_component(
+                ["SKU", "Descrição", "Status", "Cadastro", "Ações"],
+                dados_tabela,
+                sortable_columns=["sku", "descricao", "ativo", "data_cadastro", ""],
+                current_sort=sort_field,
+                sort_direction=sort_direction,
+                base_url="/admin/produtos",
+                query_params=request.query_params,
+                hx_target=f"#{ALVO_LISTAGEM}"
+            ) if produtos else P("Nenhum produto cadastrado ainda.", cls="text-muted text-center py-4"),
+            pagination_component(
+                current_page=page,
+                total_pages=total_pages,
+                base_url="/admin/produtos",
+                page_size=page_size,
+                total_records=total_produtos,
+                query_params=request.query_params,
+                hx_target=f"#{ALVO_LISTAGEM}"
+            ) if total_produtos > 0 else None
+        )
+        if requisicao_htmx(request):
+            return listagem
+        
         content = Container(
             Row(
                 Col(
@@ -1076,29 +1036,14 @@ def setup_admin_routes(app, db: Database):
             filter_component(
                 fields=filter_fields,
                 current_filters=filtros,
-                action_url="/admin/produtos"
+                action_url="/admin/produtos",
+                hx_target=f"#{ALVO_LISTAGEM}"
             ),
             Row(
                 Col(
                     card_component(
                         "Produtos Cadastrados",
-                        Div(
-                            table_component(
-                                ["SKU", "Descrição", "Status", "Cadastro", "Ações"],
-                                dados_tabela,
-                                sortable_columns=["sku", "descricao", "ativo", "data_cadastro", ""],
-                                current_sort=sort_field,
-                                sort_direction=sort_direction,
-                                base_url="/admin/produtos"
-                            ) if produtos else P("Nenhum produto cadastrado ainda.", cls="text-muted text-center py-4"),
-                            pagination_component(
-                                current_page=page,
-                                total_pages=total_pages,
-                                base_url="/admin/produtos",
-                                page_size=page_size,
-                                total_records=total_produtos
-                            ) if total_produtos > 0 else None
-                        )
+                        listagem
                     ),
                     width=12
                 )
@@ -1133,6 +1078,9 @@ def setup_admin_routes(app, db: Database):
             
             alert_message = f"Sincronização concluída! Total ERP: {total}, Inseridos: {inseridos}, Atualizados: {atualizados}, Inalterados: {inalterados}, Erros: {erros}"
             alert_type = "success"
+        elif sucesso == 'sync_cancelada':
+            alert_message = "Sincronização cancelada. Os lotes já gravados foram mantidos."
+            alert_type = "warning"
         elif erro == 'conexao_firebird':
             alert_message = "Erro ao conectar com o ERP Tecnicon. Verifique as configurações."
             alert_type = "danger"
@@ -1252,7 +1200,37 @@ def setup_admin_routes(app, db: Database):
                             .then(response => response.json())
                             .then(data => {
                                 if (data.success) {
-                                    const stats = data.stats;
+                                    acompanharSincronizacao(data.job_id);
+                                } else {
+                                    const errorDetail = encodeURIComponent(data.error || 'Erro desconhecido');
+                                    window.location.href = '/admin/produtos/sync?erro=sync_falhou&erro_detalhe=' + errorDetail;
+                                }
+                            })
+                            .catch(error => {
+                                console.error('Erro:', error);
+                                const errorDetail = encodeURIComponent(error.message || 'Erro de conexão');
+                                window.location.href = '/admin/produtos/sync?erro=sync_falhou&erro_detalhe=' + errorDetail;
+                            });
+                        }
+                        
+                        function acompanharSincronizacao(jobId) {
+                            const statusDiv = document.getElementById('statusSincronizacao');
+                            const eventos = new EventSource('/admin/jobs/' + jobId + '/eventos');
+                            
+                            eventos.addEventListener('progresso', function(e) {
+                                const job = JSON.parse(e.data);
+                                statusDiv.innerHTML =
+                                    '<div class="alert alert-info d-flex justify-content-between align-items-center">' +
+                                    '<span>' + (job.mensagem || 'Aguardando início da sincronização...') + '</span>' +
+                                    '<button type="button" class="btn btn-sm btn-outline-danger" onclick="cancelarJob(' + jobId + ')">Cancelar</button>' +
+                                    '</div>';
+                            });
+                            
+                            eventos.addEventListener('fim', function(e) {
+                                eventos.close();
+                                const job = JSON.parse(e.data);
+                                if (job.status === 'concluido') {
+                                    const stats = job.resultado;
                                     const params = new URLSearchParams({
                                         sucesso: 'sync_concluida',
                                         total: stats.total_erp,
@@ -1262,20 +1240,23 @@ def setup_admin_routes(app, db: Database):
                                         erros: stats.erros
                                     });
                                     window.location.href = '/admin/produtos/sync?' + params.toString();
+                                } else if (job.status === 'cancelado') {
+                                    window.location.href = '/admin/produtos/sync?sucesso=sync_cancelada';
                                 } else {
-                                    const errorDetail = encodeURIComponent(data.error || 'Erro desconhecido');
+                                    const errorDetail = encodeURIComponent(job.erro || 'Erro desconhecido');
                                     window.location.href = '/admin/produtos/sync?erro=sync_falhou&erro_detalhe=' + errorDetail;
                                 }
-                            })
-                            .catch(error => {
-                                console.error('Erro:', error);
-                                const errorDetail = encodeURIComponent(error.message || 'Erro de conexão');
-                                window.location.href = '/admin/produtos/sync?erro=sync_falhou&erro_detalhe=' + errorDetail;
-                            })
-                            .finally(() => {
-                                btnSincronizar.disabled = false;
-                                btnSincronizar.innerHTML = 'Atualizar Produtos do ERP';
                             });
+                            
+                            eventos.onerror = function() {
+                                eventos.close();
+                                window.location.href = '/admin/produtos/sync?erro=sync_falhou&erro_detalhe=' +
+                                    encodeURIComponent('Conexão com o servidor perdida');
+                            };
+                        }
+                        
+                        function cancelarJob(jobId) {
+                            fetch('/admin/jobs/' + jobId + '/cancelar', { method: 'POST' });
                         }
                     """)
                 )
@@ -1306,31 +1287,125 @@ def setup_admin_routes(app, db: Database):
     @app.post("/admin/produtos/sync-execute")
     @admin_required
     def execute_produtos_sync(request):
-        """Executa sincronização de produtos com ERP"""
+        """Enfileira a sincronização de produtos com ERP como job em segundo plano"""
+        user = request.state.usuario
+        
         try:
-            from app.services import get_firebird_service
-            from app.config import Config
-            
-            config = Config()
-            firebird_service = get_firebird_service(config)
-            
-            # Executar sincronização
-            stats = firebird_service.sync_produtos(db)
+            job_id = gerenciador_jobs.enfileirar(
+                TIPO_SINCRONIZACAO_PRODUTOS, usuario_id=user['usuario_id']
+            )
             
-            logger.info(f"Sincronização de produtos concluída: {stats}")
+            logger.info(f"Sincronização de produtos enfileirada como job {job_id}")
             
             return {
                 "success": True,
-                "stats": stats
+                "job_id": job_id
             }
             
         except Exception as e:
-            logger.error(f"Erro durante sincronização de produtos: {e}")
+            logger.error(f"Erro ao iniciar sincronização de produtos: {e}")
             return {
                 "success": False,
                 "error": str(e)
             }
     
+    # ===== JOBS EM SEGUNDO PLANO =====
+    
+    @app.post("/admin/caspio/importar")
+    @admin_required
+    async def importar_caspio(request):
+        """
+        Enfileira a importação de um XML do Caspio já presente no servidor
+        
+        Só são aceitos arquivos dentro de CASPIO_IMPORT_DIR; o caminho
+        informado é relativo a esse diretório e é resolvido (links e "..")
+        antes da verificação.
+        """
+        user = request.state.usuario
+        form_data = await request.form()
+        nome_arquivo = form_data.get('caminho_xml', '').strip()
+        diretorio = Path(getattr(config, 'CASPIO_IMPORT_DIR', DIRETORIO_CASPIO_PADRAO)).resolve()
+        caminho_xml = (diretorio / nome_arquivo).resolve()
+        
+        if not nome_arquivo or not caminho_xml.is_relative_to(diretorio):
+            logger.warning(f"Importação do Caspio recusada: {nome_arquivo!r} fora de {diretorio}")
+            return {
+                "success": False,
+                "error": "Arquivo fora do diretório de importação do Caspio"
+            }
+        
+        if not caminho_xml.is_file():
+            return {
+                "success": False,
+                "error": "Arquivo XML do Caspio não encontrado"
+            }
+        
+        try:
+            job_id = gerenciador_jobs.enfileirar(
+                TIPO_IMPORTACAO_CASPIO, {'caminho_xml': str(caminho_xml)}, usuario_id=user['usuario_id']
+            )
+            logger.info(f"Importação do Caspio enfileirada como job {job_id}: {caminho_xml}")
+            return {
+                "success": True,
+                "job_id": job_id
+            }
+        except Exception as e:
+            logger.error(f"Erro ao iniciar importação do Caspio: {e}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+    
+    @app.get("/admin/jobs/{job_id}")
+    @admin_required
+    def status_job(request):
+        """Retorna o estado atual de um job em JSON"""
+        job = gerenciador_jobs.obter(int(request.path_params['job_id']))
+        if not job:
+            return JSONResponse({"error": "Job não encontrado"}, status_code=404)
+        return JSONResponse(job)
+    
+    @app.get("/admin/jobs/{job_id}/eventos")
+    @admin_required
+    async def eventos_job(request):
+        """Transmite o progresso de um job via Server-Sent Events até o fim"""
+        job_id = int(request.path_params['job_id'])
+        
+        async def gerar_eventos():
+            ultimo = None
+            while True:
+                # obter pode consultar o SQLite: roda fora do event loop
+                job = await asyncio.to_thread(gerenciador_jobs.obter, job_id)
+                if job is None:
+                    yield 'event: fim\ndata: {"status": "falhou", "erro": "Job não encontrado"}\n\n'
+                    return
+                
+                dados = json.dumps(job, default=str)
+                if job['status'] in STATUS_FINAIS:
+                    yield f"event: fim\ndata: {dados}\n\n"
+                    return
+                if dados != ultimo:
+                    yield f"event: progresso\ndata: {dados}\n\n"
+                    ultimo = dados
+                
+                if await request.is_disconnected():
+                    return
+                await asyncio.sleep(INTERVALO_EVENTOS_JOB)
+        
+        return StreamingResponse(
+            gerar_eventos(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    
+    @app.post("/admin/jobs/{job_id}/cancelar")
+    @admin_required
+    def cancelar_job(request):
+        """Solicita o cancelamento de um job"""
+        job_id = int(request.path_params['job_id'])
+        cancelado = gerenciador_jobs.cancelar(job_id)
+        return {"success": cancelado}
+    
     # ===== ROTAS COM PARÂMETROS =====
     # Estas rotas devem vir DEPOIS das rotas específicas para evitar conflitos
     
@@ -1538,16 +1613,15 @@ def setup_admin_routes(app, db: Database):
                 data_cadastro=datetime.now()
             )
             
-            # Inserir no banco
-            db.execute("""
-                INSERT INTO produtos (sku, descricao, ativo, data_cadastro)
-                VALUES (?, ?, ?, ?)
-            """, (
-                produto.sku, produto.descricao, produto.ativo, format_datetime_iso(produto.data_cadastro)
-            ))
-            
-            # Obter o ID do produto inserido
-            produto_id = db.execute("SELECT last_insert_rowid()").fetchone()[0]
+            # Inserir no banco (RETURNING devolve o id no mesmo comando)
+            with UnidadeTrabalho(db) as uow:
+                produto_id = uow.inserir('produtos', {
+                    'sku': produto.sku,
+                    'descricao': produto.descricao,
+                    'ativo': produto.ativo,
+                    'data_cadastro': format_datetime_iso(produto.data_cadastro),
+                })[0]
+            invalidar_catalogo_produtos()
             
             logger.info(f"Novo produto cadastrado: {sku} (ID: {produto_id}) pelo admin {user['usuario_id']}")
             
@@ -1581,6 +1655,7 @@ def setup_admin_routes(app, db: Database):
                 "UPDATE produtos SET ativo = ? WHERE id = ?",
                 (novo_status, produto_id)
             )
+            invalidar_catalogo_produtos()
             
             action = "ativado" if novo_status else "desativado"
             logger.info(f"Produto {produto_id} {action} pelo admin {user['usuario_id']}")
@@ -1751,10 +1826,11 @@ def setup_admin_routes(app, db: Database):
             # Atualizar produto
             db.execute(
                 """UPDATE produtos 
-                   SET sku = ?, descricao = ?, ativo = ?, data_atualizacao = CURRENT_TIMESTAMP
+                   SET sku = ?, descricao = ?, ativo = ?, data_atualizacao = datetime('now', 'localtime')
                    WHERE id = ?""",
                 (sku, descricao, ativo, produto_id)
             )
+            invalidar_catalogo_produtos()
             
             logger.info(f"Produto {produto_id} editado pelo admin {user['usuario_id']}")
             
@@ -1785,108 +1861,22 @@ def setup_admin_routes(app, db: Database):
         # Calcular offset
         offset = (page - 1) * page_size
         
-        # Parâmetros de ordenação
-        sort_field = request.query_params.get('sort', 'data_cadastro')
-        sort_direction = request.query_params.get('direction', 'desc')
-        
-        # Validar campo de ordenação
-        valid_sort_fields = {
-            'id': 'g.id',
-            'cliente_nome': 'u.nome',
-            'produto_sku': 'p.sku',
-            'veiculo_marca': 'v.marca',
-            'data_instalacao': 'g.data_instalacao',
-            'data_vencimento': 'g.data_vencimento',
-            'ativo': 'g.ativo',
-            'data_cadastro': 'g.data_cadastro'
-        }
-        
-        if sort_field not in valid_sort_fields:
-            sort_field = 'data_cadastro'
-        
-        if sort_direction not in ['asc', 'desc']:
-            sort_direction = 'desc'
-        
-        # Parâmetros de filtro
-        filtros = {
-            'cliente_nome': request.query_params.get('cliente_nome', '').strip(),
-            'cliente_email': request.query_params.get('cliente_email', '').strip(),
-            'produto_sku': request.query_params.get('produto_sku', '').strip(),
-            'produto_descricao': request.query_params.get('produto_descricao', '').strip(),
-            'veiculo_marca': request.query_params.get('veiculo_marca', '').strip(),
-            'veiculo_modelo': request.query_params.get('veiculo_modelo', '').strip(),
-            'veiculo_placa': request.query_params.get('veiculo_placa', '').strip(),
-            'lote_fabricacao': request.query_params.get('lote_fabricacao', '').strip(),
-            'ativo': request.query_params.get('ativo', '').strip()
-        }
-        
-        # Construir query com filtros
-        where_conditions = []
-        params = []
-        
-        if filtros['cliente_nome']:
-            where_conditions.append("u.nome LIKE ?")
-            params.append(f"%{filtros['cliente_nome']}%")
-        
-        if filtros['cliente_email']:
-            where_conditions.append("u.email LIKE ?")
-            params.append(f"%{filtros['cliente_email']}%")
-        
-        if filtros['produto_sku']:
-            where_conditions.append("p.sku LIKE ?")
-            params.append(f"%{filtros['produto_sku']}%")
-        
-        if filtros['produto_descricao']:
-            where_conditions.append("p.descricao LIKE ?")
-            params.append(f"%{filtros['produto_descricao']}%")
-        
-        if filtros['veiculo_marca']:
-            where_conditions.append("v.marca LIKE ?")
-            params.append(f"%{filtros['veiculo_marca']}%")
-        
-        if filtros['veiculo_modelo']:
-            where_conditions.append("v.modelo LIKE ?")
-            params.append(f"%{filtros['veiculo_modelo']}%")
-        
-        if filtros['veiculo_placa']:
-            where_conditions.append("v.placa LIKE ?")
-            params.append(f"%{filtros['veiculo_placa']}%")
-        
-        if filtros['lote_fabricacao']:
-            where_conditions.append("g.lote_fabricacao LIKE ?")
-            params.append(f"%{filtros['lote_fabricacao']}%")
-        
-        if filtros['ativo']:
-            ativo_bool = filtros['ativo'] == 'true'
-            where_conditions.append("g.ativo = ?")
-            params.append(ativo_bool)
-        
-        where_clause = " WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+        # Garantias arquivadas só entram quando pedidas (visão sobre o banco de arquivo)
+        historico_disponivel = arquivo_anexado(db)
+        incluir_arquivadas = historico_disponivel and request.query_params.get('incluir_arquivadas') == 'true'
+        listagem_garantias = LISTAGEM_GARANTIAS_ADMIN_HISTORICO if incluir_arquivadas else LISTAGEM_GARANTIAS_ADMIN
+        
+        # Filtros e ordenação validados pela definição da listagem
+        consulta = listagem_garantias.montar(request.query_params)
+        filtros = {**consulta.filtros, 'incluir_arquivadas': 'true' if incluir_arquivadas else ''}
+        sort_field, sort_direction = consulta.sort_field, consulta.sort_direction
         
         try:
             # Contar total de garantias com filtros
-            count_query = f"""
-                SELECT COUNT(*) FROM garantias g
-                JOIN usuarios u ON g.usuario_id = u.id
-                JOIN produtos p ON g.produto_id = p.id
-                JOIN veiculos v ON g.veiculo_id = v.id
-                {where_clause}
-            """
-            total_garantias = db.execute(count_query, params).fetchone()[0]
-            
-            # Buscar garantias com dados relacionados (com paginação, filtros e ordenação)
-            select_query = f"""
-                SELECT g.id, u.nome, u.email, p.sku, p.descricao, v.marca, v.modelo, v.placa,
-                       g.lote_fabricacao, g.data_instalacao, g.data_cadastro, g.data_vencimento, g.ativo
-                FROM garantias g
-                JOIN usuarios u ON g.usuario_id = u.id
-                JOIN produtos p ON g.produto_id = p.id
-                JOIN veiculos v ON g.veiculo_id = v.id
-                {where_clause}
-                ORDER BY {valid_sort_fields[sort_field]} {sort_direction.upper()}
-                LIMIT ? OFFSET ?
-            """
-            garantias = db.execute(select_query, params + [page_size, offset]).fetchall()
+            total_garantias = consulta.contar(db)
+            
+            # Buscar garantias com dados relacionados (status calculado na consulta)
+            garantias = consulta.buscar(db, page_size, offset)
             
         except Exception as e:
             logger.error(f"Erro ao buscar garantias: {e}")
@@ -1896,21 +1886,11 @@ def setup_admin_routes(app, db: Database):
         # Preparar dados para a tabela
         dados_tabela = []
         for g in garantias:
-            # Verificar se está vencida
-            try:
-                vencida = g[11] and parse_iso_date(g[11]).date() < datetime.now().date() if g[11] else False
-            except (ValueError, TypeError):
-                vencida = False
-            
-            if not g[12]:  # Inativa
-                status = "Inativa"
-                status_class = "secondary"
-            elif vencida:
-                status = "Vencida"
-                status_class = "danger"
-            else:
-                status = "Ativa"
-                status_class = "success"
+            status, status_class = STATUS_EXIBICAO[g[13]]
+            if g[13] == STATUS_PROXIMA:
+                status = f"{status} ({g[14]} dias)"
+            if g[15]:
+                status = f"{status} - arquivada"
             
             acoes = Div(
                 A("Visualizar", href=f"/admin/garantias/{g[0]}", cls="btn btn-sm btn-outline-info"),
@@ -1941,11 +1921,38 @@ def setup_admin_routes(app, db: Database):
             {'name': 'veiculo_modelo', 'label': 'Modelo do Veículo', 'type': 'text'},
             {'name': 'veiculo_placa', 'label': 'Placa do Veículo', 'type': 'text'},
             {'name': 'lote_fabricacao', 'label': 'Lote de Fabricação', 'type': 'text'},
-            {'name': 'ativo', 'label': 'Status', 'type': 'select', 'options': [
-                {'value': 'true', 'label': 'Ativa'},
-                {'value': 'false', 'label': 'Inativa'}
-            ]}
+            {'name': 'status', 'label': 'Status', 'type': 'select', 'options': STATUS_OPCOES_FILTRO}
         ]
+        if historico_disponivel:
+            filter_fields.append({
+                'name': 'incluir_arquivadas', 'label': 'Arquivadas', 'type': 'select',
+                'rotulo_vazio': 'Não incluir', 'options': [{'value': 'true', 'label': 'Incluir arquivadas'}]
+            })
+        
+        # Tabela + paginação: único trecho devolvido nas requisições HTMX
+        listagem = listagem_component(
+            table_component(
+                ["ID", "Cliente", "Produto", "Veículo", "Instalação", "Vencimento", "Status", "Ações"],
+                dados_tabela,
+                sortable_columns=["id", "cliente_nome", "produto_sku", "veiculo_marca", "data_instalacao", "data_vencimento", "ativo", ""],
+                current_sort=sort_field,
+                sort_direction=sort_direction,
+                base_url="/admin/garantias",
+                query_params=request.query_params,
+                hx_target=f"#{ALVO_LISTAGEM}"
+            ) if garantias else P("Nenhuma garantia cadastrada ainda.", cls="text-muted text-center py-4"),
+            pagination_component(
+                current_page=page,
+                total_pages=total_pages,
+                base_url="/admin/garantias",
+                page_size=page_size,
+                total_records=total_garantias,
+                query_params=request.query_params,
+                hx_target=f"#{ALVO_LISTAGEM}"
+            ) if total_garantias > 0 else None
+        )
+        if requisicao_htmx(request):
+            return listagem
         
         content = Container(
             Row(
@@ -1957,29 +1964,14 @@ def setup_admin_routes(app, db: Database):
             filter_component(
                 fields=filter_fields,
                 current_filters=filtros,
-                action_url="/admin/garantias"
+                action_url="/admin/garantias",
+                hx_target=f"#{ALVO_LISTAGEM}"
             ),
             Row(
                 Col(
                     card_component(
                         "Garantias Cadastradas",
-                        Div(
-                            table_component(
-                                ["ID", "Cliente", "Produto", "Veículo", "Instalação", "Vencimento", "Status", "Ações"],
-                                dados_tabela,
-                                sortable_columns=["id", "cliente_nome", "produto_sku", "veiculo_marca", "data_instalacao", "data_vencimento", "ativo", ""],
-                                current_sort=sort_field,
-                                sort_direction=sort_direction,
-                                base_url="/admin/garantias"
-                            ) if garantias else P("Nenhuma garantia cadastrada ainda.", cls="text-muted text-center py-4"),
-                            pagination_component(
-                                current_page=page,
-                                total_pages=total_pages,
-                                base_url="/admin/garantias",
-                                page_size=page_size,
-                                total_records=total_garantias
-                            ) if total_garantias > 0 else None
-                        )
+                        listagem
                     ),
                     width=12
                 )
@@ -1996,15 +1988,15 @@ def setup_admin_routes(app, db: Database):
         garantia_id = request.path_params['garantia_id']
         
         try:
-            # Buscar garantia com dados relacionados
-            garantia = db.execute("""
+            # Buscar garantia com dados relacionados (inclusive arquivada)
+            garantia = db.execute(f"""
                 SELECT g.id, g.lote_fabricacao, g.data_instalacao, g.nota_fiscal,
                        g.nome_estabelecimento, g.quilometragem, g.data_cadastro,
                        g.data_vencimento, g.ativo, g.observacoes,
                        p.sku, p.descricao as produto_descricao,
                        v.marca, v.modelo, v.ano_modelo, v.placa,
                        u.nome as cliente_nome, u.email as cliente_email
-                FROM garantias g
+                FROM {tabela_garantias(db, incluir_arquivadas=True)} g
                 JOIN produtos p ON g.produto_id = p.id
                 JOIN veiculos v ON g.veiculo_id = v.id
                 JOIN usuarios u ON g.usuario_id = u.id
@@ -2129,11 +2121,9 @@ def setup_admin_routes(app, db: Database):
                 SELECT v.id, v.marca, v.modelo, v.ano_modelo, v.placa, v.chassi, v.cor,
                        v.data_cadastro, v.ativo,
                        u.nome as proprietario_nome, u.email as proprietario_email,
-                       COUNT(g.id) as total_garantias
+                       v.total_garantias
                 FROM veiculos v
                 LEFT JOIN usuarios u ON v.usuario_id = u.id
-                LEFT JOIN garantias g ON v.id = g.veiculo_id
-                GROUP BY v.id
                 ORDER BY v.data_cadastro DESC
                 LIMIT ? OFFSET ?
             """, (page_size, offset)).fetchall()
@@ -2173,6 +2163,25 @@ def setup_admin_routes(app, db: Database):
         # Calcular total de páginas
         total_pages = math.ceil(total_veiculos / page_size) if total_veiculos > 0 else 1
         
+        # Tabela + paginação: único trecho devolvido nas requisições HTMX
+        listagem = listagem_component(
+            table_component(
+                ["ID", "Veículo", "Ano", "Placa", "Proprietário", "Garantias", "Cadastro", "Status", "Ações"],
+                dados_tabela
+            ) if veiculos else P("Nenhum veículo cadastrado ainda.", cls="text-muted text-center py-4"),
+            pagination_component(
+                current_page=page,
+                total_pages=total_pages,
+                base_url="/admin/veiculos",
+                page_size=page_size,
+                total_records=total_veiculos,
+                query_params=request.query_params,
+                hx_target=f"#{ALVO_LISTAGEM}"
+            ) if total_veiculos > 0 else None
+        )
+        if requisicao_htmx(request):
+            return listagem
+        
         content = Container(
             Row(
                 Col(
@@ -2187,19 +2196,7 @@ def setup_admin_routes(app, db: Database):
                 Col(
                     card_component(
                         "Veículos Cadastrados",
-                        Div(
-                            table_component(
-                                ["ID", "Veículo", "Ano", "Placa", "Proprietário", "Garantias", "Cadastro", "Status", "Ações"],
-                                dados_tabela
-                            ) if veiculos else P("Nenhum veículo cadastrado ainda.", cls="text-muted text-center py-4"),
-                            pagination_component(
-                                current_page=page,
-                                total_pages=total_pages,
-                                base_url="/admin/veiculos",
-                                page_size=page_size,
-                                total_records=total_veiculos
-                            ) if total_veiculos > 0 else None
-                        )
+                        listagem
                     ),
                     width=12
                 )
@@ -2430,6 +2427,253 @@ def setup_admin_routes(app, db: Database):
         
         return base_layout("Relatórios", content, user)
     
+    # ===== ESTABELECIMENTOS INSTALADORES =====
+    
+    @app.get("/admin/estabelecimentos")
+    @admin_required
+    def listar_estabelecimentos(request):
+        """Ranking dos estabelecimentos instaladores pelas garantias ativadas"""
+        user = request.state.usuario
+        
+        # Parâmetros de paginação
+        page = int(request.query_params.get('page', 1))
+        page_size = int(request.query_params.get('size', 50))
+        
+        # Validar parâmetros
+        if page < 1:
+            page = 1
+        if page_size not in [25, 50, 100, 200]:
+            page_size = 50
+        
+        # Calcular offset
+        offset = (page - 1) * page_size
+        
+        # Filtros e ordenação validados pela definição da listagem
+        consulta = LISTAGEM_ESTABELECIMENTOS.montar(request.query_params)
+        filtros = consulta.filtros
+        sort_field, sort_direction = consulta.sort_field, consulta.sort_direction
+        
+        try:
+            total_estabelecimentos = consulta.contar(db)
+            # Contadores mantidos por triggers: sem agregação sobre garantias
+            estabelecimentos = consulta.buscar(db, page_size, offset)
+        except Exception as e:
+            logger.error(f"Erro ao buscar estabelecimentos: {e}")
+            estabelecimentos = []
+            total_estabelecimentos = 0
+        
+        dados_tabela = []
+        for e in estabelecimentos:
+            dados_tabela.append([
+                e[1],  # Nome
+                str(e[2]),  # Total de garantias
+                str(e[3]),  # Garantias ativas
+                A("Ver garantias", href=f"/admin/garantias?estabelecimento_id={e[0]}",
+                  cls="btn btn-sm btn-outline-info")
+            ])
+        
+        # Calcular total de páginas
+        total_pages = math.ceil(total_estabelecimentos / page_size) if total_estabelecimentos > 0 else 1
+        
+        filter_fields = [
+            {'name': 'nome', 'label': 'Nome do Estabelecimento', 'type': 'text'}
+        ]
+        
+        # Tabela + paginação: único trecho devolvido nas requisições HTMX
+        listagem = listagem_component(
+            table_component(
+                ["Estabelecimento", "Garantias", "Ativas", "Ações"],
+                dados_tabela,
+                sortable_columns=["nome", "total_garantias", "garantias_ativas", ""],
+                current_sort=sort_field,
+                sort_direction=sort_direction,
+                base_url="/admin/estabelecimentos",
+                query_params=request.query_params,
+                hx_target=f"#{ALVO_LISTAGEM}"
+            ) if estabelecimentos else P("Nenhum estabelecimento encontrado.", cls="text-muted text-center py-4"),
+            pagination_component(
+                current_page=page,
+                total_pages=total_pages,
+                base_url="/admin/estabelecimentos",
+                page_size=page_size,
+                total_records=total_estabelecimentos,
+                query_params=request.query_params,
+                hx_target=f"#{ALVO_LISTAGEM}"
+            ) if total_estabelecimentos > 0 else None
+        )
+        if requisicao_htmx(request):
+            return listagem
+        
+        content = Container(
+            Row(
+                Col(
+                    H2("Estabelecimentos Instaladores", cls="mb-4")
+                )
+            ),
+            filter_component(
+                fields=filter_fields,
+                current_filters=filtros,
+                action_url="/admin/estabelecimentos",
+                hx_target=f"#{ALVO_LISTAGEM}"
+            ),
+            Row(
+                Col(
+                    card_component(
+                        "Ranking por Garantias Ativas",
+                        listagem
+                    ),
+                    width=12
+                )
+            )
+        )
+        
+        return base_layout("Estabelecimentos Instaladores", content, user)
+    
+    # ===== RECALL POR LOTE =====
+    
+    @app.get("/admin/recall")
+    @admin_required
+    def recall_lote(request):
+        """Garantias de um lote (exato, prefixo ou intervalo) com totais e contatos dos clientes"""
+        user = request.state.usuario
+        criterio = ler_criterio(request.query_params)
+        
+        resultado = None
+        if not criterio.vazio:
+            try:
+                resultado = {
+                    'totais': contar_garantias(db, criterio),
+                    'garantias': buscar_garantias(db, criterio),
+                    'produto': agregar(db, criterio, 'produto'),
+                    'uf': agregar(db, criterio, 'uf'),
+                    'estabelecimento': agregar(db, criterio, 'estabelecimento'),
+                }
+            except Exception as e:
+                logger.error(f"Erro na busca de recall: {e}")
+        
+        formulario = Form(
+            Row(
+                Col(
+                    form_group("Lote", Input(type="text", name="lote", value=criterio.lote, cls="form-control",
+                                             placeholder="Ex.: LT2024")),
+                    width=4
+                ),
+                Col(
+                    Div(
+                        Label("Busca", for_="modo", cls="form-label"),
+                        Select(
+                            Option("Prefixo", value=MODO_PREFIXO, selected=criterio.modo == MODO_PREFIXO),
+                            Option("Lote exato", value=MODO_EXATO, selected=criterio.modo == MODO_EXATO),
+                            Option("Intervalo", value=MODO_INTERVALO, selected=criterio.modo == MODO_INTERVALO),
+                            id="modo",
+                            name="modo",
+                            cls="form-select"
+                        ),
+                        cls="mb-3"
+                    ),
+                    width=3
+                ),
+                Col(
+                    form_group("Lote final (intervalo)", Input(type="text", name="lote_fim", value=criterio.lote_fim,
+                                                               cls="form-control")),
+                    width=3
+                ),
+                Col(
+                    Button("Buscar", type="submit", cls="btn btn-primary mt-4"),
+                    width=2
+                )
+            ),
+            method="get",
+            action="/admin/recall"
+        )
+        
+        def tabela_agregada(titulo, cabecalho, linhas):
+            return Col(
+                card_component(
+                    titulo,
+                    table_component(
+                        [*cabecalho, "Garantias", "Clientes"],
+                        [[*(valor or "N/A" for valor in linha[:-2]), str(linha[-2]), str(linha[-1])] for linha in linhas]
+                    ) if linhas else P("Sem dados.", cls="text-muted")
+                ),
+                width=4
+            )
+        
+        secoes = []
+        if resultado:
+            totais = resultado['totais']
+            secoes = [
+                Row(
+                    Col(
+                        P(
+                            Strong(f"{totais['garantias']} garantias"),
+                            f" ({totais['ativas']} ativas) de {totais['clientes']} clientes",
+                            cls="mb-3"
+                        ),
+                        A("Exportar clientes (CSV)", href=f"/admin/recall/exportar?{request.url.query}",
+                          cls="btn btn-outline-primary mb-3"),
+                        width=12
+                    )
+                ),
+                Row(
+                    tabela_agregada("Por produto", ["SKU", "Produto"], resultado['produto']),
+                    tabela_agregada("Por UF", ["UF"], resultado['uf']),
+                    tabela_agregada("Por estabelecimento", ["Estabelecimento"], resultado['estabelecimento'])
+                ),
+                Row(
+                    Col(
+                        card_component(
+                            f"Garantias (primeiras {LIMITE_RESULTADOS})"
+                            if totais['garantias'] > LIMITE_RESULTADOS else "Garantias",
+                            table_component(
+                                ["ID", "Lote", "Produto", "Cliente", "Contato", "Cidade/UF", "Placa", "Instalação", "Ativa"],
+                                [[
+                                    A(f"#{g[0]}", href=f"/admin/garantias/{g[0]}"),
+                                    g[1],
+                                    f"{g[2]} - {g[3]}",
+                                    g[4],
+                                    f"{g[5]} {g[6] or ''}".strip(),
+                                    f"{g[7] or ''}/{g[8] or ''}",
+                                    g[9],
+                                    format_date_br(g[11]) if g[11] else "N/A",
+                                    "Sim" if g[12] else "Não"
+                                ] for g in resultado['garantias']]
+                            ) if resultado['garantias'] else P("Nenhuma garantia encontrada para o lote.",
+                                                               cls="text-muted text-center py-4")
+                        ),
+                        width=12
+                    )
+                )
+            ]
+        
+        content = Container(
+            Row(
+                Col(
+                    H2("Recall por Lote", cls="mb-4")
+                )
+            ),
+            card_component("Lote de fabricação", formulario),
+            *secoes
+        )
+        
+        return base_layout("Recall por Lote", content, user)
+    
+    @app.get("/admin/recall/exportar")
+    @admin_required
+    def exportar_recall(request):
+        """Exporta em CSV, por streaming, os clientes afetados pelo lote"""
+        criterio = ler_criterio(request.query_params)
+        if criterio.vazio:
+            return RedirectResponse("/admin/recall?erro=lote_obrigatorio", status_code=302)
+        
+        lote_arquivo = ''.join(c for c in criterio.lote if c.isalnum())
+        nome_arquivo = f"recall_{criterio.modo}_{lote_arquivo}.csv"
+        return StreamingResponse(
+            exportar_csv(db, criterio),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": f'attachment; filename="{nome_arquivo}"'}
+        )
+    
     # ===== REENVIO DE EMAIL DE CONFIRMAÇÃO =====
     
     @app.post("/admin/usuarios/{usuario_id}/reenviar-email")
@@ -2442,7 +2686,7 @@ def setup_admin_routes(app, db: Database):
         try:
             # Buscar usuário
             usuario = db.execute(
-                "SELECT id, email, nome, confirmado, token_confirmacao FROM usuarios WHERE id = ?",
+                "SELECT id, email, nome, confirmado FROM usuarios WHERE id = ?",
                 (usuario_id,)
             ).fetchone()
             
@@ -2455,14 +2699,8 @@ def setup_admin_routes(app, db: Database):
                 logger.info(f"Tentativa de reenviar email para usuário já confirmado: {usuario[1]}")
                 return RedirectResponse('/admin/usuarios?info=ja_confirmado', status_code=302)
             
-            # Gerar novo token se necessário
-            token_confirmacao = usuario[4] or Usuario.gerar_token_confirmacao()
-            
-            if not usuario[4]:  # Se não tinha token, atualizar no banco
-                db.execute(
-                    "UPDATE usuarios SET token_confirmacao = ? WHERE id = ?",
-                    (token_confirmacao, usuario_id)
-                )
+            # Novo token (só o hash fica no banco; o anterior deixa de valer)
+            token_confirmacao = emitir_token(db, usuario[0], FINALIDADE_CONFIRMACAO)
             
             # Enviar email de confirmação de forma assíncrona
             try:
@@ -2520,45 +2758,32 @@ def setup_admin_routes(app, db: Database):
                 logger.warning(f"Tentativa de auto-exclusão: {user['email']}")
                 return RedirectResponse('/admin/usuarios?erro=nao_pode_excluir_proprio', status_code=302)
             
-            # Iniciar transação para exclusão em cascata
-            db.execute("BEGIN TRANSACTION")
-            
-            try:
+            # Exclusão em cascata em uma única transação (desfeita por inteiro em caso de erro)
+            with UnidadeTrabalho(db) as uow:
                 # 1. Excluir garantias do usuário
-                garantias_result = db.execute(
-                    "DELETE FROM garantias WHERE usuario_id = ?",
-                    (usuario_id,)
-                )
-                garantias_excluidas = garantias_result.rowcount if hasattr(garantias_result, 'rowcount') else 0
+                uow.execute("DELETE FROM garantias WHERE usuario_id = ?", (usuario_id,))
+                garantias_excluidas = db.conn.changes()
+                garantias_excluidas += excluir_arquivadas_do_usuario(db, usuario_id)
                 
                 # 2. Excluir veículos do usuário
-                veiculos_result = db.execute(
-                    "DELETE FROM veiculos WHERE usuario_id = ?",
-                    (usuario_id,)
-                )
-                veiculos_excluidos = veiculos_result.rowcount if hasattr(veiculos_result, 'rowcount') else 0
-                
-                # 3. Excluir o usuário
-                db.execute(
-                    "DELETE FROM usuarios WHERE id = ?",
-                    (usuario_id,)
-                )
-                
-                # Confirmar transação
-                db.execute("COMMIT")
-                
-                logger.info(
-                    f"Usuário excluído com sucesso: {usuario[1]} (ID: {usuario_id}) "
-                    f"por {user['email']}. Garantias: {garantias_excluidas}, "
-                    f"Veículos: {veiculos_excluidos}"
-                )
+                uow.execute("DELETE FROM veiculos WHERE usuario_id = ?", (usuario_id,))
+                veiculos_excluidos = db.conn.changes()
                 
-                return RedirectResponse('/admin/usuarios?sucesso=usuario_excluido', status_code=302)
+                # 3. Excluir tokens pendentes do usuário
+                revogar_tokens(db, usuario_id)
                 
-            except Exception as e:
-                # Reverter transação em caso de erro
-                db.execute("ROLLBACK")
-                raise e
+                # 4. Excluir o usuário
+                uow.execute("DELETE FROM usuarios WHERE id = ?", (usuario_id,))
+            
+            get_auth_manager().invalidar_usuario(usuario_id)
+            
+            logger.info(
+                f"Usuário excluído com sucesso: {usuario[1]} (ID: {usuario_id}) "
+                f"por {user['email']}. Garantias: {garantias_excluidas}, "
+                f"Veículos: {veiculos_excluidos}"
+            )
+            
+            return RedirectResponse('/admin/usuarios?sucesso=usuario_excluido', status_code=302)
                 
         except Exception as e:
             logger.error(f"Erro ao excluir usuário {usuario_id}: {e}")
@@ -2576,7 +2801,7 @@ def setup_admin_routes(app, db: Database):
         try:
             # Buscar usuário
             usuario = db.execute(
-                "SELECT id, email, nome, confirmado, token_confirmacao FROM usuarios WHERE id = ?",
+                "SELECT id, email, nome, confirmado FROM usuarios WHERE id = ?",
                 (usuario_id,)
             ).fetchone()
             
@@ -2591,14 +2816,8 @@ def setup_admin_routes(app, db: Database):
             from app.email_service import EmailService
             email_service = EmailService()
             
-            # Gerar novo token se necessário
-            token = usuario[4] if usuario[4] else Usuario.gerar_token_confirmacao()
-            
-            if not usuario[4]:  # Se não tinha token, atualizar no banco
-                db.execute(
-                    "UPDATE usuarios SET token_confirmacao = ? WHERE id = ?",
-                    (token, usuario_id)
-                )
+            # Novo token (só o hash fica no banco; o anterior deixa de valer)
+            token = emitir_token(db, usuario[0], FINALIDADE_CONFIRMACAO)
             
             # Enviar email de forma assíncrona
             try:
@@ -2762,6 +2981,7 @@ def setup_admin_routes(app, db: Database):
                 "UPDATE usuarios SET senha = ? WHERE id = ?",
                 (senha_hash, usuario_id)
             )
+            get_auth_manager().invalidar_usuario(usuario_id)
             
             logger.info(f"Senha resetada para usuário {usuario[1]} (ID: {usuario_id}) pelo admin {user['email']}")
             
@@ -8,11 +8,18 @@ from datetime import datetime
 from fasthtml.common import *
 from monsterui.all import *
 from fastlite import Database
-from app.auth import login_required, get_current_user
+from app.auth import login_required, get_current_user, get_auth_manager
 from app.templates import *
 from app.filter_component import filter_component
 from app.email_service import send_warranty_activation_email
+from app.services.catalogo_produtos import get_catalogo_produtos
+from app.garantia_status import (
+    STATUS_EXIBICAO, STATUS_OPCOES_FILTRO, STATUS_PROXIMA, status_sql, dias_para_vencimento_sql, filtro_status_sql
+)
 from models.garantia import Garantia
+from app.unidade_trabalho import UnidadeTrabalho
+from app.estabelecimentos import resolver_estabelecimento
+from app.consulta_listagem import LISTAGEM_GARANTIAS_CLIENTE
 
 # Definir Row como um Div com classe Bootstrap
 Row = lambda *args, **kwargs: Div(*args, cls=f"row {kwargs.get('cls', '')}".strip(), **{k: v for k, v in kwargs.items() if k != 'cls'})
@@ -32,6 +39,8 @@ def _format_datetime(datetime_value):
 def setup_garantia_routes(app, db: Database):
     """Configura rotas de garantias"""
     
+    catalogo = get_catalogo_produtos(db)
+    
     def listar_garantias(request):
         """Lista garantias do cliente com filtros"""
         user = request.state.usuario
@@ -39,66 +48,13 @@ def setup_garantia_routes(app, db: Database):
         if user['tipo_usuario'] != 'cliente':
             return RedirectResponse('/admin', status_code=302)
         
-        # Obter parâmetros de filtro
-        filtros = {
-            'produto_sku': request.query_params.get('produto_sku', '').strip(),
-            'produto_descricao': request.query_params.get('produto_descricao', '').strip(),
-            'veiculo_marca': request.query_params.get('veiculo_marca', '').strip(),
-            'veiculo_modelo': request.query_params.get('veiculo_modelo', '').strip(),
-            'veiculo_placa': request.query_params.get('veiculo_placa', '').strip(),
-            'lote_fabricacao': request.query_params.get('lote_fabricacao', '').strip(),
-            'ativo': request.query_params.get('ativo', '').strip()
-        }
-        
-        # Construir query com filtros
-        where_conditions = ["g.usuario_id = ?"]
-        params = [user['usuario_id']]
-        
-        if filtros['produto_sku']:
-            where_conditions.append("p.sku LIKE ?")
-            params.append(f"%{filtros['produto_sku']}%")
-        
-        if filtros['produto_descricao']:
-            where_conditions.append("p.descricao LIKE ?")
-            params.append(f"%{filtros['produto_descricao']}%")
-        
-        if filtros['veiculo_marca']:
-            where_conditions.append("v.marca LIKE ?")
-            params.append(f"%{filtros['veiculo_marca']}%")
-        
-        if filtros['veiculo_modelo']:
-            where_conditions.append("v.modelo LIKE ?")
-            params.append(f"%{filtros['veiculo_modelo']}%")
-        
-        if filtros['veiculo_placa']:
-            where_conditions.append("v.placa LIKE ?")
-            params.append(f"%{filtros['veiculo_placa']}%")
-        
-        if filtros['lote_fabricacao']:
-            where_conditions.append("g.lote_fabricacao LIKE ?")
-            params.append(f"%{filtros['lote_fabricacao']}%")
-        
-        if filtros['ativo']:
-            ativo_bool = filtros['ativo'] == 'true'
-            where_conditions.append("g.ativo = ?")
-            params.append(ativo_bool)
-        
-        where_clause = " WHERE " + " AND ".join(where_conditions)
+        # Filtros validados pela definição da listagem (sempre restrita ao usuário)
+        consulta = LISTAGEM_GARANTIAS_CLIENTE.montar(request.query_params, [user['usuario_id']])
+        filtros = consulta.filtros
         
         try:
-            # Buscar garantias do usuário com filtros
-            select_query = f"""
-                SELECT g.id, p.sku, p.descricao, v.marca, v.modelo, v.placa,
-                       g.lote_fabricacao, g.data_instalacao, g.data_cadastro, 
-                       g.data_vencimento, g.ativo, g.nota_fiscal, g.nome_estabelecimento,
-                       g.quilometragem, g.observacoes
-                FROM garantias g
-                JOIN produtos p ON g.produto_id = p.id
-                JOIN veiculos v ON g.veiculo_id = v.id
-                {where_clause}
-                ORDER BY g.data_cadastro DESC
-            """
-            garantias = db.execute(select_query, params).fetchall()
+            # Buscar garantias do usuário com filtros (status calculado na consulta)
+            garantias = consulta.buscar(db)
             
         except Exception as e:
             logger.error(f"Erro ao buscar garantias do usuário {user['usuario_id']}: {e}")
@@ -107,28 +63,9 @@ def setup_garantia_routes(app, db: Database):
         # Preparar dados para a tabela
         dados_tabela = []
         for g in garantias:
-            # Verificar se está vencida
-            try:
-                if g[9]:
-                    if isinstance(g[9], str):
-                        data_vencimento = datetime.strptime(g[9], '%Y-%m-%d').date()
-                    else:
-                        data_vencimento = g[9]
-                    vencida = data_vencimento < datetime.now().date()
-                else:
-                    vencida = False
-            except:
-                vencida = False
-            
-            if not g[10]:  # Inativa
-                status = "Inativa"
-                status_class = "secondary"
-            elif vencida:
-                status = "Vencida"
-                status_class = "danger"
-            else:
-                status = "Ativa"
-                status_class = "success"
+            status, status_class = STATUS_EXIBICAO[g[15]]
+            if g[15] == STATUS_PROXIMA:
+                status = f"{status} ({g[16]} dias)"
             
             acoes = Div(
                 A("Ver", href=f"/cliente/garantias/{g[0]}", cls="btn btn-sm btn-outline-info me-1"),
@@ -167,12 +104,19 @@ def setup_garantia_routes(app, db: Database):
             {'name': 'veiculo_modelo', 'label': 'Modelo do Veículo', 'type': 'text'},
             {'name': 'veiculo_placa', 'label': 'Placa do Veículo', 'type': 'text'},
             {'name': 'lote_fabricacao', 'label': 'Lote de Fabricação', 'type': 'text'},
-            {'name': 'ativo', 'label': 'Status', 'type': 'select', 'options': [
-                {'value': 'true', 'label': 'Ativa'},
-                {'value': 'false', 'label': 'Inativa'}
-            ]}
+            {'name': 'status', 'label': 'Status', 'type': 'select', 'options': STATUS_OPCOES_FILTRO}
         ]
         
+        # Tabela: único trecho devolvido nas requisições HTMX
+        listagem = listagem_component(
+            table_component(
+                ["Produto", "Veículo", "Lote", "Instalação", "Vencimento", "Status", "Ações"],
+                dados_tabela
+            ) if garantias else P("Nenhuma garantia ativada ainda.", cls="text-muted text-center py-4")
+        )
+        if requisicao_htmx(request):
+            return listagem
+        
         content = Container(
             Row(
                 Col(
@@ -190,16 +134,14 @@ def setup_garantia_routes(app, db: Database):
             filter_component(
                 fields=filter_fields,
                 current_filters=filtros,
-                action_url="/cliente/garantias"
+                action_url="/cliente/garantias",
+                hx_target=f"#{ALVO_LISTAGEM}"
             ),
             Row(
                 Col(
                     card_component(
                         None,  # Remove título redundante
-                        table_component(
-                            ["Produto", "Veículo", "Lote", "Instalação", "Vencimento", "Status", "Ações"],
-                            dados_tabela
-                        ) if garantias else P("Nenhuma garantia ativada ainda.", cls="text-muted text-center py-4")
+                        listagem
                     ),
                     width=12
                 )
@@ -219,20 +161,6 @@ def setup_garantia_routes(app, db: Database):
         veiculo_id_selecionado = request.query_params.get('veiculo_id')
         
         try:
-            # Buscar produtos ativos
-            produtos_result = db.execute(
-                "SELECT id, sku, descricao FROM produtos WHERE ativo = TRUE ORDER BY sku"
-            ).fetchall()
-            
-            # Converter produtos para lista de dicionários
-            produtos = []
-            for row in produtos_result:
-                produtos.append({
-                    'id': row[0],
-                    'sku': row[1],
-                    'descricao': row[2]
-                })
-            
             # Buscar veículos ativos do usuário
             logger.info(f"Buscando veículos para usuário ID: {user['usuario_id']}")
             veiculos_result = db.execute("""
@@ -256,7 +184,6 @@ def setup_garantia_routes(app, db: Database):
             
         except Exception as e:
             logger.error(f"Erro ao buscar dados para nova garantia: {e}")
-            produtos = []
             veiculos = []
         
         if not veiculos:
@@ -308,7 +235,7 @@ def setup_garantia_routes(app, db: Database):
                 Col(
                     card_component(
                         "Dados da Garantia",
-                        garantia_form(produtos=produtos, veiculos=veiculos, garantia=form_data)
+                        garantia_form(veiculos=veiculos, garantia=form_data)
                     ),
                     width=10,
                     offset=1
@@ -345,23 +272,17 @@ def setup_garantia_routes(app, db: Database):
         if not produto_id:
             errors['produto_id'] = 'Produto é obrigatório'
         else:
-            try:
-                produto = db.execute(
-                    "SELECT id FROM produtos WHERE id = ? AND ativo = TRUE",
-                    (produto_id,)
-                ).fetchone()
-                if not produto:
-                    errors['produto_id'] = 'Produto inválido'
-            except:
+            if not catalogo.obter(produto_id):
                 errors['produto_id'] = 'Produto inválido'
         
-        # Validar veículo
+        # Validar veículo (marca, modelo e placa também vão no email de ativação)
+        veiculo = None
         if not veiculo_id:
             errors['veiculo_id'] = 'Veículo é obrigatório'
         else:
             try:
                 veiculo = db.execute(
-                    "SELECT id FROM veiculos WHERE id = ? AND usuario_id = ? AND ativo = TRUE",
+                    "SELECT id, marca, modelo, placa FROM veiculos WHERE id = ? AND usuario_id = ? AND ativo = TRUE",
                     (veiculo_id, user['usuario_id'])
                 ).fetchone()
                 if not veiculo:
@@ -402,33 +323,11 @@ def setup_garantia_routes(app, db: Database):
             except ValueError:
                 errors['quilometragem'] = 'Quilometragem deve ser um número'
         
-        # Verificar se já existe garantia para este produto/veículo
-        if not errors.get('produto_id') and not errors.get('veiculo_id'):
-            garantia_existente = db.execute("""
-                SELECT id FROM garantias 
-                WHERE produto_id = ? AND veiculo_id = ? AND ativo = TRUE
-            """, (produto_id, veiculo_id)).fetchone()
-            
-            if garantia_existente:
-                errors['produto_id'] = 'Já existe uma garantia ativa para este produto neste veículo'
-        
-        if errors:
+        def formulario_com_erros():
+            """Retorna o formulário com os erros de validação"""
             logger.warning(f"Erros de validação encontrados: {errors}")
             # Buscar dados para reexibir o formulário
             try:
-                produtos_result = db.execute(
-                    "SELECT id, sku, descricao FROM produtos WHERE ativo = TRUE ORDER BY sku"
-                ).fetchall()
-                
-                # Converter para lista de dicionários
-                produtos = []
-                for row in produtos_result:
-                    produtos.append({
-                        'id': row[0],
-                        'sku': row[1],
-                        'descricao': row[2]
-                    })
-                
                 veiculos_result = db.execute("""
                     SELECT id, marca, modelo, placa 
                     FROM veiculos 
@@ -446,7 +345,6 @@ def setup_garantia_routes(app, db: Database):
                         'placa': row[3]
                     })
             except:
-                produtos = []
                 veiculos = []
             
             content = Container(
@@ -470,7 +368,7 @@ def setup_garantia_routes(app, db: Database):
                         ),
                         card_component(
                             "Dados da Garantia",
-                            garantia_form(produtos, veiculos, {
+                            garantia_form(veiculos, {
                                 'produto_id': produto_id,
                                 'veiculo_id': veiculo_id,
                                 'lote_fabricacao': lote_fabricacao,
@@ -479,7 +377,7 @@ def setup_garantia_routes(app, db: Database):
                                 'nome_estabelecimento': nome_estabelecimento,
                                 'quilometragem': quilometragem,
                                 'observacoes': observacoes
-                            }, errors)
+                            }, errors, produto_selecionado=catalogo.obter(produto_id))
                         ),
                         width=10,
                         offset=1
@@ -488,6 +386,9 @@ def setup_garantia_routes(app, db: Database):
             )
             return base_layout("Nova Garantia", content, user)
         
+        if errors:
+            return formulario_com_erros()
+        
         try:
             # Criar garantia
             garantia = Garantia(
@@ -506,60 +407,51 @@ def setup_garantia_routes(app, db: Database):
             
             # A data de vencimento é calculada automaticamente no __post_init__
             
-            # Inserir no banco
-            db.execute("""
-                INSERT INTO garantias (
-                    usuario_id, produto_id, veiculo_id, lote_fabricacao, data_instalacao,
-                    nota_fiscal, nome_estabelecimento, quilometragem, data_cadastro,
-                    data_vencimento, ativo, observacoes
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                garantia.usuario_id, garantia.produto_id, garantia.veiculo_id,
-                garantia.lote_fabricacao, format_date_iso(garantia.data_instalacao),
-                garantia.nota_fiscal, garantia.nome_estabelecimento, garantia.quilometragem,
-                format_datetime_iso(garantia.data_cadastro), format_date_iso(garantia.data_vencimento),
-                garantia.ativo, garantia.observacoes
-            ))
+            # Inserir no banco; o índice único de garantia ativa por produto/veículo
+            # resolve duplicidades, inclusive em envios concorrentes
+            with UnidadeTrabalho(db) as uow:
+                estabelecimento_id = resolver_estabelecimento(db, garantia.nome_estabelecimento)
+                inserida = uow.inserir('garantias', {
+                    'usuario_id': garantia.usuario_id,
+                    'produto_id': garantia.produto_id,
+                    'veiculo_id': garantia.veiculo_id,
+                    'lote_fabricacao': garantia.lote_fabricacao,
+                    'data_instalacao': format_date_iso(garantia.data_instalacao),
+                    'nota_fiscal': garantia.nota_fiscal,
+                    'nome_estabelecimento': garantia.nome_estabelecimento,
+                    'estabelecimento_id': estabelecimento_id,
+                    'quilometragem': garantia.quilometragem,
+                    'data_cadastro': format_datetime_iso(garantia.data_cadastro),
+                    'data_vencimento': format_date_iso(garantia.data_vencimento),
+                    'ativo': garantia.ativo,
+                    'observacoes': garantia.observacoes,
+                }, retornando=('id', 'data_vencimento'), ignorar_conflito=True)
             
-            garantia_id = db.execute("SELECT last_insert_rowid()").fetchone()[0]
-
+            if not inserida:
+                errors['produto_id'] = 'Já existe uma garantia ativa para este produto neste veículo'
+                return formulario_com_erros()
+            
+            garantia_id, data_vencimento = inserida
             
             logger.info(f"Nova garantia ativada: ID {garantia_id} pelo usuário {user['usuario_id']}")
             
             # Enviar email de confirmação de garantia ativada de forma assíncrona
+            # (dados do usuário, do catálogo e do veículo já carregados na validação)
             try:
-                # Buscar dados para o email
-                dados_email = db.execute("""
-                    SELECT u.nome, u.email, p.descricao as produto_nome,
-                           (v.marca || ' ' || v.modelo || ' (' || v.placa || ')') as veiculo_info,
-                           g.data_vencimento
-                    FROM garantias g
-                    JOIN usuarios u ON g.usuario_id = u.id
-                    JOIN produtos p ON g.produto_id = p.id
-                    JOIN veiculos v ON g.veiculo_id = v.id
-                    WHERE g.id = ?
-                """, (garantia_id,)).fetchone()
+                produto = catalogo.obter(garantia.produto_id) or {}
+                # A sessão não guarda o nome; o cadastro vem do cache de usuários
+                cadastro = get_auth_manager().obter_usuario_cache(user['usuario_id']) or {}
                 
-                if dados_email:
-                    # Extrair dados da tupla
-                    nome, email, produto_nome, veiculo_info, data_vencimento = dados_email
-                    
-                    # Formatar data de vencimento
-                    data_vencimento_formatada = _format_date(data_vencimento)
-                    
-                    # Enviar email de forma assíncrona
-                    from app.async_tasks import send_warranty_activation_email_async
-                    send_warranty_activation_email_async(
-                        user_email=email,
-                        user_name=nome,
-                        produto_nome=produto_nome,
-                        veiculo_info=veiculo_info,
-                        data_vencimento=data_vencimento_formatada
-                    )
-                    
-                    logger.info(f"Email de garantia ativada agendado para envio assíncrono: {email}")
-                else:
-                    logger.error(f"Não foi possível buscar dados para envio de email da garantia {garantia_id}")
+                from app.async_tasks import send_warranty_activation_email_async
+                send_warranty_activation_email_async(
+                    user_email=user['usuario_email'],
+                    user_name=cadastro.get('nome') or user['usuario_email'],
+                    produto_nome=produto.get('descricao', ''),
+                    veiculo_info=f"{veiculo[1]} {veiculo[2]} ({veiculo[3]})",
+                    data_vencimento=_format_date(data_vencimento)
+                )
+                
+                logger.info(f"Email de garantia ativada agendado para envio assíncrono: {user['usuario_email']}")
                     
             except Exception as e:
                 logger.error(f"Erro ao agendar envio de email de garantia ativada: {e}")
@@ -571,11 +463,6 @@ def setup_garantia_routes(app, db: Database):
             
             # Buscar dados para reexibir o formulário
             try:
-                produtos_raw = db.execute(
-                    "SELECT id, sku, descricao FROM produtos WHERE ativo = TRUE ORDER BY sku"
-                ).fetchall()
-                produtos = [{'id': p[0], 'sku': p[1], 'descricao': p[2]} for p in produtos_raw]
-                
                 veiculos_raw = db.execute("""
                     SELECT id, marca, modelo, placa 
                     FROM veiculos 
@@ -584,7 +471,6 @@ def setup_garantia_routes(app, db: Database):
                 """, (user['usuario_id'],)).fetchall()
                 veiculos = [{'id': v[0], 'marca': v[1], 'modelo': v[2], 'placa': v[3]} for v in veiculos_raw]
             except:
-                produtos = []
                 veiculos = []
             
             content = Container(
@@ -608,7 +494,7 @@ def setup_garantia_routes(app, db: Database):
                         ),
                         card_component(
                             "Dados da Garantia",
-                            garantia_form(produtos, veiculos, {
+                            garantia_form(veiculos, {
                                 'produto_id': produto_id,
                                 'veiculo_id': veiculo_id,
                                 'lote_fabricacao': lote_fabricacao,
@@ -617,7 +503,7 @@ def setup_garantia_routes(app, db: Database):
                                 'nome_estabelecimento': nome_estabelecimento,
                                 'quilometragem': quilometragem,
                                 'observacoes': observacoes
-                            })
+                            }, produto_selecionado=catalogo.obter(produto_id))
                         ),
                         width=10,
                         offset=1
@@ -626,6 +512,21 @@ def setup_garantia_routes(app, db: Database):
             )
             return base_layout("Nova Garantia", content, user)
     
+    def buscar_produtos(request):
+        """Busca de produtos por prefixo de SKU ou descrição (typeahead HTMX)"""
+        termo = request.query_params.get('produto_busca', '').strip()
+        
+        if len(termo) < 2:
+            return produto_busca_resultados([], termo)
+        
+        try:
+            produtos = catalogo.buscar(termo)
+        except Exception as e:
+            logger.error(f"Erro ao buscar produtos por '{termo}': {e}")
+            produtos = []
+        
+        return produto_busca_resultados(produtos, termo)
+    
     def ver_garantia(request):
         """Visualizar detalhes da garantia"""
         user = request.state.usuario
@@ -763,10 +664,16 @@ def setup_garantia_routes(app, db: Database):
             # Alternar status
             novo_status = not garantia[0]
             
-            db.execute(
-                "UPDATE garantias SET ativo = ? WHERE id = ? AND usuario_id = ?",
+            # Reativar pode esbarrar no índice único de garantia ativa por
+            # produto/veículo: OR IGNORE pula a linha e o RETURNING vem vazio
+            alterada = db.execute(
+                "UPDATE OR IGNORE garantias SET ativo = ? WHERE id = ? AND usuario_id = ? RETURNING id",
                 (novo_status, garantia_id, user['usuario_id'])
-            )
+            ).fetchall()
+            
+            if not alterada:
+                logger.warning(f"Garantia {garantia_id} não reativada: já existe garantia ativa para o produto/veículo")
+                return RedirectResponse('/cliente/garantias?erro=garantia_ativa_existente', status_code=302)
             
             action = "ativada" if novo_status else "desativada"
             
@@ -785,6 +692,10 @@ def setup_garantia_routes(app, db: Database):
     nova_garantia_form = login_required(nova_garantia_form)
     app.get("/cliente/garantias/nova")(nova_garantia_form)
     
+    # Registrada antes de /cliente/garantias/{garantia_id}
+    buscar_produtos = login_required(buscar_produtos)
+    app.get("/cliente/garantias/produtos/busca")(buscar_produtos)
+    
     ver_garantia = login_required(ver_garantia)
     app.get("/cliente/garantias/{garantia_id}")(ver_garantia)
     
@@ -12,6 +12,7 @@ from fastlite import Database
 from app.auth import login_required, get_current_user
 from app.templates import *
 from app.date_utils import format_datetime_iso
+from app.unidade_trabalho import UnidadeTrabalho
 from models.veiculo import Veiculo
 from models.usuario import Usuario
 
@@ -32,7 +33,8 @@ def setup_veiculo_routes(app, db: Database):
         
         # Parâmetros de paginação
         page = int(request.query_params.get('page', 1))
-        page_size = int(request.query_params.get('page_size', 50))
+        # 'size' é o parâmetro gerado pela paginação; 'page_size' mantido por compatibilidade
+        page_size = int(request.query_params.get('size', request.query_params.get('page_size', 50)))
         
         # Validar parâmetros
         if page < 1:
@@ -90,6 +92,25 @@ def setup_veiculo_routes(app, db: Database):
         # Calcular total de páginas
         total_pages = math.ceil(total_veiculos / page_size) if total_veiculos > 0 else 1
         
+        # Tabela + paginação: único trecho devolvido nas requisições HTMX
+        listagem = listagem_component(
+            table_component(
+                ["Veículo", "Ano", "Placa", "Cor", "Status", "Ações"],
+                dados_tabela
+            ) if veiculos else P("Nenhum veículo cadastrado ainda.", cls="text-muted text-center py-4"),
+            pagination_component(
+                current_page=page,
+                total_pages=total_pages,
+                base_url="/cliente/veiculos",
+                page_size=page_size,
+                total_records=total_veiculos,
+                query_params=request.query_params,
+                hx_target=f"#{ALVO_LISTAGEM}"
+            ) if total_veiculos > 0 else None
+        )
+        if requisicao_htmx(request):
+            return listagem
+        
         content = Container(
             Row(
                 Col(
@@ -107,19 +128,7 @@ def setup_veiculo_routes(app, db: Database):
                 Col(
                     card_component(
                         None,  # Remove título redundante
-                        Div(
-                            table_component(
-                                ["Veículo", "Ano", "Placa", "Cor", "Status", "Ações"],
-                                dados_tabela
-                            ) if veiculos else P("Nenhum veículo cadastrado ainda.", cls="text-muted text-center py-4"),
-                            pagination_component(
-                                current_page=page,
-                                total_pages=total_pages,
-                                base_url="/cliente/veiculos",
-                                page_size=page_size,
-                                total_records=total_veiculos
-                            ) if total_veiculos > 0 else None
-                        )
+                        listagem
                     ),
                     width=12
                 )
@@ -232,28 +241,32 @@ def setup_veiculo_routes(app, db: Database):
             elif not re.match(r'^[A-HJ-NPR-Z0-9]{17}$', chassi):
                 errors['chassi'] = 'Chassi contém caracteres inválidos (não use I, O ou Q)'
         
-        # Verificar se placa já existe
+        # Chaves normalizadas (formato antigo e Mercosul unificados)
+        placa_norm = Veiculo.normalizar_placa(placa)
+        chassi_norm = Veiculo.normalizar_chassi(chassi)
+        
+        # Verificar se placa já existe (busca pelo índice único parcial)
         if not errors.get('placa'):
             placa_existente = db.execute(
-                "SELECT id FROM veiculos WHERE placa = ? AND ativo = TRUE",
-                (placa,)
+                "SELECT id FROM veiculos WHERE placa_norm = ? AND ativo = TRUE",
+                (placa_norm,)
             ).fetchone()
             
             if placa_existente:
                 errors['placa'] = 'Esta placa já está cadastrada no sistema'
         
         # Verificar se chassi já existe (se fornecido)
-        if chassi and not errors.get('chassi'):
+        if chassi_norm and not errors.get('chassi'):
             chassi_existente = db.execute(
-                "SELECT id FROM veiculos WHERE chassi = ? AND chassi != '' AND ativo = TRUE",
-                (chassi,)
+                "SELECT id FROM veiculos WHERE chassi_norm = ? AND ativo = TRUE",
+                (chassi_norm,)
             ).fetchone()
             
             if chassi_existente:
                 errors['chassi'] = 'Este chassi já está cadastrado no sistema'
         
-        if errors:
-            # Retornar formulário com erros
+        def formulario_com_erros():
+            """Retorna o formulário com os erros de validação"""
             content = Container(
                 Row(
                     Col(
@@ -284,6 +297,9 @@ def setup_veiculo_routes(app, db: Database):
             )
             return base_layout("Novo Veículo", content, user)
         
+        if errors:
+            return formulario_com_erros()
+        
         try:
             # Criar veículo
             veiculo = Veiculo(
@@ -298,19 +314,28 @@ def setup_veiculo_routes(app, db: Database):
                 ativo=True
             )
             
-            # Inserir no banco
-            db.execute("""
-                INSERT INTO veiculos (
-                    usuario_id, marca, modelo, ano_modelo, placa, cor, chassi, data_cadastro, ativo
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                veiculo.usuario_id, veiculo.marca, veiculo.modelo, veiculo.ano_modelo,
-                veiculo.placa, veiculo.cor, veiculo.chassi, format_datetime_iso(veiculo.data_cadastro), veiculo.ativo
-            ))
+            # Inserir no banco; o índice único resolve cadastros concorrentes
+            with UnidadeTrabalho(db) as uow:
+                inserido = uow.inserir('veiculos', {
+                    'usuario_id': veiculo.usuario_id,
+                    'marca': veiculo.marca,
+                    'modelo': veiculo.modelo,
+                    'ano_modelo': veiculo.ano_modelo,
+                    'placa': veiculo.placa,
+                    'cor': veiculo.cor,
+                    'chassi': veiculo.chassi,
+                    'placa_norm': placa_norm,
+                    'chassi_norm': chassi_norm,
+                    'data_cadastro': format_datetime_iso(veiculo.data_cadastro),
+                    'ativo': veiculo.ativo,
+                }, ignorar_conflito=True)
             
-            # Obter o ID do veículo inserido
-            veiculo_id = db.execute("SELECT last_insert_rowid()").fetchone()[0]
-
+            if not inserido:
+                logger.warning(f"Cadastro de veículo duplicado ignorado: {placa} (usuário {user['usuario_id']})")
+                errors['placa'] = 'Esta placa ou chassi já está cadastrado no sistema'
+                return formulario_com_erros()
+            
+            veiculo_id = inserido[0]
             
             logger.info(f"Novo veículo cadastrado: {placa} (ID: {veiculo_id}) pelo usuário {user['usuario_id']}")
             
@@ -467,16 +492,29 @@ def setup_veiculo_routes(app, db: Database):
         elif not Veiculo.validar_placa(placa):
             errors['placa'] = 'Formato de placa inválido (ABC1234 ou ABC1D23)'
         
+        placa_norm = Veiculo.normalizar_placa(placa)
+        chassi_norm = Veiculo.normalizar_chassi(chassi)
+        
         # Verificar se placa já existe (exceto o próprio veículo)
-        if not errors.get('placa') and placa.replace('-', '').replace(' ', '') != veiculo_atual[0].replace('-', '').replace(' ', ''):
+        if not errors.get('placa'):
             placa_existente = db.execute(
-                "SELECT id FROM veiculos WHERE placa = ? AND ativo = TRUE AND id != ?",
-                (placa, veiculo_id)
+                "SELECT id FROM veiculos WHERE placa_norm = ? AND ativo = TRUE AND id != ?",
+                (placa_norm, veiculo_id)
             ).fetchone()
             
             if placa_existente:
                 errors['placa'] = 'Esta placa já está cadastrada'
         
+        # Verificar se chassi já existe (exceto o próprio veículo)
+        if chassi_norm:
+            chassi_existente = db.execute(
+                "SELECT id FROM veiculos WHERE chassi_norm = ? AND ativo = TRUE AND id != ?",
+                (chassi_norm, veiculo_id)
+            ).fetchone()
+            
+            if chassi_existente:
+                errors['chassi'] = 'Este chassi já está cadastrado'
+        
         if errors:
             # Retornar formulário com erros
             content = Container(
@@ -513,10 +551,12 @@ def setup_veiculo_routes(app, db: Database):
             # Atualizar veículo
             db.execute("""
                 UPDATE veiculos 
-                SET marca = ?, modelo = ?, ano_modelo = ?, placa = ?, cor = ?, chassi = ?
+                SET marca = ?, modelo = ?, ano_modelo = ?, placa = ?, cor = ?, chassi = ?,
+                    placa_norm = ?, chassi_norm = ?
                 WHERE id = ? AND usuario_id = ?
             """, (
-                marca, modelo, ano, placa, cor, chassi, veiculo_id, user['usuario_id']
+                marca, modelo, ano, placa, cor, chassi, placa_norm, chassi_norm,
+                veiculo_id, user['usuario_id']
             ))
             
             logger.info(f"Veículo {veiculo_id} atualizado pelo usuário {user['usuario_id']}")
@@ -546,7 +586,7 @@ def setup_veiculo_routes(app, db: Database):
         try:
             # Buscar status atual
             veiculo = db.execute(
-                "SELECT ativo FROM veiculos WHERE id = ? AND usuario_id = ?",
+                "SELECT ativo, placa_norm, chassi_norm FROM veiculos WHERE id = ? AND usuario_id = ?",
                 (veiculo_id, user['usuario_id'])
             ).fetchone()
             
@@ -556,6 +596,17 @@ def setup_veiculo_routes(app, db: Database):
             # Alternar status
             novo_status = not veiculo[0]
             
+            # Reativação não pode duplicar placa/chassi de outro veículo ativo
+            if novo_status:
+                duplicado = db.execute("""
+                    SELECT id FROM veiculos
+                    WHERE ativo = TRUE AND id != ?
+                    AND (placa_norm = ? OR chassi_norm = ?)
+                """, (veiculo_id, veiculo[1], veiculo[2])).fetchone()
+                
+                if duplicado:
+                    return RedirectResponse('/cliente/veiculos?erro=duplicado', status_code=302)
+            
             db.execute(
                 "UPDATE veiculos SET ativo = ? WHERE id = ? AND usuario_id = ?",
                 (novo_status, veiculo_id, user['usuario_id'])
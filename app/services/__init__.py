@@ -1,11 +1,30 @@
 #!/usr/bin/env python3
 """
 Serviços da aplicação Viemar Garantia 70k
+
+Os serviços são carregados sob demanda para não pesar na inicialização da
+aplicação (driver do Firebird, importador do Caspio).
 """
 
-from .firebird_service import FirebirdService, get_firebird_service
+import importlib
+
+_LAZY_EXPORTS = {
+    'FirebirdService': '.firebird_service',
+    'get_firebird_service': '.firebird_service',
+    'CaspioImportService': '.caspio_import_service',
+    'ImportStats': '.caspio_import_service',
+    'CatalogoProdutos': '.catalogo_produtos',
+    'get_catalogo_produtos': '.catalogo_produtos',
+    'invalidar_catalogo_produtos': '.catalogo_produtos',
+}
+
+__all__ = list(_LAZY_EXPORTS)
 
-__all__ = [
-    'FirebirdService',
-    'get_firebird_service'
-]
\ No newline at end of file
+def __getattr__(name):
+    """Importa o módulo do serviço no primeiro acesso ao nome exportado"""
+    if name in _LAZY_EXPORTS:
+        module = importlib.import_module(_LAZY_EXPORTS[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
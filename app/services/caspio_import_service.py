@@ -13,13 +13,20 @@ import sqlite3
 import logging
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from dataclasses import dataclass
-from app.date_utils import format_date_iso, format_datetime_iso
+from app.date_utils import (
+    FORMATOS_CASPIO, format_date_iso, format_datetime_iso,
+    normalizar_data_iso, normalizar_datetime_iso
+)
+from models.veiculo import Veiculo
 
 # Configuração de logging
 logger = logging.getLogger(__name__)
 
+# Linhas do XML entre duas notificações de progresso
+INTERVALO_PROGRESSO = 100
+
 @dataclass
 class ImportStats:
     """Estatísticas de importação."""
@@ -54,6 +61,14 @@ class CaspioImportService:
         self.db_path = db_path
         self.caspio_xml_path = caspio_xml_path
         self.stats = ImportStats()
+        # Chamada com (etapa, linhas processadas, total de linhas) durante a
+        # importação; uma exceção levantada interrompe a etapa, que é desfeita
+        self.ao_progredir: Optional[Callable[[str, int, int], None]] = None
+        
+    def _notificar_progresso(self, etapa: str, atual: int, total: int):
+        """Repassa o progresso da etapa para ao_progredir, se definido."""
+        if self.ao_progredir:
+            self.ao_progredir(etapa, atual, total)
         
     def _get_db_connection(self) -> sqlite3.Connection:
         """Obtém conexão com o banco de dados."""
@@ -107,21 +122,10 @@ class CaspioImportService:
             return None
             
         try:
-            # Tenta diferentes formatos de data do Caspio
-            formats = [
-                '%m/%d/%Y %I:%M:%S %p',  # 11/9/2017 2:26:09 PM
-                '%m/%d/%Y',              # 4/14/1962
-                '%Y-%m-%d',              # 1962-04-14
-                '%d/%m/%Y',              # 14/04/1962
-            ]
-            
-            for fmt in formats:
-                try:
-                    dt = datetime.strptime(date_str, fmt)
-                    return format_date_iso(dt)
-                except ValueError:
-                    continue
-                    
+            data_iso = normalizar_data_iso(date_str, FORMATOS_CASPIO)
+            if data_iso:
+                return data_iso
+            
             logger.warning(f"Formato de data não reconhecido: {date_str}")
             return None
             
@@ -159,10 +163,17 @@ class CaspioImportService:
         Returns:
             True se veículo já existe
         """
-        cursor = conn.execute(
-            "SELECT id FROM veiculos WHERE usuario_id = ? AND placa = ?",
-            (user_id, placa)
-        )
+        placa_norm = Veiculo.normalizar_placa(placa)
+        if placa_norm:
+            cursor = conn.execute(
+                "SELECT id FROM veiculos WHERE placa_norm = ? AND usuario_id = ?",
+                (placa_norm, user_id)
+            )
+        else:
+            cursor = conn.execute(
+                "SELECT id FROM veiculos WHERE usuario_id = ? AND placa = ?",
+                (user_id, placa)
+            )
         return cursor.fetchone() is not None
     
     def _get_user_id_by_caspio_id(self, conn: sqlite3.Connection, caspio_id: str) -> Optional[int]:
@@ -210,7 +221,11 @@ class CaspioImportService:
             conn = self._get_db_connection()
             
             try:
-                for row in cliente_table.findall('Row'):
+                linhas = cliente_table.findall('Row')
+                for indice, row in enumerate(linhas, 1):
+                    if indice % INTERVALO_PROGRESSO == 0:
+                        self._notificar_progresso('usuários', indice, len(linhas))
+                    
                     try:
                         # Extrai dados do usuário
                         caspio_id = row.find('ID_CLIENTE').text if row.find('ID_CLIENTE') is not None else None
@@ -316,7 +331,11 @@ class CaspioImportService:
             conn = self._get_db_connection()
             
             try:
-                for row in veiculo_table.findall('Row'):
+                linhas = veiculo_table.findall('Row')
+                for indice, row in enumerate(linhas, 1):
+                    if indice % INTERVALO_PROGRESSO == 0:
+                        self._notificar_progresso('veículos', indice, len(linhas))
+                    
                     try:
                         # Extrai dados do veículo
                         caspio_cliente_id = row.find('ID_CLIENTE').text if row.find('ID_CLIENTE') is not None else None
@@ -357,16 +376,22 @@ class CaspioImportService:
                             if not processed_ano_modelo:
                                 processed_ano_modelo = None
                         
-                        # Insere veículo
+                        # Insere veículo (placa ativa de outro usuário é ignorada pelo índice único)
                         cursor = conn.execute("""
                             INSERT INTO veiculos (
-                                usuario_id, marca, modelo, ano_modelo, placa, data_cadastro
-                            ) VALUES (?, ?, ?, ?, ?, ?)
+                                usuario_id, marca, modelo, ano_modelo, placa, placa_norm, data_cadastro
+                            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                            ON CONFLICT DO NOTHING
                         """, (
                             user_id, marca, modelo, processed_ano_modelo, placa,
-                            format_datetime_iso(datetime.now())
+                            Veiculo.normalizar_placa(placa), format_datetime_iso(datetime.now())
                         ))
                         
+                        if cursor.rowcount == 0:
+                            logger.warning(f"Veículo com placa já cadastrada ignorado: {placa}")
+                            self.stats.vehicles_skipped += 1
+                            continue
+                        
                         self.stats.vehicles_imported += 1
                         
                         if self.stats.vehicles_imported % 100 == 0:
@@ -419,7 +444,11 @@ class CaspioImportService:
             conn = self._get_db_connection()
             
             try:
-                for row in produto_table.findall('Row'):
+                linhas = produto_table.findall('Row')
+                for indice, row in enumerate(linhas, 1):
+                    if indice % INTERVALO_PROGRESSO == 0:
+                        self._notificar_progresso('garantias', indice, len(linhas))
+                    
                     try:
                         # Extrai dados da garantia da tabela PRODUTO_APLICADO
                         caspio_cliente_id = row.find('ID_CLIENTE').text if row.find('ID_CLIENTE') is not None else None
@@ -516,7 +545,9 @@ class CaspioImportService:
                             self.stats.warranties_skipped += 1
                             continue
                         
-                        # Insere garantia na tabela garantias
+                        # Insere garantia na tabela garantias; uma garantia ativa já
+                        # existente para o produto no veículo (índice único de
+                        # m0012, comum em reimportações) faz a linha ser ignorada
                         cursor = conn.execute("""
                             INSERT INTO garantias (
                                 usuario_id, produto_id, veiculo_id, lote_fabricacao, 
@@ -525,14 +556,22 @@ class CaspioImportService:
                                 oficina_nome, oficina_nf, data_aplicacao_caspio,
                                 km_aplicacao, data_cadastro, ativo
                             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                            ON CONFLICT DO NOTHING
                         """, (
                             user_id, produto_id, vehicle_id, lote,
                             data_instalacao, nf_oficina or '', nome_oficina or '',
                             quilometragem, referencia, lote, nome_oficina, nf_oficina,
-                            data_aplicacao, quilometragem,
-                            self._parse_caspio_date(data_cadastro) or format_date_iso(datetime.now()),
+                            normalizar_datetime_iso(data_aplicacao, FORMATOS_CASPIO) or data_aplicacao,
+                            quilometragem,
+                            normalizar_datetime_iso(data_cadastro, FORMATOS_CASPIO) or format_datetime_iso(datetime.now()),
                             True
                         ))
+                        if cursor.rowcount == 0:
+                            logger.debug(
+                                f"Garantia ignorada: produto {referencia} já tem garantia ativa no veículo {vehicle_id}"
+                            )
+                            self.stats.warranties_skipped += 1
+                            continue
                         
                         self.stats.warranties_imported += 1
                         
@@ -550,6 +589,21 @@ class CaspioImportService:
             finally:
                 conn.close()
             
+            # Produtos podem ter sido criados a partir das referências do Caspio
+            from .catalogo_produtos import invalidar_catalogo_produtos
+            invalidar_catalogo_produtos()
+            
+            # Oficinas das garantias importadas (texto livre) viram estabelecimentos
+            from fastlite import Database
+            from app.database import fechar_banco
+            from app.estabelecimentos import vincular_estabelecimentos
+            db = Database(self.db_path)
+            try:
+                vincular_estabelecimentos(db)
+            finally:
+                # PRAGMA optimize ao fechar: a importação muda muito as tabelas
+                fechar_banco(db)
+            
             logger.info(f"Importação de garantias concluída: {self.stats.warranties_imported} importadas, {self.stats.warranties_skipped} ignoradas")
             return self.stats.warranties_imported
             
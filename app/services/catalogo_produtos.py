@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Catálogo de produtos ativos em memória
+
+Evita consultar e renderizar todos os produtos a cada abertura do
+formulário de garantia. O catálogo é carregado na primeira consulta e
+invalidado pela sincronização com o ERP e pelo cadastro, edição e
+ativação/desativação de produtos.
+"""
+
+import bisect
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from fastlite import Database
+
+logger = logging.getLogger(__name__)
+
+LIMITE_BUSCA_PADRAO = 20
+
+
+def _normalizar(texto: str) -> str:
+    """Normaliza texto para comparação por prefixo"""
+    return (texto or '').strip().casefold()
+
+
+class CatalogoProdutos:
+    """
+    Cache dos produtos ativos com busca por prefixo de SKU ou descrição
+
+    A busca usa listas ordenadas de chaves normalizadas e ``bisect`` para
+    localizar o intervalo do prefixo sem percorrer o catálogo inteiro.
+    """
+
+    def __init__(self, db: Database):
+        """
+        Inicializa o catálogo (vazio até a primeira consulta)
+
+        Args:
+            db: Instância do banco de dados SQLite
+        """
+        self.db = db
+        self._lock = threading.Lock()
+        self._produtos: Optional[Dict[int, Dict]] = None
+        self._indice_sku: List[Tuple[str, int]] = []
+        self._indice_descricao: List[Tuple[str, int]] = []
+
+    def _carregar(self):
+        """Lê os produtos ativos e monta os índices de prefixo"""
+        rows = self.db.execute(
+            "SELECT id, sku, descricao FROM produtos WHERE ativo = TRUE ORDER BY sku"
+        ).fetchall()
+
+        produtos = {}
+        indice_sku = []
+        indice_descricao = []
+        for row in rows:
+            produtos[row[0]] = {'id': row[0], 'sku': row[1], 'descricao': row[2] or ''}
+            indice_sku.append((_normalizar(row[1]), row[0]))
+            # Indexar a descrição completa e cada palavra dela
+            descricao = _normalizar(row[2])
+            palavras = descricao.split()
+            for i in range(len(palavras)):
+                indice_descricao.append((' '.join(palavras[i:]), row[0]))
+
+        indice_sku.sort()
+        indice_descricao.sort()
+
+        self._produtos = produtos
+        self._indice_sku = indice_sku
+        self._indice_descricao = indice_descricao
+        logger.info(f"Catálogo de produtos carregado: {len(produtos)} produtos ativos")
+
+    def _garantir_carregado(self) -> Dict[int, Dict]:
+        """Carrega o catálogo se ainda não estiver em memória"""
+        produtos = self._produtos
+        if produtos is None:
+            with self._lock:
+                if self._produtos is None:
+                    self._carregar()
+                produtos = self._produtos
+        return produtos
+
+    def invalidar(self):
+        """Descarta o catálogo em memória (recarregado na próxima consulta)"""
+        with self._lock:
+            self._produtos = None
+            self._indice_sku = []
+            self._indice_descricao = []
+        logger.debug("Catálogo de produtos invalidado")
+
+    def listar(self) -> List[Dict]:
+        """Retorna todos os produtos ativos ordenados por SKU"""
+        produtos = self._garantir_carregado()
+        return sorted(produtos.values(), key=lambda p: p['sku'])
+
+    def obter(self, produto_id) -> Optional[Dict]:
+        """
+        Retorna um produto ativo pelo ID
+
+        Args:
+            produto_id: ID do produto (int ou string numérica)
+
+        Returns:
+            Dicionário do produto ou None se não existir/estiver inativo
+        """
+        try:
+            produto_id = int(produto_id)
+        except (TypeError, ValueError):
+            return None
+        return self._garantir_carregado().get(produto_id)
+
+    @staticmethod
+    def _buscar_prefixo(indice: List[Tuple[str, int]], prefixo: str) -> List[int]:
+        """Retorna os IDs cujas chaves começam com o prefixo"""
+        inicio = bisect.bisect_left(indice, (prefixo,))
+        ids = []
+        for chave, produto_id in indice[inicio:]:
+            if not chave.startswith(prefixo):
+                break
+            ids.append(produto_id)
+        return ids
+
+    def buscar(self, termo: str, limite: int = LIMITE_BUSCA_PADRAO) -> List[Dict]:
+        """
+        Busca produtos pelo prefixo do SKU ou de palavras da descrição
+
+        Args:
+            termo: Texto digitado pelo usuário
+            limite: Quantidade máxima de resultados
+
+        Returns:
+            Lista de produtos (SKUs correspondentes primeiro)
+        """
+        prefixo = _normalizar(termo)
+        if not prefixo:
+            return []
+
+        produtos = self._garantir_carregado()
+        indice_sku, indice_descricao = self._indice_sku, self._indice_descricao
+
+        resultado = []
+        vistos = set()
+        for produto_id in (self._buscar_prefixo(indice_sku, prefixo) +
+                           self._buscar_prefixo(indice_descricao, prefixo)):
+            if produto_id in vistos or produto_id not in produtos:
+                continue
+            vistos.add(produto_id)
+            resultado.append(produtos[produto_id])
+            if len(resultado) >= limite:
+                break
+
+        return resultado
+
+
+# Instância global do catálogo
+_catalogo_produtos: Optional[CatalogoProdutos] = None
+
+
+def get_catalogo_produtos(db: Database) -> CatalogoProdutos:
+    """
+    Retorna o catálogo de produtos (singleton por banco de dados)
+
+    Args:
+        db: Instância do banco de dados SQLite
+
+    Returns:
+        Instância do CatalogoProdutos
+    """
+    global _catalogo_produtos
+
+    if _catalogo_produtos is None or _catalogo_produtos.db is not db:
+        _catalogo_produtos = CatalogoProdutos(db)
+
+    return _catalogo_produtos
+
+
+def invalidar_catalogo_produtos():
+    """Invalida o catálogo após alterações na tabela de produtos"""
+    if _catalogo_produtos is not None:
+        _catalogo_produtos.invalidar()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Substituto local (SQLite) do driver do Firebird
+
+Permite executar e testar a sincronização com o ERP Tecnicon sem acesso
+ao servidor. Expõe ``connect`` com os mesmos parâmetros usados pelo
+FirebirdService e cria as tabelas consultadas pelo serviço (PRODUTO e
+RDB$DATABASE). Ativado com FIREBIRD_DRIVER=sqlite; nesse caso
+FIREBIRD_DATABASE é o caminho do arquivo SQLite.
+"""
+
+import sqlite3
+from typing import Iterable, Tuple
+
+SCHEMA_ERP = """
+    CREATE TABLE IF NOT EXISTS PRODUTO (
+        REF_FORNECE TEXT,
+        DESCRICAO TEXT,
+        CGRUPO INTEGER,
+        CSUBGRUPO INTEGER,
+        ATIVO TEXT
+    );
+    CREATE TABLE IF NOT EXISTS RDB$DATABASE (RDB$RELATION_ID INTEGER);
+    INSERT INTO RDB$DATABASE SELECT 1 WHERE NOT EXISTS (SELECT 1 FROM RDB$DATABASE);
+"""
+
+# Grupo e subgrupo filtrados pela consulta de produtos do serviço
+CGRUPO_PADRAO = 48
+CSUBGRUPO_PADRAO = 48
+
+
+def connect(database: str, user: str = None, password: str = None,
+            role: str = None, charset: str = None, **kwargs) -> sqlite3.Connection:
+    """
+    Abre o banco SQLite que faz o papel do ERP
+
+    Os parâmetros de autenticação são aceitos para manter a assinatura do
+    firebird.driver e ignorados.
+    """
+    conexao = sqlite3.connect(database, check_same_thread=False)
+    conexao.executescript(SCHEMA_ERP)
+    return conexao
+
+
+def inserir_produtos(conexao: sqlite3.Connection, produtos: Iterable[Tuple[str, str]],
+                     ativo: str = 'S'):
+    """
+    Cadastra produtos (sku, descrição) no ERP local
+
+    Args:
+        conexao: Conexão retornada por ``connect``
+        produtos: Pares (REF_FORNECE, DESCRICAO)
+        ativo: Valor da coluna ATIVO ('S' ou 'N')
+    """
+    conexao.executemany(
+        "INSERT INTO PRODUTO (REF_FORNECE, DESCRICAO, CGRUPO, CSUBGRUPO, ATIVO) VALUES (?, ?, ?, ?, ?)",
+        [(sku, descricao, CGRUPO_PADRAO, CSUBGRUPO_PADRAO, ativo) for sku, descricao in produtos]
+    )
+    conexao.commit()
@@ -3,21 +3,64 @@
 Serviço de integração com ERP Tecnicon
 """
 
+import hashlib
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+import time
+from collections import deque
+from typing import List, Dict, Any, Callable, Iterator, Optional
 from contextlib import contextmanager
 
-try:
-    import firebird.driver as fb
-except ImportError:
-    raise ImportError("firebird-driver não está instalado. Execute: uv add firebird-driver")
+from fastlite import Database
 
 from ..config import Config
+from ..unidade_trabalho import UnidadeTrabalho
 # Removido import incorreto de get_db
 from models.produto import Produto
 
 logger = logging.getLogger(__name__)
 
+# Driver do Firebird carregado sob demanda (importação lenta e usada apenas
+# na sincronização com o ERP)
+fb = None
+
+def _get_driver():
+    """
+    Importa o driver do Firebird no primeiro uso
+    
+    Returns:
+        Módulo firebird.driver
+    """
+    global fb
+    
+    if fb is None:
+        try:
+            import firebird.driver as driver
+        except ImportError:
+            raise ImportError("firebird-driver não está instalado. Execute: uv add firebird-driver")
+        fb = driver
+    
+    return fb
+
+
+QUERY_PRODUTOS_ERP = """
+        SELECT 
+            PRODUTO.REF_FORNECE, 
+            PRODUTO.DESCRICAO 
+        FROM 
+            PRODUTO 
+        WHERE 
+            PRODUTO.CGRUPO = 48 
+            AND PRODUTO.ATIVO = 'S' 
+            AND PRODUTO.CSUBGRUPO IN (11938, 48, 17, 116, 12836)
+        """
+
+
+def hash_produto(sku: str, descricao: str) -> str:
+    """Hash do conteúdo de um produto do ERP, comparado com o último snapshot"""
+    return hashlib.sha1(f"{sku}\x1f{descricao}".encode('utf-8')).hexdigest()
+
+
 class FirebirdService:
     """
     Serviço para conectar e sincronizar dados com o ERP Tecnicon
@@ -32,6 +75,13 @@ class FirebirdService:
         """
         self.config = config
         self._connection_string = self._build_connection_string()
+        # Conexões ociosas: (conexão, instante em que foi devolvida)
+        self._pool = deque()
+        self._pool_lock = threading.Lock()
+    
+    def _config(self, nome: str, padrao):
+        """Lê uma configuração opcional (configurações de teste podem não tê-la)"""
+        return getattr(self.config, nome, padrao)
         
     def _build_connection_string(self) -> str:
         """
@@ -46,43 +96,105 @@ class FirebirdService:
             f"?role={self.config.FIREBIRD_ROLE}&charset={self.config.FIREBIRD_CHARSET}"
         )
     
+    def _abrir_conexao(self):
+        """
+        Abre uma nova conexão com o ERP
+        
+        Returns:
+            Conexão do firebird.driver ou do substituto local em SQLite
+        """
+        if self._config('FIREBIRD_DRIVER', 'firebird') == 'sqlite':
+            from . import erp_sqlite_driver
+            return erp_sqlite_driver.connect(database=str(self.config.FIREBIRD_DATABASE))
+        
+        # Usar string de conexão completa ou configurar servidor
+        dsn = f"{self.config.FIREBIRD_HOST}:{self.config.FIREBIRD_DATABASE}"
+        
+        # Configurações de conexão com tratamento de charset
+        connection_params = {
+            'database': dsn,
+            'user': self.config.FIREBIRD_USER,
+            'password': self.config.FIREBIRD_PASSWORD,
+            'role': self.config.FIREBIRD_ROLE,
+            'charset': 'ISO8859_1'  # Encoding correto para Firebird
+        }
+        
+        logger.info(f"Conectando com charset: {self.config.FIREBIRD_CHARSET}")
+        return _get_driver().connect(**connection_params)
+    
+    def _retirar_do_pool(self):
+        """Retorna uma conexão ociosa do pool ou None, descartando as expiradas"""
+        ocioso_max = self._config('FIREBIRD_POOL_IDLE_SECONDS', 300)
+        while True:
+            with self._pool_lock:
+                if not self._pool:
+                    return None
+                connection, devolvida_em = self._pool.pop()
+            if time.monotonic() - devolvida_em <= ocioso_max:
+                return connection
+            self._fechar(connection)
+    
+    def _devolver_ao_pool(self, connection):
+        """Encerra a transação da conexão e a devolve ao pool (ou fecha se estiver cheio)"""
+        try:
+            connection.rollback()
+        except Exception as e:
+            logger.warning(f"Conexão com Firebird descartada ao devolver ao pool: {e}")
+            self._fechar(connection)
+            return
+        
+        with self._pool_lock:
+            if len(self._pool) < self._config('FIREBIRD_POOL_SIZE', 2):
+                self._pool.append((connection, time.monotonic()))
+                return
+        self._fechar(connection)
+    
+    def _fechar(self, connection):
+        """Fecha uma conexão ignorando falhas"""
+        try:
+            connection.close()
+            logger.info("Conexão com Firebird fechada")
+        except Exception as e:
+            logger.error(f"Erro ao fechar conexão com Firebird: {e}")
+    
+    def fechar_conexoes(self):
+        """Fecha todas as conexões ociosas do pool"""
+        with self._pool_lock:
+            conexoes = [connection for connection, _ in self._pool]
+            self._pool.clear()
+        for connection in conexoes:
+            self._fechar(connection)
+    
     @contextmanager
     def get_connection(self):
         """
         Context manager para conexão com Firebird
         
+        Reaproveita conexões do pool. Em caso de erro durante o uso a
+        conexão é fechada em vez de voltar ao pool.
+        
         Yields:
             Conexão ativa com o Firebird
         """
         connection = None
+        sucesso = False
         try:
-            logger.info("Conectando ao ERP Tecnicon...")
-            # Usar string de conexão completa ou configurar servidor
-            dsn = f"{self.config.FIREBIRD_HOST}:{self.config.FIREBIRD_DATABASE}"
-            
-            # Configurações de conexão com tratamento de charset
-            connection_params = {
-                'database': dsn,
-                'user': self.config.FIREBIRD_USER,
-                'password': self.config.FIREBIRD_PASSWORD,
-                'role': self.config.FIREBIRD_ROLE,
-                'charset': 'ISO8859_1'  # Encoding correto para Firebird
-            }
-            
-            logger.info(f"Conectando com charset: {self.config.FIREBIRD_CHARSET}")
-            connection = fb.connect(**connection_params)
-            logger.info("Conexão com Firebird estabelecida com sucesso")
+            connection = self._retirar_do_pool()
+            if connection is None:
+                logger.info("Conectando ao ERP Tecnicon...")
+                connection = self._abrir_conexao()
+                logger.info("Conexão com Firebird estabelecida com sucesso")
             yield connection
+            sucesso = True
         except Exception as e:
             logger.error(f"Erro ao conectar com Firebird: {e}")
             raise
         finally:
-            if connection:
-                try:
-                    connection.close()
-                    logger.info("Conexão com Firebird fechada")
-                except Exception as e:
-                    logger.error(f"Erro ao fechar conexão com Firebird: {e}")
+            if connection is not None:
+                if sucesso:
+                    self._devolver_ao_pool(connection)
+                else:
+                    self._fechar(connection)
     
     def test_connection(self) -> bool:
         """
@@ -101,6 +213,65 @@ class FirebirdService:
             logger.error(f"Teste de conexão falhou: {e}")
             return False
     
+    def _converter_linha(self, row) -> Optional[Dict[str, str]]:
+        """Converte uma linha (REF_FORNECE, DESCRICAO) do ERP em dicionário"""
+        try:
+            # Garantir que os dados sejam tratados como UTF-8
+            sku = row[0].strip() if row[0] else ''
+            descricao = row[1].strip() if row[1] else ''
+            
+            # Se os dados vierem como bytes, decodificar com ISO8859_1
+            if isinstance(sku, bytes):
+                sku = sku.decode('iso8859-1', errors='replace')
+            if isinstance(descricao, bytes):
+                descricao = descricao.decode('iso8859-1', errors='replace')
+            
+            return {
+                'sku': sku,
+                'descricao': descricao
+            }
+        except UnicodeDecodeError as e:
+            logger.warning(f"Erro de encoding no produto {row}: {e}")
+            # Tentar com latin-1 como fallback
+            try:
+                sku = row[0].decode('latin-1') if isinstance(row[0], bytes) else str(row[0]).strip()
+                descricao = row[1].decode('latin-1') if isinstance(row[1], bytes) else str(row[1]).strip()
+                return {
+                    'sku': sku,
+                    'descricao': descricao
+                }
+            except Exception as fallback_error:
+                logger.error(f"Erro ao processar produto com fallback {row}: {fallback_error}")
+                return None
+    
+    def iterar_produtos_erp(self, tamanho_lote: Optional[int] = None) -> Iterator[Dict[str, str]]:
+        """
+        Percorre os produtos do ERP Tecnicon em lotes (fetchmany)
+        
+        A conexão fica em uso enquanto o iterador é consumido e volta ao
+        pool ao final.
+        
+        Args:
+            tamanho_lote: Linhas lidas por vez (padrão: FIREBIRD_FETCH_SIZE)
+            
+        Yields:
+            Dicionários com sku e descricao
+        """
+        tamanho_lote = tamanho_lote or self._config('FIREBIRD_FETCH_SIZE', 500)
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(QUERY_PRODUTOS_ERP)
+            
+            while True:
+                linhas = cursor.fetchmany(tamanho_lote)
+                if not linhas:
+                    break
+                for row in linhas:
+                    produto = self._converter_linha(row)
+                    if produto is not None:
+                        yield produto
+    
     def get_produtos_erp(self) -> List[Dict[str, Any]]:
         """
         Busca produtos do ERP Tecnicon
@@ -108,69 +279,76 @@ class FirebirdService:
         Returns:
             Lista de dicionários com os dados dos produtos
         """
-        query = """
-        SELECT 
-            PRODUTO.REF_FORNECE, 
-            PRODUTO.DESCRICAO 
-        FROM 
-            PRODUTO 
-        WHERE 
-            PRODUTO.CGRUPO = 48 
-            AND PRODUTO.ATIVO = 'S' 
-            AND PRODUTO.CSUBGRUPO IN (11938, 48, 17, 116, 12836)
-        """
-        
-        produtos = []
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(query)
-                
-                for row in cursor.fetchall():
-                    try:
-                        # Garantir que os dados sejam tratados como UTF-8
-                        sku = row[0].strip() if row[0] else ''
-                        descricao = row[1].strip() if row[1] else ''
-                        
-                        # Se os dados vierem como bytes, decodificar com ISO8859_1
-                        if isinstance(sku, bytes):
-                            sku = sku.decode('iso8859-1', errors='replace')
-                        if isinstance(descricao, bytes):
-                            descricao = descricao.decode('iso8859-1', errors='replace')
-                        
-                        produto = {
-                            'sku': sku,
-                            'descricao': descricao
-                        }
-                        produtos.append(produto)
-                    except UnicodeDecodeError as e:
-                        logger.warning(f"Erro de encoding no produto {row}: {e}")
-                        # Tentar com latin-1 como fallback
-                        try:
-                            sku = row[0].decode('latin-1') if isinstance(row[0], bytes) else str(row[0]).strip()
-                            descricao = row[1].decode('latin-1') if isinstance(row[1], bytes) else str(row[1]).strip()
-                            produto = {
-                                'sku': sku,
-                                'descricao': descricao
-                            }
-                            produtos.append(produto)
-                        except Exception as fallback_error:
-                            logger.error(f"Erro ao processar produto com fallback {row}: {fallback_error}")
-                            continue
-                    
-                logger.info(f"Encontrados {len(produtos)} produtos no ERP")
-                return produtos
-                
+            produtos = list(self.iterar_produtos_erp())
+            logger.info(f"Encontrados {len(produtos)} produtos no ERP")
+            return produtos
         except Exception as e:
             logger.error(f"Erro ao buscar produtos do ERP: {e}")
             raise
     
-    def sync_produtos(self, db) -> Dict[str, int]:
+    def _gravar_lote(self, db, lote: List[tuple], stats: Dict[str, int]):
+        """
+        Grava no SQLite os produtos alterados desde o último snapshot
+        
+        Na primeira sincronização (sem snapshot) produtos com a mesma
+        descrição apenas registram o hash, sem reescrever a linha.
+        
+        Args:
+            db: Instância do banco de dados SQLite
+            lote: Tuplas (sku, descricao, hash)
+            stats: Estatísticas atualizadas no lugar
+        """
+        with UnidadeTrabalho(db):
+            for sku, descricao, hash_atual in lote:
+                try:
+                    produto_existente = db.execute(
+                        "SELECT id, descricao FROM produtos WHERE sku = ?",
+                        (sku,)
+                    ).fetchone()
+                    
+                    if produto_existente is None:
+                        db.execute(
+                            "INSERT INTO produtos (sku, descricao, data_cadastro, data_atualizacao) VALUES (?, ?, datetime('now', 'localtime'), datetime('now', 'localtime'))",
+                            (sku, descricao)
+                        )
+                        stats['inseridos'] += 1
+                        logger.info(f"Produto inserido: {sku} - {descricao}")
+                    elif produto_existente[1] != descricao:
+                        db.execute(
+                            "UPDATE produtos SET descricao = ?, data_atualizacao = datetime('now', 'localtime') WHERE sku = ?",
+                            (descricao, sku)
+                        )
+                        stats['atualizados'] += 1
+                        logger.info(f"Produto atualizado: {sku} - {descricao}")
+                    else:
+                        stats['inalterados'] += 1
+                    
+                    db.execute("""
+                        INSERT INTO erp_produtos_snapshot (sku, hash, sincronizado_em)
+                        VALUES (?, ?, datetime('now', 'localtime'))
+                        ON CONFLICT (sku) DO UPDATE SET
+                            hash = excluded.hash, sincronizado_em = excluded.sincronizado_em
+                    """, (sku, hash_atual))
+                except Exception as e:
+                    logger.error(f"Erro ao processar produto {sku}: {e}")
+                    stats['erros'] += 1
+    
+    def sync_produtos(self, db, tamanho_lote: Optional[int] = None,
+                      ao_progredir: Optional[Callable[[Dict[str, int]], None]] = None) -> Dict[str, int]:
         """
         Sincroniza produtos do ERP com o sistema local
         
+        Os produtos são lidos do ERP em lotes e comparados pelo hash do
+        conteúdo com o snapshot da última sincronização; somente os
+        alterados são gravados, um lote por transação.
+        
         Args:
             db: Instância do banco de dados SQLite
+            tamanho_lote: Produtos lidos e gravados por vez (padrão: FIREBIRD_FETCH_SIZE)
+            ao_progredir: Chamada com as estatísticas parciais a cada lote; pode
+                interromper a sincronização levantando uma exceção (lotes já
+                gravados são mantidos)
             
         Returns:
             Dicionário com estatísticas da sincronização
@@ -182,61 +360,48 @@ class FirebirdService:
             'inalterados': 0,
             'erros': 0
         }
+        tamanho_lote = tamanho_lote or self._config('FIREBIRD_FETCH_SIZE', 500)
         
         try:
-            # Busca produtos do ERP
-            produtos_erp = self.get_produtos_erp()
-            stats['total_erp'] = len(produtos_erp)
+            # Produtos removidos localmente não contam como sincronizados
+            snapshot = dict(db.execute("""
+                SELECT s.sku, s.hash FROM erp_produtos_snapshot s
+                JOIN produtos p ON p.sku = s.sku
+            """).fetchall())
             
-            if not produtos_erp:
-                logger.warning("Nenhum produto encontrado no ERP")
-                return stats
+            alterados = []
+            for produto_erp in self.iterar_produtos_erp(tamanho_lote):
+                stats['total_erp'] += 1
+                if ao_progredir and stats['total_erp'] % tamanho_lote == 0:
+                    ao_progredir(stats)
+                
+                sku = produto_erp['sku']
+                descricao = produto_erp['descricao']
+                
+                if not sku or not descricao:
+                    logger.warning(f"Produto com dados incompletos ignorado: {produto_erp}")
+                    stats['erros'] += 1
+                    continue
+                
+                hash_atual = hash_produto(sku, descricao)
+                if snapshot.get(sku) == hash_atual:
+                    stats['inalterados'] += 1
+                    continue
+                
+                alterados.append((sku, descricao, hash_atual))
+                if len(alterados) >= tamanho_lote:
+                    self._gravar_lote(db, alterados, stats)
+                    alterados = []
             
-            # Usa o banco de dados passado como parâmetro
+            if alterados:
+                self._gravar_lote(db, alterados, stats)
             
-            for produto_erp in produtos_erp:
-                try:
-                    sku = produto_erp['sku']
-                    descricao = produto_erp['descricao']
-                    
-                    if not sku or not descricao:
-                        logger.warning(f"Produto com dados incompletos ignorado: {produto_erp}")
-                        stats['erros'] += 1
-                        continue
-                    
-                    # Verifica se o produto já existe
-                    produto_existente = db.execute(
-                        "SELECT id, descricao FROM produtos WHERE sku = ?",
-                        (sku,)
-                    ).fetchone()
-                    
-                    if produto_existente:
-                        # Produto existe - verifica se precisa atualizar
-                        # produto_existente é uma tupla: (id, descricao)
-                        descricao_existente = produto_existente[1] if len(produto_existente) > 1 else ''
-                        if descricao_existente != descricao:
-                            db.execute(
-                                "UPDATE produtos SET descricao = ?, data_atualizacao = CURRENT_TIMESTAMP WHERE sku = ?",
-                                (descricao, sku)
-                            )
-                            stats['atualizados'] += 1
-                            logger.info(f"Produto atualizado: {sku} - {descricao}")
-                        else:
-                            stats['inalterados'] += 1
-                    else:
-                        # Produto não existe - insere novo
-                        db.execute(
-                            "INSERT INTO produtos (sku, descricao, data_cadastro, data_atualizacao) VALUES (?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)",
-                            (sku, descricao)
-                        )
-                        stats['inseridos'] += 1
-                        logger.info(f"Produto inserido: {sku} - {descricao}")
-                        
-                except Exception as e:
-                    logger.error(f"Erro ao processar produto {produto_erp}: {e}")
-                    stats['erros'] += 1
+            if not stats['total_erp']:
+                logger.warning("Nenhum produto encontrado no ERP")
             
-            # As alterações são commitadas automaticamente pelo fastlite
+            if stats['inseridos'] or stats['atualizados']:
+                from .catalogo_produtos import invalidar_catalogo_produtos
+                invalidar_catalogo_produtos()
             
             logger.info(f"Sincronização concluída: {stats}")
             return stats
@@ -246,6 +411,7 @@ class FirebirdService:
             stats['erros'] += 1
             raise
 
+
 # Instância global do serviço
 _firebird_service: Optional[FirebirdService] = None
 
@@ -267,4 +433,5 @@ def get_firebird_service(config: Optional[Config] = None) -> FirebirdService:
             config = Config()
         _firebird_service = FirebirdService(config)
     
-    return _firebird_service
\ No newline at end of file
+    return _firebird_service
+
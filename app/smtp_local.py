@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Servidor SMTP local para testes e benchmarks
+
+Implementa o mínimo do protocolo (EHLO/HELO, MAIL, RCPT, DATA, RSET,
+NOOP, QUIT, com PIPELINING) e guarda as mensagens recebidas em memória,
+sem entregá-las. ``latencia`` simula a ida e volta até o relay real: as
+respostas acumuladas são enviadas, após esse atraso, quando o servidor
+precisa esperar o próximo comando. Comandos enviados juntos (PIPELINING)
+custam uma única ida e volta, como em um relay de verdade.
+
+Uso:
+    with ServidorSMTPLocal() as servidor:
+        EntregaSMTP('127.0.0.1', servidor.porta, 'garantia@viemar.com.br', usar_tls=False)
+"""
+
+import socketserver
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+
+@dataclass
+class MensagemRecebida:
+    """Mensagem aceita pelo servidor local"""
+    remetente: str
+    destinatarios: List[str]
+    dados: bytes
+
+
+class _SessaoSMTP(socketserver.BaseRequestHandler):
+    """Uma conexão SMTP"""
+
+    def setup(self):
+        self._entrada = b''
+        self._pendentes: List[bytes] = []
+
+    def _responder(self, *linhas: str):
+        self._pendentes.append(''.join(f"{linha}\r\n" for linha in linhas).encode('ascii'))
+
+    def _enviar_pendentes(self):
+        if self._pendentes:
+            time.sleep(self.server.latencia)
+            self.request.sendall(b''.join(self._pendentes))
+            self._pendentes.clear()
+
+    def _ler_linha(self) -> bytes:
+        """Próxima linha do cliente; antes de esperar na rede, envia as respostas acumuladas"""
+        while b"\n" not in self._entrada:
+            self._enviar_pendentes()
+            dados = self.request.recv(65536)
+            if not dados:
+                return b''
+            self._entrada += dados
+        linha, _, self._entrada = self._entrada.partition(b"\n")
+        return linha + b"\n"
+
+    def finish(self):
+        try:
+            self._enviar_pendentes()
+        except OSError:
+            pass
+
+    def handle(self):
+        servidor: ServidorSMTPLocal = self.server
+        with servidor.lock:
+            servidor.conexoes += 1
+        remetente, destinatarios = None, []
+        self._responder("220 localhost ESMTP viemar-teste")
+
+        while True:
+            linha = self._ler_linha()
+            if not linha:
+                return
+            comando = linha.decode('ascii', errors='replace').strip()
+            verbo = comando[:4].upper()
+
+            if verbo == 'EHLO':
+                extensoes = ["250-PIPELINING"] if servidor.pipelining else []
+                self._responder("250-localhost", *extensoes, "250-8BITMIME", "250 SIZE 10485760")
+            elif verbo == 'HELO':
+                self._responder("250 localhost")
+            elif verbo == 'MAIL':
+                remetente, destinatarios = comando.partition(':')[2].strip(' <>'), []
+                self._responder("250 OK")
+            elif verbo == 'RCPT':
+                destinatario = comando.partition(':')[2].strip(' <>')
+                if destinatario in servidor.recusar:
+                    self._responder("550 Destinatario recusado")
+                else:
+                    destinatarios.append(destinatario)
+                    self._responder("250 OK")
+            elif verbo == 'DATA':
+                if remetente is None or not destinatarios:
+                    self._responder("554 Sem destinatarios validos")
+                    continue
+                self._responder("354 Envie a mensagem; termine com <CRLF>.<CRLF>")
+                partes = []
+                while True:
+                    linha = self._ler_linha()
+                    if not linha or linha == b".\r\n":
+                        break
+                    partes.append(linha[1:] if linha.startswith(b"..") else linha)
+                with servidor.lock:
+                    servidor.mensagens.append(MensagemRecebida(remetente, destinatarios, b''.join(partes)))
+                    derrubar = servidor.derrubar_apos is not None and len(servidor.mensagens) == servidor.derrubar_apos
+                remetente, destinatarios = None, []
+                self._responder("250 OK")
+                if derrubar:
+                    # Simula o relay encerrando a conexão depois de aceitar a mensagem
+                    return
+            elif verbo == 'RSET':
+                remetente, destinatarios = None, []
+                self._responder("250 OK")
+            elif verbo == 'NOOP':
+                self._responder("250 OK")
+            elif verbo == 'QUIT':
+                self._responder("221 Tchau")
+                return
+            else:
+                self._responder("502 Comando nao implementado")
+
+
+class ServidorSMTPLocal(socketserver.ThreadingTCPServer):
+    """Servidor SMTP em uma thread, em porta livre de 127.0.0.1"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latencia: float = 0.0, recusar: Optional[List[str]] = None,
+                 derrubar_apos: Optional[int] = None, pipelining: bool = True):
+        """
+        Args:
+            latencia: Atraso (s) de cada ida e volta, simulando a rede
+            recusar: Destinatários recusados com 550
+            derrubar_apos: Fecha a conexão depois de receber essa quantidade de mensagens
+            pipelining: Anunciar a extensão PIPELINING no EHLO
+        """
+        super().__init__(('127.0.0.1', 0), _SessaoSMTP)
+        self.latencia = latencia
+        self.recusar = set(recusar or [])
+        self.derrubar_apos = derrubar_apos
+        self.pipelining = pipelining
+        self.lock = threading.Lock()
+        self.mensagens: List[MensagemRecebida] = []
+        self.conexoes = 0
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def porta(self) -> int:
+        return self.server_address[1]
+
+    def iniciar(self) -> 'ServidorSMTPLocal':
+        self._thread = threading.Thread(target=self.serve_forever, name='smtp-local', daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
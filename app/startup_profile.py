@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Perfil de inicialização da aplicação (python main.py --profile-startup)
+
+Importa o main.py em um interpretador novo com ``-X importtime`` e mostra o
+tempo de importação por módulo e o tempo de cada etapa de create_app, para
+que regressões no cold start fiquem visíveis.
+
+Este módulo usa apenas a biblioteca padrão, pois roda antes das
+importações pesadas da aplicação.
+"""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+RAIZ_PROJETO = Path(__file__).parent.parent
+
+# Prefixos de módulos do próprio projeto, sempre listados no relatório
+MODULOS_PROJETO = ('main', 'app', 'models')
+
+_MARCADOR_ETAPAS = 'ETAPAS_INICIALIZACAO='
+
+
+def parse_importtime(saida: str) -> List[Tuple[str, int, int, int]]:
+    """
+    Interpreta a saída de ``python -X importtime``
+
+    Args:
+        saida: Conteúdo do stderr do interpretador
+
+    Returns:
+        Lista de tuplas (modulo, nivel, proprio_us, acumulado_us)
+    """
+    modulos = []
+    for linha in saida.splitlines():
+        if not linha.startswith('import time:') or 'imported package' in linha:
+            continue
+        try:
+            campo_proprio, campo_acumulado, nome_bruto = linha.split('|', 2)
+            proprio = int(campo_proprio.split(':', 1)[1])
+            acumulado = int(campo_acumulado)
+        except ValueError:
+            continue
+        nome = nome_bruto.strip()
+        nivel = (len(nome_bruto) - len(nome_bruto.lstrip(' ')) - 1) // 2
+        modulos.append((nome, nivel, proprio, acumulado))
+    return modulos
+
+
+def resumir_importacoes(modulos: List[Tuple[str, int, int, int]],
+                        limite: int = 20) -> List[Tuple[str, float]]:
+    """
+    Agrupa o tempo de importação por pacote de terceiros e módulo do projeto
+
+    Pacotes de terceiros são agrupados pelo nome raiz (tempo acumulado da
+    primeira importação). Módulos do projeto aparecem individualmente com o
+    tempo próprio, para apontar qual arquivo ficou mais lento.
+
+    Returns:
+        Lista de (nome, milissegundos) ordenada do mais lento ao mais rápido
+    """
+    terceiros: Dict[str, int] = {}
+    projeto: Dict[str, int] = {}
+
+    for nome, nivel, proprio, acumulado in modulos:
+        raiz = nome.split('.')[0]
+        if raiz in MODULOS_PROJETO:
+            projeto[nome] = proprio
+        elif raiz not in terceiros or acumulado > terceiros[raiz]:
+            terceiros[raiz] = acumulado
+
+    mais_lentos = sorted(terceiros.items(), key=lambda item: item[1], reverse=True)[:limite]
+    resumo = [(nome, us / 1000) for nome, us in mais_lentos]
+    resumo += [(nome, us / 1000) for nome, us in sorted(projeto.items(), key=lambda item: item[1], reverse=True)]
+    return resumo
+
+
+def medir_inicializacao() -> Tuple[List[Tuple[str, int, int, int]], List[Tuple[str, float]]]:
+    """
+    Importa o main.py em um processo novo e coleta os tempos
+
+    Returns:
+        Tupla (importações, etapas de inicialização em ms)
+    """
+    codigo = (
+        "import json, main; "
+        f"print({_MARCADOR_ETAPAS!r} + json.dumps(main.ETAPAS_INICIALIZACAO))"
+    )
+    resultado = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', codigo],
+        cwd=RAIZ_PROJETO,
+        capture_output=True,
+        text=True
+    )
+    if resultado.returncode != 0:
+        raise RuntimeError(f"Falha ao importar main.py:\n{resultado.stderr[-2000:]}")
+
+    etapas = []
+    for linha in resultado.stdout.splitlines():
+        if linha.startswith(_MARCADOR_ETAPAS):
+            etapas = [tuple(item) for item in json.loads(linha[len(_MARCADOR_ETAPAS):])]
+
+    return parse_importtime(resultado.stderr), etapas
+
+
+def main(limite: int = 20) -> int:
+    """Executa a medição e imprime o relatório"""
+    modulos, etapas = medir_inicializacao()
+    total_importacao = sum(proprio for _, _, proprio, _ in modulos) / 1000
+
+    print("=== PERFIL DE INICIALIZAÇÃO ===")
+    print(f"\nImportações (total {total_importacao:.1f} ms)")
+    for nome, ms in resumir_importacoes(modulos, limite):
+        print(f"  {ms:9.1f} ms  {nome}")
+
+    print(f"\nEtapas de create_app (total {sum(ms for _, ms in etapas):.1f} ms)")
+    for nome, ms in etapas:
+        print(f"  {ms:9.1f} ms  {nome}")
+
+    return 0
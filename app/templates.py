@@ -6,13 +6,65 @@ Templates e componentes visuais da aplicação
 from fasthtml.common import *
 from monsterui.all import *
 from typing import Optional, List, Dict, Any
+from urllib.parse import urlencode
 from .filter_component import filter_component
+from .assets import url_asset
 
 # Definir Row como um Div com classe Bootstrap
 Row = lambda *args, **kwargs: Div(*args, cls=f"row {kwargs.get('cls', '')}".strip(), **{k: v for k, v in kwargs.items() if k != 'cls'})
 
 # Usar componentes MonsterUI (não precisamos redefinir, já estão disponíveis)
 
+# Id do contêiner da tabela + paginação trocado pelas requisições HTMX das listagens
+ALVO_LISTAGEM = "listagem"
+
+
+def requisicao_htmx(request) -> bool:
+    """
+    Indica se a requisição veio do HTMX e espera apenas o fragmento
+
+    Restaurações de histórico (HX-History-Restore-Request) precisam da
+    página inteira, então não contam como requisição parcial.
+    """
+    return (
+        request.headers.get('HX-Request') == 'true'
+        and request.headers.get('HX-History-Restore-Request') != 'true'
+    )
+
+
+def atributos_htmx(url: str, hx_target: Optional[str]) -> Dict[str, str]:
+    """Atributos hx-* de um link de listagem (vazio sem alvo HTMX)"""
+    if not hx_target:
+        return {}
+    return {"hx_get": url, "hx_target": hx_target, "hx_swap": "outerHTML", "hx_push_url": "true"}
+
+
+def url_listagem(base_url: str, query_params=None, ignorar=(), **novos) -> str:
+    """
+    URL da listagem mantendo os filtros atuais
+
+    Args:
+        base_url: Caminho da listagem
+        query_params: Parâmetros da requisição atual (filtros, ordenação)
+        ignorar: Parâmetros atuais descartados (ex.: 'page' ao ordenar)
+        **novos: Parâmetros que substituem os atuais
+    """
+    params = {
+        chave: valor for chave, valor in dict(query_params or {}).items()
+        if valor and chave not in ignorar and chave not in novos
+    }
+    params.update(novos)
+    if not params:
+        return base_url
+    separator = '&' if '?' in base_url else '?'
+    return f"{base_url}{separator}{urlencode(params)}"
+
+
+def listagem_component(*conteudo):
+    """Contêiner da tabela e da paginação, devolvido sozinho nas requisições HTMX"""
+    return Div(*conteudo, id=ALVO_LISTAGEM)
+
+
 def base_layout(title: str, content, user: Optional[Dict[str, Any]] = None, show_nav: bool = True):
     """Layout base da aplicação usando MonsterUI NavBar responsivo"""
     
@@ -28,6 +80,8 @@ def base_layout(title: str, content, user: Optional[Dict[str, Any]] = None, show
                 A("Produtos", href="/admin/produtos"),
                 A("Sincronizar ERP Tecnicon", href="/admin/sync"),
                 A("Garantias", href="/admin/garantias"),
+                A("Estabelecimentos", href="/admin/estabelecimentos"),
+                A("Recall", href="/admin/recall"),
                 A("Relatórios", href="/admin/relatorios"),
                 A("Regulamento", href="/regulamento"),
                 A("Contato", href="/contato"),
@@ -54,7 +108,7 @@ def base_layout(title: str, content, user: Optional[Dict[str, Any]] = None, show
         if user:
             # Brand com logo
             brand = Div(
-                Img(src="/static/g70k.png", alt="G70K", cls="h-16 w-auto mr-2"),
+                Img(src=url_asset("g70k.png"), alt="G70K", cls="h-16 w-auto mr-2"),
                 cls="flex items-center"
             )
             
@@ -66,7 +120,7 @@ def base_layout(title: str, content, user: Optional[Dict[str, Any]] = None, show
         else:
             # Navbar para usuários não autenticados (páginas públicas)
             brand = Div(
-                Img(src="/static/g70k.png", alt="G70K", cls="h-16 w-auto mr-2"),
+                Img(src=url_asset("g70k.png"), alt="G70K", cls="h-16 w-auto mr-2"),
                 cls="flex items-center"
             )
             
@@ -312,7 +366,7 @@ def regulamento_page(user: Optional[Dict[str, Any]] = None):
                                     Row(
                                         Col(
                                             Div(
-                                                Img(src="/static/produto-etiqueta-335377.png", alt="Exemplo real de etiqueta do produto 335377", cls="img-fluid rounded shadow-sm mb-2"),
+                                                Img(src=url_asset("produto-etiqueta-335377.png"), alt="Exemplo real de etiqueta do produto 335377", cls="img-fluid rounded shadow-sm mb-2"),
                                                 P("Exemplo real de etiqueta do produto 335377", cls="text-center text-muted small"),
                                                 cls="text-center"
                                             ),
@@ -320,7 +374,7 @@ def regulamento_page(user: Optional[Dict[str, Any]] = None):
                                         ),
                                         Col(
                                             Div(
-                                                Img(src="/static/produto-peca-vmr3112.jpg", alt="Exemplo real da peça VMR3112", cls="img-fluid rounded shadow-sm mb-2"),
+                                                Img(src=url_asset("produto-peca-vmr3112.jpg"), alt="Exemplo real da peça VMR3112", cls="img-fluid rounded shadow-sm mb-2"),
                                                 P("Exemplo real da peça VMR3112", cls="text-center text-muted small"),
                                                 cls="text-center"
                                             ),
@@ -479,7 +533,9 @@ def table_component(
     sortable_columns: List[str] = None,
     current_sort: str = None,
     sort_direction: str = "asc",
-    base_url: str = ""
+    base_url: str = "",
+    query_params=None,
+    hx_target: str = None
 ):
     """
     Componente de tabela responsiva usando MonsterUI com ordenação
@@ -492,6 +548,8 @@ def table_component(
         current_sort: Campo atualmente ordenado
         sort_direction: Direção da ordenação atual ('asc' ou 'desc')
         base_url: URL base para links de ordenação
+        query_params: Parâmetros atuais, mantidos nos links de ordenação (filtros)
+        hx_target: Seletor trocado via HTMX pelos links de ordenação (opcional)
     """
     if not headers or not rows:
         return Div("Nenhum dado disponível", cls="text-muted text-center p-3")
@@ -519,14 +577,19 @@ def table_component(
                 next_direction = "asc"
                 icon = I(cls="fas fa-sort text-muted")
             
-            # Criar link clicável para ordenação
+            # Criar link clicável para ordenação (volta para a primeira página)
+            sort_url = url_listagem(
+                base_url, query_params, ignorar=('page',),
+                sort=field_name, direction=next_direction
+            )
             header_link = A(
                 header,
                 " ",
                 icon,
-                href=f"{base_url}?sort={field_name}&direction={next_direction}",
+                href=sort_url,
                 cls="text-decoration-none d-flex align-items-center justify-content-between",
-                style="color: inherit;"
+                style="color: inherit;",
+                **atributos_htmx(sort_url, hx_target)
             )
             header_cells.append(Th(header_link, scope="col", cls="user-select-none", style="cursor: pointer;"))
         else:
@@ -561,7 +624,9 @@ def pagination_component(
     base_url: str,
     page_size: int = 50,
     total_records: int = 0,
-    page_size_options: List[int] = None
+    page_size_options: List[int] = None,
+    query_params=None,
+    hx_target: str = None
 ):
     """
     Componente de paginação horizontal estilo Google
@@ -573,6 +638,8 @@ def pagination_component(
         page_size: Tamanho atual da página
         total_records: Total de registros
         page_size_options: Opções de tamanho de página (padrão: [25, 50, 100, 200])
+        query_params: Parâmetros atuais, mantidos nos links (filtros e ordenação)
+        hx_target: Seletor trocado via HTMX pelos links de página (opcional)
     """
     if page_size_options is None:
         page_size_options = [25, 50, 100, 200]
@@ -592,8 +659,7 @@ def pagination_component(
     def build_url(page: int, size: int = None):
         if size is None:
             size = page_size
-        separator = '&' if '?' in base_url else '?'
-        return f"{base_url}{separator}page={page}&size={size}"
+        return url_listagem(base_url, query_params, page=page, size=size)
     
     # Calcular range de páginas para mostrar (estilo Google)
     start_page = max(1, current_page - 5)
@@ -615,6 +681,7 @@ def pagination_component(
             A(
                 "< Anterior",
                 href=build_url(current_page - 1),
+                **atributos_htmx(build_url(current_page - 1), hx_target),
                 cls="btn btn-outline-primary btn-sm me-2",
                 title="Página anterior"
             )
@@ -636,6 +703,7 @@ def pagination_component(
                 A(
                     str(page),
                     href=build_url(page),
+                    **atributos_htmx(build_url(page), hx_target),
                     cls="btn btn-outline-secondary btn-sm mx-1",
                     style="min-width: 40px;"
                 )
@@ -649,6 +717,7 @@ def pagination_component(
             A(
                 "Próxima >",
                 href=build_url(current_page + 1),
+                **atributos_htmx(build_url(current_page + 1), hx_target),
                 cls="btn btn-outline-primary btn-sm ms-2",
                 title="Próxima página"
             )
@@ -676,8 +745,9 @@ def pagination_component(
                         Button(
                             str(size),
                             cls=f"btn btn-sm me-1 {'btn-primary' if size == page_size else 'btn-outline-secondary'}",
-                            onclick=f"changePage(1, {size})",
-                            type="button"
+                            type="button",
+                            **(atributos_htmx(build_url(1, size), hx_target)
+                               or {"onclick": f"changePage(1, {size})"})
                         ) for size in page_size_options
                     ],
                     cls="btn-group",
@@ -1684,4 +1754,297 @@ def form_garantia(form_data: Dict = None, errors: Dict = None):
             cls="mt-3"
         ),
         method="post"
-    )
\ No newline at end of file
+    )
+
+def produto_busca_resultados(produtos: List[Dict], termo: str = ""):
+    """Resultados da busca de produtos (fragmento HTMX do formulário de garantia)"""
+    if not termo:
+        return Div()
+    
+    if not produtos:
+        return Div(
+            Small("Nenhum produto encontrado", cls="text-muted"),
+            cls="list-group-item"
+        )
+    
+    return Div(
+        *[
+            Button(
+                Strong(produto['sku']), f" - {produto['descricao']}",
+                type="button",
+                cls="list-group-item list-group-item-action",
+                data_produto_id=str(produto['id']),
+                data_produto_label=f"{produto['sku']} - {produto['descricao']}",
+                onclick="selecionarProduto(this)"
+            )
+            for produto in produtos
+        ]
+    )
+
+
+def garantia_form(veiculos: List[Dict], garantia: Dict = None, errors: Dict = None,
+                  produto_selecionado: Optional[Dict] = None):
+    """Formulário de ativação de garantia do cliente
+    
+    O produto é escolhido por busca (HTMX) em vez de um select com o
+    catálogo inteiro; apenas o produto já selecionado é renderizado.
+    """
+    if garantia is None:
+        garantia = {}
+    if errors is None:
+        errors = {}
+    
+    veiculo_id = str(garantia.get('veiculo_id', '') or '')
+    produto_label = (
+        f"{produto_selecionado['sku']} - {produto_selecionado['descricao']}"
+        if produto_selecionado else ''
+    )
+    
+    return Form(
+        Row(
+            Col(
+                form_group(
+                    "Produto",
+                    Div(
+                        Input(
+                            type="search",
+                            name="produto_busca",
+                            id="produto-busca",
+                            cls="form-control",
+                            placeholder="Digite o SKU ou a descrição do produto",
+                            autocomplete="off",
+                            value=produto_label,
+                            hx_get="/cliente/garantias/produtos/busca",
+                            hx_trigger="input changed delay:300ms, search",
+                            hx_target="#produto-resultados",
+                            hx_swap="innerHTML",
+                            oninput="document.getElementById('produto-id').value = ''"
+                        ),
+                        Input(
+                            type="hidden",
+                            name="produto_id",
+                            id="produto-id",
+                            value=str(produto_selecionado['id']) if produto_selecionado else ''
+                        ),
+                        Div(id="produto-resultados", cls="list-group mt-1")
+                    ),
+                    error=errors.get('produto_id'),
+                    required=True
+                ),
+                width=6
+            ),
+            Col(
+                form_group(
+                    "Veículo",
+                    Select(
+                        Option("Selecione um veículo...", value="", selected=(not veiculo_id)),
+                        *[
+                            Option(
+                                f"{v['marca']} {v['modelo']} - {v['placa']}",
+                                value=str(v['id']),
+                                selected=(str(v['id']) == veiculo_id)
+                            )
+                            for v in veiculos
+                        ],
+                        name="veiculo_id",
+                        cls="form-select",
+                        required=True
+                    ),
+                    error=errors.get('veiculo_id'),
+                    required=True
+                ),
+                width=6
+            )
+        ),
+        Row(
+            Col(
+                form_group(
+                    "Lote de Fabricação",
+                    Input(
+                        type="text",
+                        name="lote_fabricacao",
+                        cls="form-control",
+                        value=garantia.get('lote_fabricacao', ''),
+                        required=True
+                    ),
+                    error=errors.get('lote_fabricacao'),
+                    required=True
+                ),
+                width=6
+            ),
+            Col(
+                form_group(
+                    "Data de Instalação",
+                    Input(
+                        type="date",
+                        name="data_instalacao",
+                        cls="form-control",
+                        value=garantia.get('data_instalacao', ''),
+                        required=True
+                    ),
+                    error=errors.get('data_instalacao'),
+                    help_text="A instalação deve ter ocorrido nos últimos 30 dias",
+                    required=True
+                ),
+                width=6
+            )
+        ),
+        Row(
+            Col(
+                form_group(
+                    "Nota Fiscal",
+                    Input(
+                        type="text",
+                        name="nota_fiscal",
+                        cls="form-control",
+                        value=garantia.get('nota_fiscal', '')
+                    ),
+                    error=errors.get('nota_fiscal')
+                ),
+                width=4
+            ),
+            Col(
+                form_group(
+                    "Estabelecimento",
+                    Input(
+                        type="text",
+                        name="nome_estabelecimento",
+                        cls="form-control",
+                        value=garantia.get('nome_estabelecimento', '')
+                    ),
+                    error=errors.get('nome_estabelecimento')
+                ),
+                width=4
+            ),
+            Col(
+                form_group(
+                    "Quilometragem",
+                    Input(
+                        type="number",
+                        name="quilometragem",
+                        cls="form-control",
+                        min="0",
+                        value=garantia.get('quilometragem', '')
+                    ),
+                    error=errors.get('quilometragem')
+                ),
+                width=4
+            )
+        ),
+        Row(
+            Col(
+                form_group(
+                    "Observações",
+                    Textarea(
+                        garantia.get('observacoes', ''),
+                        name="observacoes",
+                        cls="form-control",
+                        rows="3"
+                    ),
+                    error=errors.get('observacoes')
+                ),
+                width=12
+            )
+        ),
+        Div(
+            Button("Ativar Garantia", type="submit", cls="btn btn-primary me-2"),
+            A("Cancelar", href="/cliente/garantias", cls="btn btn-secondary"),
+            cls="mt-3"
+        ),
+        Script("""
+            function selecionarProduto(el) {
+                document.getElementById('produto-id').value = el.dataset.produtoId;
+                document.getElementById('produto-busca').value = el.dataset.produtoLabel;
+                document.getElementById('produto-resultados').innerHTML = '';
+            }
+        """),
+        method="post",
+        action="/cliente/garantias/nova"
+    )
+
+
+def veiculo_form(form_data: Dict = None, is_edit: bool = False, errors: Dict = None, veiculo_id=None):
+    """Formulário de cadastro/edição de veículo do cliente"""
+    if form_data is None:
+        form_data = {}
+    if errors is None:
+        errors = {}
+    
+    action = f"/cliente/veiculos/{veiculo_id}" if is_edit else "/cliente/veiculos"
+    
+    return Form(
+        Row(
+            Col(
+                form_group(
+                    "Marca",
+                    Input(type="text", name="marca", cls="form-control",
+                          value=form_data.get('marca', ''), required=True),
+                    error=errors.get('marca'),
+                    required=True
+                ),
+                width=6
+            ),
+            Col(
+                form_group(
+                    "Modelo",
+                    Input(type="text", name="modelo", cls="form-control",
+                          value=form_data.get('modelo', ''), required=True),
+                    error=errors.get('modelo'),
+                    required=True
+                ),
+                width=6
+            )
+        ),
+        Row(
+            Col(
+                form_group(
+                    "Ano/Modelo",
+                    Input(type="text", name="ano_modelo", cls="form-control",
+                          placeholder="2020 ou 2020/2021",
+                          value=form_data.get('ano_modelo', ''), required=True),
+                    error=errors.get('ano_modelo'),
+                    required=True
+                ),
+                width=4
+            ),
+            Col(
+                form_group(
+                    "Placa",
+                    Input(type="text", name="placa", cls="form-control",
+                          placeholder="ABC1234 ou ABC1D23",
+                          value=form_data.get('placa', ''), required=True),
+                    error=errors.get('placa'),
+                    required=True
+                ),
+                width=4
+            ),
+            Col(
+                form_group(
+                    "Cor",
+                    Input(type="text", name="cor", cls="form-control",
+                          value=form_data.get('cor', '')),
+                    error=errors.get('cor')
+                ),
+                width=4
+            )
+        ),
+        Row(
+            Col(
+                form_group(
+                    "Chassi",
+                    Input(type="text", name="chassi", cls="form-control",
+                          maxlength="17", value=form_data.get('chassi', '')),
+                    error=errors.get('chassi'),
+                    help_text="Opcional - 17 caracteres"
+                ),
+                width=12
+            )
+        ),
+        Div(
+            Button("Salvar Alterações" if is_edit else "Cadastrar Veículo", type="submit", cls="btn btn-primary me-2"),
+            A("Cancelar", href="/cliente/veiculos", cls="btn btn-secondary"),
+            cls="mt-3"
+        ),
+        method="post",
+        action=action
+    )
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Tokens de confirmação de email e de redefinição de senha
+
+Os tokens ficam na tabela ``tokens`` e não mais em colunas de
+``usuarios``. Apenas o SHA-256 do token é gravado: o valor em claro só
+existe no link enviado por email. A busca usa o índice único de
+``token_hash`` e cada token vale uma única vez e até ``expira_em``. Os
+vencidos são removidos pela tarefa ``limpeza_tokens`` do agendador.
+"""
+
+import hashlib
+import logging
+import secrets
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastlite import Database
+
+from app.date_utils import format_datetime_iso
+
+logger = logging.getLogger(__name__)
+
+FINALIDADE_CONFIRMACAO = 'confirmacao'
+FINALIDADE_RESET_SENHA = 'reset_senha'
+
+# Validade de cada tipo de token
+VALIDADE_TOKENS = {
+    FINALIDADE_CONFIRMACAO: timedelta(hours=24),
+    FINALIDADE_RESET_SENHA: timedelta(hours=1),
+}
+
+
+def hash_token(token: str) -> str:
+    """SHA-256 do token (hex), que é o que fica gravado no banco"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def emitir_token(db: Database, usuario_id: int, finalidade: str,
+                 validade: Optional[timedelta] = None) -> str:
+    """
+    Gera um token para o usuário, substituindo o anterior de mesma finalidade
+
+    Args:
+        db: Banco de dados
+        usuario_id: Dono do token
+        finalidade: FINALIDADE_CONFIRMACAO ou FINALIDADE_RESET_SENHA
+        validade: Prazo do token (padrão: VALIDADE_TOKENS[finalidade])
+
+    Returns:
+        Token em claro, para ser enviado ao usuário
+    """
+    if finalidade not in VALIDADE_TOKENS:
+        raise ValueError(f"Finalidade de token inválida: {finalidade}")
+
+    token = secrets.token_urlsafe(32)
+    agora = datetime.now()
+    expira_em = agora + (validade or VALIDADE_TOKENS[finalidade])
+
+    db.execute("DELETE FROM tokens WHERE usuario_id = ? AND finalidade = ?", (usuario_id, finalidade))
+    db.execute(
+        "INSERT INTO tokens (token_hash, finalidade, usuario_id, criado_em, expira_em) VALUES (?, ?, ?, ?, ?)",
+        (hash_token(token), finalidade, usuario_id, format_datetime_iso(agora), format_datetime_iso(expira_em))
+    )
+    return token
+
+
+def usuario_do_token(db: Database, token: str, finalidade: str) -> Optional[int]:
+    """Retorna o usuario_id de um token válido (sem consumi-lo)"""
+    if not token:
+        return None
+    row = db.execute(
+        "SELECT usuario_id FROM tokens WHERE token_hash = ? AND finalidade = ? AND expira_em > ?",
+        (hash_token(token), finalidade, format_datetime_iso(datetime.now()))
+    ).fetchone()
+    return row[0] if row else None
+
+
+def consumir_token(db: Database, token: str, finalidade: str) -> Optional[int]:
+    """
+    Invalida o token e retorna o usuario_id, se ele era válido
+
+    A remoção e a verificação acontecem no mesmo comando, então dois
+    cliques simultâneos no mesmo link não usam o token duas vezes.
+    """
+    if not token:
+        return None
+    row = db.execute(
+        "DELETE FROM tokens WHERE token_hash = ? AND finalidade = ? AND expira_em > ? RETURNING usuario_id",
+        (hash_token(token), finalidade, format_datetime_iso(datetime.now()))
+    ).fetchone()
+    return row[0] if row else None
+
+
+def revogar_tokens(db: Database, usuario_id: int, finalidade: Optional[str] = None) -> int:
+    """Remove os tokens do usuário (todos ou de uma finalidade)"""
+    if finalidade:
+        db.execute("DELETE FROM tokens WHERE usuario_id = ? AND finalidade = ?", (usuario_id, finalidade))
+    else:
+        db.execute("DELETE FROM tokens WHERE usuario_id = ?", (usuario_id,))
+    return db.conn.changes()
+
+
+def purgar_tokens_expirados(db: Database) -> int:
+    """Remove os tokens vencidos (usa o índice de expira_em)"""
+    db.execute("DELETE FROM tokens WHERE expira_em <= ?", (format_datetime_iso(datetime.now()),))
+    removidos = db.conn.changes()
+    if removidos:
+        logger.info(f"Removidos {removidos} tokens expirados")
+    return removidos
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Unidade de trabalho: as escritas de uma requisição em uma transação
+
+Cada ``db.execute`` fora de transação é confirmado sozinho (um commit e
+um fsync por comando). Nas rotas que gravam mais de uma linha, as
+escritas passam por ``UnidadeTrabalho``, que abre ``BEGIN IMMEDIATE`` ao
+entrar, confirma ao sair e desfaz tudo se houver exceção. Os INSERTs usam
+``RETURNING`` para obter o id (e outras colunas) no mesmo comando, sem o
+``SELECT last_insert_rowid()`` seguinte.
+
+Uso:
+    with UnidadeTrabalho(db) as uow:
+        usuario_id = uow.inserir('usuarios', {'email': email, ...})[0]
+        emitir_token(db, usuario_id, FINALIDADE_CONFIRMACAO)
+
+As rotas compartilham uma conexão e os handlers síncronos rodam em
+threads: a transação é da conexão, não da thread. Cada unidade segura a
+trava da conexão (``trava_transacao``) do BEGIN ao COMMIT/ROLLBACK, então
+a unidade de outra requisição espera em vez de entrar na transação
+alheia (e ser desfeita junto com ela). Dentro de uma unidade da mesma
+thread, ou de uma transação aberta pela própria thread, a unidade vira um
+SAVEPOINT, então funções que usam ``UnidadeTrabalho`` podem ser chamadas
+umas pelas outras.
+"""
+
+import itertools
+import logging
+import threading
+import weakref
+from typing import Any, Mapping, Optional, Sequence, Tuple
+
+from fastlite import Database
+
+logger = logging.getLogger(__name__)
+
+_savepoints = itertools.count(1)
+
+# Trava de transação por conexão e profundidade das unidades por thread
+_travas: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+_travas_criacao = threading.Lock()
+_local = threading.local()
+
+
+def trava_transacao(db: Database) -> threading.RLock:
+    """Trava (reentrante) que serializa as transações abertas na conexão"""
+    with _travas_criacao:
+        trava = _travas.get(db.conn)
+        if trava is None:
+            trava = _travas[db.conn] = threading.RLock()
+        return trava
+
+
+def _profundidades() -> dict:
+    """Unidades abertas pela thread atual, por conexão"""
+    if not hasattr(_local, 'profundidades'):
+        _local.profundidades = {}
+    return _local.profundidades
+
+
+class UnidadeTrabalho:
+    """Transação de escrita com INSERT ... RETURNING"""
+
+    def __init__(self, db: Database):
+        self.db = db
+        self._savepoint: Optional[str] = None
+        self._trava = trava_transacao(db)
+
+    def __enter__(self) -> 'UnidadeTrabalho':
+        self._trava.acquire()
+        profundidades = _profundidades()
+        try:
+            # Com a trava, uma transação já aberta só pode ser desta thread
+            if profundidades.get(id(self.db.conn)) or self.db.conn.in_transaction:
+                self._savepoint = f"uow_{next(_savepoints)}"
+                self.db.execute(f"SAVEPOINT {self._savepoint}")
+            else:
+                self.db.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self._trava.release()
+            raise
+        profundidades[id(self.db.conn)] = profundidades.get(id(self.db.conn), 0) + 1
+        return self
+
+    def __exit__(self, tipo, erro, traceback) -> bool:
+        try:
+            if self._savepoint:
+                if tipo is not None:
+                    self.db.execute(f"ROLLBACK TO {self._savepoint}")
+                self.db.execute(f"RELEASE {self._savepoint}")
+            elif tipo is None:
+                self.db.execute("COMMIT")
+            else:
+                self.db.execute("ROLLBACK")
+                logger.debug(f"Unidade de trabalho desfeita: {erro}")
+        finally:
+            profundidades = _profundidades()
+            profundidades[id(self.db.conn)] -= 1
+            if not profundidades[id(self.db.conn)]:
+                del profundidades[id(self.db.conn)]
+            self._trava.release()
+        return False
+
+    def execute(self, sql: str, params: Sequence[Any] = ()):
+        """Executa um comando dentro da transação"""
+        return self.db.execute(sql, params)
+
+    def inserir(self, tabela: str, valores: Mapping[str, Any],
+                retornando: Sequence[str] = ('id',),
+                ignorar_conflito: bool = False) -> Optional[Tuple]:
+        """
+        INSERT ... RETURNING
+
+        Args:
+            tabela: Tabela de destino
+            valores: Coluna -> valor
+            retornando: Colunas devolvidas pelo INSERT
+            ignorar_conflito: Usa ON CONFLICT DO NOTHING (índices únicos)
+
+        Returns:
+            Tupla com as colunas de ``retornando``, ou None se a linha não
+            foi inserida por conflito
+        """
+        colunas = list(valores)
+        conflito = " ON CONFLICT DO NOTHING" if ignorar_conflito else ""
+        sql = (
+            f"INSERT INTO {tabela} ({', '.join(colunas)}) "
+            f"VALUES ({', '.join('?' for _ in colunas)}){conflito} "
+            f"RETURNING {', '.join(retornando)}"
+        )
+        # fetchall percorre o cursor até o fim, concluindo o comando
+        rows = self.db.execute(sql, [valores[coluna] for coluna in colunas]).fetchall()
+        return tuple(rows[0]) if rows else None
@@ -3,9 +3,20 @@
 Aplicação FastHTML para Sistema de Garantia Viemar
 """
 
+import atexit
 import logging
 import os
+import sys
+import time
+from contextlib import contextmanager
 from pathlib import Path
+
+# Perfil de inicialização: roda antes das importações pesadas, em um
+# interpretador separado (ver app/startup_profile.py)
+if __name__ == "__main__" and "--profile-startup" in sys.argv:
+    from app.startup_profile import main as profile_startup
+    sys.exit(profile_startup())
+
 from fasthtml.common import *
 from monsterui.all import *
 from fastlite import Database
@@ -24,8 +35,13 @@ except ImportError:
 
 from app.config import Config
 from app.logger import setup_logging, get_logger
-from app.database import init_database
+from app.database import abrir_banco, fechar_banco, init_database
+from app.arquivamento import anexar_arquivo
+from app.jobs import get_gerenciador_jobs
 from app.auth import setup_auth, init_auth
+from app.limite_requisicoes import setup_limite_requisicoes
+from app.compressao import setup_compressao
+from app.assets import iniciar_pipeline_assets, setup_assets, url_asset
 from app.routes import setup_routes
 from app.routes_veiculos import setup_veiculo_routes
 from app.routes_garantias import setup_garantia_routes
@@ -35,36 +51,75 @@ from app.routes_admin import setup_admin_routes
 setup_logging()
 logger = get_logger(__name__)
 
+# Tempo (ms) de cada etapa de create_app, exibido por --profile-startup
+ETAPAS_INICIALIZACAO = []
+
+@contextmanager
+def medir_etapa(nome: str):
+    """Registra a duração de uma etapa da inicialização"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+        ETAPAS_INICIALIZACAO.append((nome, duracao_ms))
+        logger.debug(f"Inicialização - {nome}: {duracao_ms:.1f} ms")
+
 def create_app():
     """Cria e configura a aplicação FastHTML"""
     
     # Instanciar configuração
-    config = Config()
+    with medir_etapa("config"):
+        config = Config()
+    
+    # Arquivos estáticos com hash no nome e pré-comprimidos
+    with medir_etapa("assets"):
+        assets = iniciar_pipeline_assets(config)
     
     # Configurar aplicação com MonsterUI - forçar apenas tema claro
-    app, rt = fast_app(
-        debug=config.DEBUG,
-        live=config.LIVE_RELOAD,
-        hdrs=Theme.blue.headers(mode="light") + [
-            Link(rel="stylesheet", href="/static/style.css"),
-            Link(rel="icon", type="image/x-icon", href="/static/favicon.ico"),
-            Link(rel="shortcut icon", type="image/x-icon", href="/static/favicon.ico")
-        ]
-    )
+    # (cabeçalhos padrão do FastHTML e do tema apontam para as cópias locais)
+    with medir_etapa("fast_app"):
+        app, rt = fast_app(
+            debug=config.DEBUG,
+            live=config.LIVE_RELOAD,
+            default_hdrs=False,
+            hdrs=assets.cabecalhos_locais(
+                def_hdrs() + Theme.blue.headers(mode="light"), permitir_cdn=config.ASSETS_PERMITIR_CDN
+            ) + [
+                Link(rel="stylesheet", href=url_asset("style.css")),
+                Link(rel="icon", type="image/x-icon", href=url_asset("favicon.ico")),
+                Link(rel="shortcut icon", type="image/x-icon", href=url_asset("favicon.ico"))
+            ]
+        )
+        setup_assets(app, assets)
     
     # Configurar banco de dados
-    db = Database(config.DATABASE_PATH)
-    init_database(db)
+    with medir_etapa("init_database"):
+        db = abrir_banco(config.DATABASE_PATH, config.SQLITE_CACHE_COMANDOS)
+        init_database(db)
+        anexar_arquivo(db, config.ARQUIVO_DATABASE_PATH)
+        get_gerenciador_jobs(db, config.JOB_WORKERS)
+        # PRAGMA optimize ao encerrar o processo
+        atexit.register(fechar_banco, db)
     
     # Configurar autenticação
-    init_auth(db)
-    setup_auth(app)
+    with medir_etapa("auth"):
+        init_auth(db)
+        setup_auth(app)
+        setup_limite_requisicoes(app, config)
+        setup_compressao(app, config)
     
     # Configurar todas as rotas
-    setup_routes(app, db)
-    setup_veiculo_routes(app, db)
-    setup_garantia_routes(app, db)
-    setup_admin_routes(app, db)
+    with medir_etapa("rotas"):
+        setup_routes(app, db)
+        setup_veiculo_routes(app, db)
+        setup_garantia_routes(app, db)
+        setup_admin_routes(app, db, config)
+    
+    # Tarefas de manutenção (vencimentos, sessões, relatório diário, sincronização com o ERP)
+    if config.AGENDADOR_ATIVO:
+        from app.agendador import iniciar_agendador
+        iniciar_agendador(db, config)
     
     logger.info("Aplicação FastHTML configurada com sucesso")
     return app, config
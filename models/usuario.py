@@ -31,8 +31,6 @@ class Usuario:
     cpf_cnpj: str = ''
     data_nascimento: Optional[datetime] = None
     data_cadastro: Optional[datetime] = None
-    token_confirmacao: str = ''
-    token_reset_senha: str = ''
     
     @classmethod
     def criar_hash_senha(cls, senha: str) -> str:
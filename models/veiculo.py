@@ -83,6 +83,37 @@ class Veiculo:
                 return f"{placa_limpa[:3]}{placa_limpa[3]}{placa_limpa[4]}{placa_limpa[5:]}"
         return placa
 
+    @staticmethod
+    def normalizar_placa(placa: Optional[str]) -> Optional[str]:
+        """
+        Normaliza a placa para detecção de duplicidade
+        
+        Remove pontuação e converte o formato antigo para o Mercosul
+        (ABC1234 -> ABC1C34), de modo que as duas formas da mesma placa
+        resultem na mesma chave. Placas inválidas ou de preenchimento
+        (ex: 'SEM-PLACA') retornam None.
+        """
+        if not placa:
+            return None
+        
+        placa_limpa = ''.join(c for c in Veiculo.formatar_placa_estatico(placa) if c.isalnum())
+        if not Veiculo.validar_placa(placa_limpa):
+            return None
+        
+        # Formato antigo: o segundo dígito vira letra no padrão Mercosul (0=A ... 9=J)
+        if placa_limpa[4].isdigit():
+            placa_limpa = placa_limpa[:4] + chr(ord('A') + int(placa_limpa[4])) + placa_limpa[5:]
+        
+        return placa_limpa
+    
+    @staticmethod
+    def normalizar_chassi(chassi: Optional[str]) -> Optional[str]:
+        """Normaliza o chassi (maiúsculas, sem pontuação); vazio retorna None"""
+        if not chassi:
+            return None
+        chassi_limpo = ''.join(c for c in chassi.upper() if c.isalnum())
+        return chassi_limpo or None
+    
     @staticmethod
     def validar_placa(placa: str) -> bool:
         """Valida se a placa está no formato correto"""
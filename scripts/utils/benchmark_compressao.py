@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark do tamanho das listagens de garantias com e sem compressão
+
+Cria um banco temporário com N garantias, monta a aplicação com o
+middleware de compressão e mede os bytes enviados por /admin/garantias
+(size=200) e /cliente/garantias para cada Accept-Encoding.
+
+Uso: python scripts/utils/benchmark_compressao.py [--garantias N] [--repeticoes N]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Adicionar o diretório raiz ao path
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from fasthtml.common import FastHTML
+from fastlite import Database
+from starlette.testclient import TestClient
+
+from app.assets import BROTLI_DISPONIVEL
+from app.auth import get_auth_manager, init_auth
+from app.compressao import CompressaoMiddleware
+from app.database import init_database
+from app.routes import setup_routes
+from app.routes_admin import setup_admin_routes
+from app.routes_garantias import setup_garantia_routes
+from app.routes_veiculos import setup_veiculo_routes
+
+PAGINAS = {
+    'admin': '/admin/garantias?size=200',
+    'cliente': '/cliente/garantias',
+}
+
+
+def popular(db: Database, quantidade: int):
+    """Cria um cliente com N garantias e um administrador"""
+    db.execute("""
+        INSERT INTO usuarios (nome, email, senha_hash, tipo_usuario, confirmado)
+        VALUES ('Cliente Benchmark', 'cliente@benchmark.com', 'x', 'cliente', TRUE),
+               ('Admin Benchmark', 'admin@benchmark.com', 'x', 'administrador', TRUE)
+    """)
+    for i in range(quantidade):
+        db.execute("INSERT INTO produtos (sku, descricao, ativo) VALUES (?, ?, TRUE)",
+                   (f"AMT-{i:05d}", f"Amortecedor dianteiro modelo {i}"))
+        db.execute("""
+            INSERT INTO veiculos (usuario_id, marca, modelo, ano_modelo, placa, cor, ativo)
+            VALUES (1, 'Volkswagen', 'Gol', '2020', ?, 'Prata', TRUE)
+        """, (f"BMK{i:04d}",))
+        db.execute("""
+            INSERT INTO garantias (usuario_id, produto_id, veiculo_id, lote_fabricacao, data_instalacao,
+                                   nota_fiscal, nome_estabelecimento, quilometragem, data_cadastro,
+                                   data_vencimento, ativo)
+            VALUES (1, ?, ?, ?, '2025-01-10', ?, 'Auto Center Benchmark', 42000,
+                    '2025-01-10 10:00:00', '2026-01-10', TRUE)
+        """, (i + 1, i + 1, f"L{i:06d}", f"NF{i:06d}"))
+
+
+def criar_cliente(db: Database, tipo: str, usuario_id: int, email: str) -> TestClient:
+    app = FastHTML()
+    setup_routes(app, db)
+    setup_veiculo_routes(app, db)
+    setup_garantia_routes(app, db)
+    setup_admin_routes(app, db)
+    app.add_middleware(CompressaoMiddleware)
+    client = TestClient(app)
+    client.cookies['viemar_session'] = get_auth_manager().criar_sessao(usuario_id, email, tipo)
+    return client
+
+
+def medir(client: TestClient, url: str, codificacao: str, repeticoes: int):
+    """Retorna (bytes enviados, menor tempo em ms)"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        response = client.get(url, headers={'Accept-Encoding': codificacao})
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    enviados = int(response.headers.get('content-length', len(response.content)))
+    return enviados, min(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--garantias', type=int, default=200)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        db = Database(os.path.join(diretorio, 'benchmark.db'))
+        init_database(db)
+        init_auth(db)
+        popular(db, args.garantias)
+
+        clientes = {
+            'cliente': criar_cliente(db, 'cliente', 1, 'cliente@benchmark.com'),
+            'admin': criar_cliente(db, 'administrador', 2, 'admin@benchmark.com'),
+        }
+        codificacoes = ['identity', 'gzip'] + (['br'] if BROTLI_DISPONIVEL else [])
+
+        print(f"{args.garantias} garantias, melhor de {args.repeticoes} requisições")
+        print(f"{'página':<10}{'codificação':<14}{'bytes':>10}{'redução':>10}{'tempo (ms)':>12}")
+        for nome, url in PAGINAS.items():
+            original = None
+            for codificacao in codificacoes:
+                enviados, tempo = medir(clientes[nome], url, codificacao, args.repeticoes)
+                original = original or enviados
+                reducao = 100 * (1 - enviados / original)
+                print(f"{nome:<10}{codificacao:<14}{enviados:>10}{reducao:>9.1f}%{tempo:>12.1f}")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
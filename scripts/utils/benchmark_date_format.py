@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark da formatação de datas para exibição
+
+Compara o custo por célula de format_date_br/format_datetime_br antes
+(tentativas sucessivas de strptime, sem cache) e depois (fatiamento fixo
+para o formato ISO canônico e cache para valores legados).
+
+Uso: python scripts/utils/benchmark_date_format.py [--celulas N] [--repeticoes N]
+"""
+
+import argparse
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Adicionar o diretório raiz ao path
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.date_utils import (
+    _format_date_br_texto, _format_datetime_br_texto,
+    format_date_br, format_datetime_br
+)
+
+
+def gerar_valores(quantidade: int, formato: str, semente: int = 42):
+    """Gera datas aleatórias no formato informado"""
+    gerador = random.Random(semente)
+    inicio = datetime(2015, 1, 1)
+    return [
+        (inicio + timedelta(seconds=gerador.randrange(10 * 365 * 86400))).strftime(formato)
+        for _ in range(quantidade)
+    ]
+
+
+def medir(funcao, valores, repeticoes: int) -> float:
+    """Retorna o menor custo médio por célula em nanossegundos"""
+    tempos = timeit.repeat(lambda: [funcao(v) for v in valores], number=1, repeat=repeticoes)
+    return min(tempos) / len(valores) * 1e9
+
+
+def main():
+    """Executa o benchmark e imprime o custo por célula"""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--celulas', type=int, default=2000, help='Células por rodada')
+    parser.add_argument('--repeticoes', type=int, default=5, help='Rodadas por medição')
+    args = parser.parse_args()
+
+    cenarios = [
+        ('data canônica', gerar_valores(args.celulas, '%Y-%m-%d'),
+         _format_date_br_texto.__wrapped__, format_date_br),
+        ('data/hora canônica', gerar_valores(args.celulas, '%Y-%m-%d %H:%M:%S'),
+         _format_datetime_br_texto.__wrapped__, format_datetime_br),
+        # Legado: poucos valores distintos repetidos, como numa página de listagem
+        ('data/hora legada (T + µs)', gerar_valores(50, '%Y-%m-%dT%H:%M:%S.%f') * (args.celulas // 50),
+         _format_datetime_br_texto.__wrapped__, format_datetime_br),
+    ]
+
+    print(f"{'cenário':<28}{'antes (ns)':>12}{'depois (ns)':>13}{'ganho':>9}")
+    for nome, valores, antes, depois in cenarios:
+        _format_date_br_texto.cache_clear()
+        _format_datetime_br_texto.cache_clear()
+        custo_antes = medir(antes, valores, args.repeticoes)
+        custo_depois = medir(depois, valores, args.repeticoes)
+        print(f"{nome:<28}{custo_antes:>12.0f}{custo_depois:>13.0f}{custo_antes / custo_depois:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
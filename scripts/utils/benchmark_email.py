@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark de envio de emails contra o servidor SMTP local
+
+Simula uma campanha de avisos de vencimento e mede mensagens/s em três
+modos:
+
+  - uma conexão por email (como o envio pelo vieutil)
+  - conexão persistente, sem PIPELINING
+  - conexão persistente com PIPELINING
+
+Uso: python scripts/utils/benchmark_email.py [--mensagens N] [--latencia-ms MS]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Adicionar o diretório raiz ao path
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.envio_smtp import EntregaSMTP
+from app.smtp_local import ServidorSMTPLocal
+
+MODOS = [
+    ('uma conexão por email', 1, False),
+    ('persistente', 10_000, False),
+    ('persistente + pipelining', 10_000, True),
+]
+
+
+def medir(mensagens: int, latencia: float, mensagens_por_conexao: int, pipelining: bool):
+    """Retorna (mensagens/s, conexões abertas)"""
+    with ServidorSMTPLocal(latencia=latencia, pipelining=pipelining) as servidor:
+        entrega = EntregaSMTP(
+            '127.0.0.1', servidor.porta, 'garantia70mil@viemar.com.br',
+            usar_tls=False, mensagens_por_conexao=mensagens_por_conexao
+        )
+        lote = [
+            (f"cliente{i}@exemplo.com.br", f"Garantia vencendo em 30 dias - Produto {i}",
+             f"Olá Cliente {i},\n\nSua garantia está próxima do vencimento!\n")
+            for i in range(mensagens)
+        ]
+        inicio = time.perf_counter()
+        resultados = entrega.enviar_lote(lote)
+        entrega.fechar()
+        segundos = time.perf_counter() - inicio
+        assert all(resultados) and len(servidor.mensagens) == mensagens
+        return mensagens / segundos, entrega.estatisticas()['conexoes']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mensagens', type=int, default=200)
+    parser.add_argument('--latencia-ms', type=float, default=5.0,
+                        help='Ida e volta simulada até o relay (padrão: 5 ms)')
+    args = parser.parse_args()
+
+    print(f"{args.mensagens} mensagens, latência simulada de {args.latencia_ms} ms")
+    print(f"{'modo':<28}{'mensagens/s':>14}{'conexões':>10}")
+    for nome, por_conexao, pipelining in MODOS:
+        taxa, conexoes = medir(args.mensagens, args.latencia_ms / 1000, por_conexao, pipelining)
+        print(f"{nome:<28}{taxa:>14.1f}{conexoes:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Build dos arquivos estáticos para o deploy
+
+Gera os arquivos com hash no nome e as versões gzip/brotli no diretório
+de assets, para que a aplicação apenas carregue o manifesto ao iniciar
+(ASSETS_BUILD_NA_INICIALIZACAO=False). Antes baixa os arquivos de CDN
+que ainda não estão em static/vendor/ (que devem ser versionados); se
+algum não puder ser baixado, o build falha, porque a aplicação não inicia
+com cabeçalhos apontando para a CDN (ASSETS_PERMITIR_CDN).
+
+Uso: python scripts/utils/build_assets.py [--destino DIR]
+"""
+
+import argparse
+import sys
+import urllib.request
+from pathlib import Path
+
+# Adicionar o diretório raiz ao path
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.assets import ASSETS_VENDORIZADOS, BROTLI_DISPONIVEL, PipelineAssets
+
+RAIZ = Path(__file__).resolve().parents[2]
+
+
+def vendorizar(diretorio_vendor: Path) -> int:
+    """
+    Baixa os arquivos de CDN ausentes em static/vendor
+
+    Raises:
+        RuntimeError: Se algum arquivo não puder ser baixado
+    """
+    diretorio_vendor.mkdir(parents=True, exist_ok=True)
+    baixados = 0
+    falhas = []
+    for url, nome in ASSETS_VENDORIZADOS.items():
+        destino = diretorio_vendor / nome
+        if destino.exists():
+            continue
+        print(f"Baixando {url}")
+        try:
+            with urllib.request.urlopen(url, timeout=30) as resposta:
+                conteudo = resposta.read()
+        except OSError as e:
+            falhas.append(f"{url}: {e}")
+            continue
+        temporario = destino.with_name(destino.name + '.tmp')
+        temporario.write_bytes(conteudo)
+        temporario.replace(destino)
+        baixados += 1
+    if falhas:
+        raise RuntimeError("Arquivos de CDN não baixados para static/vendor:\n  " + "\n  ".join(falhas))
+    return baixados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--destino', default=str(RAIZ / 'data' / 'assets'), help='Diretório de build')
+    args = parser.parse_args()
+
+    try:
+        print(f"{vendorizar(RAIZ / 'static' / 'vendor')} arquivos baixados")
+    except RuntimeError as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if not BROTLI_DISPONIVEL:
+        print("Pacote brotli não instalado: apenas versões gzip serão geradas")
+
+    manifesto = PipelineAssets(RAIZ / 'static', Path(args.destino)).construir()
+    print(f"{len(manifesto)} arquivos processados em {args.destino}")
+
+
+if __name__ == "__main__":
+    main()
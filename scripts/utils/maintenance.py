@@ -1,219 +1,105 @@
 #!/usr/bin/env python3
 """
 Script de manutenção para o sistema de garantia Viemar
-Executa tarefas periódicas como notificações de vencimento
+
+As tarefas rodam automaticamente no agendador da aplicação (app.agendador);
+este script permite executá-las manualmente. As tarefas agendadas passam
+por Agendador.executar_manual: a execução ocupa o horário mais recente do
+cron sob o lease, então não repete um horário já executado pela aplicação
+(ex.: os e-mails de vencimento) nem roda junto com ela. Use ``--forcar``
+para executar de novo mesmo assim. As correções (repair-*, link-installers)
+não são agendadas e rodam diretamente.
 """
 
 import sys
-import os
-from datetime import datetime, timedelta
 from pathlib import Path
 
 # Adicionar o diretório raiz ao path
-sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
 
 from fastlite import Database
+from app.agendador import Agendador
+from app.arquivamento import anexar_arquivo
 from app.config import Config
+from app.contadores import recalcular_contadores
+from app.database import fechar_banco, init_database
+from app.estabelecimentos import recalcular_contadores_estabelecimentos, vincular_estabelecimentos
 from app.logger import setup_logging, get_logger
-from app.email_service import send_warranty_expiry_notification, send_admin_notification
-from app.date_utils import format_date_iso, format_date_br
+from app.manutencao import registrar_tarefas_manutencao
 
 # Configurar logging
 setup_logging()
 logger = get_logger(__name__)
 
-def check_warranty_expiry():
-    """Verifica garantias próximas do vencimento"""
-    logger.info("Iniciando verificação de vencimento de garantias")
-    
-    try:
-        db = Database(Config.DATABASE_PATH)
-        
-        # Buscar garantias que vencem em 30, 15 e 7 dias
-        notification_days = [30, 15, 7]
-        total_notifications = 0
-        
-        for days in notification_days:
-            target_date = datetime.now() + timedelta(days=days)
-            target_date_str = format_date_iso(target_date)
-            
-            # Query para buscar garantias que vencem na data alvo
-            query = """
-            SELECT 
-                g.id,
-                g.data_vencimento,
-                u.nome as usuario_nome,
-                u.email as usuario_email,
-                p.descricao as produto_nome,
-                v.marca || ' ' || v.modelo || ' - ' || v.placa as veiculo_info
-            FROM garantias g
-            JOIN usuarios u ON g.usuario_id = u.id
-            JOIN produtos p ON g.produto_id = p.id
-            JOIN veiculos v ON g.veiculo_id = v.id
-            WHERE DATE(g.data_vencimento) = DATE(?)
-            AND g.ativo = 1
-            AND u.ativo = 1
-            """
-            
-            garantias = db.execute(query, (target_date_str,)).fetchall()
-            
-            for garantia in garantias:
-                # Enviar notificação por email
-                success = send_warranty_expiry_notification(
-                    user_email=garantia['usuario_email'],
-                    user_name=garantia['usuario_nome'],
-                    produto_nome=garantia['produto_nome'],
-                    veiculo_info=garantia['veiculo_info'],
-                    days_until_expiry=days
-                )
-                
-                if success:
-                    logger.info(f"Notificação enviada para {garantia['usuario_email']} - Garantia vence em {days} dias")
-                    total_notifications += 1
-                else:
-                    logger.error(f"Falha ao enviar notificação para {garantia['usuario_email']}")
-        
-        # Enviar relatório para administrador
-        if total_notifications > 0:
-            send_admin_notification(
-                subject=f"Relatório de Notificações - {format_date_br(datetime.now())}",
-                message=f"Foram enviadas {total_notifications} notificações de vencimento de garantias hoje."
-            )
-        
-        logger.info(f"Verificação concluída. {total_notifications} notificações enviadas.")
-        return total_notifications
-        
-    except Exception as e:
-        logger.error(f"Erro na verificação de vencimento: {e}")
-        send_admin_notification(
-            subject="Erro no Sistema de Garantias",
-            message=f"Erro na verificação de vencimento de garantias: {e}"
-        )
-        return 0
-
-def cleanup_expired_sessions():
-    """Remove sessões expiradas do banco"""
-    logger.info("Iniciando limpeza de sessões expiradas")
-    
-    try:
-        db = Database(Config.DATABASE_PATH)
-        
-        # Remover sessões expiradas (mais de 24 horas)
-        expiry_time = datetime.now() - timedelta(hours=24)
-        
-        # Assumindo que existe uma tabela de sessões
-        # Se não existir, esta parte pode ser removida
-        try:
-            result = db.execute(
-                "DELETE FROM sessions WHERE created_at < ?",
-                (expiry_time.isoformat(),)
-            )
-            logger.info(f"Removidas {result.rowcount} sessões expiradas")
-        except Exception:
-            # Tabela de sessões pode não existir ainda
-            logger.info("Tabela de sessões não encontrada, pulando limpeza")
-        
-    except Exception as e:
-        logger.error(f"Erro na limpeza de sessões: {e}")
-
-def generate_daily_report():
-    """Gera relatório diário do sistema"""
-    logger.info("Gerando relatório diário")
-    
-    try:
-        db = Database(Config.DATABASE_PATH)
-        
-        # Estatísticas do dia
-        today = format_date_iso(datetime.now())
-        
-        # Novas garantias ativadas hoje
-        new_warranties = db.execute(
-            "SELECT COUNT(*) as count FROM garantias WHERE DATE(data_cadastro) = DATE(?)",
-            (today,)
-        ).fetchone()['count']
-        
-        # Novos usuários cadastrados hoje
-        new_users = db.execute(
-            "SELECT COUNT(*) as count FROM usuarios WHERE DATE(data_cadastro) = DATE(?)",
-            (today,)
-        ).fetchone()['count']
-        
-        # Total de garantias ativas
-        total_warranties = db.execute(
-            "SELECT COUNT(*) as count FROM garantias WHERE ativo = 1"
-        ).fetchone()['count']
-        
-        # Total de usuários ativos
-        total_users = db.execute(
-            "SELECT COUNT(*) as count FROM usuarios WHERE ativo = 1"
-        ).fetchone()['count']
-        
-        # Garantias que vencem nos próximos 30 dias
-        expiring_soon = db.execute(
-            "SELECT COUNT(*) as count FROM garantias WHERE data_vencimento BETWEEN DATE('now') AND DATE('now', '+30 days') AND ativo = 1"
-        ).fetchone()['count']
-        
-        report = f"""
-Relatório Diário - Sistema de Garantias Viemar
-Data: {format_date_br(datetime.now())}
-
-=== ATIVIDADE DO DIA ===
-- Novas garantias ativadas: {new_warranties}
-- Novos usuários cadastrados: {new_users}
-
-=== ESTATÍSTICAS GERAIS ===
-- Total de garantias ativas: {total_warranties}
-- Total de usuários ativos: {total_users}
-- Garantias vencendo em 30 dias: {expiring_soon}
-
-=== ALERTAS ===
-"""        
-        
-        if expiring_soon > 10:
-            report += f"- ATENÇÃO: {expiring_soon} garantias vencem nos próximos 30 dias\n"
-        
-        if new_warranties == 0:
-            report += "- Nenhuma garantia foi ativada hoje\n"
-        
-        # Enviar relatório para administrador
-        send_admin_notification(
-            subject=f"Relatório Diário - {format_date_br(datetime.now())}",
-            message=report
-        )
-        
-        logger.info("Relatório diário gerado e enviado")
-        
-    except Exception as e:
-        logger.error(f"Erro na geração do relatório: {e}")
+# Comando -> tarefa registrada no agendador (app.manutencao)
+TAREFAS_AGENDADAS = {
+    'check-expiry': 'vencimento_garantias',
+    'report': 'relatorio_diario',
+    'purge-tokens': 'limpeza_tokens',
+    'archive': 'arquivamento_garantias',
+    'optimize-db': 'otimizacao_banco',
+}
+
+# Correções sob demanda, sem horário no agendador
+TAREFAS = {
+    'repair-counters': recalcular_contadores,
+    'link-installers': vincular_estabelecimentos,
+    'repair-installer-counters': recalcular_contadores_estabelecimentos,
+}
+
+USO = (
+    "Uso: python maintenance.py "
+    f"[{'|'.join([*TAREFAS_AGENDADAS, *TAREFAS])}|all] [--forcar]"
+)
+
 
 def main():
     """Função principal do script de manutenção"""
     logger.info("=== Iniciando script de manutenção ===")
-    
-    # Verificar argumentos da linha de comando
-    if len(sys.argv) > 1:
-        task = sys.argv[1]
-        
-        if task == "check-expiry":
-            check_warranty_expiry()
-        elif task == "cleanup":
-            cleanup_expired_sessions()
-        elif task == "report":
-            generate_daily_report()
-        elif task == "all":
-            check_warranty_expiry()
-            cleanup_expired_sessions()
-            generate_daily_report()
-        else:
-            print("Uso: python maintenance.py [check-expiry|cleanup|report|all]")
-            sys.exit(1)
-    else:
-        # Executar todas as tarefas por padrão
-        check_warranty_expiry()
-        cleanup_expired_sessions()
-        generate_daily_report()
-    
+
+    argumentos = [arg for arg in sys.argv[1:] if arg != '--forcar']
+    forcar = '--forcar' in sys.argv[1:]
+    tarefa = argumentos[0] if argumentos else 'all'
+    if tarefa == 'cleanup':
+        # Sessões ficam em memória em cada processo da aplicação
+        print("A limpeza de sessões é executada pelo agendador da aplicação")
+        return
+    if tarefa != 'all' and tarefa not in TAREFAS_AGENDADAS and tarefa not in TAREFAS:
+        print(USO)
+        sys.exit(1)
+
+    config = Config()
+    db = Database(config.DATABASE_PATH)
+    init_database(db)
+    anexar_arquivo(db, config.ARQUIVO_DATABASE_PATH)
+    agendador = Agendador(db)
+    registrar_tarefas_manutencao(agendador, config)
+
+    for comando, nome in TAREFAS_AGENDADAS.items():
+        if tarefa in ('all', comando):
+            try:
+                execucao_id = agendador.executar_manual(nome, forcar=forcar)
+            except Exception as e:
+                logger.error(f"Erro na tarefa {comando}: {e}")
+                continue
+            if execucao_id is None:
+                logger.warning(
+                    f"{comando}: horário mais recente já executado pela aplicação ou manualmente (use --forcar para repetir)"
+                )
+            else:
+                execucao = agendador.historico(nome, limite=1)[0]
+                logger.info(f"{comando}: {execucao['status']} {execucao['resultado'] or execucao['erro'] or ''}")
+
+    for nome, funcao in TAREFAS.items():
+        if tarefa in ('all', nome):
+            try:
+                logger.info(f"{nome}: {funcao(db)}")
+            except Exception as e:
+                logger.error(f"Erro na tarefa {nome}: {e}")
+
+    fechar_banco(db)
     logger.info("=== Script de manutenção concluído ===")
 
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -3,13 +3,21 @@
 Script de migração para preparar o banco para importação do Caspio.
 
 Este script adiciona as colunas necessárias para suportar a importação
-dos dados do Caspio mantendo referências aos IDs originais.
+dos dados do Caspio mantendo referências aos IDs originais. As colunas são
+criadas pelo motor de migrações versionadas (app/migrations).
 """
 
 import sqlite3
+import sys
 import logging
 from pathlib import Path
 
+# Adicionar o diretório raiz ao path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from fastlite import Database
+from app.migrations import aplicar_migracoes
+
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -25,67 +33,15 @@ def migrate_database(db_path: str) -> bool:
         True se migração foi bem-sucedida
     """
     try:
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        
         logger.info("Iniciando migração do banco de dados")
         
-        # Adiciona coluna caspio_id à tabela usuarios
-        try:
-            conn.execute("ALTER TABLE usuarios ADD COLUMN caspio_id TEXT")
-            logger.info("Coluna caspio_id adicionada à tabela usuarios")
-        except sqlite3.OperationalError as e:
-            if "duplicate column name" in str(e).lower():
-                logger.info("Coluna caspio_id já existe na tabela usuarios")
-            else:
-                raise
-        
-        # Adiciona coluna caspio_veiculo_id à tabela veiculos
-        try:
-            conn.execute("ALTER TABLE veiculos ADD COLUMN caspio_veiculo_id TEXT")
-            logger.info("Coluna caspio_veiculo_id adicionada à tabela veiculos")
-        except sqlite3.OperationalError as e:
-            if "duplicate column name" in str(e).lower():
-                logger.info("Coluna caspio_veiculo_id já existe na tabela veiculos")
-            else:
-                raise
-        
-        # Adiciona colunas necessárias para garantias do Caspio
-        caspio_warranty_columns = [
-            ("referencia_produto", "TEXT"),
-            ("lote_caspio", "TEXT"),
-            ("data_aplicacao_caspio", "TEXT"),
-            ("km_aplicacao", "INTEGER"),
-            ("oficina_nome", "TEXT"),
-            ("oficina_nf", "TEXT")
-        ]
-        
-        for column_name, column_type in caspio_warranty_columns:
-            try:
-                conn.execute(f"ALTER TABLE garantias ADD COLUMN {column_name} {column_type}")
-                logger.info(f"Coluna {column_name} adicionada à tabela garantias")
-            except sqlite3.OperationalError as e:
-                if "duplicate column name" in str(e).lower():
-                    logger.info(f"Coluna {column_name} já existe na tabela garantias")
-                else:
-                    raise
-        
-        # Cria índices para as novas colunas
-        indices = [
-            "CREATE INDEX IF NOT EXISTS idx_usuarios_caspio_id ON usuarios (caspio_id)",
-            "CREATE INDEX IF NOT EXISTS idx_veiculos_caspio_id ON veiculos (caspio_veiculo_id)",
-            "CREATE INDEX IF NOT EXISTS idx_garantias_referencia ON garantias (referencia_produto)",
-            "CREATE INDEX IF NOT EXISTS idx_garantias_lote_caspio ON garantias (lote_caspio)"
-        ]
-        
-        for index_sql in indices:
-            conn.execute(index_sql)
-            logger.info(f"Índice criado: {index_sql.split('ON')[1].strip()}")
-        
-        conn.commit()
-        conn.close()
+        # As colunas do Caspio agora fazem parte das migrações versionadas
+        # (app/migrations/m0003_colunas_caspio.py)
+        db = Database(db_path)
+        aplicadas = aplicar_migracoes(db)
+        db.close()
         
-        logger.info("Migração concluída com sucesso")
+        logger.info(f"Migração concluída com sucesso ({aplicadas} migrações aplicadas)")
         return True
         
     except Exception as e:
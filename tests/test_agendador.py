@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Testes para o agendador de tarefas e as tarefas de manutenção
+"""
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from app.agendador import Agendador, CronSpec, iniciar_agendador
+from app.arquivamento import anexar_arquivo, arquivo_anexado
+from app.database import fechar_banco
+from app.manutencao import gerar_relatorio_diario, verificar_vencimento_garantias
+
+
+class TestCronSpec:
+    """Testes para a interpretação das expressões cron"""
+
+    @pytest.mark.parametrize('expressao, apos, esperado', [
+        ('*/15 * * * *', datetime(2025, 3, 10, 8, 7, 30), datetime(2025, 3, 10, 8, 15)),
+        ('0 8 * * *', datetime(2025, 3, 10, 8, 0), datetime(2025, 3, 11, 8, 0)),
+        ('30 6 1 * *', datetime(2025, 12, 15, 0, 0), datetime(2026, 1, 1, 6, 30)),
+        ('0 9 * * 1-5', datetime(2025, 3, 14, 10, 0), datetime(2025, 3, 17, 9, 0)),
+        ('0 0 * * 7', datetime(2025, 3, 10, 0, 0), datetime(2025, 3, 16, 0, 0)),
+        ('0 0 29 2 *', datetime(2025, 3, 1, 0, 0), datetime(2028, 2, 29, 0, 0)),
+        # Dia do mês e dia da semana restritos: basta um deles conferir
+        ('0 0 13 * 5', datetime(2025, 3, 1, 0, 0), datetime(2025, 3, 7, 0, 0)),
+    ])
+    def test_proxima_execucao(self, expressao, apos, esperado):
+        """Próximo horário segue a semântica do cron"""
+        assert CronSpec(expressao).proxima_execucao(apos) == esperado
+
+    @pytest.mark.parametrize('expressao, ate, esperado', [
+        ('*/15 * * * *', datetime(2025, 3, 10, 8, 7, 30), datetime(2025, 3, 10, 8, 0)),
+        ('0 8 * * *', datetime(2025, 3, 10, 8, 0), datetime(2025, 3, 10, 8, 0)),
+        ('0 8 * * *', datetime(2025, 3, 10, 7, 59), datetime(2025, 3, 9, 8, 0)),
+        ('30 6 1 * *', datetime(2026, 1, 1, 6, 0), datetime(2025, 12, 1, 6, 30)),
+        ('0 4 * * 0', datetime(2025, 3, 14, 10, 0), datetime(2025, 3, 9, 4, 0)),
+    ])
+    def test_execucao_anterior(self, expressao, ate, esperado):
+        """Último horário até o instante, inclusive"""
+        assert CronSpec(expressao).execucao_anterior(ate) == esperado
+
+    @pytest.mark.parametrize('expressao', ['* * * *', '60 * * * *', '*/0 * * * *', '0 0 31 2 *'])
+    def test_expressao_invalida(self, expressao):
+        """Campos fora do intervalo ou datas impossíveis são rejeitados"""
+        with pytest.raises(ValueError):
+            CronSpec(expressao).proxima_execucao(datetime(2025, 1, 1))
+
+
+class TestAgendador:
+    """Testes para execução, lease e histórico"""
+
+    def test_horario_executado_uma_vez_entre_processos(self, temp_db):
+        """Dois processos disputando o mesmo horário: apenas um executa"""
+        execucoes = []
+        horario = datetime(2025, 3, 10, 8, 0)
+        agendadores = [Agendador(temp_db, dono=f'worker-{i}') for i in range(2)]
+        for agendador in agendadores:
+            agendador.registrar('tarefa', '0 8 * * *', lambda db: execucoes.append(1))
+
+        resultados = [agendador.executar('tarefa', horario) for agendador in agendadores]
+
+        assert len(execucoes) == 1
+        assert resultados[1] is None
+        # O horário seguinte fica livre novamente
+        assert agendadores[1].executar('tarefa', horario + timedelta(days=1)) is not None
+
+    def test_tarefa_por_processo_ignora_lease(self, temp_db):
+        """Tarefas não exclusivas rodam em todos os processos"""
+        execucoes = []
+        horario = datetime(2025, 3, 10, 8, 0)
+        for i in range(2):
+            agendador = Agendador(temp_db, dono=f'worker-{i}')
+            agendador.registrar('local', '* * * * *', lambda db: execucoes.append(1), exclusiva=False)
+            agendador.executar('local', horario)
+
+        assert len(execucoes) == 2
+
+    def test_historico(self, temp_db):
+        """Resultado e erro de cada execução ficam registrados"""
+        agendador = Agendador(temp_db)
+        agendador.registrar('ok', '0 * * * *', lambda db: {'total': 3})
+        agendador.registrar('erro', '0 * * * *', lambda db: 1 / 0)
+
+        agendador.executar('ok')
+        agendador.executar('erro')
+
+        erro, ok = agendador.historico()
+        assert (ok['tarefa'], ok['status'], ok['resultado']) == ('ok', 'concluida', '{"total": 3}')
+        assert (erro['status'], erro['erro']) == ('falhou', 'division by zero')
+
+    def test_executar_pendentes_com_jitter(self, temp_db):
+        """Tarefa roda só após o horário mais o jitter e é reagendada"""
+        execucoes = []
+        agendador = Agendador(temp_db)
+        agendador.registrar('tarefa', '*/5 * * * *', lambda db: execucoes.append(1), jitter_segundos=30)
+        tarefa = agendador._tarefas['tarefa']
+        horario = tarefa.horario
+
+        assert horario <= tarefa.executar_em <= horario + timedelta(seconds=30)
+        assert agendador.executar_pendentes(horario - timedelta(seconds=1)) == 0
+        assert agendador.executar_pendentes(horario + timedelta(seconds=31)) == 1
+        assert execucoes == [1]
+        assert tarefa.horario == horario + timedelta(minutes=5)
+
+    def test_execucao_manual_nao_repete_horario(self, temp_db):
+        """Execução manual ocupa o último horário: a aplicação não repete, nem o script"""
+        execucoes = []
+        aplicacao = Agendador(temp_db, dono='aplicacao')
+        script = Agendador(temp_db, dono='script')
+        for agendador in (aplicacao, script):
+            agendador.registrar('tarefa', '0 8 * * *', lambda db: execucoes.append(1))
+        ultimo = aplicacao._tarefas['tarefa'].cron.execucao_anterior(datetime.now())
+
+        assert aplicacao.executar('tarefa', ultimo) is not None
+        assert script.executar_manual('tarefa') is None
+        assert script.executar_manual('tarefa', forcar=True) is not None
+        assert execucoes == [1, 1]
+
+    def test_conexao_propria(self, temp_db, tmp_path, monkeypatch):
+        """As tarefas não usam a conexão das rotas, e o arquivo fica anexado"""
+        # A instância global volta ao valor anterior no fim do teste
+        monkeypatch.setattr('app.agendador._agendador', None)
+        caminho_arquivo = tmp_path / 'archive.db'
+        anexar_arquivo(temp_db, caminho_arquivo)
+
+        agendador = iniciar_agendador(temp_db, SimpleNamespace(ARQUIVO_DATABASE_PATH=str(caminho_arquivo)))
+        try:
+            assert agendador.db.conn is not temp_db.conn
+            assert agendador.db.conn.filename == temp_db.conn.filename
+            assert arquivo_anexado(agendador.db)
+            assert 'arquivamento_garantias' in agendador.proximas_execucoes()
+        finally:
+            agendador.parar(timeout=5)
+            fechar_banco(agendador.db)
+
+
+class TestManutencao:
+    """Testes para as tarefas de manutenção"""
+
+    def test_verificar_vencimento(self, temp_db, sample_user_data, sample_veiculo_data):
+        """Garantia que vence em 15 dias gera notificação"""
+        temp_db.execute(
+            "INSERT INTO usuarios (email, nome, senha_hash, tipo_usuario, confirmado) VALUES (?, ?, 'x', 'cliente', TRUE)",
+            (sample_user_data['email'], sample_user_data['nome'])
+        )
+        usuario_id = temp_db.execute("SELECT id FROM usuarios WHERE email = ?", (sample_user_data['email'],)).fetchone()[0]
+        temp_db.execute("INSERT INTO produtos (sku, descricao, ativo) VALUES ('AMT-1', 'Amortecedor', TRUE)")
+        temp_db.execute(
+            "INSERT INTO veiculos (usuario_id, marca, modelo, ano_modelo, placa, cor, ativo) VALUES (?, ?, ?, ?, ?, ?, TRUE)",
+            (usuario_id, sample_veiculo_data['marca'], sample_veiculo_data['modelo'],
+             sample_veiculo_data['ano_modelo'], sample_veiculo_data['placa'], sample_veiculo_data['cor'])
+        )
+        vencimento = (datetime.now() + timedelta(days=15)).strftime('%Y-%m-%d')
+        temp_db.execute("""
+            INSERT INTO garantias (usuario_id, produto_id, veiculo_id, lote_fabricacao, data_instalacao,
+                                   nota_fiscal, nome_estabelecimento, quilometragem, data_vencimento, ativo)
+            VALUES (?, 1, 1, 'L1', '2025-01-01', 'NF1', 'Oficina', 1000, ?, TRUE)
+        """, (usuario_id, vencimento))
+
+        with patch('app.manutencao.send_warranty_expiry_notification', return_value=True) as notificar, \
+                patch('app.manutencao.send_admin_notification'):
+            resultado = verificar_vencimento_garantias(temp_db)
+
+        assert resultado == {'enviadas': 1, 'falhas': 0}
+        assert notificar.call_args.kwargs['days_until_expiry'] == 15
+
+    def test_relatorio_diario(self, temp_db):
+        """Relatório conta os registros sem depender de acesso por nome de coluna"""
+        with patch('app.manutencao.send_admin_notification', return_value=True) as enviar:
+            resultado = gerar_relatorio_diario(temp_db)
+
+        assert resultado['enviado'] is True
+        assert 'Relatório Diário' in enviar.call_args.kwargs['subject']
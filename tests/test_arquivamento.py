@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Testes para o arquivamento de garantias antigas
+"""
+
+from datetime import date, timedelta
+
+import pytest
+
+from app.arquivamento import (
+    VISAO_HISTORICO, anexar_arquivo, arquivar_garantias, arquivo_anexado, tabela_garantias
+)
+from app.date_utils import format_date_iso
+
+
+def _inserir(db, sql, params=()):
+    return db.execute(f"{sql} RETURNING id", params).fetchall()[0][0]
+
+
+def _dias_atras(dias):
+    return format_date_iso(date.today() - timedelta(days=dias))
+
+
+@pytest.fixture
+def cenario(temp_db, tmp_path):
+    """Banco de arquivo anexado e garantias recentes e antigas de um cliente"""
+    anexar_arquivo(temp_db, tmp_path / 'archive.db')
+    usuario_id = _inserir(
+        temp_db,
+        "INSERT INTO usuarios (email, senha_hash, nome, tipo_usuario) VALUES ('arquivo@teste.com', 'hash', 'Cliente Arquivo', 'cliente')"
+    )
+    veiculo_id = _inserir(
+        temp_db, "INSERT INTO veiculos (usuario_id, marca, modelo, placa) VALUES (?, 'VW', 'Gol', 'ARQ1234')",
+        (usuario_id,)
+    )
+    garantias = {}
+    casos = {
+        # nome: (cadastro, vencimento, ativo, desativação)
+        'vigente': (_dias_atras(10), _dias_atras(-300), True, None),
+        'vencida_recente': (_dias_atras(500), _dias_atras(100), True, None),
+        'vencida_antiga': (_dias_atras(2000), _dias_atras(1000), True, None),
+        'inativa_antiga': (_dias_atras(900), _dias_atras(-100), False, _dias_atras(800)),
+        # Cadastrada há muito tempo, desativada agora (data preenchida pelo trigger)
+        'desativada_recente': (_dias_atras(900), _dias_atras(-100), False, None),
+    }
+    for i, (nome, (cadastro, vencimento, ativo, desativacao)) in enumerate(casos.items()):
+        produto_id = _inserir(temp_db, "INSERT INTO produtos (sku) VALUES (?)", (f"ARQ-{i}",))
+        garantias[nome] = _inserir(temp_db, """
+            INSERT INTO garantias (usuario_id, produto_id, veiculo_id, lote_fabricacao, data_instalacao,
+                                   nota_fiscal, nome_estabelecimento, quilometragem,
+                                   data_cadastro, data_vencimento, ativo, data_desativacao)
+            VALUES (?, ?, ?, ?, ?, 'NF', 'Oficina', 0, ?, ?, ?, ?)
+        """, (usuario_id, produto_id, veiculo_id, f"LT-{nome}", cadastro, cadastro, vencimento, ativo, desativacao))
+    return {'usuario_id': usuario_id, 'garantias': garantias}
+
+
+class TestAnexar:
+    """Tabela de arquivo e visão histórica"""
+
+    def test_sem_arquivo(self, temp_db):
+        assert not arquivo_anexado(temp_db)
+        assert tabela_garantias(temp_db, incluir_arquivadas=True) == 'garantias'
+        with pytest.raises(RuntimeError):
+            arquivar_garantias(temp_db)
+
+    def test_espelha_colunas(self, temp_db, tmp_path):
+        anexar_arquivo(temp_db, tmp_path / 'archive.db')
+        colunas = {row[1] for row in temp_db.execute("PRAGMA arquivo.table_info(garantias)").fetchall()}
+
+        assert {'lote_norm', 'estabelecimento_id', 'data_arquivamento'} <= colunas
+        assert tabela_garantias(temp_db, incluir_arquivadas=True) == VISAO_HISTORICO
+
+        temp_db.execute("ALTER TABLE garantias ADD COLUMN coluna_nova TEXT")
+        anexar_arquivo(temp_db, tmp_path / 'archive.db')
+        colunas = {row[1] for row in temp_db.execute("PRAGMA arquivo.table_info(garantias)").fetchall()}
+        assert 'coluna_nova' in colunas
+
+
+class TestArquivar:
+    """Movimentação em lotes"""
+
+    def test_move_antigas(self, temp_db, cenario):
+        ids = cenario['garantias']
+
+        resultado = arquivar_garantias(temp_db, dias=365, tamanho_lote=1)
+
+        assert resultado['arquivadas'] == 2
+        quentes = {row[0] for row in temp_db.execute("SELECT id FROM garantias").fetchall()}
+        assert quentes == {ids['vigente'], ids['vencida_recente'], ids['desativada_recente']}
+        arquivadas = temp_db.execute("SELECT id, lote_norm, data_arquivamento FROM arquivo.garantias").fetchall()
+        assert {row[0] for row in arquivadas} == {ids['vencida_antiga'], ids['inativa_antiga']}
+        assert all(row[1] and row[2] for row in arquivadas)
+        assert arquivar_garantias(temp_db, dias=365)['arquivadas'] == 0
+
+    def test_contadores_refletem_tabela_quente(self, temp_db, cenario):
+        arquivar_garantias(temp_db, dias=365)
+
+        total = temp_db.execute(
+            "SELECT total_garantias FROM usuarios WHERE id = ?", (cenario['usuario_id'],)
+        ).fetchone()[0]
+        assert total == 3
+
+    def test_visao_historica(self, temp_db, cenario):
+        arquivar_garantias(temp_db, dias=365)
+
+        rows = temp_db.execute(f"SELECT id, arquivada FROM {VISAO_HISTORICO} ORDER BY id").fetchall()
+        assert [row[0] for row in rows] == sorted(cenario['garantias'].values())
+        assert sum(row[1] for row in rows) == 2
+
+    def test_data_desativacao_mantida_por_triggers(self, temp_db, cenario):
+        garantia_id = cenario['garantias']['vigente']
+
+        temp_db.execute("UPDATE garantias SET ativo = FALSE WHERE id = ?", (garantia_id,))
+        desativacao = temp_db.execute("SELECT data_desativacao FROM garantias WHERE id = ?", (garantia_id,)).fetchone()[0]
+        assert desativacao.startswith(format_date_iso(date.today()))
+        assert arquivar_garantias(temp_db, dias=365)['arquivadas'] == 2
+
+        temp_db.execute("UPDATE garantias SET ativo = TRUE WHERE id = ?", (garantia_id,))
+        assert temp_db.execute("SELECT data_desativacao FROM garantias WHERE id = ?", (garantia_id,)).fetchone()[0] is None
+
+
+class TestRotas:
+    """Alternância "incluir arquivadas" e detalhes de garantia arquivada"""
+
+    def test_listagem_admin(self, admin_user, temp_db, cenario):
+        arquivar_garantias(temp_db, dias=365)
+        client = admin_user['client']
+
+        response = client.get('/admin/garantias')
+        assert response.status_code == 200
+        assert 'Incluir arquivadas' in response.text
+        assert f"/admin/garantias/{cenario['garantias']['vencida_antiga']}" not in response.text
+
+        response = client.get('/admin/garantias?incluir_arquivadas=true')
+        assert f"/admin/garantias/{cenario['garantias']['vencida_antiga']}" in response.text
+        assert 'arquivada' in response.text
+
+    def test_detalhe_arquivada(self, admin_user, temp_db, cenario):
+        arquivar_garantias(temp_db, dias=365)
+
+        response = admin_user['client'].get(f"/admin/garantias/{cenario['garantias']['inativa_antiga']}")
+
+        assert response.status_code == 200
+        assert 'LT-inativa_antiga' in response.text
+
+    def test_excluir_usuario_remove_arquivadas(self, admin_user, temp_db, cenario):
+        arquivar_garantias(temp_db, dias=365)
+
+        response = admin_user['client'].post(f"/admin/usuarios/{cenario['usuario_id']}/excluir")
+
+        assert response.status_code == 302
+        assert temp_db.execute("SELECT COUNT(*) FROM arquivo.garantias").fetchone()[0] == 0
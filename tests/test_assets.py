@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Testes para o pipeline de arquivos estáticos com hash e pré-compressão
+"""
+
+import gzip
+
+import pytest
+from fasthtml.common import FastHTML, Link, Script
+
+from app.assets import CACHE_IMUTAVEL, PipelineAssets, setup_assets
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    """Pipeline com um static/ mínimo, incluindo um arquivo vendorizado"""
+    static = tmp_path / 'static'
+    (static / 'vendor').mkdir(parents=True)
+    (static / 'style.css').write_text('body { color: #333; }\n' * 50)
+    (static / 'logo.png').write_bytes(b'\x89PNG' + bytes(200))
+    (static / 'vendor' / 'htmx-2.0.7.js').write_text('var htmx = {};\n' * 50)
+
+    pipeline = PipelineAssets(static, tmp_path / 'build')
+    pipeline.construir()
+    return pipeline
+
+
+class TestPipelineAssets:
+    """Testes para o manifesto e os arquivos gerados"""
+
+    def test_nome_com_hash(self, pipeline, tmp_path):
+        """Nome muda com o conteúdo e o texto ganha versão gzip"""
+        nome = pipeline.manifesto['style.css']
+
+        assert nome.startswith('style.') and nome.endswith('.css') and nome != 'style.css'
+        assert pipeline.url('style.css') == f'/assets/{nome}'
+        assert gzip.decompress((tmp_path / 'build' / f'{nome}.gz').read_bytes()).startswith(b'body')
+        # Imagens não são comprimidas novamente
+        assert not (tmp_path / 'build' / f"{pipeline.manifesto['logo.png']}.gz").exists()
+
+        (tmp_path / 'static' / 'style.css').write_text('body { color: #000; }')
+        assert pipeline.construir()['style.css'] != nome
+
+    def test_carregar_manifesto(self, pipeline, tmp_path):
+        """Manifesto gerado no build é reaproveitado sem reprocessar"""
+        outro = PipelineAssets(tmp_path / 'static', tmp_path / 'build')
+
+        assert outro.carregar() is True
+        assert outro.manifesto == pipeline.manifesto
+        assert PipelineAssets(tmp_path / 'static', tmp_path / 'vazio').carregar() is False
+
+    def test_cabecalhos_locais(self, pipeline):
+        """URLs de CDN vendorizadas viram locais; as demais só com permitir_cdn"""
+        htmx = Script(src='https://cdn.jsdelivr.net/npm/htmx.org@2.0.7/dist/htmx.js')
+        daisy = Link(rel='stylesheet', href='https://cdn.jsdelivr.net/npm/daisyui@4.12.24/dist/full.min.css')
+
+        local, cdn = pipeline.cabecalhos_locais([htmx, daisy], permitir_cdn=True)
+
+        assert local.attrs['src'] == pipeline.url('vendor/htmx-2.0.7.js')
+        assert cdn is daisy
+        # O cabeçalho original (global do FastHTML) não é alterado
+        assert htmx.attrs['src'].startswith('https://')
+
+    def test_cabecalho_sem_copia_local_falha(self, pipeline):
+        """Arquivo de CDN não vendorizado impede a inicialização"""
+        daisy = Link(rel='stylesheet', href='https://cdn.jsdelivr.net/npm/daisyui@4.12.24/dist/full.min.css')
+
+        with pytest.raises(RuntimeError, match='daisyui'):
+            pipeline.cabecalhos_locais([daisy])
+        assert len(pipeline.cabecalhos_locais([Script(src='https://cdn.jsdelivr.net/npm/htmx.org@2.0.7/dist/htmx.js')])) == 1
+
+
+class TestRotaAssets:
+    """Testes para a rota /assets/"""
+
+    @pytest.fixture
+    def client(self, pipeline):
+        from starlette.testclient import TestClient
+        app = FastHTML()
+        setup_assets(app, pipeline)
+        return TestClient(app)
+
+    def test_resposta_imutavel_comprimida(self, client, pipeline):
+        """Cliente com gzip recebe a versão pré-comprimida, cacheável para sempre"""
+        response = client.get(pipeline.url('style.css'), headers={'Accept-Encoding': 'gzip'})
+
+        assert response.status_code == 200
+        assert response.headers['cache-control'] == CACHE_IMUTAVEL
+        assert response.headers['content-encoding'] == 'gzip'
+        assert response.headers['content-type'].startswith('text/css')
+        assert response.text.startswith('body')
+
+    def test_sem_compressao(self, client, pipeline):
+        """Cliente sem Accept-Encoding recebe o arquivo original"""
+        response = client.get(pipeline.url('logo.png'), headers={'Accept-Encoding': 'identity'})
+
+        assert 'content-encoding' not in response.headers
+        assert response.headers['content-type'] == 'image/png'
+
+    @pytest.mark.parametrize('caminho', ['/assets/style.css', '/assets/../app/config.py', '/assets/manifest.json'])
+    def test_apenas_arquivos_do_manifesto(self, client, caminho):
+        """Somente nomes com hash do manifesto são servidos"""
+        assert client.get(caminho).status_code == 404
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Testes para o cache de usuários usado por get_current_user
+"""
+
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+from app import auth
+from app.auth import SESSION_COOKIE_NAME, get_auth_manager, get_current_user
+
+
+def _requisicao(session_id):
+    return SimpleNamespace(cookies={SESSION_COOKIE_NAME: session_id})
+
+
+@pytest.fixture
+def consultas(authenticated_user):
+    """Espiona as consultas ao banco feitas para carregar o usuário"""
+    manager = get_auth_manager()
+    with patch.object(manager, 'obter_usuario_por_id', wraps=manager.obter_usuario_por_id) as espiao:
+        yield espiao
+
+
+class TestCacheUsuario:
+    """Testes para leitura, expiração e invalidação do cache"""
+
+    def test_sem_consulta_dentro_do_ttl(self, authenticated_user, consultas):
+        requisicao = _requisicao(authenticated_user['session_id'])
+
+        primeiro = get_current_user(requisicao)
+        segundo = get_current_user(requisicao)
+
+        assert consultas.call_count == 1
+        assert primeiro['nome'] == segundo['nome'] == authenticated_user['user_data']['nome']
+
+    def test_expira_apos_ttl(self, authenticated_user, consultas):
+        requisicao = _requisicao(authenticated_user['session_id'])
+
+        with patch.object(auth, 'USUARIO_CACHE_TTL_SEGUNDOS', 0):
+            get_current_user(requisicao)
+            get_current_user(requisicao)
+
+        assert consultas.call_count == 2
+
+    def test_invalidado_ao_atualizar_perfil(self, authenticated_user, temp_db):
+        """O nome novo aparece na requisição seguinte, sem esperar o TTL"""
+        client = authenticated_user['client']
+        requisicao = _requisicao(authenticated_user['session_id'])
+        get_current_user(requisicao)
+
+        response = client.post('/cliente/perfil', data={'nome': 'Nome Atualizado', 'telefone': '11999999999'})
+
+        assert response.status_code == 302
+        assert get_current_user(requisicao)['nome'] == 'Nome Atualizado'
+
+    def test_invalidado_ao_excluir_usuario(self, authenticated_user, temp_db):
+        manager = get_auth_manager()
+        usuario_id = authenticated_user['id']
+        assert manager.obter_usuario_cache(usuario_id) is not None
+
+        temp_db.execute("DELETE FROM usuarios WHERE id = ?", (usuario_id,))
+        assert manager.obter_usuario_cache(usuario_id) is not None  # ainda no cache
+        manager.invalidar_usuario(str(usuario_id))  # path_params chegam como texto
+
+        assert manager.obter_usuario_cache(usuario_id) is None
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Testes para a importação de garantias do Caspio
+"""
+
+from fastlite import Database
+
+from app.database import init_database
+from app.services.caspio_import_service import CaspioImportService
+
+XML_GARANTIAS = """<?xml version="1.0" encoding="utf-8"?>
+<Export>
+  <Table>
+    <Name>PRODUTO_APLICADO</Name>
+    {linhas}
+  </Table>
+</Export>
+"""
+
+LINHA = """<Row>
+      <ID_CLIENTE>CSP-1</ID_CLIENTE>
+      <REFERENCIA>AMT-100</REFERENCIA>
+      <LOTE>{lote}</LOTE>
+      <DATA_APLICACAO>2023-05-10</DATA_APLICACAO>
+      <NOME_OFICINA>Oficina Caspio</NOME_OFICINA>
+    </Row>"""
+
+
+def test_garantia_ativa_existente_ignorada(tmp_path):
+    """Duas aplicações do mesmo produto no mesmo veículo: a segunda é ignorada, sem erro"""
+    caminho = str(tmp_path / 'caspio.db')
+    # O importador usa o módulo sqlite3; a conexão apsw fica fechada durante a importação
+    db = Database(caminho)
+    init_database(db)
+    usuario_id = db.execute("""
+        INSERT INTO usuarios (email, senha_hash, nome, tipo_usuario, caspio_id)
+        VALUES ('caspio@teste.com', 'hash', 'Cliente Caspio', 'cliente', 'CSP-1') RETURNING id
+    """).fetchall()[0][0]
+    db.execute("INSERT INTO veiculos (usuario_id, marca, modelo, placa) VALUES (?, 'VW', 'Gol', 'CSP1234')", (usuario_id,))
+    db.close()
+    xml = tmp_path / 'caspio.xml'
+    xml.write_text(XML_GARANTIAS.format(linhas=LINHA.format(lote='L1') + LINHA.format(lote='L2')), encoding='utf-8')
+
+    servico = CaspioImportService(caminho, str(xml))
+
+    assert servico.import_warranties() == 1
+    assert servico.stats.warranties_skipped == 1
+    assert servico.stats.errors == []
+    db = Database(caminho)
+    try:
+        assert db.execute("SELECT COUNT(*) FROM garantias").fetchone()[0] == 1
+    finally:
+        db.close()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Testes para o catálogo de produtos em cache e a busca do formulário de garantia
+"""
+
+import pytest
+
+from app.services.catalogo_produtos import (
+    CatalogoProdutos, get_catalogo_produtos, invalidar_catalogo_produtos
+)
+
+
+@pytest.fixture
+def produtos(temp_db):
+    """Produtos de teste"""
+    dados = [
+        ('AMT-1001', 'Amortecedor dianteiro Gol', True),
+        ('AMT-1002', 'Amortecedor traseiro Gol', True),
+        ('KIT-2001', 'Kit batente dianteiro', True),
+        ('AMT-9999', 'Amortecedor descontinuado', False),
+    ]
+    for sku, descricao, ativo in dados:
+        temp_db.execute(
+            "INSERT INTO produtos (sku, descricao, ativo) VALUES (?, ?, ?)",
+            (sku, descricao, ativo)
+        )
+    return temp_db
+
+
+class TestCatalogoProdutos:
+    """Testes para o cache do catálogo"""
+
+    def test_lista_apenas_ativos(self, produtos):
+        """Catálogo contém somente produtos ativos ordenados por SKU"""
+        catalogo = CatalogoProdutos(produtos)
+
+        skus = [p['sku'] for p in catalogo.listar()]
+
+        assert skus == ['AMT-1001', 'AMT-1002', 'KIT-2001']
+
+    def test_busca_por_prefixo_sku(self, produtos):
+        """Busca encontra produtos pelo início do SKU, sem diferenciar caixa"""
+        catalogo = CatalogoProdutos(produtos)
+
+        skus = [p['sku'] for p in catalogo.buscar('amt-10')]
+
+        assert skus == ['AMT-1001', 'AMT-1002']
+
+    def test_busca_por_palavra_da_descricao(self, produtos):
+        """Busca encontra produtos pelo início de qualquer palavra da descrição"""
+        catalogo = CatalogoProdutos(produtos)
+
+        skus = {p['sku'] for p in catalogo.buscar('diant')}
+
+        assert skus == {'AMT-1001', 'KIT-2001'}
+
+    def test_busca_respeita_limite(self, produtos):
+        """Quantidade de resultados é limitada"""
+        catalogo = CatalogoProdutos(produtos)
+
+        assert len(catalogo.buscar('a', limite=1)) == 1
+
+    def test_cache_e_invalidacao(self, produtos):
+        """Novos produtos só aparecem após invalidar o catálogo"""
+        catalogo = get_catalogo_produtos(produtos)
+        assert catalogo.obter(1) is not None
+
+        produtos.execute(
+            "INSERT INTO produtos (sku, descricao, ativo) VALUES ('NOV-1', 'Novo produto', 1)"
+        )
+        assert catalogo.buscar('NOV') == []
+
+        invalidar_catalogo_produtos()
+        assert [p['sku'] for p in catalogo.buscar('NOV')] == ['NOV-1']
+
+
+class TestBuscaProdutosRoute:
+    """Testes para o endpoint de busca (typeahead) e o formulário"""
+
+    def test_busca_retorna_fragmento(self, authenticated_user, produtos):
+        """Endpoint retorna apenas os produtos encontrados"""
+        client = authenticated_user['client']
+
+        response = client.get('/cliente/garantias/produtos/busca?produto_busca=KIT')
+
+        assert response.status_code == 200
+        assert 'KIT-2001' in response.text
+        assert 'AMT-1001' not in response.text
+
+    def test_formulario_nao_renderiza_catalogo(self, authenticated_user, produtos):
+        """Formulário de nova garantia não inclui a lista de produtos"""
+        client = authenticated_user['client']
+        produtos.execute(
+            "INSERT INTO veiculos (usuario_id, marca, modelo, placa) VALUES (?, 'VW', 'Gol', 'ABC1234')",
+            (authenticated_user['id'],)
+        )
+
+        response = client.get('/cliente/garantias/nova')
+
+        assert response.status_code == 200
+        assert 'produtos/busca' in response.text
+        assert 'AMT-1002' not in response.text
+
+    def test_toggle_admin_invalida_catalogo(self, admin_user, produtos):
+        """Desativar produto no admin remove o produto da busca"""
+        client = admin_user['client']
+        catalogo = get_catalogo_produtos(produtos)
+        assert catalogo.obter(3) is not None
+
+        client.get('/admin/produtos/3/toggle')
+
+        assert catalogo.obter(3) is None
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Testes para o middleware de compressão de respostas
+"""
+
+import asyncio
+import gzip
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.compressao import CompressaoMiddleware, escolher_codificacao
+
+HTML_GRANDE = '<div class="card shadow-sm mb-3 p-4">Garantia</div>' * 200
+
+
+def _html(request):
+    return HTMLResponse(HTML_GRANDE)
+
+
+def _pequeno(request):
+    return HTMLResponse('<p>ok</p>')
+
+
+def _json(request):
+    return JSONResponse({'itens': [{'sku': f'AMT-{i}', 'ativo': True} for i in range(200)]})
+
+
+def _imagem(request):
+    return Response(b'\x89PNG' + bytes(5000), media_type='image/png')
+
+
+def _pre_comprimido(request):
+    return Response(gzip.compress(b'x' * 5000), media_type='text/css', headers={'Content-Encoding': 'gzip'})
+
+
+def _stream(request):
+    async def partes():
+        for i in range(5):
+            yield f"<tr><td>linha {i}</td></tr>".encode() * 10
+    return StreamingResponse(partes(), media_type='text/html')
+
+
+@pytest.fixture
+def client():
+    app = Starlette(routes=[
+        Route('/html', _html), Route('/pequeno', _pequeno), Route('/json', _json),
+        Route('/imagem', _imagem), Route('/pre', _pre_comprimido), Route('/stream', _stream),
+    ])
+    app.add_middleware(CompressaoMiddleware, tamanho_minimo=500)
+    return TestClient(app)
+
+
+class TestEscolherCodificacao:
+    """Testes para a negociação do Accept-Encoding"""
+
+    @pytest.mark.parametrize('accept_encoding, esperado', [
+        ('gzip, deflate', 'gzip'),
+        ('gzip;q=0, deflate', None),
+        ('identity', None),
+        ('', None),
+        ('*', 'gzip'),
+    ])
+    def test_gzip(self, accept_encoding, esperado):
+        with patch('app.compressao.BROTLI_DISPONIVEL', False):
+            assert escolher_codificacao(accept_encoding) == esperado
+
+    def test_brotli_preferido_quando_disponivel(self):
+        with patch('app.compressao.BROTLI_DISPONIVEL', True):
+            assert escolher_codificacao('gzip, br') == 'br'
+            assert escolher_codificacao('gzip, br;q=0') == 'gzip'
+
+
+class TestCompressaoMiddleware:
+    """Testes para os limites de tipo e tamanho e para o streaming"""
+
+    def test_html_comprimido(self, client):
+        """HTML grande vai com gzip, Content-Length do corpo comprimido e Vary"""
+        response = client.get('/html', headers={'Accept-Encoding': 'gzip'})
+
+        assert response.headers['content-encoding'] == 'gzip'
+        assert response.headers['vary'] == 'Accept-Encoding'
+        assert int(response.headers['content-length']) < len(HTML_GRANDE) / 10
+        assert response.text == HTML_GRANDE
+
+    def test_json_comprimido(self, client):
+        response = client.get('/json', headers={'Accept-Encoding': 'gzip'})
+
+        assert response.headers['content-encoding'] == 'gzip'
+        assert len(response.json()['itens']) == 200
+
+    @pytest.mark.parametrize('caminho, encoding_original', [
+        ('/pequeno', None), ('/imagem', None), ('/pre', 'gzip'),
+    ])
+    def test_respostas_nao_comprimidas(self, client, caminho, encoding_original):
+        """Abaixo do mínimo, tipo não comprimível ou já codificado: resposta intacta"""
+        response = client.get(caminho, headers={'Accept-Encoding': 'gzip'})
+
+        assert response.headers.get('content-encoding') == encoding_original
+
+    def test_cliente_sem_suporte(self, client):
+        response = client.get('/html', headers={'Accept-Encoding': 'identity'})
+
+        assert 'content-encoding' not in response.headers
+        assert response.text == HTML_GRANDE
+
+    def test_streaming_comprimido_por_partes(self):
+        """Cada parte é enviada comprimida e decodificável sem esperar o fim"""
+        enviados = []
+        fim = asyncio.Event()
+
+        async def receber():
+            # Cliente conectado até receber a última parte
+            await fim.wait()
+            return {'type': 'http.disconnect'}
+
+        async def enviar(mensagem):
+            enviados.append(mensagem)
+            if mensagem['type'] == 'http.response.body' and not mensagem.get('more_body'):
+                fim.set()
+
+        middleware = CompressaoMiddleware(Starlette(routes=[Route('/stream', _stream)]))
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': '/stream', 'root_path': '', 'query_string': b'',
+            'headers': [(b'accept-encoding', b'gzip')],
+        }
+        # Loop próprio em outra thread, isolado do loop de outros testes
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(asyncio.run, middleware(scope, receber, enviar)).result(timeout=10)
+
+        inicio, *corpos = enviados
+        cabecalhos = dict(inicio['headers'])
+        assert cabecalhos[b'content-encoding'] == b'gzip'
+        assert b'content-length' not in cabecalhos
+        assert len(corpos) == 6
+
+        descompressor = zlib.decompressobj(31)
+        partes = [descompressor.decompress(m['body']) for m in corpos]
+        assert partes[0] == b"<tr><td>linha 0</td></tr>" * 10
+        assert b''.join(partes).count(b'<tr>') == 50
+        assert descompressor.eof
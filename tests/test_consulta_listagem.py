@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Testes para as consultas declarativas das listagens
+"""
+
+import pytest
+
+from app.consulta_listagem import (
+    LISTAGEM_GARANTIAS_ADMIN, LISTAGEM_GARANTIAS_CLIENTE, LISTAGEM_PRODUTOS, LISTAGEM_USUARIOS
+)
+from app.database import abrir_banco, init_database
+
+
+class TestSqlCanonico:
+    """O mesmo conjunto de filtros gera sempre o mesmo texto de SQL"""
+
+    def test_ordem_dos_parametros_nao_muda_o_sql(self):
+        primeira = LISTAGEM_GARANTIAS_ADMIN.montar({'veiculo_placa': 'ABC', 'cliente_nome': 'Ana'})
+        segunda = LISTAGEM_GARANTIAS_ADMIN.montar({'cliente_nome': 'Maria', 'veiculo_placa': 'XYZ'})
+
+        assert primeira.sql_pagina is segunda.sql_pagina
+        assert primeira.params == ['%Ana%', '%ABC%']
+        assert segunda.params == ['%Maria%', '%XYZ%']
+
+    def test_filtros_vazios_e_desconhecidos_ignorados(self):
+        consulta = LISTAGEM_PRODUTOS.montar({'sku': '  ', 'descricao': '', 'inexistente': 'x'})
+
+        assert 'WHERE' not in consulta.sql_contagem
+        assert consulta.params == []
+        assert consulta.filtros == {'sku': '', 'descricao': '', 'ativo': ''}
+
+    def test_ordenacao_invalida_usa_padrao(self):
+        consulta = LISTAGEM_USUARIOS.montar({'sort': 'senha_hash; DROP TABLE usuarios', 'direction': 'up'})
+
+        assert (consulta.sort_field, consulta.sort_direction) == ('data_cadastro', 'desc')
+        assert consulta.sql_pagina.endswith("ORDER BY data_cadastro DESC LIMIT ? OFFSET ?")
+
+    def test_booleano_e_status_como_parametros(self):
+        usuarios = LISTAGEM_USUARIOS.montar({'confirmado': 'false', 'tipo_usuario': 'cliente'})
+        assert usuarios.params == ['cliente', False]
+
+        hoje = LISTAGEM_GARANTIAS_CLIENTE.montar({'status': 'vencida'}, [7])
+        assert hoje.sql_todos.count('?') == len(hoje.params) == 2
+        assert hoje.params[0] == 7
+
+    def test_status_desconhecido_ignorado(self):
+        consulta = LISTAGEM_GARANTIAS_CLIENTE.montar({'status': 'qualquer'}, [7])
+
+        assert consulta.params == [7]
+
+    def test_contagem_sem_juncoes(self):
+        sem_filtro = LISTAGEM_GARANTIAS_ADMIN.montar({})
+        assert sem_filtro.sql_contagem == "SELECT COUNT(*) FROM garantias g"
+
+        na_principal = LISTAGEM_GARANTIAS_ADMIN.montar({'status': 'ativa', 'lote_fabricacao': 'LT'})
+        assert 'JOIN' not in na_principal.sql_contagem
+
+        nas_juncoes = LISTAGEM_GARANTIAS_ADMIN.montar({'status': 'ativa', 'cliente_nome': 'Ana'})
+        assert 'JOIN usuarios u' in nas_juncoes.sql_contagem
+
+
+class TestCacheDeComandos:
+    """Requisições repetidas reaproveitam o comando compilado"""
+
+    @pytest.fixture
+    def db(self, tmp_path):
+        db = abrir_banco(tmp_path / 'cache.db', cache_comandos=300)
+        init_database(db)
+        yield db
+        db.close()
+
+    def test_tamanho_configurado(self, db):
+        assert db.conn.cache_stats()['size'] == 300
+
+    def test_mesma_combinacao_reaproveita_comando(self, db):
+        for i in range(5):
+            db.execute("INSERT INTO produtos (sku, descricao) VALUES (?, 'Amortecedor')", (f"AMT-{i}",))
+
+        LISTAGEM_PRODUTOS.montar({'sku': 'AMT'}).buscar(db, 25, 0)
+        antes = db.conn.cache_stats()
+        for termo in ('AMT-1', 'AMT-2', 'AMT-3'):
+            assert len(LISTAGEM_PRODUTOS.montar({'sku': termo}).buscar(db, 25, 0)) == 1
+        depois = db.conn.cache_stats()
+
+        assert depois['hits'] - antes['hits'] == 3
+        assert depois['misses'] == antes['misses']
+
+
+class TestRotas:
+    """As rotas continuam filtrando e ordenando como antes"""
+
+    def test_admin_produtos_filtra_e_ordena(self, admin_user, temp_db):
+        for sku in ('AMT-2', 'KIT-1', 'AMT-1'):
+            temp_db.execute("INSERT INTO produtos (sku, descricao) VALUES (?, 'Produto')", (sku,))
+
+        response = admin_user['client'].get('/admin/produtos?sku=AMT&sort=sku&direction=desc')
+
+        assert response.status_code == 200
+        assert 'KIT-1' not in response.text
+        assert response.text.index('AMT-2') < response.text.index('AMT-1')
+
+    def test_admin_usuarios_filtro_tipo(self, admin_user, temp_db):
+        temp_db.execute(
+            "INSERT INTO usuarios (email, senha_hash, nome, tipo_usuario) VALUES ('cliente@listagem.com', 'hash', 'Cliente', 'cliente')"
+        )
+
+        response = admin_user['client'].get('/admin/usuarios?tipo_usuario=administrador')
+
+        assert response.status_code == 200
+        assert 'admin@viemar.com.br' in response.text
+        assert 'cliente@listagem.com' not in response.text
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Testes para os contadores de garantias e veículos mantidos por triggers
+"""
+
+import pytest
+
+from app.contadores import recalcular_contadores
+
+
+def _inserir_usuario(db, email):
+    db.execute(
+        "INSERT INTO usuarios (email, senha_hash, nome, tipo_usuario, confirmado) VALUES (?, 'hash', ?, 'cliente', TRUE)",
+        (email, email)
+    )
+    return db.execute("SELECT last_insert_rowid()").fetchone()[0]
+
+
+def _inserir_veiculo(db, usuario_id, placa, ativo=True):
+    db.execute(
+        "INSERT INTO veiculos (usuario_id, marca, modelo, placa, ativo) VALUES (?, 'Fiat', 'Uno', ?, ?)",
+        (usuario_id, placa, ativo)
+    )
+    return db.execute("SELECT last_insert_rowid()").fetchone()[0]
+
+
+def _inserir_garantia(db, usuario_id, veiculo_id, produto_id, ativo=True):
+    db.execute("""
+        INSERT INTO garantias (usuario_id, produto_id, veiculo_id, lote_fabricacao, data_instalacao,
+                               nota_fiscal, nome_estabelecimento, quilometragem, ativo)
+        VALUES (?, ?, ?, 'L1', '2024-01-15', 'NF1', 'Oficina', 1000, ?)
+    """, (usuario_id, produto_id, veiculo_id, ativo))
+    return db.execute("SELECT last_insert_rowid()").fetchone()[0]
+
+
+def _contadores(db, tabela, registro_id):
+    colunas = 'total_garantias, garantias_ativas'
+    if tabela == 'usuarios':
+        colunas += ', veiculos_ativos'
+    return tuple(db.execute(f"SELECT {colunas} FROM {tabela} WHERE id = ?", (registro_id,)).fetchone())
+
+
+@pytest.fixture
+def cenario(temp_db):
+    """Usuário com dois veículos e um produto"""
+    temp_db.execute("INSERT INTO produtos (sku, descricao) VALUES ('CNT001', 'Produto')")
+    produto_id = temp_db.execute("SELECT last_insert_rowid()").fetchone()[0]
+    usuario_id = _inserir_usuario(temp_db, 'contador@teste.com')
+    return {
+        'produto_id': produto_id,
+        'usuario_id': usuario_id,
+        'veiculos': [_inserir_veiculo(temp_db, usuario_id, 'AAA1111'), _inserir_veiculo(temp_db, usuario_id, 'BBB2222')],
+    }
+
+
+class TestTriggersContadores:
+    """Testes para a manutenção dos contadores pelos triggers"""
+
+    def test_insercao(self, temp_db, cenario):
+        usuario_id, (v1, v2) = cenario['usuario_id'], cenario['veiculos']
+        _inserir_garantia(temp_db, usuario_id, v1, cenario['produto_id'])
+        _inserir_garantia(temp_db, usuario_id, v1, cenario['produto_id'], ativo=False)
+
+        assert _contadores(temp_db, 'veiculos', v1) == (2, 1)
+        assert _contadores(temp_db, 'veiculos', v2) == (0, 0)
+        assert _contadores(temp_db, 'usuarios', usuario_id) == (2, 1, 2)
+
+    def test_desativar_e_reativar(self, temp_db, cenario):
+        usuario_id, v1 = cenario['usuario_id'], cenario['veiculos'][0]
+        garantia_id = _inserir_garantia(temp_db, usuario_id, v1, cenario['produto_id'])
+
+        temp_db.execute("UPDATE garantias SET ativo = FALSE WHERE id = ?", (garantia_id,))
+        assert _contadores(temp_db, 'veiculos', v1) == (1, 0)
+
+        temp_db.execute("UPDATE garantias SET ativo = TRUE WHERE id = ?", (garantia_id,))
+        temp_db.execute("UPDATE garantias SET observacoes = 'x' WHERE id = ?", (garantia_id,))
+        assert _contadores(temp_db, 'veiculos', v1) == (1, 1)
+        assert _contadores(temp_db, 'usuarios', usuario_id) == (1, 1, 2)
+
+    def test_troca_de_veiculo_e_de_dono(self, temp_db, cenario):
+        usuario_id, (v1, v2) = cenario['usuario_id'], cenario['veiculos']
+        outro_id = _inserir_usuario(temp_db, 'outro@teste.com')
+        garantia_id = _inserir_garantia(temp_db, usuario_id, v1, cenario['produto_id'])
+
+        temp_db.execute("UPDATE garantias SET veiculo_id = ? WHERE id = ?", (v2, garantia_id))
+        assert _contadores(temp_db, 'veiculos', v1) == (0, 0)
+        assert _contadores(temp_db, 'veiculos', v2) == (1, 1)
+
+        temp_db.execute("UPDATE veiculos SET usuario_id = ? WHERE id = ?", (outro_id, v2))
+        temp_db.execute("UPDATE garantias SET usuario_id = ? WHERE id = ?", (outro_id, garantia_id))
+        assert _contadores(temp_db, 'usuarios', usuario_id) == (0, 0, 1)
+        assert _contadores(temp_db, 'usuarios', outro_id) == (1, 1, 1)
+
+    def test_exclusao(self, temp_db, cenario):
+        usuario_id, v1 = cenario['usuario_id'], cenario['veiculos'][0]
+        garantia_id = _inserir_garantia(temp_db, usuario_id, v1, cenario['produto_id'])
+
+        temp_db.execute("DELETE FROM garantias WHERE id = ?", (garantia_id,))
+        temp_db.execute("DELETE FROM veiculos WHERE id = ?", (v1,))
+
+        assert _contadores(temp_db, 'usuarios', usuario_id) == (0, 0, 1)
+
+
+class TestRecalcularContadores:
+    """Testes para o comando de reparo"""
+
+    def test_corrige_divergencias(self, temp_db, cenario):
+        usuario_id, v1 = cenario['usuario_id'], cenario['veiculos'][0]
+        _inserir_garantia(temp_db, usuario_id, v1, cenario['produto_id'])
+        temp_db.execute("UPDATE veiculos SET total_garantias = 7, garantias_ativas = 0 WHERE id = ?", (v1,))
+        temp_db.execute("UPDATE usuarios SET veiculos_ativos = 0 WHERE id = ?", (usuario_id,))
+
+        assert recalcular_contadores(temp_db) == {'veiculos': 1, 'usuarios': 1}
+        assert _contadores(temp_db, 'veiculos', v1) == (1, 1)
+        assert _contadores(temp_db, 'usuarios', usuario_id) == (1, 1, 2)
+        assert recalcular_contadores(temp_db) == {'veiculos': 0, 'usuarios': 0}
+
+
+class TestTelasUsamContadores:
+    """As telas leem os totais da linha"""
+
+    def test_dashboard_cliente(self, authenticated_user, temp_db, sample_produto_data):
+        usuario_id = authenticated_user['id']
+        veiculo_id = _inserir_veiculo(temp_db, usuario_id, 'CCC3333')
+        _inserir_veiculo(temp_db, usuario_id, 'DDD4444', ativo=False)
+        for i in range(3):
+            temp_db.execute("INSERT INTO produtos (sku, descricao) VALUES (?, ?)",
+                            (f"{sample_produto_data['sku']}-{i}", sample_produto_data['descricao']))
+            produto_id = temp_db.execute("SELECT last_insert_rowid()").fetchone()[0]
+            _inserir_garantia(temp_db, usuario_id, veiculo_id, produto_id)
+
+        response = authenticated_user['client'].get('/cliente')
+
+        assert response.status_code == 200
+        assert '>1</h3>' in response.text and '>3</h3>' in response.text
+
+    def test_listagem_admin_veiculos(self, admin_user, temp_db, cenario):
+        v1 = cenario['veiculos'][0]
+        _inserir_garantia(temp_db, cenario['usuario_id'], v1, cenario['produto_id'])
+        for _ in range(3):
+            _inserir_garantia(temp_db, cenario['usuario_id'], v1, cenario['produto_id'], ativo=False)
+
+        response = admin_user['client'].get('/admin/veiculos')
+
+        assert response.status_code == 200
+        assert '<td class="">4</td>' in response.text
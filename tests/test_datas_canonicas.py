@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Testes para o formato ISO canônico das datas e o caminho rápido de formatação
+"""
+
+from datetime import date, datetime
+
+import pytest
+
+from app.date_utils import (
+    FORMATOS_CASPIO, _format_date_br_texto, _format_datetime_br_texto,
+    format_date_br, format_datetime_br, format_datetime_br_short,
+    normalizar_data_iso, normalizar_datetime_iso
+)
+from app.migrations import aplicar_migracoes, descobrir_migracoes
+
+
+class TestFormatacaoRapida:
+    """Testes para o fatiamento fixo do formato canônico"""
+
+    @pytest.mark.parametrize("valor", [
+        '2025-09-17', '2024-02-29', '2025-04-30', '2025-12-31',
+        '2025-09-17 18:51:50', '2025-01-01 00:00:00', '2025-12-31 23:59:59',
+    ])
+    def test_caminho_rapido_igual_ao_strptime(self, valor):
+        """Fatiamento produz o mesmo resultado que o caminho com strptime"""
+        assert format_date_br(valor) == _format_date_br_texto.__wrapped__(valor)
+        assert format_datetime_br(valor) == _format_datetime_br_texto.__wrapped__(valor)
+
+    def test_formato_curto(self):
+        """Formato curto descarta os segundos"""
+        assert format_datetime_br_short('2025-09-17 18:51:50') == '17/09/2025 18:51'
+        assert format_datetime_br_short('2025-09-17') == '17/09/2025 00:00'
+
+    @pytest.mark.parametrize("valor,esperado", [
+        ('2025-09-18T15:02:39.832026', '18/09/2025'),
+        ('2025-13-45', 'N/A'),
+        ('texto', 'N/A'),
+    ])
+    def test_valores_fora_do_padrao(self, valor, esperado):
+        """Valores legados ou inválidos seguem pelo caminho antigo"""
+        assert format_date_br(valor) == esperado
+
+    @pytest.mark.parametrize("valor", [
+        '2026-02-30', '2025-02-29', '2025-04-31', '0000-01-01',
+        '2025-09-17 24:00:00', '2025-09-17 18:60:00', '2026-02-30 10:00:00',
+    ])
+    def test_data_inexistente_com_formato_canonico(self, valor):
+        """Datas e horas inexistentes no formato canônico resultam em N/A, como no strptime"""
+        assert format_date_br(valor) == _format_date_br_texto.__wrapped__(valor) == 'N/A'
+        assert format_datetime_br(valor) == _format_datetime_br_texto.__wrapped__(valor)
+
+    def test_valores_legados_em_cache(self):
+        """Valor legado repetido é convertido uma única vez"""
+        _format_datetime_br_texto.cache_clear()
+
+        for _ in range(3):
+            assert format_datetime_br('2025-09-18T15:02:39.832026') == '18/09/2025 15:02:39'
+
+        info = _format_datetime_br_texto.cache_info()
+        assert (info.misses, info.hits) == (1, 2)
+
+
+class TestNormalizacao:
+    """Testes para a conversão ao formato canônico"""
+
+    @pytest.mark.parametrize("valor,esperado", [
+        ('2025-09-18T15:02:39.832026', '2025-09-18 15:02:39'),
+        ('2025-09-18 15:02', '2025-09-18 15:02:00'),
+        ('2025-09-18', '2025-09-18 00:00:00'),
+        ('18/09/2025 15:02:39', '2025-09-18 15:02:39'),
+        ('2025-09-18T15:02:39+00:00', '2025-09-18 15:02:39'),
+        (datetime(2025, 9, 18, 15, 2, 39, 1234), '2025-09-18 15:02:39'),
+        (date(2025, 9, 18), '2025-09-18 00:00:00'),
+        ('inválida', None),
+        ('', None),
+    ])
+    def test_normalizar_datetime(self, valor, esperado):
+        """Variações de data/hora resultam em yyyy-MM-dd HH:mm:ss"""
+        assert normalizar_datetime_iso(valor) == esperado
+
+    def test_normalizar_data(self):
+        """Datas com horário perdem o horário"""
+        assert normalizar_data_iso('2025-09-18T15:02:39') == '2025-09-18'
+        assert normalizar_data_iso('18/09/2025') == '2025-09-18'
+
+    def test_formato_caspio(self):
+        """Datas do Caspio têm o mês antes do dia"""
+        assert normalizar_datetime_iso('11/9/2017 2:26:09 PM', FORMATOS_CASPIO) == '2017-11-09 14:26:09'
+
+
+class TestMigracaoDatas:
+    """Testes para a migração das datas existentes"""
+
+    def test_normaliza_valores_legados(self, temp_db):
+        """Migração reescreve as datas fora do padrão e mantém as inválidas"""
+        versao = next(m.versao for m in descobrir_migracoes() if 'datas_iso' in m.nome)
+        temp_db.execute("DELETE FROM schema_version WHERE versao >= ?", (versao,))
+        temp_db.execute("INSERT INTO produtos (sku, descricao, data_cadastro) VALUES ('P1', 'Produto', '2025-09-18T15:02:39.832026')")
+        temp_db.execute("""
+            INSERT INTO veiculos (usuario_id, marca, modelo, placa, data_cadastro)
+            VALUES (1, 'VW', 'Gol', 'ABC1234', 'sem data')
+        """)
+        temp_db.execute("""
+            INSERT INTO garantias (usuario_id, produto_id, veiculo_id, lote_fabricacao,
+                data_instalacao, nota_fiscal, nome_estabelecimento, quilometragem,
+                data_vencimento, data_cadastro, data_aplicacao_caspio)
+            VALUES (1, 1, 1, 'L1', '2025-09-18T00:00:00', 'NF1', 'Oficina', 0,
+                '2027-09-18 00:00:00', '2025-09-18', '11/9/2017 2:26:09 PM')
+        """)
+
+        aplicar_migracoes(temp_db)
+
+        assert temp_db.execute("SELECT data_cadastro FROM produtos").fetchone()[0] == '2025-09-18 15:02:39'
+        assert temp_db.execute("SELECT data_cadastro FROM veiculos").fetchone()[0] == 'sem data'
+        garantia = temp_db.execute("""
+            SELECT data_instalacao, data_vencimento, data_cadastro, data_aplicacao_caspio FROM garantias
+        """).fetchone()
+        assert tuple(garantia) == ('2025-09-18', '2027-09-18', '2025-09-18 00:00:00', '2017-11-09 14:26:09')
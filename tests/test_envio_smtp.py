@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Testes para a entrega SMTP persistente, usando o servidor SMTP local
+"""
+
+from email import message_from_bytes
+from unittest.mock import Mock, patch
+
+import pytest
+
+from app.envio_smtp import EntregaSMTP
+from app.smtp_local import ServidorSMTPLocal
+
+REMETENTE = 'garantia70mil@viemar.com.br'
+
+
+def _entrega(servidor, **kwargs):
+    return EntregaSMTP('127.0.0.1', servidor.porta, REMETENTE, usar_tls=False, **kwargs)
+
+
+def _lote(quantidade):
+    return [(f"cliente{i}@exemplo.com.br", f"Aviso {i}", f"Linha {i}\n.linha com ponto\n") for i in range(quantidade)]
+
+
+class TestEntregaSMTP:
+    """Testes para reuso da conexão, pipelining e reconexão"""
+
+    @pytest.mark.parametrize('pipelining', [True, False])
+    def test_lote_em_uma_conexao(self, pipelining):
+        with ServidorSMTPLocal(pipelining=pipelining) as servidor:
+            entrega = _entrega(servidor)
+            resultados = entrega.enviar_lote(_lote(5))
+            entrega.fechar()
+
+        assert resultados == [True] * 5
+        assert servidor.conexoes == 1
+        assert [m.destinatarios for m in servidor.mensagens] == [[f"cliente{i}@exemplo.com.br"] for i in range(5)]
+
+        mensagem = message_from_bytes(servidor.mensagens[3].dados)
+        assert mensagem['Subject'] == 'Aviso 3'
+        assert mensagem['From'] == REMETENTE
+        # Linha começando com ponto sobrevive ao dot-stuffing
+        assert '\n.linha com ponto' in mensagem.get_payload().replace('\r\n', '\n')
+
+    def test_envios_avulsos_reusam_conexao(self):
+        with ServidorSMTPLocal() as servidor:
+            entrega = _entrega(servidor)
+            assert entrega.enviar('a@exemplo.com.br', 'Um', 'corpo')
+            assert entrega.enviar('b@exemplo.com.br', 'Dois', 'corpo')
+            entrega.fechar()
+
+        assert servidor.conexoes == 1
+        assert entrega.estatisticas()['enviadas'] == 2
+
+    def test_reconecta_quando_servidor_derruba(self):
+        with ServidorSMTPLocal(derrubar_apos=2) as servidor:
+            entrega = _entrega(servidor)
+            resultados = entrega.enviar_lote(_lote(4))
+            entrega.fechar()
+
+        assert resultados == [True] * 4
+        assert len(servidor.mensagens) == 4
+        assert servidor.conexoes == 2
+        assert entrega.estatisticas()['reconexoes'] == 1
+
+    def test_destinatario_recusado_nao_derruba_o_lote(self):
+        with ServidorSMTPLocal(recusar=['cliente1@exemplo.com.br']) as servidor:
+            entrega = _entrega(servidor)
+            resultados = entrega.enviar_lote(_lote(3))
+            entrega.fechar()
+
+        assert resultados == [True, False, True]
+        assert servidor.conexoes == 1
+        estatisticas = entrega.estatisticas()
+        assert estatisticas['falhas'] == 1 and estatisticas['enviadas'] == 2
+        assert estatisticas['mensagens_por_segundo'] > 0
+
+    def test_limite_de_mensagens_por_conexao(self):
+        with ServidorSMTPLocal() as servidor:
+            entrega = _entrega(servidor, mensagens_por_conexao=2)
+            entrega.enviar_lote(_lote(5))
+            entrega.fechar()
+
+        assert servidor.conexoes == 3
+
+    def test_servidor_indisponivel(self):
+        servidor = ServidorSMTPLocal()
+        porta = servidor.porta
+        servidor.server_close()
+
+        entrega = EntregaSMTP('127.0.0.1', porta, REMETENTE, usar_tls=False, timeout=2)
+
+        assert entrega.enviar('a@exemplo.com.br', 'Assunto', 'corpo') is False
+        assert entrega.estatisticas()['falhas'] == 1
+
+
+class TestEmailServiceBackendSMTP:
+    """EmailService com EMAIL_BACKEND=smtp"""
+
+    def test_send_emails_usa_entrega_persistente(self):
+        with ServidorSMTPLocal() as servidor:
+            config = Mock(EMAIL_BACKEND='smtp', EMAIL_FROM=REMETENTE)
+            entrega = _entrega(servidor)
+            with patch('app.email_service.get_config', return_value=config), \
+                    patch('app.email_service.get_entrega_smtp', return_value=entrega):
+                from app.email_service import EmailService
+                service = EmailService()
+                resultados = service.send_emails(_lote(3))
+                enviado = service.send_email('x@exemplo.com.br', 'Avulso', 'corpo')
+            entrega.fechar()
+
+        assert resultados == [True] * 3 and enviado is True
+        assert servidor.conexoes == 1
+        assert len(servidor.mensagens) == 4
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Testes para a sincronização incremental de produtos com o ERP
+
+Usam o substituto local em SQLite do driver do Firebird.
+"""
+
+import json
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import pytest
+
+from app.config import Config
+from app.services import erp_sqlite_driver
+from app.agendador import Agendador
+from app.manutencao import registrar_tarefas_manutencao
+from app.services.firebird_service import FirebirdService
+
+
+@pytest.fixture
+def erp(tmp_path):
+    """ERP local com três produtos"""
+    caminho = tmp_path / 'erp.db'
+    conexao = erp_sqlite_driver.connect(str(caminho))
+    erp_sqlite_driver.inserir_produtos(conexao, [
+        ('AMT-1001', 'Amortecedor dianteiro'),
+        ('AMT-1002', 'Amortecedor traseiro'),
+        ('KIT-2001', 'Kit batente'),
+    ])
+    yield conexao, caminho
+    conexao.close()
+
+
+@pytest.fixture
+def service(erp):
+    """Serviço configurado para o ERP local"""
+    config = Mock(spec=Config)
+    config.FIREBIRD_DRIVER = 'sqlite'
+    config.FIREBIRD_DATABASE = erp[1]
+    config.FIREBIRD_POOL_SIZE = 1
+    config.FIREBIRD_POOL_IDLE_SECONDS = 300
+    config.FIREBIRD_FETCH_SIZE = 2
+    config.FIREBIRD_HOST = 'localhost'
+    config.FIREBIRD_USER = 'usuario'
+    config.FIREBIRD_PASSWORD = 'senha'
+    config.FIREBIRD_ROLE = 'role'
+    config.FIREBIRD_CHARSET = 'ISO8859_1'
+    service = FirebirdService(config)
+    yield service
+    service.fechar_conexoes()
+
+
+class TestPoolConexoes:
+    """Testes para o reaproveitamento de conexões"""
+
+    def test_conexao_reaproveitada(self, service):
+        """Segunda consulta reutiliza a conexão devolvida ao pool"""
+        with patch.object(erp_sqlite_driver, 'connect', wraps=erp_sqlite_driver.connect) as connect:
+            assert service.test_connection()
+            assert service.test_connection()
+
+        assert connect.call_count == 1
+
+    def test_conexao_com_erro_descartada(self, service):
+        """Conexão que falhou durante o uso não volta ao pool"""
+        with pytest.raises(RuntimeError):
+            with service.get_connection():
+                raise RuntimeError("falha")
+
+        assert len(service._pool) == 0
+
+    def test_leitura_em_lotes(self, service):
+        """Produtos são lidos com fetchmany, sem carregar tudo de uma vez"""
+        skus = [p['sku'] for p in service.iterar_produtos_erp(tamanho_lote=1)]
+
+        assert sorted(skus) == ['AMT-1001', 'AMT-1002', 'KIT-2001']
+        assert len(service._pool) == 1
+
+
+class TestSincronizacaoIncremental:
+    """Testes para a comparação com o snapshot"""
+
+    def test_segunda_sincronizacao_nao_grava(self, service, temp_db):
+        """Sem alterações no ERP nenhum produto é reescrito"""
+        primeira = service.sync_produtos(temp_db)
+        temp_db.execute("UPDATE produtos SET data_atualizacao = 'marcador'")
+
+        segunda = service.sync_produtos(temp_db)
+
+        assert primeira['inseridos'] == 3
+        assert (segunda['inseridos'], segunda['atualizados'], segunda['inalterados']) == (0, 0, 3)
+        marcadores = temp_db.execute(
+            "SELECT COUNT(*) FROM produtos WHERE data_atualizacao = 'marcador'"
+        ).fetchone()[0]
+        assert marcadores == 3
+
+    def test_apenas_alterado_e_atualizado(self, service, temp_db, erp):
+        """Produto alterado no ERP é o único gravado"""
+        service.sync_produtos(temp_db)
+        erp[0].execute("UPDATE PRODUTO SET DESCRICAO = 'Kit batente reforçado' WHERE REF_FORNECE = 'KIT-2001'")
+        erp[0].commit()
+
+        stats = service.sync_produtos(temp_db)
+
+        assert (stats['atualizados'], stats['inalterados']) == (1, 2)
+        descricao = temp_db.execute("SELECT descricao FROM produtos WHERE sku = 'KIT-2001'").fetchone()[0]
+        assert descricao == 'Kit batente reforçado'
+
+    def test_produto_removido_localmente_volta(self, service, temp_db):
+        """Produto apagado no SQLite é inserido novamente mesmo com snapshot"""
+        service.sync_produtos(temp_db)
+        temp_db.execute("DELETE FROM produtos WHERE sku = 'AMT-1001'")
+
+        stats = service.sync_produtos(temp_db)
+
+        assert stats['inseridos'] == 1
+
+    def test_execucao_agendada(self, service, temp_db):
+        """Sincronização roda como tarefa exclusiva do agendador quando CRON_SINCRONIZACAO_ERP está definido"""
+        agendador = Agendador(temp_db)
+        registrar_tarefas_manutencao(agendador, SimpleNamespace(CRON_SINCRONIZACAO_ERP='0 * * * *'))
+
+        with patch('app.services.firebird_service._firebird_service', service):
+            execucao_id = agendador.executar_manual('sincronizacao_erp')
+
+        assert agendador._tarefas['sincronizacao_erp'].exclusiva
+        status, resultado = temp_db.execute(
+            "SELECT status, resultado FROM agendador_execucoes WHERE id = ?", (execucao_id,)
+        ).fetchone()
+        assert (status, json.loads(resultado)['inseridos']) == ('concluida', 3)
+        assert temp_db.execute("SELECT COUNT(*) FROM erp_produtos_snapshot").fetchone()[0] == 3
+        assert agendador.executar_manual('sincronizacao_erp') is None
+
+    def test_sem_cron_nao_registra(self, temp_db):
+        """Sem CRON_SINCRONIZACAO_ERP a sincronização automática fica desativada"""
+        agendador = Agendador(temp_db)
+        registrar_tarefas_manutencao(agendador, SimpleNamespace())
+
+        assert 'sincronizacao_erp' not in agendador._tarefas
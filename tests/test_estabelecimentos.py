@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Testes para a dimensão de estabelecimentos instaladores
+"""
+
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from app.estabelecimentos import (
+    normalizar_estabelecimento, recalcular_contadores_estabelecimentos,
+    resolver_estabelecimento, vincular_estabelecimentos
+)
+from app.services.catalogo_produtos import invalidar_catalogo_produtos
+
+
+def _inserir(db, sql, params=()):
+    return db.execute(f"{sql} RETURNING id", params).fetchall()[0][0]
+
+
+def _contadores(db, estabelecimento_id):
+    return tuple(db.execute(
+        "SELECT total_garantias, garantias_ativas FROM estabelecimentos WHERE id = ?", (estabelecimento_id,)
+    ).fetchone())
+
+
+@pytest.fixture
+def cenario(temp_db):
+    """Usuário com um veículo e três produtos"""
+    usuario_id = temp_db.execute("SELECT id FROM usuarios LIMIT 1").fetchone()[0]
+    veiculo_id = _inserir(
+        temp_db, "INSERT INTO veiculos (usuario_id, marca, modelo, placa) VALUES (?, 'VW', 'Gol', 'EST1234')",
+        (usuario_id,)
+    )
+    produtos = [_inserir(temp_db, "INSERT INTO produtos (sku) VALUES (?)", (f"EST-{i}",)) for i in range(3)]
+    return {'usuario_id': usuario_id, 'veiculo_id': veiculo_id, 'produtos': produtos}
+
+
+def _inserir_garantia(db, cenario, produto, nome, oficina_nome=None, ativo=True):
+    return _inserir(db, """
+        INSERT INTO garantias (usuario_id, produto_id, veiculo_id, lote_fabricacao, data_instalacao,
+                               nota_fiscal, nome_estabelecimento, oficina_nome, quilometragem, ativo)
+        VALUES (?, ?, ?, 'L1', '2024-01-15', 'NF', ?, ?, 0, ?)
+    """, (cenario['usuario_id'], cenario['produtos'][produto], cenario['veiculo_id'], nome, oficina_nome, ativo))
+
+
+class TestNormalizacao:
+    """Nomes com grafias diferentes viram o mesmo estabelecimento"""
+
+    def test_normalizar(self):
+        assert normalizar_estabelecimento('  Auto  Peças São João ') == 'AUTO PECAS SAO JOAO'
+        assert normalizar_estabelecimento('   ') == ''
+        assert normalizar_estabelecimento(None) == ''
+
+    def test_resolver_reaproveita(self, temp_db):
+        primeiro = resolver_estabelecimento(temp_db, 'Auto Peças São João')
+        segundo = resolver_estabelecimento(temp_db, 'AUTO PECAS  sao joao')
+
+        assert primeiro == segundo
+        assert resolver_estabelecimento(temp_db, '') is None
+        nome = temp_db.execute("SELECT nome FROM estabelecimentos WHERE id = ?", (primeiro,)).fetchone()[0]
+        assert nome == 'Auto Peças São João'
+
+
+class TestVinculacao:
+    """Passada em lotes e contadores mantidos por triggers"""
+
+    def test_vincula_e_conta(self, temp_db, cenario):
+        _inserir_garantia(temp_db, cenario, 0, 'Oficina Central')
+        _inserir_garantia(temp_db, cenario, 1, 'OFICINA  CENTRAL', ativo=False)
+        _inserir_garantia(temp_db, cenario, 2, '', oficina_nome='Oficína Central')
+
+        assert vincular_estabelecimentos(temp_db) == {'vinculadas': 3}
+        assert vincular_estabelecimentos(temp_db) == {'vinculadas': 0}
+
+        ids = temp_db.execute("SELECT DISTINCT estabelecimento_id FROM garantias").fetchall()
+        assert len(ids) == 1
+        assert _contadores(temp_db, ids[0][0]) == (3, 2)
+
+    def test_triggers(self, temp_db, cenario):
+        estabelecimento_id = resolver_estabelecimento(temp_db, 'Oficina A')
+        outro_id = resolver_estabelecimento(temp_db, 'Oficina B')
+        garantia_id = _inserir(temp_db, """
+            INSERT INTO garantias (usuario_id, produto_id, veiculo_id, lote_fabricacao, data_instalacao,
+                                   nota_fiscal, nome_estabelecimento, estabelecimento_id, quilometragem)
+            VALUES (?, ?, ?, 'L1', '2024-01-15', 'NF', 'Oficina A', ?, 0)
+        """, (cenario['usuario_id'], cenario['produtos'][0], cenario['veiculo_id'], estabelecimento_id))
+        assert _contadores(temp_db, estabelecimento_id) == (1, 1)
+
+        temp_db.execute("UPDATE garantias SET ativo = FALSE WHERE id = ?", (garantia_id,))
+        assert _contadores(temp_db, estabelecimento_id) == (1, 0)
+
+        temp_db.execute("UPDATE garantias SET estabelecimento_id = ? WHERE id = ?", (outro_id, garantia_id))
+        assert _contadores(temp_db, estabelecimento_id) == (0, 0)
+        assert _contadores(temp_db, outro_id) == (1, 0)
+
+        temp_db.execute("DELETE FROM garantias WHERE id = ?", (garantia_id,))
+        assert _contadores(temp_db, outro_id) == (0, 0)
+
+    def test_recalcular(self, temp_db, cenario):
+        _inserir_garantia(temp_db, cenario, 0, 'Oficina A')
+        vincular_estabelecimentos(temp_db)
+        temp_db.execute("UPDATE estabelecimentos SET total_garantias = 9")
+
+        assert recalcular_contadores_estabelecimentos(temp_db) == {'estabelecimentos': 1}
+        assert recalcular_contadores_estabelecimentos(temp_db) == {'estabelecimentos': 0}
+
+
+class TestRotas:
+    """Criação de garantia, ranking e filtro por estabelecimento"""
+
+    def test_criar_garantia_vincula(self, authenticated_user, temp_db):
+        produto_id = _inserir(temp_db, "INSERT INTO produtos (sku, descricao) VALUES ('EST-AMT', 'Amortecedor')")
+        veiculo_id = _inserir(
+            temp_db, "INSERT INTO veiculos (usuario_id, marca, modelo, placa) VALUES (?, 'VW', 'Gol', 'EST9999')",
+            (authenticated_user['id'],)
+        )
+        invalidar_catalogo_produtos()
+
+        with patch('app.async_tasks.send_warranty_activation_email_async'):
+            response = authenticated_user['client'].post('/cliente/garantias/nova', data={
+                'produto_id': str(produto_id),
+                'veiculo_id': str(veiculo_id),
+                'lote_fabricacao': 'LT1',
+                'data_instalacao': datetime.now().strftime('%Y-%m-%d'),
+                'nota_fiscal': 'NF1',
+                'nome_estabelecimento': 'Mecânica Rápida',
+                'quilometragem': '1000',
+            })
+
+        assert response.status_code == 302
+        row = temp_db.execute("""
+            SELECT e.nome_norm, e.garantias_ativas FROM garantias g
+            JOIN estabelecimentos e ON g.estabelecimento_id = e.id
+        """).fetchone()
+        assert tuple(row) == ('MECANICA RAPIDA', 1)
+
+    def test_ranking_e_filtro(self, admin_user, temp_db, cenario):
+        _inserir_garantia(temp_db, cenario, 0, 'Oficina Pequena')
+        _inserir_garantia(temp_db, cenario, 1, 'Oficina Grande')
+        _inserir_garantia(temp_db, cenario, 2, 'oficina grande')
+        vincular_estabelecimentos(temp_db)
+        grande_id = resolver_estabelecimento(temp_db, 'Oficina Grande')
+        client = admin_user['client']
+
+        response = client.get('/admin/estabelecimentos')
+        assert response.status_code == 200
+        assert response.text.index('Oficina Grande') < response.text.index('Oficina Pequena')
+
+        response = client.get('/admin/estabelecimentos?nome=pequena')
+        assert 'Oficina Pequena' in response.text
+        assert 'Oficina Grande' not in response.text
+
+        response = client.get(f'/admin/garantias?estabelecimento_id={grande_id}')
+        assert response.status_code == 200
+        assert response.text.count('href="/admin/garantias/') == 2
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Testes para o status de garantias calculado no SQL
+"""
+
+from datetime import date, timedelta
+
+import pytest
+
+from app.date_utils import format_date_iso
+from app.garantia_status import status_sql, dias_para_vencimento_sql, filtro_status_sql
+
+
+@pytest.fixture
+def garantias(temp_db):
+    """Garantias com vencimentos em situações diferentes (um produto por caso)"""
+    temp_db.execute(
+        "INSERT INTO veiculos (usuario_id, marca, modelo, placa) VALUES (1, 'VW', 'Gol', 'ABC1234')"
+    )
+    hoje = date.today()
+    casos = {
+        'vencida': (hoje - timedelta(days=1), True),
+        'proxima': (hoje + timedelta(days=10), True),
+        'limite': (hoje + timedelta(days=30), True),
+        'ativa': (hoje + timedelta(days=400), True),
+        'inativa': (hoje - timedelta(days=1), False),
+    }
+    for produto_id, (lote, (vencimento, ativo)) in enumerate(casos.items(), start=1):
+        temp_db.execute("INSERT INTO produtos (sku, descricao) VALUES (?, 'Produto')", (f"VIE00{produto_id}",))
+        temp_db.execute("""
+            INSERT INTO garantias (usuario_id, produto_id, veiculo_id, lote_fabricacao,
+                data_instalacao, nota_fiscal, nome_estabelecimento, quilometragem,
+                data_vencimento, ativo)
+            VALUES (1, ?, 1, ?, ?, 'NF1', 'Oficina', 0, ?, ?)
+        """, (produto_id, lote, format_date_iso(hoje), format_date_iso(vencimento), ativo))
+    return temp_db
+
+
+def _status_por_lote(db):
+    rows = db.execute(
+        f"SELECT g.lote_fabricacao, {status_sql()}, {dias_para_vencimento_sql()} FROM garantias g"
+    ).fetchall()
+    return {row[0]: (row[1], row[2]) for row in rows}
+
+
+class TestStatusSql:
+    """Testes para as expressões de status"""
+
+    def test_status_calculado(self, garantias):
+        """Expressão CASE segue as regras de Garantia.status_garantia"""
+        status = _status_por_lote(garantias)
+
+        assert status['vencida'] == ('vencida', -1)
+        assert status['proxima'] == ('proxima', 10)
+        assert status['limite'] == ('proxima', 30)
+        assert status['ativa'][0] == 'ativa'
+        assert status['inativa'][0] == 'inativa'
+
+    @pytest.mark.parametrize("filtro", ['vencida', 'proxima', 'ativa', 'inativa'])
+    def test_filtro_consistente_com_status(self, garantias, filtro):
+        """Filtro por intervalo retorna exatamente as garantias do status"""
+        condicao, params = filtro_status_sql(filtro)
+        lotes = {
+            row[0] for row in garantias.execute(
+                f"SELECT g.lote_fabricacao FROM garantias g WHERE {condicao}", params
+            ).fetchall()
+        }
+        esperados = {lote for lote, (status, _) in _status_por_lote(garantias).items() if status == filtro}
+
+        assert lotes == esperados
+
+    def test_filtro_usa_indice_de_vencimento(self, garantias):
+        """Filtro de próximas do vencimento é uma busca por intervalo no índice"""
+        condicao, params = filtro_status_sql('proxima')
+        plano = garantias.execute(
+            f"EXPLAIN QUERY PLAN SELECT g.id FROM garantias g WHERE {condicao}", params
+        ).fetchall()
+        detalhes = ' '.join(row[-1] for row in plano)
+
+        assert 'idx_garantias_ativo_vencimento' in detalhes
+
+    def test_filtro_desconhecido(self):
+        """Status desconhecido não gera condição"""
+        assert filtro_status_sql('xyz') == (None, [])
+
+
+class TestListagemStatus:
+    """Testes para o filtro de status nas listagens"""
+
+    def test_admin_filtra_proximas_do_vencimento(self, admin_user, garantias):
+        """Listagem admin mostra apenas garantias que vencem em até 30 dias"""
+        client = admin_user['client']
+
+        response = client.get('/admin/garantias?status=proxima')
+
+        assert response.status_code == 200
+        assert response.text.count('Próxima do vencimento') == 2
+        assert 'Vencida</span>' not in response.text
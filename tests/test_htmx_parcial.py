@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Testes para a renderização parcial das listagens (requisições HTMX)
+"""
+
+import pytest
+from fasthtml.common import to_xml
+
+from app.templates import pagination_component, table_component, url_listagem
+
+HX = {'HX-Request': 'true'}
+
+
+@pytest.fixture
+def produtos(temp_db):
+    """60 produtos para gerar mais de uma página"""
+    for i in range(60):
+        temp_db.execute(
+            "INSERT INTO produtos (sku, descricao, ativo) VALUES (?, ?, TRUE)",
+            (f"AMT-{i:03d}", f"Amortecedor {i}")
+        )
+
+
+class TestComponentes:
+    """Testes para os links gerados pela tabela e pela paginação"""
+
+    def test_url_listagem_mantem_filtros(self):
+        params = {'sku': 'AMT', 'ativo': '', 'page': '3', 'sort': 'sku'}
+
+        url = url_listagem('/admin/produtos', params, ignorar=('page',), sort='descricao', direction='asc')
+
+        assert url == '/admin/produtos?sku=AMT&sort=descricao&direction=asc'
+        assert url_listagem('/admin/produtos') == '/admin/produtos'
+
+    def test_ordenacao_com_htmx(self):
+        html = to_xml(table_component(
+            ['SKU'], [['AMT-1']], sortable_columns=['sku'], current_sort='sku',
+            base_url='/admin/produtos', query_params={'sku': 'AMT', 'page': '2'}, hx_target='#listagem'
+        ))
+
+        assert 'hx-get="/admin/produtos?sku=AMT&amp;sort=sku&amp;direction=desc"' in html
+        assert 'hx-target="#listagem"' in html
+        assert 'page=2' not in html
+
+    def test_paginacao_sem_htmx_mantem_comportamento(self):
+        """Sem alvo HTMX os links continuam sendo navegação comum"""
+        html = to_xml(pagination_component(2, 3, '/admin/produtos', page_size=25, total_records=60))
+
+        assert 'hx-get' not in html
+        assert 'href="/admin/produtos?page=3&amp;size=25"' in html
+        assert 'changePage(1, 50)' in html
+
+
+class TestListagensParciais:
+    """Testes para as rotas de listagem com e sem HX-Request"""
+
+    def test_admin_produtos_fragmento(self, admin_user, produtos):
+        client = admin_user['client']
+
+        response = client.get('/admin/produtos?sku=AMT&size=25&page=2', headers=HX)
+
+        assert response.status_code == 200
+        assert response.text.lstrip().startswith('<div id="listagem"')
+        assert 'AMT-0' in response.text
+        assert 'filter-form' not in response.text
+        assert '<nav' not in response.text
+        # Links de página e tamanho mantêm o filtro e trocam só a listagem
+        assert 'hx-get="/admin/produtos?sku=AMT&amp;page=3&amp;size=25"' in response.text
+        assert 'hx-push-url="true"' in response.text
+
+    def test_admin_produtos_pagina_completa(self, admin_user, produtos):
+        """Sem HX-Request (ou em restauração de histórico) a página vem inteira"""
+        client = admin_user['client']
+
+        for headers in ({}, {**HX, 'HX-History-Restore-Request': 'true'}):
+            response = client.get('/admin/produtos', headers=headers)
+
+            assert response.status_code == 200
+            assert 'filter-form' in response.text
+            assert 'id="listagem"' in response.text
+            assert 'hx-target="#listagem"' in response.text
+
+    @pytest.mark.parametrize('url', ['/admin/usuarios', '/admin/garantias', '/admin/veiculos'])
+    def test_demais_listagens_admin(self, admin_user, url):
+        response = admin_user['client'].get(url, headers=HX)
+
+        assert response.status_code == 200
+        assert response.text.lstrip().startswith('<div id="listagem"')
+
+    @pytest.mark.parametrize('url', ['/cliente/garantias', '/cliente/veiculos'])
+    def test_listagens_cliente(self, authenticated_user, url):
+        client = authenticated_user['client']
+
+        parcial = client.get(url, headers=HX)
+        completa = client.get(url)
+
+        assert parcial.text.lstrip().startswith('<div id="listagem"')
+        assert len(parcial.content) < len(completa.content)
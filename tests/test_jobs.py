@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Testes para os jobs em segundo plano e o acompanhamento via Server-Sent Events
+"""
+
+import json
+import threading
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+from app.config import Config
+from app.jobs import (
+    HEARTBEAT_EXPIRADO, STATUS_CANCELADO, STATUS_CONCLUIDO, STATUS_EXECUTANDO, STATUS_FALHOU,
+    GerenciadorJobs, get_gerenciador_jobs
+)
+from app.services import erp_sqlite_driver
+from app.services.firebird_service import FirebirdService
+
+
+@pytest.fixture
+def gerenciador(temp_db):
+    """Gerenciador com jobs de teste registrados"""
+    gerenciador = GerenciadorJobs(temp_db)
+
+    def somar(contexto):
+        for i in range(1, 4):
+            contexto.progresso(i, 3, f"Passo {i}")
+        return {'soma': sum(contexto.parametros['valores'])}
+
+    def falhar(contexto):
+        raise RuntimeError("falha no job")
+
+    gerenciador.registrar('somar', somar)
+    gerenciador.registrar('falhar', falhar)
+    yield gerenciador
+    gerenciador.encerrar()
+
+
+class TestGerenciadorJobs:
+    """Testes para execução, falha e cancelamento de jobs"""
+
+    def test_job_concluido(self, gerenciador):
+        """Resultado e progresso final ficam registrados na tabela jobs"""
+        job_id = gerenciador.enfileirar('somar', {'valores': [1, 2, 3]})
+        gerenciador.aguardar(job_id, timeout=5)
+
+        job = gerenciador.obter(job_id)
+
+        assert job['status'] == STATUS_CONCLUIDO
+        assert job['resultado'] == {'soma': 6}
+        assert (job['progresso'], job['processados'], job['mensagem']) == (100, 3, 'Passo 3')
+
+    def test_job_com_erro(self, gerenciador):
+        """Exceção no job marca o job como falho com a mensagem de erro"""
+        job_id = gerenciador.enfileirar('falhar')
+        gerenciador.aguardar(job_id, timeout=5)
+
+        job = gerenciador.obter(job_id)
+
+        assert job['status'] == STATUS_FALHOU
+        assert job['erro'] == 'falha no job'
+
+    def test_tipo_desconhecido(self, gerenciador):
+        """Tipo não registrado é rejeitado antes de criar o job"""
+        with pytest.raises(ValueError):
+            gerenciador.enfileirar('inexistente')
+
+    def test_cancelamento(self, gerenciador):
+        """Job em execução é interrompido na próxima atualização de progresso"""
+        iniciado = threading.Event()
+
+        def esperar(contexto):
+            iniciado.set()
+            for i in range(500):
+                contexto.progresso(i, 500)
+                time.sleep(0.01)
+            return {}
+
+        gerenciador.registrar('esperar', esperar)
+        job_id = gerenciador.enfileirar('esperar')
+        assert iniciado.wait(5)
+        assert gerenciador.obter(job_id)['status'] == STATUS_EXECUTANDO
+
+        assert gerenciador.cancelar(job_id) is True
+        gerenciador.aguardar(job_id, timeout=5)
+
+        assert gerenciador.obter(job_id)['status'] == STATUS_CANCELADO
+        assert gerenciador.cancelar(job_id) is False
+
+    def test_cancelamento_em_outro_worker(self, gerenciador, temp_db):
+        """Pedido feito por outro processo chega ao job pela coluna jobs.cancelar"""
+        iniciado = threading.Event()
+
+        def esperar(contexto):
+            iniciado.set()
+            for i in range(500):
+                contexto.progresso(i, 500)
+                time.sleep(0.01)
+            return {}
+
+        gerenciador.registrar('esperar', esperar)
+        job_id = gerenciador.enfileirar('esperar')
+        assert iniciado.wait(5)
+        outro_worker = GerenciadorJobs(temp_db, dono='outro-host:42')
+
+        assert outro_worker.cancelar(job_id) is True
+        gerenciador.aguardar(job_id, timeout=5)
+
+        assert gerenciador.obter(job_id)['status'] == STATUS_CANCELADO
+        outro_worker.encerrar()
+
+    def test_recuperar_interrompidos(self, gerenciador, temp_db):
+        """Só são recuperados jobs de processos encerrados, não os de outros workers vivos"""
+        agora = time.time()
+        jobs = {
+            'sem_dono': (None, None),
+            'mesmo_pid_anterior': (gerenciador.dono, agora - 10),
+            'outro_worker_vivo': ('outro-host:42', agora),
+            'outro_worker_parado': ('outro-host:43', agora - HEARTBEAT_EXPIRADO - 1),
+        }
+        for nome, (dono, heartbeat) in jobs.items():
+            temp_db.execute(
+                "INSERT INTO jobs (tipo, status, mensagem, dono, heartbeat_em) VALUES ('somar', 'executando', ?, ?, ?)",
+                (nome, dono, heartbeat)
+            )
+        gerenciador._criado_em = agora - 5
+
+        assert gerenciador.recuperar_interrompidos() == 3
+        assert temp_db.execute("SELECT mensagem FROM jobs WHERE status = 'executando'").fetchall() == [('outro_worker_vivo',)]
+
+    def test_heartbeat_do_processo(self, gerenciador, temp_db):
+        """O job recebe o dono e o heartbeat é renovado só para os jobs do processo"""
+        job_id = gerenciador.enfileirar('somar', {'valores': [1]})
+        gerenciador.aguardar(job_id, timeout=5)
+        temp_db.execute(
+            "INSERT INTO jobs (tipo, status, dono, heartbeat_em) VALUES ('somar', 'pendente', ?, 0)",
+            (gerenciador.dono,)
+        )
+        temp_db.execute("INSERT INTO jobs (tipo, status, dono, heartbeat_em) VALUES ('somar', 'pendente', 'outro-host:42', 0)")
+
+        assert temp_db.execute("SELECT dono FROM jobs WHERE id = ?", (job_id,)).fetchone()[0] == gerenciador.dono
+        assert gerenciador.renovar_heartbeat() == 1
+        assert temp_db.execute("SELECT COUNT(*) FROM jobs WHERE heartbeat_em = 0").fetchone()[0] == 1
+
+
+class TestRotasJobs:
+    """Testes para a sincronização como job e o stream de eventos"""
+
+    @pytest.fixture
+    def erp_local(self, tmp_path):
+        """Serviço Firebird apontando para o ERP local em SQLite"""
+        caminho = tmp_path / 'erp.db'
+        conexao = erp_sqlite_driver.connect(str(caminho))
+        erp_sqlite_driver.inserir_produtos(conexao, [('AMT-1001', 'Amortecedor dianteiro')])
+        conexao.close()
+
+        config = Mock(spec=Config)
+        config.FIREBIRD_DRIVER = 'sqlite'
+        config.FIREBIRD_DATABASE = caminho
+        for nome in ('FIREBIRD_HOST', 'FIREBIRD_USER', 'FIREBIRD_PASSWORD', 'FIREBIRD_ROLE', 'FIREBIRD_CHARSET'):
+            setattr(config, nome, '')
+        service = FirebirdService(config)
+        with patch('app.services.firebird_service._firebird_service', service):
+            yield service
+        service.fechar_conexoes()
+
+    def test_sincronizacao_enfileirada(self, admin_user, temp_db, erp_local):
+        """Sincronização roda como job e o resultado chega pelo stream de eventos"""
+        client = admin_user['client']
+
+        response = client.post('/admin/produtos/sync-execute')
+        job_id = response.json()['job_id']
+        get_gerenciador_jobs(temp_db).aguardar(job_id, timeout=5)
+
+        eventos = client.get(f'/admin/jobs/{job_id}/eventos')
+
+        assert eventos.headers['content-type'].startswith('text/event-stream')
+        linha_dados = eventos.text.split('event: fim\ndata: ')[1].split('\n')[0]
+        job = json.loads(linha_dados)
+        assert job['status'] == STATUS_CONCLUIDO
+        assert job['resultado']['inseridos'] == 1
+        assert temp_db.execute("SELECT COUNT(*) FROM produtos WHERE sku = 'AMT-1001'").fetchone()[0] == 1
+
+    def test_importacao_caspio_fora_do_diretorio(self, admin_user, tmp_path, monkeypatch):
+        """Só arquivos dentro de CASPIO_IMPORT_DIR podem ser importados"""
+        diretorio = tmp_path / 'caspio'
+        diretorio.mkdir()
+        fora = tmp_path / 'segredo.xml'
+        fora.write_text('<Export/>', encoding='utf-8')
+        monkeypatch.setattr('app.routes_admin.DIRETORIO_CASPIO_PADRAO', diretorio)
+        client = admin_user['client']
+
+        for caminho in (str(fora), '../segredo.xml'):
+            response = client.post('/admin/caspio/importar', data={'caminho_xml': caminho})
+            assert response.json() == {
+                'success': False, 'error': 'Arquivo fora do diretório de importação do Caspio'
+            }
+
+        response = client.post('/admin/caspio/importar', data={'caminho_xml': 'inexistente.xml'})
+        assert response.json()['error'] == 'Arquivo XML do Caspio não encontrado'
+
+    def test_status_job_inexistente(self, admin_user):
+        """Consulta de job inexistente retorna 404"""
+        client = admin_user['client']
+
+        response = client.get('/admin/jobs/999')
+
+        assert response.status_code == 404
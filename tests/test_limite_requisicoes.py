@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Testes para o limite de requisições (token bucket) das rotas públicas
+"""
+
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from app.limite_requisicoes import (
+    CHAVE_EMAIL, BaldesMemoria, BaldesSQLite, LimiteRequisicoesMiddleware,
+    RegraLimite, interpretar_orcamento
+)
+
+
+class TestBaldes:
+    """Testes para os baldes em memória e em SQLite"""
+
+    def test_interpretar_orcamento(self):
+        """'N/S' vira capacidade N com recarga de N/S tokens por segundo"""
+        assert interpretar_orcamento('5/60') == (5, 5 / 60)
+        with pytest.raises(ValueError):
+            interpretar_orcamento('0/60')
+
+    @pytest.mark.parametrize('criar_baldes', [
+        lambda tmp_path: BaldesMemoria(),
+        lambda tmp_path: BaldesSQLite(str(tmp_path / 'limite.db')),
+    ])
+    def test_consumo_e_recarga(self, tmp_path, criar_baldes):
+        """Capacidade esgota, indica a espera e recarrega com o tempo"""
+        baldes = criar_baldes(tmp_path)
+
+        assert baldes.consumir('ip', 2, 1.0, agora=100.0) == (True, 0.0)
+        assert baldes.consumir('ip', 2, 1.0, agora=100.0) == (True, 0.0)
+        permitido, espera = baldes.consumir('ip', 2, 1.0, agora=100.5)
+        assert not permitido
+        assert espera == pytest.approx(0.5)
+        # Recusa não debita: após a recarga há um token disponível
+        assert baldes.consumir('ip', 2, 1.0, agora=101.0)[0]
+        assert baldes.consumir('outro', 2, 1.0, agora=100.5)[0]
+
+    def test_sqlite_compartilhado(self, tmp_path):
+        """Dois workers apontando para o mesmo arquivo dividem o orçamento"""
+        caminho = str(tmp_path / 'limite.db')
+        worker_1, worker_2 = BaldesSQLite(caminho), BaldesSQLite(caminho)
+
+        assert worker_1.consumir('ip', 1, 0.01, agora=10.0)[0]
+        assert not worker_2.consumir('ip', 1, 0.01, agora=10.0)[0]
+
+    def test_memoria_descarta_menos_usados(self):
+        """Acima do limite de chaves, o balde menos usado é descartado"""
+        baldes = BaldesMemoria(max_baldes=2)
+        for chave in ('a', 'b', 'c'):
+            baldes.consumir(chave, 1, 0.01, agora=0.0)
+
+        assert 'a' not in baldes._baldes
+        assert not baldes.consumir('c', 1, 0.01, agora=0.0)[0]
+
+
+class TestMiddleware:
+    """Testes para as recusas antes de chegar à rota"""
+
+    def _cliente(self, app, regras):
+        from starlette.testclient import TestClient
+        app.add_middleware(LimiteRequisicoesMiddleware, regras=regras, baldes=BaldesMemoria())
+        return TestClient(app, follow_redirects=False)
+
+    def test_login_recusado_antes_da_autenticacao(self, app):
+        """Acima do orçamento por IP o login retorna 429 sem chamar o bcrypt"""
+        client = self._cliente(app, [RegraLimite.de_orcamento('login', 'POST', '/login', '2/60')])
+
+        with patch('app.auth.AuthManager.autenticar_usuario', return_value=None) as autenticar:
+            respostas = [client.post('/login', data={'email': 'a@b.com', 'senha': 'x'}) for _ in range(3)]
+
+        assert [r.status_code for r in respostas] == [302, 302, 429]
+        assert respostas[2].headers['retry-after'] == '30'
+        assert autenticar.call_count == 2
+
+    def test_orcamento_por_email(self, app):
+        """O orçamento por email é independente para cada conta e o corpo chega à rota"""
+        client = self._cliente(app, [
+            RegraLimite.de_orcamento('login', 'POST', '/login', '1/60', CHAVE_EMAIL)
+        ])
+
+        with patch('app.auth.AuthManager.autenticar_usuario', return_value=None) as autenticar:
+            primeira = client.post('/login', data={'email': 'A@b.com', 'senha': 'x'})
+            repetida = client.post('/login', data={'email': 'a@b.com', 'senha': 'y'})
+            outra = client.post('/login', data={'email': 'c@d.com', 'senha': 'x'})
+
+        assert (primeira.status_code, repetida.status_code, outra.status_code) == (302, 429, 302)
+        assert [c.args[1] for c in autenticar.call_args_list] == ['x', 'x']
+
+    def test_cep_responde_json(self, app):
+        """A API de CEP recebe o erro no formato JSON usado pelo frontend"""
+        client = self._cliente(app, [RegraLimite.de_orcamento('cep', 'GET', '/api/cep/', '1/60')])
+
+        with patch('app.routes.consultar_cep_sync', return_value=({'cep': '01001000'}, None)) as consultar:
+            client.get('/api/cep/01001000')
+            resposta = client.get('/api/cep/01001000')
+
+        assert resposta.status_code == 429
+        assert resposta.json()['success'] is False
+        assert consultar.call_count == 1
+
+    def test_sqlite_consome_fora_do_event_loop(self, app, tmp_path):
+        """O UPSERT do SQLite roda em uma thread, não no event loop"""
+        baldes = BaldesSQLite(str(tmp_path / 'limites.db'))
+        consumir = baldes.consumir
+        no_event_loop = []
+
+        def registrar(*args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+                no_event_loop.append(True)
+            except RuntimeError:
+                no_event_loop.append(False)
+            return consumir(*args, **kwargs)
+
+        baldes.consumir = registrar
+        app.add_middleware(
+            LimiteRequisicoesMiddleware,
+            regras=[RegraLimite.de_orcamento('cep', 'GET', '/api/cep/', '1/60')],
+            baldes=baldes,
+        )
+        from starlette.testclient import TestClient
+        client = TestClient(app, follow_redirects=False)
+
+        with patch('app.routes.consultar_cep_sync', return_value=({'cep': '01001000'}, None)):
+            client.get('/api/cep/01001000')
+            resposta = client.get('/api/cep/01001000')
+
+        assert resposta.status_code == 429
+        assert no_event_loop == [False, False]
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Testes para o motor de migrações versionadas
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+import pytest
+from fastlite import Database
+
+from app.database import init_database
+from app.migrations import (
+    Migracao, aplicar_migracoes, colunas_tabela, descobrir_migracoes,
+    migrar_em_lotes, versao_atual
+)
+
+
+@pytest.fixture
+def empty_db():
+    """Banco de dados vazio, sem migrações aplicadas"""
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+        db_path = tmp.name
+
+    db = Database(db_path)
+    yield db
+
+    db.close()
+    os.unlink(db_path)
+
+
+class TestMigracoes:
+    """Testes para aplicação das migrações"""
+
+    def test_descobrir_migracoes_ordenadas(self):
+        """Migrações são descobertas em ordem crescente de versão"""
+        migracoes = descobrir_migracoes()
+        versoes = [m.versao for m in migracoes]
+
+        assert versoes == sorted(versoes)
+        assert versoes[0] == 1
+        assert len(set(versoes)) == len(versoes)
+
+    def test_aplica_todas_em_banco_vazio(self, empty_db):
+        """Banco vazio recebe todas as migrações e registra a versão"""
+        aplicadas = aplicar_migracoes(empty_db)
+
+        assert aplicadas == len(descobrir_migracoes())
+        assert versao_atual(empty_db) == descobrir_migracoes()[-1].versao
+        assert 'caspio_id' in colunas_tabela(empty_db, 'usuarios')
+        assert 'oficina_nome' in colunas_tabela(empty_db, 'garantias')
+
+    def test_segunda_execucao_nao_aplica_nada(self, temp_db):
+        """Banco atualizado não reaplica migrações"""
+        versao = versao_atual(temp_db)
+
+        assert aplicar_migracoes(temp_db) == 0
+        init_database(temp_db)
+        assert versao_atual(temp_db) == versao
+
+    def test_banco_legado_sem_email_enviado(self, empty_db):
+        """Banco criado antes do controle de versões é atualizado"""
+        empty_db.execute("""
+            CREATE TABLE usuarios (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                email TEXT UNIQUE NOT NULL,
+                senha_hash TEXT NOT NULL,
+                nome TEXT NOT NULL,
+                tipo_usuario TEXT NOT NULL DEFAULT 'cliente',
+                confirmado BOOLEAN DEFAULT FALSE,
+                data_cadastro DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        aplicar_migracoes(empty_db)
+
+        assert 'email_enviado' in colunas_tabela(empty_db, 'usuarios')
+
+    def test_falha_faz_rollback(self, empty_db):
+        """Migração com erro não deixa alterações nem registra versão"""
+        def upgrade_com_erro(db):
+            db.execute("CREATE TABLE parcial (id INTEGER)")
+            raise RuntimeError("falha proposital")
+
+        migracoes = [Migracao(1, 'm0001_teste', 'teste', upgrade_com_erro)]
+
+        with pytest.raises(RuntimeError):
+            aplicar_migracoes(empty_db, migracoes)
+
+        assert versao_atual(empty_db) == 0
+        assert 'parcial' not in empty_db.table_names()
+
+    def test_processos_simultaneos_aplicam_uma_vez(self, empty_db):
+        """Dois processos iniciando juntos: cada migração roda uma vez e nenhum falha"""
+        chamadas = []
+
+        def criar_tabela(db):
+            chamadas.append('criar_tabela')
+            time.sleep(0.2)
+            db.execute("CREATE TABLE simultanea (id INTEGER)")
+
+        def preencher(db):
+            chamadas.append('preencher')
+            db.execute("INSERT INTO simultanea VALUES (1)")
+
+        migracoes = [
+            Migracao(1, 'm0001_tabela', 'tabela', criar_tabela),
+            Migracao(2, 'm0002_dados', 'dados', preencher, transacional=False),
+        ]
+        erros = []
+
+        def iniciar_processo():
+            db = Database(empty_db.conn.filename)
+            db.conn.setbusytimeout(5000)
+            try:
+                aplicar_migracoes(db, migracoes)
+            except Exception as e:
+                erros.append(e)
+            finally:
+                db.close()
+
+        threads = [threading.Thread(target=iniciar_processo) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+
+        assert erros == []
+        assert sorted(chamadas) == ['criar_tabela', 'preencher']
+        assert versao_atual(empty_db) == 2
+
+    def test_versao_alvo(self, empty_db):
+        """Aplicação pode parar em uma versão específica"""
+        aplicar_migracoes(empty_db, versao_alvo=1)
+
+        assert versao_atual(empty_db) == 1
+        assert 'caspio_id' not in colunas_tabela(empty_db, 'usuarios')
+
+
+class TestMigrarEmLotes:
+    """Testes para migrações de dados em lotes"""
+
+    def test_atualiza_todas_as_linhas(self, empty_db):
+        """Todas as linhas são processadas em vários lotes"""
+        empty_db.execute("CREATE TABLE itens (id INTEGER PRIMARY KEY, nome TEXT)")
+        for i in range(25):
+            empty_db.execute("INSERT INTO itens (nome) VALUES (?)", (f"item {i}",))
+
+        total = migrar_em_lotes(
+            empty_db, 'itens', ['nome'],
+            lambda row: {'nome': row[1].upper()},
+            tamanho_lote=10
+        )
+
+        assert total == 25
+        nomes = [row[0] for row in empty_db.execute("SELECT nome FROM itens").fetchall()]
+        assert all(nome.startswith('ITEM') for nome in nomes)
+
+    def test_ignora_linhas_sem_alteracao(self, empty_db):
+        """Linhas para as quais a transformação retorna None são mantidas"""
+        empty_db.execute("CREATE TABLE itens (id INTEGER PRIMARY KEY, nome TEXT)")
+        empty_db.execute("INSERT INTO itens (nome) VALUES ('a'), ('B')")
+
+        total = migrar_em_lotes(
+            empty_db, 'itens', ['nome'],
+            lambda row: None if row[1].isupper() else {'nome': row[1].upper()}
+        )
+
+        assert total == 1
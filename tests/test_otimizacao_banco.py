@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Testes para auto_vacuum incremental, estatísticas e otimização do banco
+"""
+
+import apsw
+import pytest
+
+from app.arquivamento import anexar_arquivo
+from app.database import estatisticas_armazenamento, fechar_banco
+from app.manutencao import otimizar_banco
+
+
+def _estatisticas(db, esquema='main'):
+    return next(b for b in estatisticas_armazenamento(db) if b['banco'] == esquema)
+
+
+@pytest.fixture
+def fragmentado(temp_db):
+    """Banco com páginas na freelist após uma exclusão em massa"""
+    temp_db.execute("CREATE TABLE carga (id INTEGER PRIMARY KEY, dados TEXT)")
+    temp_db.execute("""
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 2000)
+        INSERT INTO carga (dados) SELECT printf('%.500c', 'x') FROM n
+    """)
+    temp_db.execute("DELETE FROM carga")
+    return temp_db
+
+
+class TestEstatisticas:
+    """Modo incremental e estatísticas por banco"""
+
+    def test_migracao_ativa_incremental(self, temp_db):
+        assert _estatisticas(temp_db)['auto_vacuum'] == 'incremental'
+
+    def test_campos(self, temp_db, tmp_path):
+        anexar_arquivo(temp_db, tmp_path / 'archive.db')
+
+        estatisticas = {b['banco']: b for b in estatisticas_armazenamento(temp_db)}
+
+        assert set(estatisticas) == {'main', 'arquivo'}
+        assert estatisticas['arquivo']['auto_vacuum'] == 'incremental'
+        main = estatisticas['main']
+        assert main['tamanho_bytes'] > 0
+        assert 0 <= main['fragmentacao_pct'] <= 100
+
+    def test_fragmentacao(self, fragmentado):
+        estatisticas = _estatisticas(fragmentado)
+
+        assert estatisticas['paginas_livres'] > 100
+        assert estatisticas['fragmentacao_pct'] > 0
+
+
+class TestOtimizar:
+    """ANALYZE e incremental_vacuum limitado"""
+
+    def test_vacuum_limitado(self, fragmentado):
+        livres = _estatisticas(fragmentado)['paginas_livres']
+
+        resultado = otimizar_banco(fragmentado, paginas_vacuum=50)
+
+        assert resultado['paginas_liberadas']['main'] == 50
+        # O ANALYZE também ocupa páginas da freelist (sqlite_stat1)
+        assert 0 < resultado['paginas_livres']['main'] <= livres - 50
+
+    def test_libera_tudo(self, fragmentado):
+        antes = _estatisticas(fragmentado)
+
+        resultado = otimizar_banco(fragmentado)
+
+        assert resultado['paginas_livres']['main'] == 0
+        assert resultado['tamanho_bytes']['main'] < antes['tamanho_bytes']
+        assert fragmentado.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE name = 'sqlite_stat1'"
+        ).fetchone()[0] == 1
+
+    def test_fechar_banco(self, temp_db):
+        fechar_banco(temp_db)
+
+        with pytest.raises(apsw.ConnectionClosedError):
+            temp_db.execute("SELECT 1")
+
+
+def test_dashboard_admin(admin_user):
+    response = admin_user['client'].get('/admin')
+
+    assert response.status_code == 200
+    assert 'Banco de Dados' in response.text
+    assert 'incremental' in response.text
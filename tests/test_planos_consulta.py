@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Testes de regressão dos planos de consulta das listagens, dashboards e detalhes
+
+Cada rota é chamada contra um banco populado com o exec_trace ligado
+(app.planos_consulta.CapturaConsultas). Todas as consultas capturadas
+passam pelo EXPLAIN QUERY PLAN: nenhuma pode varrer por completo uma
+tabela grande, e as listagens na ordenação padrão não podem ordenar em
+B-tree temporária. Filtros "contém" (LIKE '%valor%') não têm índice
+possível: as rotas com esses filtros declaram as tabelas que podem varrer.
+A quantidade de comandos por rota tem um orçamento, para que consultas
+N+1 também apareçam.
+
+O banco não passa por ANALYZE: sem sqlite_stat1 o planejador estima
+tabelas grandes, como em produção.
+"""
+
+import pytest
+
+from app.auth import get_auth_manager
+from app.estabelecimentos import vincular_estabelecimentos
+from app.planos_consulta import (
+    TABELAS_GRANDES, CapturaConsultas, analisar_captura, plano_consulta, problemas_plano, relatorio_orcamento
+)
+
+CLIENTES = 30
+GARANTIAS_POR_CLIENTE = 3
+
+# (rota, orçamento de comandos, ordenação padrão sem B-tree temporária, varreduras permitidas)
+ROTAS_ADMIN = [
+    ('/admin', 10, False, ()),
+    ('/admin/usuarios', 2, True, ()),
+    ('/admin/usuarios?tipo_usuario=cliente&nome=cliente', 2, False, ('usuarios',)),
+    ('/admin/produtos', 2, True, ()),
+    ('/admin/produtos?ativo=true&sku=PLN', 2, False, ('produtos',)),
+    ('/admin/veiculos', 2, True, ()),
+    ('/admin/garantias', 3, True, ()),
+    ('/admin/garantias?status=ativa&lote_fabricacao=LT-1', 3, False, ()),
+    ('/admin/garantias?estabelecimento_id={estabelecimento_id}', 3, False, ()),
+    ('/admin/garantias?cliente_email=cliente1', 3, False, ('usuarios', 'garantias')),
+    ('/admin/estabelecimentos', 2, True, ()),
+    ('/admin/recall?modo=prefixo&lote=LT-1', 5, False, ()),
+    ('/admin/garantias/{garantia_id}', 2, False, ()),
+    ('/admin/usuarios/{usuario_id}', 1, False, ()),
+]
+
+# Rotas do cliente, com a sessão do primeiro cliente populado
+ROTAS_CLIENTE = [
+    ('/cliente', 2, False, ()),
+    ('/cliente/garantias', 1, True, ()),
+    ('/cliente/garantias?status=ativa', 1, False, ()),
+    ('/cliente/veiculos', 2, False, ()),
+    ('/cliente/garantias/{garantia_id}', 1, False, ()),
+]
+
+PARAMETROS_ROTA = 'rota,orcamento,ordem_padrao,varreduras'
+
+_MEDICOES = []
+
+
+def _inserir(db, sql, params=()):
+    return db.execute(f"{sql} RETURNING id", params).fetchall()[0][0]
+
+
+@pytest.fixture
+def banco_populado(temp_db):
+    """Clientes com veículos, produtos e garantias vinculadas a estabelecimentos"""
+    produtos = [
+        _inserir(temp_db, "INSERT INTO produtos (sku, descricao) VALUES (?, ?)", (f"PLN-{i:03d}", f"Produto {i}"))
+        for i in range(GARANTIAS_POR_CLIENTE * 2)
+    ]
+    clientes = []
+    for c in range(CLIENTES):
+        usuario_id = _inserir(temp_db, """
+            INSERT INTO usuarios (email, senha_hash, nome, tipo_usuario, confirmado)
+            VALUES (?, 'hash', ?, 'cliente', TRUE)
+        """, (f"cliente{c}@plano.com", f"Cliente {c}"))
+        veiculo_id = _inserir(
+            temp_db, "INSERT INTO veiculos (usuario_id, marca, modelo, placa) VALUES (?, 'VW', 'Gol', ?)",
+            (usuario_id, f"PLN{c:04d}")
+        )
+        garantias = [
+            _inserir(temp_db, """
+                INSERT INTO garantias (usuario_id, produto_id, veiculo_id, lote_fabricacao, data_instalacao,
+                                       nota_fiscal, nome_estabelecimento, quilometragem,
+                                       data_vencimento, ativo)
+                VALUES (?, ?, ?, ?, '2024-01-15', 'NF', ?, 0, '2030-01-15', ?)
+            """, (usuario_id, produtos[(c + g) % len(produtos)], veiculo_id, f"LT-{c}{g}",
+                  f"Oficina {c % 5}", g != 2))
+            for g in range(GARANTIAS_POR_CLIENTE)
+        ]
+        clientes.append({'id': usuario_id, 'veiculo_id': veiculo_id, 'garantias': garantias})
+    vincular_estabelecimentos(temp_db)
+    return {
+        'clientes': clientes,
+        'estabelecimento_id': temp_db.execute("SELECT MIN(id) FROM estabelecimentos").fetchone()[0],
+    }
+
+
+def _medir(db, client, rota, orcamento, ordem_padrao, varreduras):
+    """Chama a rota capturando os comandos e verifica planos e orçamento"""
+    with CapturaConsultas(db) as captura:
+        response = client.get(rota)
+    assert response.status_code == 200, rota
+
+    _MEDICOES.append((rota, len(captura.comandos), orcamento))
+    problemas = analisar_captura(
+        db, captura, tabelas_grandes=TABELAS_GRANDES - set(varreduras),
+        permitir_ordenacao_temporaria=not ordem_padrao
+    )
+    assert not problemas, f"{rota}: planos sem índice\n" + '\n'.join(
+        f"  {sql}\n    -> {detalhes}" for sql, detalhes in problemas
+    )
+    assert len(captura.comandos) <= orcamento, f"{rota}: {len(captura.comandos)} comandos\n" + '\n'.join(
+        f"  {comando.sql.strip()[:120]}" for comando in captura.comandos
+    )
+
+
+class TestCaptura:
+    """Harness de captura e análise de planos"""
+
+    def test_captura_e_restaura(self, temp_db):
+        with CapturaConsultas(temp_db) as captura:
+            temp_db.execute("SELECT COUNT(*) FROM produtos").fetchall()
+            temp_db.execute("UPDATE produtos SET ativo = TRUE WHERE id = ?", (0,))
+
+        assert [c.consulta for c in captura.comandos] == [True, False]
+        assert captura.comandos[1].params == (0,)
+        assert temp_db.conn.exec_trace is None
+
+    def test_detecta_varredura(self, temp_db):
+        sql = "SELECT g.id FROM garantias g WHERE g.nota_fiscal = ? ORDER BY g.data_instalacao"
+        detalhes = plano_consulta(temp_db, sql, ('NF',))
+
+        assert problemas_plano(detalhes, sql) == ['SCAN g']
+        assert len(problemas_plano(detalhes, sql, permitir_ordenacao_temporaria=False)) == 2
+        assert problemas_plano(detalhes, sql, tabelas_grandes=()) == []
+
+    def test_busca_indexada(self, temp_db):
+        sql = "SELECT id FROM garantias WHERE usuario_id = ?"
+
+        assert problemas_plano(plano_consulta(temp_db, sql, (1,)), sql) == []
+
+    def test_relatorio(self):
+        relatorio = relatorio_orcamento([('/a', 3, 5), ('/bb', 9, 5)])
+
+        assert '/bb' in relatorio
+        assert relatorio.count('EXCEDIDO') == 1
+
+
+class TestRotas:
+    """Planos e orçamento de comandos por rota"""
+
+    @pytest.mark.parametrize(PARAMETROS_ROTA, ROTAS_ADMIN)
+    def test_rotas_admin(self, admin_user, temp_db, banco_populado, rota, orcamento, ordem_padrao, varreduras):
+        cliente = banco_populado['clientes'][1]
+        rota = rota.format(
+            estabelecimento_id=banco_populado['estabelecimento_id'], garantia_id=cliente['garantias'][0],
+            usuario_id=cliente['id'], veiculo_id=cliente['veiculo_id'],
+        )
+        client = admin_user['client']
+        client.get(rota)  # Aquece caches (catálogo, sessão) antes de medir
+
+        _medir(temp_db, client, rota, orcamento, ordem_padrao, varreduras)
+
+    @pytest.mark.parametrize(PARAMETROS_ROTA, ROTAS_CLIENTE)
+    def test_rotas_cliente(self, client, temp_db, banco_populado, rota, orcamento, ordem_padrao, varreduras):
+        cliente = banco_populado['clientes'][0]
+        rota = rota.format(garantia_id=cliente['garantias'][0])
+        client.cookies['viemar_session'] = get_auth_manager().criar_sessao(
+            cliente['id'], 'cliente0@plano.com', 'cliente'
+        )
+        client.get(rota)
+
+        _medir(temp_db, client, rota, orcamento, ordem_padrao, varreduras)
+
+
+def teardown_module():
+    """Relatório de comandos por rota (visível com pytest -s)"""
+    if _MEDICOES:
+        print('\n' + relatorio_orcamento(_MEDICOES))
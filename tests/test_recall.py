@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Testes para o recall por lote de fabricação
+"""
+
+import csv
+import io
+
+import pytest
+
+from app.recall import (
+    MODO_EXATO, MODO_INTERVALO, MODO_PREFIXO, CriterioRecall,
+    agregar, buscar_garantias, contar_garantias, exportar_csv, ler_criterio, normalizar_lote
+)
+
+
+def _inserir(db, sql, params=()):
+    return db.execute(f"{sql} RETURNING id", params).fetchall()[0][0]
+
+
+@pytest.fixture
+def lotes(temp_db):
+    """Garantias de três clientes em lotes com grafias diferentes"""
+    produtos = [
+        _inserir(temp_db, "INSERT INTO produtos (sku, descricao) VALUES (?, ?)", (sku, f"Produto {sku}"))
+        for sku in ('AMT-1', 'AMT-2')
+    ]
+    clientes = []
+    for i, uf in enumerate(('SP', 'SP', 'PR')):
+        usuario_id = _inserir(
+            temp_db,
+            "INSERT INTO usuarios (email, senha_hash, nome, tipo_usuario, telefone, cidade, uf) "
+            "VALUES (?, 'hash', ?, 'cliente', ?, 'Cidade', ?)",
+            (f"cliente{i}@recall.com", f"Cliente {i}", f"1199999000{i}", uf)
+        )
+        veiculo_id = _inserir(
+            temp_db,
+            "INSERT INTO veiculos (usuario_id, marca, modelo, placa) VALUES (?, 'VW', 'Gol', ?)",
+            (usuario_id, f"REC{i}000")
+        )
+        clientes.append((usuario_id, veiculo_id))
+
+    garantias = [
+        # (cliente, produto, lote, estabelecimento)
+        (0, 0, 'lt-2024.001', 'Oficina A'),
+        (0, 1, 'LT2024001', 'Oficina A'),
+        (1, 0, 'LT 2024/002', 'Oficina B'),
+        (2, 0, 'LT2024003', 'Oficina B'),
+        (2, 1, 'LT2025001', 'Oficina C'),
+    ]
+    for cliente, produto, lote, estabelecimento in garantias:
+        usuario_id, veiculo_id = clientes[cliente]
+        temp_db.execute("""
+            INSERT INTO garantias (usuario_id, produto_id, veiculo_id, lote_fabricacao, data_instalacao,
+                                   nota_fiscal, nome_estabelecimento, quilometragem)
+            VALUES (?, ?, ?, ?, '2024-03-01', 'NF', ?, 1000)
+        """, (usuario_id, produtos[produto], veiculo_id, lote, estabelecimento))
+    return temp_db
+
+
+class TestNormalizacao:
+    """A coluna gerada e a função Python normalizam igual"""
+
+    def test_coluna_gerada(self, lotes):
+        rows = lotes.execute("SELECT lote_fabricacao, lote_norm FROM garantias").fetchall()
+
+        for lote, lote_norm in rows:
+            assert lote_norm == normalizar_lote(lote)
+        assert normalizar_lote(' lt-2024.001 ') == 'LT2024001'
+
+    def test_ler_criterio(self):
+        criterio = ler_criterio({'lote': 'lt-2024', 'modo': 'invalido'})
+
+        assert criterio == CriterioRecall(MODO_PREFIXO, 'LT2024')
+        assert ler_criterio({'modo': MODO_INTERVALO, 'lote': 'LT1'}).vazio
+
+
+class TestBuscas:
+    """Buscas por lote exato, prefixo e intervalo"""
+
+    def test_exato_ignora_grafia(self, lotes):
+        garantias = buscar_garantias(lotes, CriterioRecall(MODO_EXATO, 'LT2024001'))
+
+        assert sorted(g[1] for g in garantias) == ['LT2024001', 'lt-2024.001']
+        assert contar_garantias(lotes, CriterioRecall(MODO_EXATO, 'LT2024001')) == {
+            'garantias': 2, 'clientes': 1, 'ativas': 2
+        }
+
+    def test_prefixo(self, lotes):
+        totais = contar_garantias(lotes, CriterioRecall(MODO_PREFIXO, 'LT2024'))
+
+        assert totais['garantias'] == 4
+        assert totais['clientes'] == 3
+
+    def test_intervalo_em_qualquer_ordem(self, lotes):
+        criterio = CriterioRecall(MODO_INTERVALO, 'LT2024003', 'LT2024002')
+
+        assert [g[1] for g in buscar_garantias(lotes, criterio)] == ['LT 2024/002', 'LT2024003']
+
+    @pytest.mark.parametrize('criterio', [
+        CriterioRecall(MODO_EXATO, 'LT2024001'),
+        CriterioRecall(MODO_PREFIXO, 'LT2024'),
+        CriterioRecall(MODO_INTERVALO, 'LT2024001', 'LT2024003'),
+    ])
+    def test_busca_usa_indice(self, lotes, criterio):
+        condicao, params = criterio.condicao()
+        plano = lotes.execute(f"EXPLAIN QUERY PLAN SELECT id FROM garantias g WHERE {condicao}", params).fetchall()
+
+        assert any('idx_garantias_lote_norm' in row[-1] for row in plano)
+
+
+class TestAgregacoes:
+    """Totais por produto, UF e estabelecimento"""
+
+    def test_por_dimensao(self, lotes):
+        criterio = CriterioRecall(MODO_PREFIXO, 'LT2024')
+
+        assert agregar(lotes, criterio, 'produto') == [('AMT-1', 'Produto AMT-1', 3, 3), ('AMT-2', 'Produto AMT-2', 1, 1)]
+        assert agregar(lotes, criterio, 'uf') == [('SP', 3, 2), ('PR', 1, 1)]
+        assert agregar(lotes, criterio, 'estabelecimento') == [('Oficina A', 2, 1), ('Oficina B', 2, 2)]
+
+
+class TestExportacao:
+    """Exportação em CSV por partes"""
+
+    def test_csv_em_lotes(self, lotes):
+        partes = list(exportar_csv(lotes, CriterioRecall(MODO_PREFIXO, 'LT'), tamanho_lote=2))
+        linhas = list(csv.reader(io.StringIO(''.join(partes))))
+
+        assert len(partes) == 4  # cabeçalho + 3 lotes de até 2 garantias
+        assert linhas[0][:2] == ['garantia_id', 'lote']
+        assert len(linhas) == 6
+        assert len({linha[0] for linha in linhas[1:]}) == 5
+        assert linhas[-1][1] == 'LT2025001'
+
+
+class TestRotas:
+    """Tela de recall, exportação e filtro de lote da listagem"""
+
+    def test_pagina(self, admin_user, lotes):
+        response = admin_user['client'].get('/admin/recall?lote=lt-2024&modo=prefixo')
+
+        assert response.status_code == 200
+        assert '4 garantias' in response.text
+        assert 'cliente2@recall.com' in response.text
+        assert 'Oficina C' not in response.text
+
+    def test_exportacao(self, admin_user, lotes):
+        response = admin_user['client'].get('/admin/recall/exportar?lote=LT2025001&modo=exato')
+
+        assert response.status_code == 200
+        assert response.headers['content-type'].startswith('text/csv')
+        assert 'recall_exato_LT2025001.csv' in response.headers['content-disposition']
+        assert 'cliente2@recall.com' in response.text
+
+    def test_exportacao_sem_lote(self, admin_user):
+        response = admin_user['client'].get('/admin/recall/exportar')
+
+        assert response.status_code == 302
+
+    def test_listagem_admin_filtra_por_prefixo(self, admin_user, lotes):
+        response = admin_user['client'].get('/admin/garantias?lote_fabricacao=lt-2025')
+
+        assert response.status_code == 200
+        assert 'REC2000' in response.text
+        assert 'REC1000' not in response.text
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Testes para a expiração e os limites das sessões em memória
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.auth import AuthManager
+
+
+def _expirar(manager, session_id, horas=1):
+    """Coloca o prazo da sessão no passado (heap incluído, como se tivesse sido criada antes)"""
+    manager.sessions[session_id]['expira_em'] = datetime.now() - timedelta(hours=horas)
+    manager._expiracoes = [(d['expira_em'], sid) for sid, d in manager.sessions.items()]
+
+
+@pytest.fixture
+def manager(temp_db):
+    return AuthManager(temp_db, max_sessoes_por_usuario=3, max_sessoes=5)
+
+
+class TestExpiracaoSessoes:
+    """Testes para o índice de expiração"""
+
+    def test_sessao_abandonada_removida_por_outra_requisicao(self, manager):
+        """Sessões que ninguém consulta saem quando outras requisições passam pelo gerenciador"""
+        abandonada = manager.criar_sessao(1, 'a@teste.com', 'cliente')
+        ativa = manager.criar_sessao(2, 'b@teste.com', 'cliente')
+        _expirar(manager, abandonada)
+
+        assert manager.obter_sessao(ativa) is not None
+        assert abandonada not in manager.sessions
+        assert manager.estatisticas_sessoes()['expiradas'] == 1
+
+    def test_renovada_nao_expira(self, manager):
+        """Entrada antiga no heap é recolocada com o prazo renovado"""
+        session_id = manager.criar_sessao(1, 'a@teste.com', 'cliente')
+        _expirar(manager, session_id)
+        manager.renovar_sessao(session_id)
+
+        assert manager.limpar_sessoes_expiradas() == 0
+        assert manager.obter_sessao(session_id) is not None
+        assert len(manager._expiracoes) == 1
+
+    def test_limpeza_completa(self, manager):
+        ids = [manager.criar_sessao(i, f'u{i}@teste.com', 'cliente') for i in range(4)]
+        for session_id in ids[:3]:
+            manager.sessions[session_id]['expira_em'] = datetime.now() - timedelta(minutes=1)
+        manager._expiracoes = [(d['expira_em'], sid) for sid, d in manager.sessions.items()]
+
+        assert manager.limpar_sessoes_expiradas() == 3
+        assert list(manager.sessions) == [ids[3]]
+
+
+class TestLimitesSessoes:
+    """Testes para os limites por usuário e total"""
+
+    def test_limite_por_usuario_remove_mais_antiga(self, manager):
+        ids = [manager.criar_sessao(1, 'a@teste.com', 'cliente') for _ in range(4)]
+
+        assert ids[0] not in manager.sessions
+        assert all(session_id in manager.sessions for session_id in ids[1:])
+        assert manager.estatisticas_sessoes()['removidas_limite_usuario'] == 1
+
+    def test_limite_total_remove_proxima_a_expirar(self, manager):
+        ids = [manager.criar_sessao(i, f'u{i}@teste.com', 'cliente') for i in range(5)]
+        manager.renovar_sessao(ids[0])  # a mais antiga foi usada agora
+
+        manager.criar_sessao(9, 'novo@teste.com', 'cliente')
+
+        estatisticas = manager.estatisticas_sessoes()
+        assert estatisticas['ativas'] == 5
+        assert estatisticas['removidas_limite_total'] == 1
+        assert ids[0] in manager.sessions and ids[1] not in manager.sessions
+
+    def test_contadores(self, manager):
+        session_id = manager.criar_sessao(1, 'a@teste.com', 'cliente')
+        manager.criar_sessao(2, 'b@teste.com', 'cliente')
+        manager.destruir_sessao(session_id)
+
+        estatisticas = manager.estatisticas_sessoes()
+        assert estatisticas['criadas'] == 2
+        assert estatisticas['encerradas'] == 1
+        assert estatisticas['ativas'] == estatisticas['usuarios'] == 1
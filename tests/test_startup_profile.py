@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Testes para importações sob demanda e perfil de inicialização
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+from app.startup_profile import parse_importtime, resumir_importacoes
+
+RAIZ_PROJETO = Path(__file__).parent.parent
+
+SAIDA_IMPORTTIME = """import time: self [us] | cumulative | imported package
+import time:       100 |        100 |   httpx._main
+import time:       500 |        600 | httpx
+import time:      1200 |       1200 |   app.cep_service
+import time:       300 |       1500 | app.routes
+"""
+
+
+def test_parse_importtime():
+    """Saída do -X importtime é convertida em tuplas com nível de aninhamento"""
+    modulos = parse_importtime(SAIDA_IMPORTTIME)
+
+    assert modulos[0] == ('httpx._main', 1, 100, 100)
+    assert modulos[1] == ('httpx', 0, 500, 600)
+    assert len(modulos) == 4
+
+
+def test_resumir_importacoes_agrupa_terceiros():
+    """Pacotes de terceiros são agrupados e módulos do projeto listados um a um"""
+    resumo = dict(resumir_importacoes(parse_importtime(SAIDA_IMPORTTIME)))
+
+    assert resumo['httpx'] == 0.6
+    assert 'httpx._main' not in resumo
+    assert resumo['app.cep_service'] == 1.2
+    assert resumo['app.routes'] == 0.3
+
+
+def test_rotas_nao_importam_integracoes_pesadas():
+    """Firebird, importador do Caspio e vieutil só carregam no primeiro uso"""
+    codigo = (
+        "import sys; "
+        "import app.routes, app.routes_admin, app.routes_garantias, app.services; "
+        "print(','.join(m for m in ('firebird.driver', 'vieutil', "
+        "'app.services.caspio_import_service') if m in sys.modules))"
+    )
+    resultado = subprocess.run(
+        [sys.executable, '-c', codigo],
+        cwd=RAIZ_PROJETO, capture_output=True, text=True
+    )
+
+    assert resultado.returncode == 0, resultado.stderr
+    assert resultado.stdout.strip().splitlines()[-1:] in ([], [''])
+
+
+def test_services_exporta_sob_demanda():
+    """Nomes exportados por app.services continuam acessíveis"""
+    from app.services import get_firebird_service, CaspioImportService
+
+    assert callable(get_firebird_service)
+    assert CaspioImportService.__name__ == 'CaspioImportService'
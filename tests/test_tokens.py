@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Testes para a tabela de tokens de confirmação e redefinição de senha
+"""
+
+from datetime import timedelta
+
+import pytest
+
+from app.manutencao import limpar_tokens_expirados
+from app.migrations import colunas_tabela
+from app.tokens import (
+    FINALIDADE_CONFIRMACAO, FINALIDADE_RESET_SENHA, consumir_token, emitir_token,
+    hash_token, revogar_tokens, usuario_do_token
+)
+
+
+@pytest.fixture
+def usuario_id(temp_db):
+    temp_db.execute(
+        """INSERT INTO usuarios (email, senha_hash, tipo_usuario, nome, confirmado, data_cadastro)
+           VALUES ('token@teste.com', 'hash', 'cliente', 'Usuário Token', FALSE, '2024-01-01 10:00:00')"""
+    )
+    return temp_db.execute("SELECT id FROM usuarios WHERE email = 'token@teste.com'").fetchone()[0]
+
+
+class TestTokens:
+    """Testes para emissão, consumo e limpeza de tokens"""
+
+    def test_colunas_antigas_removidas(self, temp_db):
+        colunas = colunas_tabela(temp_db, 'usuarios')
+        assert 'token_confirmacao' not in colunas
+        assert 'token_reset_senha' not in colunas
+
+    def test_somente_hash_gravado(self, temp_db, usuario_id):
+        token = emitir_token(temp_db, usuario_id, FINALIDADE_CONFIRMACAO)
+
+        gravados = [row[0] for row in temp_db.execute("SELECT token_hash FROM tokens").fetchall()]
+        assert gravados == [hash_token(token)]
+
+    def test_consumido_uma_unica_vez(self, temp_db, usuario_id):
+        token = emitir_token(temp_db, usuario_id, FINALIDADE_RESET_SENHA)
+
+        assert usuario_do_token(temp_db, token, FINALIDADE_CONFIRMACAO) is None
+        assert consumir_token(temp_db, token, FINALIDADE_RESET_SENHA) == usuario_id
+        assert consumir_token(temp_db, token, FINALIDADE_RESET_SENHA) is None
+
+    def test_nova_emissao_substitui_anterior(self, temp_db, usuario_id):
+        antigo = emitir_token(temp_db, usuario_id, FINALIDADE_CONFIRMACAO)
+        novo = emitir_token(temp_db, usuario_id, FINALIDADE_CONFIRMACAO)
+
+        assert usuario_do_token(temp_db, antigo, FINALIDADE_CONFIRMACAO) is None
+        assert usuario_do_token(temp_db, novo, FINALIDADE_CONFIRMACAO) == usuario_id
+
+    def test_expirado_rejeitado_e_purgado(self, temp_db, usuario_id):
+        vencido = emitir_token(temp_db, usuario_id, FINALIDADE_RESET_SENHA, validade=timedelta(seconds=-1))
+        valido = emitir_token(temp_db, usuario_id, FINALIDADE_CONFIRMACAO)
+
+        assert consumir_token(temp_db, vencido, FINALIDADE_RESET_SENHA) is None
+        assert limpar_tokens_expirados(temp_db) == {'removidos': 1}
+        assert usuario_do_token(temp_db, valido, FINALIDADE_CONFIRMACAO) == usuario_id
+
+    def test_revogar(self, temp_db, usuario_id):
+        emitir_token(temp_db, usuario_id, FINALIDADE_CONFIRMACAO)
+        emitir_token(temp_db, usuario_id, FINALIDADE_RESET_SENHA)
+
+        assert revogar_tokens(temp_db, usuario_id) == 2
+        assert temp_db.execute("SELECT COUNT(*) FROM tokens").fetchone()[0] == 0
+
+
+class TestConfirmacaoEmail:
+    """Fluxo /confirmar-email com a tabela de tokens"""
+
+    def test_confirma_e_consome_token(self, client, temp_db, usuario_id):
+        token = emitir_token(temp_db, usuario_id, FINALIDADE_CONFIRMACAO)
+
+        response = client.get(f'/confirmar-email?token={token}')
+
+        assert response.status_code == 200
+        assert 'Email confirmado com sucesso' in response.text
+        assert temp_db.execute("SELECT confirmado FROM usuarios WHERE id = ?", (usuario_id,)).fetchone()[0]
+        assert temp_db.execute("SELECT COUNT(*) FROM tokens").fetchone()[0] == 0
+
+    def test_token_invalido(self, client, usuario_id):
+        response = client.get('/confirmar-email?token=inexistente')
+
+        assert response.status_code == 200
+        assert 'Token inválido' in response.text
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Testes para a unidade de trabalho e os INSERTs com RETURNING das rotas
+"""
+
+import threading
+import time
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from app.migrations import m0012_garantias_ativa_unica
+from app.services.catalogo_produtos import invalidar_catalogo_produtos
+from app.unidade_trabalho import UnidadeTrabalho
+
+
+def _contar(db, tabela):
+    return db.execute(f"SELECT COUNT(*) FROM {tabela}").fetchone()[0]
+
+
+class TestUnidadeTrabalho:
+    """Testes para commit, rollback e savepoints"""
+
+    def test_inserir_retorna_colunas(self, temp_db):
+        with UnidadeTrabalho(temp_db) as uow:
+            produto_id, sku = uow.inserir('produtos', {'sku': 'UOW-1', 'descricao': 'Produto'}, retornando=('id', 'sku'))
+
+        assert sku == 'UOW-1'
+        assert temp_db.execute("SELECT sku FROM produtos WHERE id = ?", (produto_id,)).fetchone()[0] == 'UOW-1'
+        assert not temp_db.conn.in_transaction
+
+    def test_excecao_desfaz_todas_as_escritas(self, temp_db):
+        with pytest.raises(RuntimeError):
+            with UnidadeTrabalho(temp_db) as uow:
+                uow.inserir('produtos', {'sku': 'UOW-1', 'descricao': 'Produto'})
+                uow.inserir('produtos', {'sku': 'UOW-2', 'descricao': 'Produto'})
+                raise RuntimeError("falha no meio da requisição")
+
+        assert _contar(temp_db, 'produtos') == 0
+        assert not temp_db.conn.in_transaction
+
+    def test_conflito_ignorado_retorna_none(self, temp_db):
+        with UnidadeTrabalho(temp_db) as uow:
+            assert uow.inserir('produtos', {'sku': 'UOW-1'}, ignorar_conflito=True) is not None
+            assert uow.inserir('produtos', {'sku': 'UOW-1'}, ignorar_conflito=True) is None
+
+        assert _contar(temp_db, 'produtos') == 1
+
+    def test_aninhada_vira_savepoint(self, temp_db):
+        with UnidadeTrabalho(temp_db) as externa:
+            externa.inserir('produtos', {'sku': 'UOW-1'})
+            with pytest.raises(ValueError):
+                with UnidadeTrabalho(temp_db) as interna:
+                    interna.inserir('produtos', {'sku': 'UOW-2'})
+                    raise ValueError("desfaz só a interna")
+
+        skus = [row[0] for row in temp_db.execute("SELECT sku FROM produtos").fetchall()]
+        assert skus == ['UOW-1']
+
+    def test_requisicoes_concorrentes_na_mesma_conexao(self, temp_db):
+        """A unidade de outra thread espera a transação aberta em vez de entrar nela"""
+        inserido = threading.Event()
+        resultado = {}
+
+        def requisicao_com_erro():
+            try:
+                with UnidadeTrabalho(temp_db) as uow:
+                    uow.inserir('produtos', {'sku': 'UOW-A'})
+                    inserido.set()
+                    time.sleep(0.2)
+                    raise RuntimeError("falha na requisição A")
+            except RuntimeError:
+                pass
+
+        def requisicao_ok():
+            inserido.wait(5)
+            with UnidadeTrabalho(temp_db) as uow:
+                resultado['id'] = uow.inserir('produtos', {'sku': 'UOW-B'})[0]
+
+        threads = [threading.Thread(target=requisicao_com_erro), threading.Thread(target=requisicao_ok)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        skus = [row[0] for row in temp_db.execute("SELECT sku FROM produtos").fetchall()]
+        assert skus == ['UOW-B']
+        assert not temp_db.conn.in_transaction
+
+
+@pytest.fixture
+def formulario_garantia(authenticated_user, temp_db):
+    """Produto e veículo do usuário autenticado, com os dados do formulário"""
+    temp_db.execute("INSERT INTO produtos (sku, descricao) VALUES ('UOW-AMT', 'Amortecedor Dianteiro')")
+    produto_id = temp_db.execute("SELECT id FROM produtos WHERE sku = 'UOW-AMT'").fetchone()[0]
+    temp_db.execute(
+        "INSERT INTO veiculos (usuario_id, marca, modelo, placa) VALUES (?, 'VW', 'Gol', 'ABC1234')",
+        (authenticated_user['id'],)
+    )
+    veiculo_id = temp_db.execute("SELECT id FROM veiculos WHERE placa = 'ABC1234'").fetchone()[0]
+    invalidar_catalogo_produtos()
+    return {
+        'produto_id': str(produto_id),
+        'veiculo_id': str(veiculo_id),
+        'lote_fabricacao': 'LT2024001',
+        'data_instalacao': datetime.now().strftime('%Y-%m-%d'),
+        'nota_fiscal': 'NF1',
+        'nome_estabelecimento': 'Oficina',
+        'quilometragem': '1000',
+    }
+
+
+class TestCriarGarantia:
+    """criar_garantia com o índice único de garantia ativa"""
+
+    def test_email_sem_consulta_adicional(self, authenticated_user, temp_db, formulario_garantia):
+        client = authenticated_user['client']
+
+        with patch('app.async_tasks.send_warranty_activation_email_async') as enviar:
+            response = client.post('/cliente/garantias/nova', data=formulario_garantia)
+
+        assert response.status_code == 302
+        assert response.headers['location'] == '/cliente/garantias?sucesso=ativada'
+        dados = enviar.call_args.kwargs
+        assert dados['produto_nome'] == 'Amortecedor Dianteiro'
+        assert dados['veiculo_info'] == 'VW Gol (ABC1234)'
+        assert dados['user_email'] == authenticated_user['user_data']['email']
+        assert dados['user_name'] == authenticated_user['user_data']['nome']
+
+    def test_duplicada_barrada_pelo_indice(self, authenticated_user, temp_db, formulario_garantia):
+        client = authenticated_user['client']
+
+        with patch('app.async_tasks.send_warranty_activation_email_async'):
+            client.post('/cliente/garantias/nova', data=formulario_garantia)
+            response = client.post('/cliente/garantias/nova', data=formulario_garantia)
+
+        assert response.status_code == 200
+        assert 'Já existe uma garantia ativa para este produto neste veículo' in response.text
+        assert _contar(temp_db, 'garantias') == 1
+
+    def test_reativar_com_outra_ativa(self, authenticated_user, temp_db, formulario_garantia):
+        """Reativar quando já há outra garantia ativa devolve o erro específico"""
+        client = authenticated_user['client']
+
+        with patch('app.async_tasks.send_warranty_activation_email_async'):
+            client.post('/cliente/garantias/nova', data=formulario_garantia)
+            primeira = temp_db.execute("SELECT MAX(id) FROM garantias").fetchone()[0]
+            client.get(f'/cliente/garantias/{primeira}/toggle')
+            client.post('/cliente/garantias/nova', data=formulario_garantia)
+
+        response = client.get(f'/cliente/garantias/{primeira}/toggle')
+
+        assert response.status_code == 302
+        assert response.headers['location'] == '/cliente/garantias?erro=garantia_ativa_existente'
+        assert temp_db.execute("SELECT ativo FROM garantias WHERE id = ?", (primeira,)).fetchone()[0] == 0
+        assert _contar(temp_db, 'garantias') == 2
+
+
+class TestMigracaoGarantiaAtivaUnica:
+    """Migração do índice único parcial"""
+
+    def test_desativa_duplicadas_existentes(self, temp_db):
+        temp_db.execute("DROP INDEX idx_garantias_produto_veiculo_ativa")
+        usuario_id = temp_db.execute("SELECT id FROM usuarios LIMIT 1").fetchone()[0]
+        produto_id = temp_db.execute("INSERT INTO produtos (sku) VALUES ('DUP-1') RETURNING id").fetchall()[0][0]
+        veiculo_id = temp_db.execute(
+            "INSERT INTO veiculos (usuario_id, marca, modelo, placa) VALUES (?, 'VW', 'Gol', 'DUP1234') RETURNING id",
+            (usuario_id,)
+        ).fetchall()[0][0]
+        ids = [
+            temp_db.execute("""
+                INSERT INTO garantias (usuario_id, produto_id, veiculo_id, lote_fabricacao, data_instalacao,
+                                       nota_fiscal, nome_estabelecimento, quilometragem, ativo)
+                VALUES (?, ?, ?, 'L1', '2024-01-15', 'NF', 'Oficina', 0, TRUE)
+                RETURNING id
+            """, (usuario_id, produto_id, veiculo_id)).fetchall()[0][0]
+            for _ in range(3)
+        ]
+
+        m0012_garantias_ativa_unica.upgrade(temp_db)
+
+        ativas = temp_db.execute("SELECT id FROM garantias WHERE ativo = TRUE").fetchall()
+        assert [row[0] for row in ativas] == ids[:1]
+        assert _contar(temp_db, 'garantias') == 3
+        relatorio = temp_db.execute(
+            "SELECT garantia_id, garantia_mantida_id, motivo FROM garantias_desativadas ORDER BY garantia_id"
+        ).fetchall()
+        assert [tuple(row) for row in relatorio] == [
+            (ids[1], ids[0], m0012_garantias_ativa_unica.MOTIVO_DUPLICADA),
+            (ids[2], ids[0], m0012_garantias_ativa_unica.MOTIVO_DUPLICADA),
+        ]
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Testes para placa/chassi normalizados e detecção de veículos duplicados
+"""
+
+import pytest
+
+from app.migrations import aplicar_migracoes, descobrir_migracoes
+from models.veiculo import Veiculo
+
+
+class TestNormalizacao:
+    """Testes para normalização de placa e chassi"""
+
+    @pytest.mark.parametrize("placa,esperado", [
+        ('ABC1234', 'ABC1C34'),
+        ('abc-1234', 'ABC1C34'),
+        ('ABC1C34', 'ABC1C34'),
+        ('ABC 1D23', 'ABC1D23'),
+        ('SEM-PLACA', None),
+        ('', None),
+        (None, None),
+    ])
+    def test_normalizar_placa(self, placa, esperado):
+        """Formato antigo e Mercosul resultam na mesma chave"""
+        assert Veiculo.normalizar_placa(placa) == esperado
+
+    def test_normalizar_chassi(self):
+        """Chassi é normalizado para maiúsculas sem pontuação"""
+        assert Veiculo.normalizar_chassi(' 1hgbh41-jxmn109186 ') == '1HGBH41JXMN109186'
+        assert Veiculo.normalizar_chassi('') is None
+
+
+class TestMigracaoPlacaNorm:
+    """Testes para o preenchimento das colunas normalizadas"""
+
+    def test_backfill_e_duplicados(self, temp_db):
+        """Migração preenche as chaves e libera duplicados antes do índice único"""
+        versao_norm = next(m.versao for m in descobrir_migracoes() if 'placa_chassi_norm' in m.nome)
+        temp_db.execute("DROP INDEX idx_veiculos_placa_norm")
+        temp_db.execute("DROP INDEX idx_veiculos_chassi_norm")
+        temp_db.execute("DELETE FROM schema_version WHERE versao >= ?", (versao_norm,))
+        for placa in ('ABC1234', 'ABC-1C34', 'SEM-PLACA'):
+            temp_db.execute(
+                "INSERT INTO veiculos (usuario_id, marca, modelo, placa) VALUES (1, 'VW', 'Gol', ?)",
+                (placa,)
+            )
+
+        aplicar_migracoes(temp_db)
+
+        rows = temp_db.execute("SELECT placa, placa_norm FROM veiculos ORDER BY id").fetchall()
+        assert rows[0] == ('ABC1234', 'ABC1C34')
+        assert rows[1] == ('ABC-1C34', None)
+        assert rows[2] == ('SEM-PLACA', None)
+
+
+class TestDeduplicacaoRoutes:
+    """Testes para cadastro de veículos duplicados"""
+
+    def test_placa_formato_antigo_duplica_mercosul(self, authenticated_user, temp_db, sample_veiculo_data):
+        """Placa no formato antigo é detectada como duplicada da versão Mercosul"""
+        client = authenticated_user['client']
+        client.post('/cliente/veiculos', data=sample_veiculo_data)
+
+        dados = dict(sample_veiculo_data, placa='ABC1C34', chassi='')
+        response = client.post('/cliente/veiculos', data=dados)
+
+        assert response.status_code == 200
+        assert 'Esta placa já está cadastrada no sistema' in response.text
+        total = temp_db.execute("SELECT COUNT(*) FROM veiculos").fetchone()[0]
+        assert total == 1
+
+    def test_indice_unico_impede_insercao_concorrente(self, authenticated_user, temp_db):
+        """Índice único parcial rejeita duas placas normalizadas iguais ativas"""
+        temp_db.execute(
+            "INSERT INTO veiculos (usuario_id, marca, modelo, placa, placa_norm) VALUES (1, 'VW', 'Gol', 'ABC1234', 'ABC1C34')"
+        )
+        inserido = temp_db.execute("""
+            INSERT INTO veiculos (usuario_id, marca, modelo, placa, placa_norm)
+            VALUES (2, 'VW', 'Gol', 'ABC1C34', 'ABC1C34')
+            ON CONFLICT DO NOTHING RETURNING id
+        """).fetchone()
+
+        assert inserido is None
+
+    def test_reativar_veiculo_com_placa_em_uso(self, authenticated_user, temp_db):
+        """Veículo inativo não pode ser reativado se a placa estiver em uso"""
+        client = authenticated_user['client']
+        user_id = authenticated_user['id']
+        temp_db.execute(
+            "INSERT INTO veiculos (usuario_id, marca, modelo, placa, placa_norm, ativo) VALUES (?, 'VW', 'Gol', 'ABC1234', 'ABC1C34', 0)",
+            (user_id,)
+        )
+        inativo_id = temp_db.execute("SELECT last_insert_rowid()").fetchone()[0]
+        temp_db.execute(
+            "INSERT INTO veiculos (usuario_id, marca, modelo, placa, placa_norm) VALUES (?, 'VW', 'Gol', 'ABC1C34', 'ABC1C34')",
+            (user_id,)
+        )
+
+        response = client.get(f'/cliente/veiculos/{inativo_id}/toggle')
+
+        assert response.headers['location'] == '/cliente/veiculos?erro=duplicado'